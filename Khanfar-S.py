@@ -1,105 +1,57 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import subprocess
-import json
 import os
-import win32com.client
+import queue
+import time
 from datetime import datetime
-from cryptography.fernet import Fernet
-from base64 import b64encode
-from hashlib import sha256
+from command_pipeline import LatencyStats
+from i18n import Translator
+from config import format_value
+
+# NumPy-backed modules (scan list, rtl_tcp, spectrum, supervisor, activity),
+# cryptography and the control API (asyncio alone is ~70 ms) are imported
+# where they are first used, so importing the launcher stays cheap.
+STARTED = time.perf_counter()
+# startup_bench.py: quit as soon as the window is up
+STARTUP_BENCH = bool(os.environ.get('KHANFAR_STARTUP_BENCH'))
+ENCRYPTION_KEY = b'khanfar_secure_key_2024'
 
 class SDRLauncherGUI:
     def __init__(self, root):
         self.root = root
         
-        # Initialize translations first
-        self.translations = {
-            'ar': {
-                'window_title': 'أنظمة خنفر',
-                'frequency_control': 'التحكم بالتردد',
-                'frequency_mhz': 'التردد (ميجاهرتز):',
-                'set': 'تعيين',
-                'scanner_controls': 'أدوات المسح',
-                'load_list': 'تحميل القائمة',
-                'save_list': 'حفظ القائمة',
-                'add_current': 'إضافة التردد الحالي',
-                'launch': 'تشغيل',
-                'start_scan': 'بدء المسح (S)',
-                'stop_scan': 'إيقاف المسح (S)',
-                'ready': 'جاهز',
-                'scanning': 'جاري المسح...',
-                'frequency_set': 'تم تعيين التردد: {} ميجاهرتز',
-                'launch_success': 'تم التشغيل بنجاح',
-                'save_success': 'تم الحفظ بنجاح',
-                'settings_loaded': 'تم تحميل الإعدادات',
-                'invalid_frequency': 'تردد غير صالح',
-                'launch_fmp_first': 'الرجاء تشغيل البرنامج أولاً',
-                'settings': 'الإعدادات',
-                'advanced': 'متقدم',
-                'language': 'اللغة',
-                'save_settings': 'حفظ الإعدادات',
-                'main_controls': 'التحكم الرئيسي',
-                'activation_title': 'تفعيل البرنامج',
-                'activation_message': 'الرجاء إدخال رمز التفعيل:',
-                'invalid_key': 'رمز التفعيل غير صالح',
-                'activation_success': 'تم التفعيل بنجاح',
-                'activate': 'تفعيل'
-            },
-            'en': {
-                'window_title': 'Khanfar Scanner',
-                'frequency_control': 'Frequency Control',
-                'frequency_mhz': 'Frequency (MHz):',
-                'set': 'Set',
-                'scanner_controls': 'Scanner Controls',
-                'load_list': 'Load List',
-                'save_list': 'Save List',
-                'add_current': 'Add Current',
-                'launch': 'Launch',
-                'start_scan': 'Start Scan (S)',
-                'stop_scan': 'Stop Scan (S)',
-                'ready': 'Ready',
-                'scanning': 'Scanning...',
-                'frequency_set': 'Frequency set to: {} MHz',
-                'launch_success': 'Launch successful',
-                'save_success': 'Save successful',
-                'settings_loaded': 'Settings loaded',
-                'invalid_frequency': 'Invalid frequency',
-                'launch_fmp_first': 'Please launch FMP24 first',
-                'settings': 'Settings',
-                'advanced': 'Advanced',
-                'language': 'Language',
-                'save_settings': 'Save Settings',
-                'main_controls': 'Main Controls',
-                'activation_title': 'Software Activation',
-                'activation_message': 'Please enter your activation key:',
-                'invalid_key': 'Invalid activation key',
-                'activation_success': 'Activation successful',
-                'activate': 'Activate'
-            }
-        }
+        # Settings, scan list and FMP24 are owned by the controller; the
+        # window is one client of its API
+        self.controller_server = None
+        self.api = self.connect_controller()
+        settings = self.api.call('get_settings')
+        
+        # Message catalogs are read from locales/ when a language is first used
+        self.i18n = Translator(settings['language'])
         
         # Initialize language
-        self.current_language = tk.StringVar(value='ar')
+        self.current_language = tk.StringVar(value=settings['language'])
         self.current_language.trace_add('write', self.on_language_change)
         
         # Add encryption key
-        self.encryption_key = b'khanfar_secure_key_2024'  # 32 bytes key
+        self.encryption_key = ENCRYPTION_KEY  # 32 bytes key
         
         # Check activation before proceeding
         if not self.check_activation():
             self.show_activation_dialog()
             if not hasattr(self, 'activated') or not self.activated:
+                self.disconnect_controller()
                 self.root.destroy()
                 return
         
-        self.root.title(self.get_text('window_title'))
+        self.i18n.bind_setter('window_title', self.root.title, 'window_title')
         
         # Initialize variables
         self.scanning = False
+        self.launched = False
         self.current_entry = None
-        self.fmp_process = None
         self.scan_frequencies = []
+        self.scan_list = None
         
         # Style configuration
         self.style = ttk.Style()
@@ -113,6 +65,8 @@ class SDRLauncherGUI:
         self.ppm = tk.StringVar(value="23")
         self.rf_gain = tk.StringVar(value="32")
         self.frequency = tk.StringVar(value="423")
+        self.dongle_count = tk.StringVar(value="1")
+        self.reference_mhz = tk.StringVar(value="")
         
         # Validate entries
         self.input_device.trace_add("write", self.validate_input_device)
@@ -122,6 +76,8 @@ class SDRLauncherGUI:
         self.frequency.trace_add("write", self.validate_frequency)
         
         self.role_config = tk.BooleanVar(value=True)
+        self.control_backend = tk.StringVar(value="sendkeys")
+        self.rtl_tcp_address = tk.StringVar(value="127.0.0.1:1234")
         self.muted = tk.BooleanVar(value=False)
         
         # Create status label first
@@ -139,9 +95,20 @@ class SDRLauncherGUI:
         self.create_gui()
         
         # Load saved settings
-        self.load_settings()
+        self.load_settings(settings)
+        self.control_backend.trace_add('write', self.on_backend_change)
+        
+        # Command results, scan state and ScanList changes arrive as events
+        self.api.subscribe()
+        status = self.api.call('status')
+        self.launched = status['launched']
+        if status['scanning']:
+            self.scanning = True
+            self.i18n.bind(self.scan_btn, 'stop_scan')
+        self.root.after(50, self.poll_events)
         
         # Bind keyboard shortcuts
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         self.root.bind('<s>', self.toggle_scan)
         self.root.bind('<S>', self.toggle_scan)
         self.root.bind('g', lambda e: self.adjust_gain(-1))   # Decrease gain
@@ -149,55 +116,83 @@ class SDRLauncherGUI:
         self.root.bind('p', lambda e: self.adjust_ppm(-1))   # Decrease PPM
         self.root.bind('P', lambda e: self.adjust_ppm(1))    # Increase PPM
         
+    def connect_controller(self):
+        """Use a controller that is already running, or start one in-process"""
+        from config import ConfigStore
+        from control_api import ControlClient, ControlServer, DEFAULT_ADDRESS
+        from controller import ScannerController
+        settings = ConfigStore()
+        address = settings.get('api_address') or DEFAULT_ADDRESS
+        try:
+            client = ControlClient(address)
+            settings.close()
+            return client
+        except OSError:
+            pass
+        controller = ScannerController(settings)
+        try:
+            self.controller_server = ControlServer(controller, address).start()
+        except OSError:
+            # Address taken by something else; scripts can't reach this one
+            self.controller_server = ControlServer(controller, '127.0.0.1:0').start()
+        return ControlClient(self.controller_server.bound)
+        
+    def disconnect_controller(self):
+        """Close the API connection; FMP24 is left running"""
+        self.api.close()
+        if self.controller_server is not None:
+            self.controller_server.stop(stop_fmp=False)
+            self.controller_server = None
+            
+    def poll_events(self):
+        """Handle controller events on the Tk thread"""
+        try:
+            while True:
+                event, data = self.api.events.get_nowait()
+                if event == 'command':
+                    self.on_command_result(data)
+                elif event == 'scan':
+                    self.scanning = data['scanning']
+                    self.i18n.bind(self.scan_btn, 'stop_scan' if self.scanning else 'start_scan')
+                elif event == 'scan_list' and data['source'] == 'disk':
+                    self.on_scan_list_changed()
+                elif event == 'launch':
+                    self.launched = True
+                elif event == 'ppm' and 'ppm' in data:
+                    self.ppm.set(f"{data['ppm']:.1f}")
+                elif event == 'gain' and 'gain' in data:
+                    self.rf_gain.set(f"{data['gain']:.1f}")
+                elif event == 'disconnected':
+                    self.status_label.config(text=f"Controller connection lost: {data['message']}")
+                    return
+        except queue.Empty:
+            pass
+        self.root.after(50, self.poll_events)
+        
+    def when_done(self, future, done, interval=100):
+        """Call done(result, error) on the Tk thread once an API request has finished"""
+        if not future.done():
+            self.root.after(interval, self.when_done, future, done, interval)
+            return
+        error = future.exception()
+        done(None if error is not None else future.result(), error)
+        
+    def show_api_error(self, error, title="Warning"):
+        message = self.get_text(error.key) if getattr(error, 'key', None) else str(error)
+        messagebox.showwarning(title, message)
+
     def get_text(self, key, *args):
         """Get translated text"""
-        text = self.translations[self.current_language.get()].get(key, key)
-        if args:
-            return text.format(*args)
-        return text
+        return self.i18n.get(key, *args)
 
     def on_language_change(self, *args):
         """Update GUI text when language changes"""
-        # Update window title
-        self.root.title(self.get_text('window_title'))
-        
-        # Update notebook tabs
-        self.notebook.tab(0, text=self.get_text('main_controls'))
-        self.notebook.tab(1, text=self.get_text('scanner_controls'))
-        self.notebook.tab(2, text=self.get_text('settings'))
-        self.notebook.tab(3, text=self.get_text('advanced'))
-        
-        # Update scan button text
-        if self.scanning:
-            self.scan_btn.config(text=self.get_text('stop_scan'))
-        else:
-            self.scan_btn.config(text=self.get_text('start_scan'))
-        
-        # Update all frame labels
-        for widget in self.root.winfo_children():
-            self.update_widget_text(widget)
+        # One pass over the widgets bound to message keys
+        self.i18n.set_language(self.current_language.get())
             
         # Save settings when language changes
         self.save_settings()
             
-    def update_widget_text(self, widget):
-        """Recursively update text for all widgets"""
-        try:
-            if isinstance(widget, (ttk.Button, ttk.Label, ttk.LabelFrame)):
-                current_text = widget.cget('text')
-                # Find matching key by checking both English and Arabic values
-                for lang in ['en', 'ar']:
-                    for key, value in self.translations[lang].items():
-                        if str(value) == str(current_text):
-                            widget.configure(text=self.get_text(key))
-                            break
-                            
-            # Update children widgets
-            for child in widget.winfo_children():
-                self.update_widget_text(child)
-        except:
-            pass  # Skip any widgets that can't be updated
-            
     def create_gui(self):
         # Create notebook for tabs
         self.notebook = ttk.Notebook(self.root)
@@ -208,28 +203,49 @@ class SDRLauncherGUI:
         scanner_frame = ttk.Frame(self.notebook)
         settings_frame = ttk.Frame(self.notebook)
         advanced_frame = ttk.Frame(self.notebook)
-        
-        self.notebook.add(main_frame, text=self.get_text('main_controls'))
-        self.notebook.add(scanner_frame, text=self.get_text('scanner_controls'))
-        self.notebook.add(settings_frame, text=self.get_text('settings'))
-        self.notebook.add(advanced_frame, text=self.get_text('advanced'))
-        
-        # Create controls in each tab
+        spectrum_frame = ttk.Frame(self.notebook)
+        
+        tabs = [
+            (main_frame, 'main_controls'),
+            (scanner_frame, 'scanner_controls'),
+            (settings_frame, 'settings'),
+            (advanced_frame, 'advanced'),
+            (spectrum_frame, 'spectrum'),
+        ]
+        for frame, key in tabs:
+            self.notebook.add(frame)
+            self.i18n.bind_setter(f'tab:{key}', lambda text, frame=frame: self.notebook.tab(frame, text=text), key)
+        
+        # Only the first tab is built now; the others when first selected
+        self.scanner_frame = scanner_frame
+        self.tab_builders = {
+            str(scanner_frame): self.create_scanner_controls,
+            str(settings_frame): self.create_settings_controls,
+            str(advanced_frame): self.create_advanced_controls,
+            str(spectrum_frame): self.create_spectrum_controls,
+        }
         self.create_main_controls(main_frame)
-        self.create_scanner_controls(scanner_frame)
-        self.create_settings_controls(settings_frame)
-        self.create_advanced_controls(advanced_frame)
+        self.notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
+
+    def on_tab_changed(self, event=None):
+        self.ensure_tab(self.notebook.select())
+
+    def ensure_tab(self, frame):
+        """Build a deferred tab's widgets if that hasn't happened yet"""
+        builder = self.tab_builders.pop(str(frame), None)
+        if builder is not None:
+            builder(self.root.nametowidget(str(frame)))
 
     def create_main_controls(self, parent):
         # Frequency control frame
-        freq_frame = ttk.LabelFrame(parent, text=self.get_text('frequency_control'), padding="5")
+        freq_frame = self.i18n.bind(ttk.LabelFrame(parent, padding="5"), 'frequency_control')
         freq_frame.grid(row=0, column=0, sticky='nsew', padx=5, pady=5)
         
-        ttk.Label(freq_frame, text=self.get_text('frequency_mhz')).grid(row=0, column=0, sticky='w', padx=5)
+        self.i18n.bind(ttk.Label(freq_frame), 'frequency_mhz').grid(row=0, column=0, sticky='w', padx=5)
         freq_entry = ttk.Entry(freq_frame, textvariable=self.frequency, width=12)
         freq_entry.grid(row=0, column=1, padx=5)
         freq_entry.bind('<Return>', self.set_frequency)
-        ttk.Button(freq_frame, text=self.get_text('set'), command=self.set_frequency).grid(row=0, column=2, padx=5)
+        self.i18n.bind(ttk.Button(freq_frame, command=self.set_frequency), 'set').grid(row=0, column=2, padx=5)
         
         # Step size selector
         self.step_size = tk.StringVar(value="0.00625")  # 6.25 kHz
@@ -248,17 +264,20 @@ class SDRLauncherGUI:
         ttk.Label(device_frame, text="Output Device:").grid(row=1, column=0, sticky='w', padx=5)
         ttk.Entry(device_frame, textvariable=self.output_device, width=10).grid(row=1, column=1, padx=5)
         
+        ttk.Label(device_frame, text="Dongles:").grid(row=2, column=0, sticky='w', padx=5)
+        ttk.Spinbox(device_frame, from_=1, to=8, textvariable=self.dongle_count, width=8).grid(row=2, column=1, padx=5)
+        
         # Control buttons frame
         control_frame = ttk.Frame(parent, padding="5")
         control_frame.grid(row=3, column=0, sticky='ew', pady=10)
         
-        ttk.Button(control_frame, text=self.get_text('launch'), command=self.launch_fmp24).pack(side='left', padx=5)
-        self.scan_btn = ttk.Button(control_frame, text=self.get_text('start_scan'), command=self.toggle_scan)
+        self.i18n.bind(ttk.Button(control_frame, command=self.launch_fmp24), 'launch').pack(side='left', padx=5)
+        self.scan_btn = self.i18n.bind(ttk.Button(control_frame, command=self.toggle_scan), 'start_scan')
         self.scan_btn.pack(side='left', padx=5)
-        ttk.Button(control_frame, text=self.get_text('save_settings'), command=self.save_config).pack(side='left', padx=5)
+        self.i18n.bind(ttk.Button(control_frame, command=self.save_config), 'save_settings').pack(side='left', padx=5)
         
     def create_scanner_controls(self, parent):
-        scanner_frame = ttk.LabelFrame(parent, text=self.get_text('scanner_controls'), padding="5")
+        scanner_frame = self.i18n.bind(ttk.LabelFrame(parent, padding="5"), 'scanner_controls')
         scanner_frame.pack(fill='both', expand=True, padx=5, pady=5)
 
         # Scan list using Text widget for direct editing
@@ -276,16 +295,16 @@ class SDRLauncherGUI:
         btn_frame = ttk.Frame(scanner_frame)
         btn_frame.pack(fill='x', pady=5)
         
-        ttk.Button(btn_frame, text=self.get_text('load_list'), command=self.load_scan_list).pack(side='left', padx=5)
-        ttk.Button(btn_frame, text=self.get_text('save_list'), command=self.save_scan_list).pack(side='left', padx=5)
-        ttk.Button(btn_frame, text=self.get_text('add_current'), command=self.add_frequency).pack(side='left', padx=5)
+        self.i18n.bind(ttk.Button(btn_frame, command=self.load_scan_list), 'load_list').pack(side='left', padx=5)
+        self.i18n.bind(ttk.Button(btn_frame, command=self.save_scan_list), 'save_list').pack(side='left', padx=5)
+        self.i18n.bind(ttk.Button(btn_frame, command=self.add_frequency), 'add_current').pack(side='left', padx=5)
 
         # Load initial scan list
         self.load_scan_list()
 
     def create_settings_controls(self, parent):
         # Settings frame
-        settings_frame = ttk.LabelFrame(parent, text=self.get_text('settings'), padding="5")
+        settings_frame = self.i18n.bind(ttk.LabelFrame(parent, padding="5"), 'settings')
         settings_frame.pack(fill='both', expand=True, padx=5, pady=5)
         
         # PPM correction
@@ -296,6 +315,9 @@ class SDRLauncherGUI:
         ttk.Label(ppm_frame, text="Use 'p' to decrease, 'P' to increase").pack(side='left', padx=5)
         ttk.Button(ppm_frame, text="P↑", command=lambda: self.adjust_ppm(1)).pack(side='left', padx=2)
         ttk.Button(ppm_frame, text="p↓", command=lambda: self.adjust_ppm(-1)).pack(side='left', padx=2)
+        ttk.Label(ppm_frame, text="Reference MHz:").pack(side='left', padx=5)
+        ttk.Entry(ppm_frame, textvariable=self.reference_mhz, width=10).pack(side='left', padx=2)
+        ttk.Button(ppm_frame, text="Calibrate", command=self.calibrate_ppm).pack(side='left', padx=2)
         
         # RF Gain
         ttk.Label(settings_frame, text="RF Gain Control:").grid(row=1, column=0, sticky='w', padx=5)
@@ -305,25 +327,38 @@ class SDRLauncherGUI:
         ttk.Label(gain_frame, text="Use 'g' to decrease, 'G' to increase").pack(side='left', padx=5)
         ttk.Button(gain_frame, text="G↑", command=lambda: self.adjust_gain(1)).pack(side='left', padx=2)
         ttk.Button(gain_frame, text="g↓", command=lambda: self.adjust_gain(-1)).pack(side='left', padx=2)
+        ttk.Button(gain_frame, text="Auto", command=self.auto_gain).pack(side='left', padx=2)
         
         # Role configuration
         ttk.Checkbutton(settings_frame, text="Role Configuration (-rc)",
                       variable=self.role_config).grid(row=2, column=0, columnspan=2, sticky='w', padx=5)
         
+        # Control backend
+        backend_frame = ttk.LabelFrame(settings_frame, text="Control Backend", padding="5")
+        backend_frame.grid(row=3, column=0, columnspan=2, sticky='ew', padx=5, pady=5)
+        
+        ttk.Radiobutton(backend_frame, text="SendKeys (FMP24 window)", value="sendkeys",
+                       variable=self.control_backend).grid(row=0, column=0, columnspan=2, sticky='w', padx=5)
+        ttk.Radiobutton(backend_frame, text="rtl_tcp", value="rtl_tcp",
+                       variable=self.control_backend).grid(row=1, column=0, sticky='w', padx=5)
+        address_entry = ttk.Entry(backend_frame, textvariable=self.rtl_tcp_address, width=20)
+        address_entry.grid(row=1, column=1, sticky='w', padx=5)
+        address_entry.bind('<Return>', self.on_backend_change)
+        
         # Batch file controls
         batch_frame = ttk.LabelFrame(settings_frame, text="Batch File", padding="5")
-        batch_frame.grid(row=3, column=0, columnspan=2, sticky='ew', padx=5, pady=10)
+        batch_frame.grid(row=4, column=0, columnspan=2, sticky='ew', padx=5, pady=10)
         
         ttk.Button(batch_frame, text="Create Batch File", command=self.create_batch).pack(side='left', padx=5)
         ttk.Button(batch_frame, text="Load Defaults", command=self.load_defaults).pack(side='left', padx=5)
         
     def create_advanced_controls(self, parent):
         """Create advanced settings controls"""
-        advanced_frame = ttk.LabelFrame(parent, text=self.get_text('advanced'), padding="5")
+        advanced_frame = self.i18n.bind(ttk.LabelFrame(parent, padding="5"), 'advanced')
         advanced_frame.pack(fill='both', expand=True, padx=5, pady=5)
         
         # Language selection
-        lang_frame = ttk.LabelFrame(advanced_frame, text=self.get_text('language'), padding="5")
+        lang_frame = self.i18n.bind(ttk.LabelFrame(advanced_frame, padding="5"), 'language')
         lang_frame.pack(fill='x', padx=5, pady=5)
         
         ttk.Radiobutton(lang_frame, text="عربي", value="ar", 
@@ -331,6 +366,156 @@ class SDRLauncherGUI:
         ttk.Radiobutton(lang_frame, text="English", value="en",
                        variable=self.current_language).pack(side='left', padx=20)
 
+    def create_spectrum_controls(self, parent):
+        """Spectrum trace and waterfall drawn from an rtl_tcp IQ stream"""
+        from spectrum import fft_settings
+        try:
+            self.spectrum_settings = fft_settings("FMP24.cfg")
+        except (OSError, ValueError, IndexError):
+            self.spectrum_settings = {'sample_rate': 2.4e6, 'width': 1024, 'fft_size': 65536, 'update_rate': 15.0}
+        self.spectrum_worker = None
+        self.spectrum_tk_stats = LatencyStats(512)
+        self.iq_address = tk.StringVar(value=self.rtl_tcp_address.get())
+        
+        source_frame = ttk.Frame(parent, padding="5")
+        source_frame.pack(fill='x')
+        ttk.Label(source_frame, text="IQ source (rtl_tcp or file):").pack(side='left', padx=5)
+        ttk.Entry(source_frame, textvariable=self.iq_address, width=22).pack(side='left', padx=5)
+        self.spectrum_btn = ttk.Button(source_frame, text="Start", command=self.toggle_spectrum)
+        self.spectrum_btn.pack(side='left', padx=5)
+        self.spectrum_stats_label = ttk.Label(source_frame, text="")
+        self.spectrum_stats_label.pack(side='left', padx=5)
+        
+        width = self.spectrum_settings['width']
+        self.spectrum_photo = tk.PhotoImage(width=width, height=420)
+        ttk.Label(parent, image=self.spectrum_photo).pack(padx=5, pady=5)
+        
+        # Spectrum memory (FMP's M/X keys) and carriers it found that aren't in the ScanList
+        memory_frame = ttk.Frame(parent, padding="5")
+        memory_frame.pack(fill='x')
+        self.spectrum_memory_shown = tk.BooleanVar(value=True)
+        ttk.Checkbutton(memory_frame, text="Memory (M)", variable=self.spectrum_memory_shown,
+                        command=self.toggle_spectrum_memory).pack(side='left', padx=5)
+        ttk.Button(memory_frame, text="Reset (X)", command=self.reset_spectrum_memory).pack(side='left', padx=5)
+        ttk.Button(memory_frame, text="Add to ScanList", command=self.add_discovery).pack(side='right', padx=5)
+        self.discoveries = []
+        self.discovery_list = tk.Listbox(parent, height=5)
+        self.discovery_list.pack(fill='x', padx=5, pady=5)
+        self.discovery_list.bind('<Double-Button-1>', lambda event: self.add_discovery())
+        
+    def toggle_spectrum(self):
+        """Start or stop the spectrum worker"""
+        if self.spectrum_worker is not None:
+            self.spectrum_worker.stop()
+            self.spectrum_worker = None
+            self.spectrum_btn.config(text="Start")
+            return
+        try:
+            from iq_file import open_source
+            from spectrum import SpectrumWorker
+            from spectrum_memory import SpectrumMemory
+            from survey import step_table
+            settings = self.spectrum_settings
+            center_hz = float(self.frequency.get()) * 1e6
+            # A recording (FMP's R key or an rtl_sdr capture) is replayed at the dongle's pace
+            source = open_source(self.iq_address.get(), settings['sample_rate'], center_hz)
+            memory = SpectrumMemory(settings['fft_size'], settings['sample_rate'], center_hz,
+                                    settings['update_rate'], self.listed_frequencies(),
+                                    step_table("FMP24.cfg"))
+            self.spectrum_worker = SpectrumWorker(
+                source, settings['fft_size'], settings['width'], settings['update_rate'],
+                settings['sample_rate'], memory, trace_height=120, waterfall_height=300).start()
+            self.spectrum_worker.show_memory = self.spectrum_memory_shown.get()
+            self.spectrum_btn.config(text="Stop")
+            self.spectrum_frame_count = 0
+            self.spectrum_started = datetime.now()
+            self.update_spectrum()
+        except Exception as e:
+            self.status_label.config(text=f"Spectrum failed: {str(e)}")
+            
+    def update_spectrum(self):
+        """Show the newest rendered frame on the Tk loop"""
+        worker = self.spectrum_worker
+        if worker is None:
+            return
+        if worker.error is not None:
+            self.status_label.config(text=f"Spectrum stopped: {str(worker.error)}")
+            self.toggle_spectrum()
+            return
+        alerts = worker.memory.alerts()
+        if alerts:
+            self.show_discoveries()
+            latest = alerts[-1]
+            self.status_label.config(text=(
+                f"New carrier {latest['freq_hz'] / 1e6:.5f} MHz ({latest['snr_db']:.0f} dB) "
+                f"at {datetime.fromtimestamp(latest['first_seen']).strftime('%H:%M:%S')}"))
+        frame = worker.take_frame()
+        if frame is not None:
+            started = datetime.now()
+            # tkinter only passes bytes objects on as Tcl byte arrays
+            self.spectrum_photo.configure(data=bytes(frame), format='PPM')
+            self.spectrum_tk_stats.add((datetime.now() - started).total_seconds())
+            self.spectrum_frame_count += 1
+            if self.spectrum_frame_count % 15 == 0:
+                elapsed = (datetime.now() - self.spectrum_started).total_seconds()
+                stats = worker.stats()
+                self.spectrum_stats_label.config(text=(
+                    f"{self.spectrum_frame_count / elapsed:.1f} fps  "
+                    f"FFT {stats['fft_p50_ms']:.1f} ms  "
+                    f"draw {stats['render_p50_ms']:.1f} ms  "
+                    f"Tk {self.spectrum_tk_stats.percentile(50) * 1000:.1f} ms"))
+        # Poll at twice the frame rate so a frame is never held back a whole period
+        self.root.after(int(500 / self.spectrum_settings['update_rate']), self.update_spectrum)
+
+    def toggle_spectrum_memory(self):
+        """Show or hide the max-hold overlay (FMP's M key)"""
+        if self.spectrum_worker is not None:
+            self.spectrum_worker.show_memory = self.spectrum_memory_shown.get()
+
+    def reset_spectrum_memory(self):
+        """Clear the max-hold and busy counts (FMP's X key)"""
+        if self.spectrum_worker is not None:
+            self.spectrum_worker.reset_memory()
+
+    def listed_frequencies(self):
+        """Active ScanList frequencies in Hz, as the controller has them"""
+        try:
+            return [freq * 1e6 for freq, mode in self.api.call('channels')]
+        except Exception:
+            return []
+
+    def show_discoveries(self):
+        """Refill the discovered-carrier list, most recently heard first"""
+        if self.spectrum_worker is None:
+            return
+        selected = self.discovery_list.curselection()
+        keep = self.discoveries[selected[0]]['freq_hz'] if selected else None
+        self.discoveries = self.spectrum_worker.memory.discovered()
+        self.discovery_list.delete(0, tk.END)
+        for i, found in enumerate(self.discoveries):
+            first = datetime.fromtimestamp(found['first_seen']).strftime('%H:%M:%S')
+            last = datetime.fromtimestamp(found['last_seen']).strftime('%H:%M:%S')
+            self.discovery_list.insert(tk.END, (
+                f"{found['freq_hz'] / 1e6:.5f} MHz  {found['mode']:<4}  {found['snr_db']:3.0f} dB  "
+                f"x{found['hits']}  first {first}  last {last}"))
+            if found['freq_hz'] == keep:
+                self.discovery_list.selection_set(i)
+
+    def add_discovery(self):
+        """Append the selected discovered carrier to FMP24.ScanList"""
+        selected = self.discovery_list.curselection()
+        if not selected:
+            self.status_label.config(text="Select a discovered carrier first")
+            return
+        found = self.discoveries[selected[0]]
+        self.ensure_tab(self.scanner_frame)
+        self.scan_list.insert(tk.END, found['line'] + "\n")
+        self.save_scan_list()
+        if self.spectrum_worker is not None:
+            self.spectrum_worker.memory.set_listed(self.listed_frequencies())
+            self.show_discoveries()
+        self.status_label.config(text=f"Added {found['freq_hz'] / 1e6:.5f} MHz to FMP24.ScanList")
+
     def update_datetime(self):
         """Update the datetime display in the status bar"""
         self.datetime_label.config(text=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
@@ -343,19 +528,19 @@ class SDRLauncherGUI:
             step = float(self.step_size.get())
             new_freq = current + (direction * step)
             self.frequency.set(f"{new_freq:.6f}")
-            if self.fmp_process:
+            if self.launched:
                 self.send_command(f"f{new_freq}")
         except ValueError:
             self.status_label.config(text="Invalid frequency or step size")
             
     def update_volume(self, *args):
         """Update the volume level"""
-        if self.fmp_process:
+        if self.launched:
             self.send_command(f"v100")  # Set default volume
             
     def toggle_mute(self, event=None):
         """Toggle mute state"""
-        if self.fmp_process:
+        if self.launched:
             self.muted.set(not self.muted.get())
             if self.muted.get():
                 self.send_command("m1")
@@ -366,152 +551,169 @@ class SDRLauncherGUI:
             
     def send_command(self, cmd):
         """Send a command to FMP24 window"""
+        from control_api import RpcError
         try:
-            shell = win32com.client.Dispatch("WScript.Shell")
-            shell.AppActivate("FMP24")
-            shell.SendKeys(cmd)
-        except Exception as e:
+            self.api.call('send_keys', cmd)
+        except (RpcError, OSError) as e:
             self.status_label.config(text=f"Command failed: {str(e)}")
+        
+    def on_backend_change(self, *args):
+        """Switch the controller to the newly selected backend"""
+        from control_api import RpcError
+        try:
+            backend = self.api.call('set_backend', self.control_backend.get(), self.rtl_tcp_address.get())
+            self.status_label.config(text=f"Control backend: {backend['backend']}")
+        except RpcError as e:
+            self.status_label.config(text=str(e))
+        
+    def on_command_result(self, result):
+        """Called on the Tk thread once the controller has dispatched a command"""
+        if result['error'] is not None:
+            self.status_label.config(text=f"Command failed: {result['error']}")
+        elif result['kind'] == 'tune':
+            self.status_label.config(text=self.get_text('frequency_set').format(result['value']))
+        elif result['kind'] == 'scan_restart':
+            self.status_label.config(text=f"Scanning restarted (paused {result['value'] * 1000:.0f} ms)")
             
     def load_scan_list(self):
         """Load frequencies from FMP24.ScanList"""
         try:
-            with open("FMP24.ScanList", 'r') as file:
-                content = file.read()
-                self.scan_list.delete('1.0', tk.END)
-                self.scan_list.insert('1.0', content)
-                self.status_label.config(text="Loaded FMP24.ScanList")
+            content = self.api.call('get_scan_list')
+            self.scan_list.delete('1.0', tk.END)
+            self.scan_list.insert('1.0', content)
+            self.scan_list.edit_modified(False)
+            self.status_label.config(text="Loaded FMP24.ScanList")
         except Exception as e:
             self.status_label.config(text=f"Could not load FMP24.ScanList: {str(e)}")
 
     def save_scan_list(self):
-        """Save current scan list to FMP24.ScanList"""
-        was_scanning = self.scanning  # Remember if we were scanning
-        
-        if was_scanning:
-            # Stop scanning with Esc key
-            self.scanning = False
-            if self.fmp_process:
-                shell = win32com.client.Dispatch("WScript.Shell")
-                shell.AppActivate("FMP24")
-                # Send Esc to stop scanning
-                shell.SendKeys("{ESC}")
+        """Save current scan list to FMP24.ScanList
         
+        The controller restarts a running scan if channels were added or removed.
+        """
         try:
-            content = self.scan_list.get('1.0', tk.END)
-            with open("FMP24.ScanList", 'w') as file:
-                file.write(content)
-            self.status_label.config(text="Saved to FMP24.ScanList")
-            
-            if was_scanning:
-                # Wait a moment before restarting scan
-                self.root.after(2000, self.restart_scan)
-                
+            content = self.scan_list.get('1.0', 'end-1c')
+            diff = self.api.call('save_scan_list', content)
+            self.scan_list.edit_modified(False)
+            self.status_label.config(
+                text=f"Saved to FMP24.ScanList (+{diff['added']}/-{diff['removed']} channels)")
         except Exception as e:
             self.status_label.config(text=f"Could not save FMP24.ScanList: {str(e)}")
             
-    def restart_scan(self):
-        """Restart scanning after save"""
-        if self.fmp_process:
-            shell = win32com.client.Dispatch("WScript.Shell")
-            shell.AppActivate("FMP24")
-            shell.SendKeys("s")  # Press 'S' to restart scanning
-            self.scanning = True
-            self.status_label.config(text="Scanning restarted")
+    def on_scan_list_changed(self):
+        """FMP24.ScanList was changed by another program"""
+        if getattr(self, 'spectrum_worker', None) is not None:
+            self.spectrum_worker.memory.set_listed(self.listed_frequencies())
+            self.show_discoveries()
+        # Nothing to refresh until the scanner tab has loaded the list
+        if self.scan_list is None:
+            return
+        if self.scan_list.edit_modified():
+            # Keep the user's unsaved edits; the next save wins
+            self.status_label.config(text="FMP24.ScanList changed on disk; unsaved edits kept")
+        else:
+            self.load_scan_list()
             
     def add_frequency(self):
-        """Add current frequency to scan list"""
+        """Add current frequency to scan list, described from the frequency lists"""
         try:
             freq = float(self.frequency.get())
-            self.scan_list.insert(tk.END, f"{freq:.3f} NFM\n")
-            self.save_scan_list()  # Auto-save after adding
-            self.status_label.config(text=f"Added frequency: {freq:.3f} MHz")
         except ValueError:
             messagebox.showerror("Error", "Invalid frequency value")
+            return
+        self.when_done(self.api.request('scan_line', freq), self.on_scan_line)
+
+    def on_scan_line(self, result, error):
+        if error is not None:
+            self.status_label.config(text=f"Could not add frequency: {str(error)}")
+            return
+        self.scan_list.insert(tk.END, result['line'] + "\n")
+        self.save_scan_list()  # Auto-save after adding
+        self.status_label.config(text=f"Added {result['line']}")
 
     def toggle_scan(self, event=None):
         """Toggle scanning mode"""
+        from control_api import RpcError
         try:
             if not self.scanning:
-                # Get frequencies from Text widget and parse them
-                frequencies = []
-                for line in self.scan_list.get('1.0', tk.END).splitlines():
-                    if line.strip():  # Skip empty lines
-                        # Split line and take first part as frequency
-                        freq_str = line.split()[0]  # Take first part before NFM
-                        try:
-                            freq = float(freq_str)
-                            frequencies.append(freq)
-                        except ValueError:
-                            continue  # Skip invalid frequencies
-                            
-                if not frequencies:
-                    messagebox.showwarning("Warning", "No valid frequencies in scan list")
-                    return
-                    
-                self.scan_frequencies = frequencies
+                self.ensure_tab(self.scanner_frame)
+                # Saves the list, re-parsing only the lines edited since the last scan
+                result = self.api.call('start_scan', self.scan_list.get('1.0', 'end-1c'))
+                self.scan_list.edit_modified(False)
                 self.scanning = True
-                
-                # Send scan command to FMP24
-                if self.fmp_process:
-                    shell = win32com.client.Dispatch("WScript.Shell")
-                    shell.AppActivate("FMP24")
-                    shell.SendKeys("s")
-                    self.status_label.config(text="Scanning started")
+                if result['errors']:
+                    line, message = result['errors'][0]
+                    self.status_label.config(
+                        text=f"Scan list line {line}: {message} ({result['error_count']} errors)")
                 else:
-                    messagebox.showwarning("Warning", "Please launch FMP24 first")
-                    self.scanning = False
+                    self.status_label.config(text="Scanning started")
             else:
                 # Stop scanning with Esc key
+                self.api.call('stop_scan')
                 self.scanning = False
-                if self.fmp_process:
-                    shell = win32com.client.Dispatch("WScript.Shell")
-                    shell.AppActivate("FMP24")
-                    # Send Esc to stop scanning
-                    shell.SendKeys("{ESC}")
                 self.status_label.config(text="Scanning stopped")
+        except RpcError as e:
+            self.show_api_error(e)
+            self.scanning = False
         except Exception as e:
             messagebox.showerror("Error", f"Failed to toggle scanning: {str(e)}")
             self.scanning = False
+        self.i18n.bind(self.scan_btn, 'stop_scan' if self.scanning else 'start_scan')
             
     def adjust_gain(self, direction):
         """Adjust gain using g/G keys"""
         try:
-            current_gain = float(self.rf_gain.get())
-            new_gain = current_gain + (1 * direction)
+            # Repeated presses are merged into one net gain change
+            new_gain = self.api.call('step_gain', direction)
             self.rf_gain.set(f"{new_gain:.1f}")
-            if self.fmp_process:
-                shell = win32com.client.Dispatch("WScript.Shell")
-                shell.AppActivate("FMP24")
-                if direction > 0:
-                    shell.SendKeys("G")
-                else:
-                    shell.SendKeys("g")
-                self.status_label.config(text=f"RF Gain: {new_gain:.1f}")
-                # Save settings after adjustment
-                self.save_settings()
+            self.status_label.config(text=f"RF Gain: {new_gain:.1f}")
         except Exception as e:
             self.status_label.config(text=f"Failed to adjust gain: {str(e)}")
                 
+    def auto_gain(self):
+        """Sweep the tuner's gains on the IQ source and apply the best one"""
+        source = getattr(self, 'iq_address', self.rtl_tcp_address).get()
+        self.status_label.config(text="Auto gain: sweeping...")
+        self.when_done(self.api.request('auto_gain', source=source), self.on_auto_gain)
+        
+    def on_auto_gain(self, result, error):
+        if error is not None:
+            self.status_label.config(text=f"Auto gain failed: {str(error)}")
+            return
+        self.rf_gain.set(f"{result['gain']:.1f}")
+        snr = f", SNR {result['mean_snr_db']:.0f} dB" if result['mean_snr_db'] is not None else ""
+        self.status_label.config(text=f"Auto gain: {result['gain']:.1f} dB{snr} ({result['reason']})")
+            
     def adjust_ppm(self, direction):
         """Adjust PPM using p/P keys"""
         try:
-            current_ppm = float(self.ppm.get())
-            new_ppm = current_ppm + (0.1 * direction)
+            new_ppm = self.api.call('step_ppm', direction)
             self.ppm.set(f"{new_ppm:.1f}")
-            if self.fmp_process:
-                shell = win32com.client.Dispatch("WScript.Shell")
-                shell.AppActivate("FMP24")
-                if direction > 0:
-                    shell.SendKeys("P")
-                else:
-                    shell.SendKeys("p")
-                self.status_label.config(text=f"PPM correction: {new_ppm:.1f}")
-                # Save settings after adjustment
-                self.save_settings()
+            self.status_label.config(text=f"PPM correction: {new_ppm:.1f}")
         except Exception as e:
             self.status_label.config(text=f"Failed to adjust PPM: {str(e)}")
                 
+    def calibrate_ppm(self):
+        """Measure PPM on the reference carrier from the IQ source and apply it in one step"""
+        try:
+            reference_mhz = float(self.reference_mhz.get())
+        except ValueError:
+            self.status_label.config(text="Reference must be a frequency in MHz")
+            return
+        # The spectrum view's IQ source once it has been opened, rtl_tcp otherwise
+        source = getattr(self, 'iq_address', self.rtl_tcp_address).get()
+        self.status_label.config(text="Calibrating PPM...")
+        self.when_done(self.api.request('calibrate_ppm', reference_mhz=reference_mhz, source=source),
+                       self.on_calibrated)
+        
+    def on_calibrated(self, result, error):
+        if error is not None:
+            self.status_label.config(text=f"PPM calibration failed: {str(error)}")
+            return
+        self.ppm.set(f"{result['ppm']:.1f}")
+        self.status_label.config(text=(f"PPM calibrated: {result['ppm']:.1f} "
+                                       f"(SNR {result['snr_db']:.0f} dB, {result['seconds'] * 1000:.0f} ms)"))
+            
     def validate_input_device(self, *args):
         try:
             value = int(self.input_device.get())
@@ -578,143 +780,111 @@ class SDRLauncherGUI:
             
     def launch_fmp24(self):
         try:
-            cmd = ["FMP24"]
-            
-            if self.role_config.get():
-                cmd.append("-rc")
-                
-            cmd.extend([
-                f"-i{self.input_device.get()}",
-                f"-P{self.ppm.get()}",
-                f"-f{self.frequency.get()}",
-                f"-g{self.rf_gain.get()}",
-                f"-o{self.output_device.get()}"
-            ])
-            
-            cmd.append("-_3")  # Minimize both windows
-            
-            # Launch FMP24
-            self.fmp_process = subprocess.Popen(cmd)
-            self.status_label.config(text="FMP24 launched successfully")
-            
-            # Save current configuration
-            self.save_config()
-            
+            # The controller launches from the saved settings
+            self.save_settings()
         except Exception as e:
             messagebox.showerror("Error", f"Failed to launch FMP24: {str(e)}")
             self.status_label.config(text="Launch failed")
+            return
+        # Launch may wait behind a survey or sweep on the controller's worker
+        self.status_label.config(text="Launching FMP24...")
+        self.when_done(self.api.request('launch'), self.on_launched)
+
+    def on_launched(self, result, error):
+        if error is not None:
+            messagebox.showerror("Error", f"Failed to launch FMP24: {str(error)}")
+            self.status_label.config(text="Launch failed")
+            return
+        self.launched = True
+        if result['unplaced_channels']:
+            self.status_label.config(
+                text=f"FMP24 launched on {result['dongles']} dongles; "
+                     f"{result['unplaced_channels']} channels are outside every dongle's window")
+        elif result['dongles'] > 1:
+            self.status_label.config(text=f"FMP24 launched on {result['dongles']} dongles")
+        else:
+            self.status_label.config(text="FMP24 launched successfully")
     
     def save_config(self):
-        config = {
-            'input_device': self.input_device.get(),
-            'ppm': self.ppm.get(),
-            'frequency': self.frequency.get(),
-            'rf_gain': self.rf_gain.get(),
-            'output_device': self.output_device.get(),
-            'role_config': self.role_config.get()
-        }
-        
+        """Save settings now instead of waiting for the background write"""
+        self.save_settings()
         try:
-            with open("launcher_config.json", 'w') as f:
-                json.dump(config, f, indent=4)
+            self.api.call('save_settings')
             self.status_label.config(text="Configuration saved")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save configuration: {str(e)}")
     
     def load_config(self):
-        try:
-            if os.path.exists("launcher_config.json"):
-                with open("launcher_config.json", 'r') as f:
-                    config = json.load(f)
-                    
-                self.input_device.set(config.get('input_device', '1'))
-                self.ppm.set(config.get('ppm', '23'))
-                self.frequency.set(config.get('frequency', '423'))
-                self.rf_gain.set(config.get('rf_gain', '32'))
-                self.output_device.set(config.get('output_device', '2'))
-                self.role_config.set(config.get('role_config', True))
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load configuration: {str(e)}")
+        self.load_settings()
     
     def load_defaults(self):
-        self.input_device.set("1")
-        self.ppm.set("23")
-        self.frequency.set("423")
-        self.rf_gain.set("32")
-        self.output_device.set("2")
-        self.role_config.set(True)
+        self.load_settings(self.api.call('reset_settings'))
         self.status_label.config(text="Default settings loaded")
         
     def save_settings(self):
-        """Save current settings to file"""
-        settings = {
-            'ppm': self.ppm.get(),
-            'gain': self.rf_gain.get(),
-            'input_device': self.input_device.get(),
-            'output_device': self.output_device.get(),
-            'language': self.current_language.get()  # Save language preference
-        }
+        """Save current settings; written in the background once changes settle"""
+        from control_api import RpcError
         try:
-            with open("fmp_settings.json", 'w') as f:
-                json.dump(settings, f, indent=4)
-        except Exception as e:
-            self.status_label.config(text=f"Could not save settings: {str(e)}")
+            self.api.call(
+                'update_settings',
+                ppm=self.ppm.get(),
+                gain=self.rf_gain.get(),
+                frequency=self.frequency.get(),
+                input_device=self.input_device.get(),
+                output_device=self.output_device.get(),
+                role_config=self.role_config.get(),
+                language=self.current_language.get(),
+                backend=self.control_backend.get(),
+                rtl_tcp_address=self.rtl_tcp_address.get(),
+                dongles=self.dongle_count.get(),
+            )
+        except RpcError as e:
+            self.status_label.config(text=str(e))
 
-    def load_settings(self):
-        """Load settings from file"""
+    def load_settings(self, values=None):
+        """Show the stored settings"""
+        if values is None:
+            values = self.api.call('get_settings')
+        self.ppm.set(format_value(values['ppm']))
+        self.rf_gain.set(format_value(values['gain']))
+        self.frequency.set(format_value(values['frequency']))
+        self.input_device.set(format_value(values['input_device']))
+        self.output_device.set(format_value(values['output_device']))
+        self.role_config.set(values['role_config'])
+        self.control_backend.set(values['backend'])
+        self.rtl_tcp_address.set(values['rtl_tcp_address'])
+        self.dongle_count.set(format_value(values['dongles']))
+        self.current_language.set(values['language'])
+        self.status_label.config(text="Settings loaded")
+            
+    def on_close(self):
+        """Write pending settings before the window goes away"""
+        from control_api import RpcError
         try:
-            if os.path.exists("fmp_settings.json"):
-                with open("fmp_settings.json", 'r') as f:
-                    settings = json.load(f)
-                self.ppm.set(settings.get('ppm', '0'))
-                self.rf_gain.set(settings.get('gain', '50'))
-                self.input_device.set(settings.get('input_device', '1'))
-                self.output_device.set(settings.get('output_device', '1'))
-                
-                # Load and set language preference
-                saved_language = settings.get('language', 'ar')
-                self.current_language.set(saved_language)
-                
-                self.status_label.config(text="Settings loaded")
-        except Exception as e:
-            # Set defaults if loading fails
-            self.ppm.set('0')
-            self.rf_gain.set('50')
-            self.input_device.set('1')
-            self.output_device.set('1')
-            self.current_language.set('ar')  # Default to Arabic
-            self.status_label.config(text=f"Could not load settings: {str(e)}")
+            self.api.call('save_settings')
+        except (RpcError, OSError):
+            pass
+        self.disconnect_controller()
+        self.root.destroy()
             
     def set_frequency(self, event=None):
         """Set frequency directly in FMP24"""
+        from control_api import RpcError
         try:
             freq = float(self.frequency.get())
-            if self.fmp_process:
-                shell = win32com.client.Dispatch("WScript.Shell")
-                shell.AppActivate("FMP24")
-                
-                # If scanning, stop it first with Esc
-                if self.scanning:
-                    shell.SendKeys("{ESC}")
-                    self.scanning = False
-                    self.root.after(200)  # Wait for scan to stop
-                
-                # Type each digit with delay
-                freq_str = f"{freq:.3f}"
-                for digit in freq_str:
-                    shell.SendKeys(digit)
-                    self.root.after(200)  # 200ms delay between digits
-                
-                # Press Enter
-                shell.SendKeys("{ENTER}")
-                self.status_label.config(text=self.get_text('frequency_set').format(freq))
-            else:
-                messagebox.showwarning("Warning", self.get_text('launch_fmp_first'))
+            # Digits are typed by the command worker; a newer retune replaces a pending one
+            self.api.call('tune', freq)
         except ValueError:
             messagebox.showerror("Error", self.get_text('invalid_frequency'))
+        except RpcError as e:
+            self.show_api_error(e)
 
     def check_activation(self):
-        """Check if software is activated"""
+        """Check if software is activated
+        
+        The license is decrypted only when it has no valid cache stamp; after
+        that a keyed hash of the license file is enough.
+        """
         documents_path = os.path.expanduser('~/Documents')
         license_file = os.path.join(documents_path, '.khanfar_license')
         
@@ -722,13 +892,40 @@ class SDRLauncherGUI:
             try:
                 with open(license_file, 'r') as f:
                     encrypted_key = f.read().strip()
+                if self.activation_cached(license_file, encrypted_key):
+                    return True
                 # Decrypt and validate the key
                 decrypted_key = self.decrypt_key(encrypted_key)
-                return self.validate_key(decrypted_key)
+                if self.validate_key(decrypted_key):
+                    self.cache_activation(license_file, encrypted_key)
+                    return True
+                return False
             except:
                 return False
         return False
     
+    def activation_stamp(self, encrypted_key):
+        """Keyed hash tying the cache stamp to this license file's contents"""
+        import hashlib
+        import hmac
+        return hmac.new(self.encryption_key, b'activated:' + encrypted_key.encode(), hashlib.sha256).hexdigest()
+    
+    def activation_cached(self, license_file, encrypted_key):
+        import hmac
+        try:
+            with open(license_file + '.stamp', 'r') as f:
+                stamp = f.read().strip()
+        except OSError:
+            return False
+        return hmac.compare_digest(stamp, self.activation_stamp(encrypted_key))
+    
+    def cache_activation(self, license_file, encrypted_key):
+        try:
+            with open(license_file + '.stamp', 'w') as f:
+                f.write(self.activation_stamp(encrypted_key))
+        except OSError:
+            pass  # Only costs a decrypt on the next start
+    
     def validate_key(self, key):
         """Validate the activation key"""
         # For this example, we'll accept key "1234567890"
@@ -736,6 +933,9 @@ class SDRLauncherGUI:
     
     def encrypt_key(self, key):
         """Encrypt the activation key"""
+        from base64 import b64encode
+        from hashlib import sha256
+        from cryptography.fernet import Fernet
         fernet_key = b64encode(sha256(self.encryption_key).digest())
         f = Fernet(fernet_key)
         
@@ -745,6 +945,9 @@ class SDRLauncherGUI:
     def decrypt_key(self, encrypted_key):
         """Decrypt the activation key"""
         try:
+            from base64 import b64encode
+            from hashlib import sha256
+            from cryptography.fernet import Fernet
             fernet_key = b64encode(sha256(self.encryption_key).digest())
             f = Fernet(fernet_key)
             
@@ -763,6 +966,7 @@ class SDRLauncherGUI:
             encrypted_key = self.encrypt_key(key)
             with open(license_file, 'w') as f:
                 f.write(encrypted_key)
+            self.cache_activation(license_file, encrypted_key)
             return True
         except:
             return False
@@ -842,4 +1046,13 @@ class SDRLauncherGUI:
 if __name__ == "__main__":
     root = tk.Tk()
     app = SDRLauncherGUI(root)
+    if STARTUP_BENCH:
+        # Report once the window is mapped and the loop is idle, then quit
+        def report_interactive():
+            if not root.winfo_viewable():
+                root.after(1, lambda: root.after_idle(report_interactive))
+                return
+            print(f"interactive_ms={(time.perf_counter() - STARTED) * 1000:.1f}", flush=True)
+            root.destroy()
+        root.after_idle(report_interactive)
     root.mainloop()
@@ -0,0 +1,346 @@
+"""Per-channel activity history in SQLite
+
+Every hit (a channel going active and then quiet again) is stored with its
+start time, dwell and peak level, keyed by the ScanList channel frequency.
+Writes go through a queue to a background thread that commits in batches,
+so callers on the Tk thread never wait on the disk.  The database runs in
+WAL mode so queries from other threads don't block the writer.
+
+Two tables:
+  hits     one row per hit, kept for raw_days
+  buckets  hits/dwell/peak per channel per 15 minutes, kept for rollup_days,
+           updated as hits are written so history queries never scan hits
+"""
+import queue
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+
+BUCKET_SECONDS = 900
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hits (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    channel INTEGER NOT NULL,
+    mode INTEGER NOT NULL DEFAULT 0,
+    dwell REAL NOT NULL,
+    level REAL,
+    tag TEXT
+);
+CREATE INDEX IF NOT EXISTS hits_ts ON hits (ts, channel, dwell);
+CREATE INDEX IF NOT EXISTS hits_channel_ts ON hits (channel, ts);
+CREATE TABLE IF NOT EXISTS buckets (
+    channel INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    hits INTEGER NOT NULL,
+    dwell REAL NOT NULL,
+    peak REAL,
+    PRIMARY KEY (channel, bucket)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS buckets_bucket ON buckets (bucket, channel, hits);
+"""
+
+UPSERT_BUCKET = """
+INSERT INTO buckets (channel, bucket, hits, dwell, peak) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (channel, bucket) DO UPDATE SET
+    hits = hits + excluded.hits,
+    dwell = dwell + excluded.dwell,
+    peak = max(coalesce(peak, excluded.peak), coalesce(excluded.peak, peak))
+"""
+
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=10.0, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class ActivityStore:
+    """Activity database with a batched background writer
+
+    record() only enqueues; call flush() to wait for pending rows and
+    close() when done.
+    """
+
+    def __init__(self, path="activity.db", batch_size=500, flush_interval=1.0,
+                 raw_days=7, rollup_days=30, prune_interval=3600.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.raw_days = raw_days
+        self.rollup_days = rollup_days
+        self.prune_interval = prune_interval
+        self.written = 0
+        self.errors = 0
+        self.last_error = None
+        conn = sqlite3.connect(path)
+        # auto_vacuum only takes effect on a new database, before any table exists
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.executescript(SCHEMA)
+        conn.close()
+        self._readers = threading.local()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._writer, name="activity-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, channel, dwell, level=None, mode=0, tag=None, ts=None):
+        """Queue one hit; ts is its start time (defaults to now - dwell)"""
+        if ts is None:
+            ts = time.time() - dwell
+        self._queue.put((float(ts), int(channel), int(mode), float(dwell), level, tag))
+
+    def record_many(self, rows):
+        """Queue (ts, channel, mode, dwell, level, tag) rows in one go"""
+        self._queue.put(list(rows))
+
+    def flush(self):
+        """Block until every queued row is committed"""
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _writer(self):
+        conn = connect(self.path)
+        next_prune = time.monotonic() + self.prune_interval
+        stop = False
+        while not stop:
+            batch = []
+            taken = 0
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = ()
+            else:
+                taken += 1
+            deadline = time.monotonic() + 0.05
+            while item is not None:
+                if isinstance(item, list):
+                    batch.extend(item)
+                elif item:
+                    batch.append(item)
+                if len(batch) >= self.batch_size or time.monotonic() > deadline:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                    taken += 1
+                except queue.Empty:
+                    break
+            if item is None:
+                stop = True
+            try:
+                if batch:
+                    self._write(conn, batch)
+                if stop or time.monotonic() >= next_prune:
+                    self._prune(conn)
+                    next_prune = time.monotonic() + self.prune_interval
+            except sqlite3.Error as e:
+                self.errors += 1
+                self.last_error = str(e)
+            finally:
+                for _ in range(taken):
+                    self._queue.task_done()
+        conn.close()
+
+    def _write(self, conn, batch):
+        buckets = {}
+        for ts, channel, mode, dwell, level, tag in batch:
+            key = (channel, int(ts // BUCKET_SECONDS))
+            entry = buckets.get(key)
+            if entry is None:
+                buckets[key] = [1, dwell, level]
+            else:
+                entry[0] += 1
+                entry[1] += dwell
+                if level is not None and (entry[2] is None or level > entry[2]):
+                    entry[2] = level
+        with conn:
+            conn.executemany(
+                "INSERT INTO hits (ts, channel, mode, dwell, level, tag) VALUES (?, ?, ?, ?, ?, ?)", batch)
+            conn.executemany(UPSERT_BUCKET, [k + tuple(v) for k, v in buckets.items()])
+        self.written += len(batch)
+
+    def _prune(self, conn, now=None):
+        """Drop raw hits and buckets past retention and hand the pages back"""
+        now = time.time() if now is None else now
+        with conn:
+            conn.execute("DELETE FROM hits WHERE ts < ?", (now - self.raw_days * 86400,))
+            conn.execute("DELETE FROM buckets WHERE bucket < ?",
+                         (int((now - self.rollup_days * 86400) // BUCKET_SECONDS),))
+        conn.execute("PRAGMA incremental_vacuum")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def _reader(self):
+        conn = getattr(self._readers, 'conn', None)
+        if conn is None:
+            conn = self._readers.conn = connect(self.path)
+        return conn
+
+    def top_channels(self, seconds=3600, limit=10, now=None):
+        """[(channel, hits, total dwell)] busiest channels over the last `seconds`"""
+        now = time.time() if now is None else now
+        return self._reader().execute(
+            "SELECT channel, COUNT(*) AS n, SUM(dwell) FROM hits WHERE ts >= ? "
+            "GROUP BY channel ORDER BY n DESC LIMIT ?", (now - seconds, limit)).fetchall()
+
+    def histogram(self, channel, days=30, now=None):
+        """(bucket start times, hits) per 15 minutes for one channel, zero-filled"""
+        now = time.time() if now is None else now
+        last = int(now // BUCKET_SECONDS)
+        first = last - int(days * 86400 // BUCKET_SECONDS) + 1
+        rows = self._reader().execute(
+            "SELECT bucket, hits FROM buckets WHERE channel = ? AND bucket BETWEEN ? AND ?",
+            (int(channel), first, last)).fetchall()
+        counts = np.zeros(last - first + 1, dtype=np.int64)
+        if rows:
+            data = np.array(rows, dtype=np.int64)
+            counts[data[:, 0] - first] = data[:, 1]
+        return (np.arange(first, last + 1) * BUCKET_SECONDS, counts)
+
+    def hit_rates(self, hours=24, now=None):
+        """{channel: hits per hour} over the last `hours`, from the rollup"""
+        now = time.time() if now is None else now
+        first = int((now - hours * 3600) // BUCKET_SECONDS)
+        rows = self._reader().execute(
+            "SELECT channel, SUM(hits) FROM buckets WHERE bucket >= ? GROUP BY channel", (first,))
+        return {channel: hits / hours for channel, hits in rows}
+
+    def recent(self, channel, limit=20):
+        """[(ts, dwell, level, tag)] latest hits on one channel"""
+        return self._reader().execute(
+            "SELECT ts, dwell, level, tag FROM hits WHERE channel = ? ORDER BY ts DESC LIMIT ?",
+            (int(channel), limit)).fetchall()
+
+
+class ActivityTracker:
+    """Turn per-block channel activity into hits
+
+    Feed it the channels' active flags and levels (e.g. from a
+    ChannelReport); a hit is recorded when a channel goes quiet, with the
+    time it was active, its peak level and the last tone tag seen.
+    """
+
+    def __init__(self, store, channels_hz, modes=None, min_dwell=0.2):
+        self.store = store
+        self.min_dwell = min_dwell
+        self.set_channels(channels_hz, modes)
+
+    def set_channels(self, channels_hz, modes=None):
+        self.channels_hz = np.asarray(channels_hz, dtype=np.int64)
+        count = len(self.channels_hz)
+        self.modes = np.zeros(count, dtype=np.int64) if modes is None else np.asarray(modes, dtype=np.int64)
+        self.started = np.full(count, np.nan)
+        self.peak = np.full(count, -np.inf)
+        self.tags = [None] * count
+
+    def update(self, active, levels_db=None, now=None, tags=None):
+        now = time.time() if now is None else now
+        active = np.asarray(active, dtype=bool)
+        running = ~np.isnan(self.started)
+        self.started[active & ~running] = now
+        if levels_db is not None:
+            levels = np.nan_to_num(np.asarray(levels_db, dtype=np.float64), nan=-np.inf)
+            np.maximum(self.peak, np.where(active, levels, -np.inf), out=self.peak)
+        if tags is not None:
+            for i in np.flatnonzero(active):
+                if tags[i] is not None:
+                    self.tags[i] = tags[i]
+        ended = np.flatnonzero(running & ~active)
+        if len(ended):
+            dwell = now - self.started[ended]
+            keep = dwell >= self.min_dwell
+            rows = [(float(self.started[i]), int(self.channels_hz[i]), int(self.modes[i]), float(d),
+                     float(self.peak[i]) if np.isfinite(self.peak[i]) else None, self.tags[i])
+                    for i, d in zip(ended[keep], dwell[keep])]
+            if rows:
+                self.store.record_many(rows)
+            self.started[ended] = np.nan
+            self.peak[ended] = -np.inf
+            for i in ended:
+                self.tags[i] = None
+
+
+def synthetic_hits(rows, channels=200, days=30, now=None, seed=0):
+    """Random hits over `days`, busier on a few channels"""
+    now = time.time() if now is None else now
+    rng = np.random.default_rng(seed)
+    freqs = 420_000_000 + np.arange(channels, dtype=np.int64) * 12_500
+    weights = 1.0 / (1 + np.arange(channels))
+    pick = rng.choice(channels, rows, p=weights / weights.sum())
+    ts = np.sort(now - rng.uniform(0, days * 86400, rows))
+    dwell = rng.exponential(4.0, rows)
+    level = rng.uniform(-90, -30, rows)
+    return ts, freqs[pick], dwell, level
+
+
+def load_synthetic(store, rows, days=30, chunk=200_000, now=None):
+    """Bulk-load synthetic history straight into the tables (bypasses the writer)"""
+    conn = connect(store.path)
+    ts, channel, dwell, level = synthetic_hits(rows, days=days, now=now)
+    with conn:
+        for start in range(0, rows, chunk):
+            end = start + chunk
+            conn.executemany(
+                "INSERT INTO hits (ts, channel, mode, dwell, level) VALUES (?, ?, 0, ?, ?)",
+                zip(ts[start:end].tolist(), channel[start:end].tolist(),
+                    dwell[start:end].tolist(), level[start:end].tolist()))
+        conn.execute(
+            "INSERT INTO buckets (channel, bucket, hits, dwell, peak) "
+            "SELECT channel, CAST(ts / ? AS INTEGER), COUNT(*), SUM(dwell), MAX(level) "
+            "FROM hits GROUP BY 1, 2 "
+            "ON CONFLICT (channel, bucket) DO UPDATE SET hits = hits + excluded.hits, "
+            "dwell = dwell + excluded.dwell", (BUCKET_SECONDS,))
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def measure(rows=10_000_000, path=None, repeats=20):
+    """Query times over `rows` hits and the cost of record() on the caller's thread"""
+    import os
+    import tempfile
+    path = path or os.path.join(tempfile.mkdtemp(), 'activity.db')
+    now = time.time()
+    store = ActivityStore(path, raw_days=31)
+    started = time.perf_counter()
+    load_synthetic(store, rows, now=now)
+    load_seconds = time.perf_counter() - started
+
+    def timed(call):
+        call()
+        began = time.perf_counter()
+        for _ in range(repeats):
+            result = call()
+        return (time.perf_counter() - began) / repeats * 1000, result
+
+    top_ms, top = timed(lambda: store.top_channels(3600, 10, now=now))
+    hist_ms, (_, counts) = timed(lambda: store.histogram(top[0][0], 30, now=now))
+    rates_ms, _ = timed(lambda: store.hit_rates(24, now=now))
+
+    began = time.perf_counter()
+    for i in range(10000):
+        store.record(420_000_000 + (i % 50) * 12_500, 2.0, -60.0)
+    record_us = (time.perf_counter() - began) / 10000 * 1e6
+    store.flush()
+    store.close()
+    size_mb = os.path.getsize(path) / 1e6
+    return {
+        'rows': rows,
+        'load_s': load_seconds,
+        'top_last_hour_ms': top_ms,
+        'histogram_30d_ms': hist_ms,
+        'histogram_buckets': len(counts),
+        'hit_rates_24h_ms': rates_ms,
+        'record_us': record_us,
+        'written_by_writer': store.written,
+        'db_mb': size_mb,
+    }
+
+
+if __name__ == "__main__":
+    print(measure())
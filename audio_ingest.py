@@ -0,0 +1,521 @@
+"""Single-connection audio ingest with fan-out to several consumers
+
+FMP24 serves its audio (16-bit mono PCM on -o<port>) to one TCP client
+only.  AudioIngest connects once, receives straight into a preallocated
+ring buffer with sock_recv_into, and hands each consumer memoryview
+slices of that ring, so consumers don't each get their own copy of the
+audio.  The ring holds a whole number of frames, so a frame never wraps.
+
+Each consumer runs as its own task with its own read cursor.  A consumer
+that falls behind is handled according to its policy:
+
+  DROP   - its cursor is moved forward over frames that are about to be
+           overwritten; the skipped frames are counted as dropped
+  BLOCK  - ingest stops reading the socket (TCP backpressure) for up to
+           block_timeout seconds, then falls back to dropping
+
+Run as a script to ingest one FMP24 port and record it, relay it to
+another port (DSD+ -i<port>), show its level and decode its tones:
+
+    python audio_ingest.py 127.0.0.1:20001 --record capture.wav --relay 20101 --tones
+"""
+import argparse
+import asyncio
+import json
+import socket
+import time
+import wave
+
+import numpy as np
+
+
+DROP = 'drop'
+BLOCK = 'block'
+
+SAMPLE_WIDTH = 2
+
+
+class AudioRing:
+    """Preallocated byte ring addressed by absolute stream offsets"""
+
+    def __init__(self, frame_bytes, frames):
+        self.frame_bytes = frame_bytes
+        self.capacity = frame_bytes * frames
+        self.buffer = bytearray(self.capacity)
+        self.view = memoryview(self.buffer)
+        self.head = 0  # total bytes written
+
+    def writable(self, limit):
+        """Contiguous slice to receive into, up to absolute offset `limit`"""
+        start = self.head % self.capacity
+        size = min(self.capacity - start, limit - self.head)
+        return self.view[start:start + size]
+
+    def frame(self, offset):
+        start = offset % self.capacity
+        return self.view[start:start + self.frame_bytes]
+
+    @property
+    def complete(self):
+        """Absolute offset of the end of the last complete frame"""
+        return self.head - self.head % self.frame_bytes
+
+
+class Consumer:
+    """Base class: override handle(frame) (sync) or consume(frame) (async)
+
+    The memoryview passed in is only valid until consume() first awaits
+    (handle() always qualifies); copy it if it is needed after that.
+    """
+
+    name = 'consumer'
+
+    def __init__(self, policy=DROP, block_timeout=0.5):
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.cursor = 0
+        self.frames = 0
+        self.dropped = 0
+        self.max_lag = 0
+        self.busy_seconds = 0.0
+
+    def handle(self, frame):
+        pass
+
+    async def consume(self, frame):
+        self.handle(frame)
+
+    async def close(self):
+        pass
+
+
+class LevelMeter(Consumer):
+    """RMS and peak level in dBFS of the most recent frame"""
+
+    name = 'level'
+
+    def __init__(self, policy=DROP):
+        super().__init__(policy)
+        self.rms_db = -120.0
+        self.peak_db = -120.0
+
+    def handle(self, frame):
+        samples = np.frombuffer(frame, dtype='<i2')
+        if not len(samples):
+            return
+        power = np.dot(samples, samples.astype(np.float64)) / len(samples)
+        self.rms_db = 10 * np.log10(max(power, 1.0) / 32768.0 ** 2)
+        self.peak_db = 20 * np.log10(max(int(np.abs(samples).max()), 1) / 32768.0)
+
+
+class Recorder(Consumer):
+    """Write the stream to a 16-bit mono WAV file"""
+
+    name = 'recorder'
+
+    def __init__(self, path, sample_rate=48000, policy=BLOCK, block_timeout=2.0):
+        super().__init__(policy, block_timeout)
+        self.wav = wave.open(path, 'wb')
+        self.wav.setnchannels(1)
+        self.wav.setsampwidth(SAMPLE_WIDTH)
+        self.wav.setframerate(sample_rate)
+
+    def handle(self, frame):
+        self.wav.writeframesraw(frame)
+
+    async def close(self):
+        self.wav.close()
+
+
+class ToneConsumer(Consumer):
+    """Feed a ToneDecoder and keep the latest tag"""
+
+    name = 'tones'
+
+    def __init__(self, decoder, stream_id=0, policy=DROP, on_tag=None):
+        super().__init__(policy)
+        self.decoder = decoder
+        self.stream_id = stream_id
+        self.on_tag = on_tag
+        self.tag = None
+
+    def handle(self, frame):
+        samples = np.frombuffer(frame, dtype='<i2')
+        self.decoder.feed(self.stream_id, samples * np.float32(1 / 32768.0))
+        tags = self.decoder.decode()
+        if self.stream_id in tags and tags[self.stream_id] != self.tag:
+            self.tag = tags[self.stream_id]
+            if self.on_tag:
+                self.on_tag(self.tag)
+
+
+class TcpRelay(Consumer):
+    """Re-serve the stream on another port, e.g. for DSD+
+
+    Frames arriving while no client is connected are discarded.  Unlike
+    the other consumers this one copies each frame once, since a slow
+    client's transport holds on to it past consume().
+    """
+
+    name = 'relay'
+
+    def __init__(self, host='127.0.0.1', port=0, policy=DROP, block_timeout=0.5):
+        super().__init__(policy, block_timeout)
+        self.host = host
+        self.port = port
+        self.server = None
+        self.writers = set()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._accept, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def _accept(self, reader, writer):
+        writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.writers.add(writer)
+
+    async def consume(self, frame):
+        # The frame is only valid until the first drain(), and a transport
+        # buffers what it can't send at once, so all clients share one copy
+        data = bytes(frame)
+        for writer in list(self.writers):
+            if writer.is_closing():
+                self.writers.discard(writer)
+                continue
+            writer.write(data)
+            try:
+                await writer.drain()
+            except ConnectionError:
+                self.writers.discard(writer)
+
+    async def close(self):
+        for writer in self.writers:
+            writer.close()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+
+class AudioIngest:
+    """Connect to an FMP24 audio port once and fan frames out to consumers"""
+
+    def __init__(self, host, port, sample_rate=48000, frame_ms=20, ring_seconds=2.0,
+                 reconnect=True, max_backoff=10.0):
+        self.host = host
+        self.port = port
+        self.sample_rate = sample_rate
+        frame_bytes = int(sample_rate * frame_ms / 1000) * SAMPLE_WIDTH
+        frames = max(4, int(ring_seconds * 1000 / frame_ms))
+        self.ring = AudioRing(frame_bytes, frames)
+        self.reconnect = reconnect
+        self.max_backoff = max_backoff
+        self.consumers = []
+        self.connected = False
+        self.bytes_received = 0
+        self.blocked_seconds = 0.0
+        self._data = None
+        self._space = None
+        self._tasks = []
+        self._running = False
+        self._loop = None
+        self._receiver = None
+        self._wake = None
+
+    def add(self, consumer):
+        consumer.cursor = self.ring.complete
+        self.consumers.append(consumer)
+        if self._running:
+            self._tasks.append(asyncio.ensure_future(self._feed(consumer)))
+        return consumer
+
+    async def run(self):
+        """Receive until stopped, reconnecting with backoff if the port drops"""
+        self._loop = asyncio.get_running_loop()
+        self._data = asyncio.Condition()
+        self._space = asyncio.Condition()
+        self._wake = asyncio.Event()
+        self._running = True
+        for consumer in self.consumers:
+            if isinstance(consumer, TcpRelay) and consumer.server is None:
+                await consumer.start()
+        self._tasks = [asyncio.ensure_future(self._feed(c)) for c in self.consumers]
+        backoff = 0.5
+        try:
+            while self._running:
+                self._receiver = asyncio.ensure_future(self._receive())
+                try:
+                    await self._receiver
+                    backoff = 0.5
+                except OSError:
+                    pass
+                except asyncio.CancelledError:
+                    if self._running:
+                        raise
+                self.connected = False
+                if not self.reconnect or not self._running:
+                    break
+                try:
+                    await asyncio.wait_for(self._wake.wait(), backoff)
+                except asyncio.TimeoutError:
+                    pass
+                backoff = min(self.max_backoff, backoff * 2)
+        finally:
+            await self._shutdown()
+
+    def stop(self):
+        """Stop ingest; safe to call from another thread"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._cancel)
+
+    def _cancel(self):
+        self._running = False
+        self._wake.set()
+        if self._receiver is not None:
+            self._receiver.cancel()
+
+    async def _receive(self):
+        loop = asyncio.get_running_loop()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            await loop.sock_connect(sock, (self.host, self.port))
+            self.connected = True
+            ring = self.ring
+            # Drop a partial frame left by the previous connection so samples stay aligned
+            ring.head = ring.complete
+            while self._running:
+                limit = await self._room()
+                count = await loop.sock_recv_into(sock, ring.writable(limit))
+                if not count:
+                    return
+                ring.head += count
+                self.bytes_received += count
+                async with self._data:
+                    self._data.notify_all()
+        finally:
+            sock.close()
+
+    async def _room(self):
+        """Furthest absolute offset ingest may write to without overrunning a consumer"""
+        ring = self.ring
+        deadlines = {}
+        while True:
+            now = time.perf_counter()
+            limit = ring.head + ring.capacity
+            timeout = 0.05
+            for consumer in self.consumers:
+                if consumer.cursor + ring.capacity > ring.head:
+                    limit = min(limit, consumer.cursor + ring.capacity)
+                    continue
+                if consumer.policy == BLOCK:
+                    deadline = deadlines.setdefault(consumer, now + consumer.block_timeout)
+                    if now < deadline:
+                        limit = ring.head
+                        timeout = min(timeout, deadline - now)
+                        continue
+                # A full ring behind: drop half a ring so it doesn't drop frame by frame
+                self._skip(consumer, ring.complete - ring.capacity // 2)
+                limit = min(limit, consumer.cursor + ring.capacity)
+            if limit > ring.head:
+                return limit
+            try:
+                async with self._space:
+                    await asyncio.wait_for(self._space.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self.blocked_seconds += time.perf_counter() - now
+
+    def _skip(self, consumer, offset):
+        offset -= offset % self.ring.frame_bytes
+        if offset > consumer.cursor:
+            consumer.dropped += (offset - consumer.cursor) // self.ring.frame_bytes
+            consumer.cursor = offset
+
+    async def _feed(self, consumer):
+        ring = self.ring
+        while self._running or consumer.cursor < ring.complete:
+            if consumer.cursor >= ring.complete:
+                if not self._running:
+                    break
+                async with self._data:
+                    await self._data.wait_for(lambda: consumer.cursor < ring.complete or not self._running)
+                continue
+            consumer.max_lag = max(consumer.max_lag, (ring.complete - consumer.cursor) // ring.frame_bytes)
+            offset = consumer.cursor
+            # The frame is only read before consume() first awaits, so the
+            # cursor can move on now and ingest may reuse the slot after that
+            consumer.cursor += ring.frame_bytes
+            started = time.perf_counter()
+            try:
+                await consumer.consume(ring.frame(offset))
+            except Exception:
+                consumer.dropped += 1
+            finally:
+                consumer.busy_seconds += time.perf_counter() - started
+            consumer.frames += 1
+            async with self._space:
+                self._space.notify_all()
+
+    async def _shutdown(self):
+        self._running = False
+        if self._data is not None:
+            async with self._data:
+                self._data.notify_all()
+        # Let consumers that are keeping up finish the buffered frames
+        if self._tasks:
+            await asyncio.wait(self._tasks, timeout=1.0)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for consumer in self.consumers:
+            await consumer.close()
+
+    def metrics(self):
+        """Per-consumer lag and drop counters"""
+        frame_ms = self.ring.frame_bytes / SAMPLE_WIDTH / self.sample_rate * 1000
+        result = {}
+        for consumer in self.consumers:
+            lag = (self.ring.complete - consumer.cursor) // self.ring.frame_bytes
+            result[consumer.name] = {
+                'frames': consumer.frames,
+                'dropped': consumer.dropped,
+                'lag_frames': lag,
+                'lag_ms': lag * frame_ms,
+                'max_lag_ms': consumer.max_lag * frame_ms,
+                'busy_ms_per_frame': consumer.busy_seconds * 1000 / consumer.frames if consumer.frames else 0.0,
+            }
+        return result
+
+
+class SlowConsumer(Consumer):
+    """Consumer that takes `delay` seconds per frame, for testing policies"""
+
+    def __init__(self, delay, policy=DROP, name='slow'):
+        super().__init__(policy)
+        self.delay = delay
+        self.name = name
+
+    async def consume(self, frame):
+        await asyncio.sleep(self.delay)
+
+
+def measure(seconds=4.0, sample_rate=48000, speedup=4.0):
+    """Fan-out metrics with a stalled consumer alongside the real ones
+
+    Audio is served faster than realtime (speedup) from a local stand-in
+    for the FMP24 port.
+    """
+    import os
+    import shutil
+    import tempfile
+    import threading
+    from tone_decoder import ToneDecoder, synthetic_audio
+
+    audio = (synthetic_audio(seconds * speedup, sample_rate, ctcss=100.0) * 20000).astype('<i2').tobytes()
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    host, port = listener.getsockname()
+
+    def serve():
+        conn, _ = listener.accept()
+        chunk = sample_rate // 50 * SAMPLE_WIDTH
+        started = time.perf_counter()
+        with conn:
+            for offset in range(0, len(audio), chunk):
+                conn.sendall(audio[offset:offset + chunk])
+                due = started + (offset + chunk) / SAMPLE_WIDTH / sample_rate / speedup
+                time.sleep(max(0.0, due - time.perf_counter()))
+        listener.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    directory = tempfile.mkdtemp(prefix='audio-ingest-')
+    try:
+        path = os.path.join(directory, 'capture.wav')
+        ingest = AudioIngest(host, port, sample_rate, ring_seconds=1.0, reconnect=False)
+        tones = ingest.add(ToneConsumer(ToneDecoder(sample_rate)))
+        ingest.add(LevelMeter())
+        ingest.add(Recorder(path, sample_rate))
+        ingest.add(SlowConsumer(0.1))
+        started = time.perf_counter()
+        asyncio.run(ingest.run())
+        elapsed = time.perf_counter() - started
+        with wave.open(path, 'rb') as wav:
+            recorded = wav.getnframes() * SAMPLE_WIDTH
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return {
+        'received_mb': ingest.bytes_received / 1e6,
+        'elapsed_s': elapsed,
+        'recorded_complete': recorded == ingest.bytes_received - ingest.bytes_received % ingest.ring.frame_bytes,
+        'blocked_s': ingest.blocked_seconds,
+        'tone': tones.tag,
+        'consumers': ingest.metrics(),
+    }
+
+
+async def _report(ingest, meter, interval):
+    while True:
+        await asyncio.sleep(interval)
+        stats = {'connected': ingest.connected, 'received_mb': round(ingest.bytes_received / 1e6, 3)}
+        if meter is not None:
+            stats['rms_db'] = round(meter.rms_db, 1)
+            stats['peak_db'] = round(meter.peak_db, 1)
+        stats['consumers'] = {name: {'dropped': m['dropped'], 'lag_ms': m['lag_ms']}
+                              for name, m in ingest.metrics().items()}
+        print(json.dumps(stats), flush=True)
+
+
+async def _serve(ingest, meter, interval):
+    reporter = asyncio.ensure_future(_report(ingest, meter, interval)) if interval > 0 else None
+    try:
+        await ingest.run()
+    finally:
+        if reporter is not None:
+            reporter.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest an FMP24 audio port once and fan it out")
+    parser.add_argument('address', nargs='?', help="FMP24 -o port as host:port; without it, run the measurement")
+    parser.add_argument('--sample-rate', type=int, default=48000)
+    parser.add_argument('--frame-ms', type=int, default=20)
+    parser.add_argument('--ring-seconds', type=float, default=2.0)
+    parser.add_argument('--record', metavar='WAV', help="write the audio to a WAV file")
+    parser.add_argument('--relay', type=int, metavar='PORT', help="serve the audio again on this port")
+    parser.add_argument('--relay-host', default='127.0.0.1')
+    parser.add_argument('--tones', action='store_true', help="print CTCSS/DCS tags as they change")
+    parser.add_argument('--level', action='store_true', help="include the audio level in the stats")
+    parser.add_argument('--stats', type=float, default=5.0, metavar='SECONDS',
+                        help="print lag and drop counters this often (0 = never)")
+    parser.add_argument('--policy', choices=(DROP, BLOCK), default=DROP,
+                        help="what a relay or tone decoder that falls behind does")
+    args = parser.parse_args()
+    if args.address is None:
+        result = measure()
+        for name, stats in result.pop('consumers').items():
+            print(name, stats)
+        print(result)
+        return
+    from rtl_tcp import parse_address
+    host, port = parse_address(args.address, 20001)
+    ingest = AudioIngest(host, port, args.sample_rate, args.frame_ms, args.ring_seconds)
+    if args.record:
+        ingest.add(Recorder(args.record, args.sample_rate))
+    if args.relay is not None:
+        ingest.add(TcpRelay(args.relay_host, args.relay, args.policy))
+    if args.tones:
+        from tone_decoder import ToneDecoder
+        ingest.add(ToneConsumer(ToneDecoder(args.sample_rate), policy=args.policy,
+                                on_tag=lambda tag: print(f"tone {tag}", flush=True)))
+    meter = ingest.add(LevelMeter()) if args.level else None
+    if not ingest.consumers:
+        parser.error("nothing to do: give --record, --relay, --tones or --level")
+    try:
+        asyncio.run(_serve(ingest, meter, args.stats))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
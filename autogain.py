@@ -0,0 +1,271 @@
+"""Automatic RF gain from IQ statistics
+
+Does what FMP.txt asks of the operator: step through the tuner's gain
+table, watch for ADC clipping and for the noise floor rising faster than
+the signals, and settle on the gain where the ScanList channels stand
+highest above the noise without clipping.  Each gain step captures a few
+blocks and computes, all vectorized:
+
+  - an 8-bit code histogram of I and Q; codes 0 and 255 are clipped
+  - the noise floor (median bin of the averaged power spectrum)
+  - the SNR of every active ScanList channel inside the captured span
+
+The best gain is the lowest one within tolerance_db of the best mean
+channel SNR among gains that don't clip, so a surplus of gain that only
+lifts the noise floor is given back.
+"""
+import queue
+import threading
+import time
+
+import numpy as np
+
+from calibrate import average_power
+from channelizer import DEFAULT_SAMPLE_RATE
+
+
+# Gain tables in dB, as librtlsdr reports them per tuner
+GAIN_TABLES = {
+    'R820T': (0.0, 0.9, 1.4, 2.7, 3.7, 7.7, 8.7, 12.5, 14.4, 15.7, 16.6, 19.7, 20.7, 22.9, 25.4,
+              28.0, 29.7, 32.8, 33.8, 36.4, 37.2, 38.6, 40.2, 42.1, 43.4, 43.9, 44.5, 48.0, 49.6),
+    'E4000': (-1.0, 1.5, 4.0, 6.5, 9.0, 11.5, 14.0, 16.5, 19.0, 21.5, 24.0, 29.0, 34.0, 42.0),
+    'FC0012': (-9.9, -4.0, 7.1, 17.9, 19.2),
+}
+GAIN_TABLES['R828D'] = GAIN_TABLES['R820T']
+
+
+def gain_table(tuner_type=None):
+    return GAIN_TABLES.get(tuner_type, GAIN_TABLES['R820T'])
+
+
+def code_histogram(iq):
+    """Counts of the 256 8-bit codes over I and Q (complex64 scaled as uint8_to_complex64)"""
+    codes = np.rint(iq.view(np.float32) * 127.5 + 127.5)
+    np.clip(codes, 0, 255, out=codes)
+    return np.bincount(codes.astype(np.uint8), minlength=256)
+
+
+def channel_snr(power, sample_rate, offsets_hz, bandwidths_hz, noise):
+    """SNR in dB of each channel: mean power over its bandwidth against the per-bin noise"""
+    size = len(power)
+    bin_hz = sample_rate / size
+    cumulative = np.concatenate(([0.0], np.cumsum(power, dtype=np.float64)))
+    low = np.clip(np.rint(size // 2 + (offsets_hz - bandwidths_hz / 2) / bin_hz).astype(np.int64), 0, size - 1)
+    high = np.clip(np.rint(size // 2 + (offsets_hz + bandwidths_hz / 2) / bin_hz).astype(np.int64), 1, size)
+    high = np.maximum(high, low + 1)
+    mean = (cumulative[high] - cumulative[low]) / (high - low)
+    return 10 * np.log10(np.maximum(mean, 1e-30) / noise)
+
+
+class GainSweep:
+    """Sweep a gain-settable IQ source over its gain table
+
+    source needs read(count), set_gain(dB) and frequency_hz; channels_hz and
+    bandwidths_hz are the ScanList channels to judge by (those outside the
+    captured span are ignored).
+    """
+
+    def __init__(self, source, channels_hz=(), bandwidths_hz=12.5e3, gains=None, sample_rate=None,
+                 fft_size=16384, blocks=4, max_clip=1e-4, tolerance_db=0.5, active_snr_db=6.0):
+        self.source = source
+        self.sample_rate = sample_rate or getattr(source, 'sample_rate', None) or DEFAULT_SAMPLE_RATE
+        self.channels_hz = np.asarray(channels_hz, dtype=np.float64)
+        self.bandwidths_hz = np.broadcast_to(np.asarray(bandwidths_hz, dtype=np.float64),
+                                             self.channels_hz.shape)
+        self.gains = tuple(gains) if gains is not None else gain_table(getattr(source, 'tuner_type', None))
+        self.fft_size = fft_size
+        self.blocks = blocks
+        self.max_clip = max_clip
+        self.tolerance_db = tolerance_db
+        self.active_snr_db = active_snr_db
+        self._iq = np.empty(fft_size * blocks, dtype=np.complex64)
+
+    def capture(self):
+        step = self.fft_size
+        for k in range(self.blocks):
+            self._iq[k * step:(k + 1) * step] = self.source.read(step)
+        return self._iq
+
+    def analyze(self, iq):
+        """Clip fraction, noise floor and per-channel SNR of one capture"""
+        histogram = code_histogram(iq)
+        power = average_power(iq, self.fft_size)
+        noise = float(np.median(power))
+        offsets = self.channels_hz - self.source.frequency_hz
+        inside = np.abs(offsets) + self.bandwidths_hz / 2 < self.sample_rate * 0.45
+        snr = channel_snr(power, self.sample_rate, offsets[inside], self.bandwidths_hz[inside], noise)
+        return {
+            'clip_fraction': float(histogram[0] + histogram[255]) / float(histogram.sum()),
+            'noise_floor_db': 10 * np.log10(max(noise, 1e-30)),
+            'snr_db': snr,
+        }
+
+    def measure_gain(self, gain):
+        self.source.set_gain(gain)
+        # Samples in flight were taken at the old gain
+        self.source.read(self.fft_size)
+        return self.analyze(self.capture())
+
+    def run(self):
+        """Sweep every gain and pick the best; returns the choice and the table"""
+        started = time.perf_counter()
+        steps = [dict(self.measure_gain(gain), gain=gain) for gain in self.gains]
+        snr = np.array([step.pop('snr_db') for step in steps])
+        # Judge by the channels that carry something at some gain
+        active = snr.max(axis=0) >= self.active_snr_db if snr.size else np.zeros(0, dtype=bool)
+        clean = np.array([step['clip_fraction'] <= self.max_clip for step in steps])
+        if not clean.any():
+            clean[0] = True  # everything clips: the lowest gain is the least bad
+        if active.any():
+            score = snr[:, active].mean(axis=1)
+            reason = f"best mean SNR over {int(active.sum())} active channels"
+        else:
+            # Nothing to listen to: the noise floor is all there is, keep the most gain that doesn't clip
+            score = np.array([step['noise_floor_db'] for step in steps])
+            reason = "no active channels; highest gain without clipping"
+        for step, value in zip(steps, score):
+            step['score_db'] = float(value)
+        best = float(score[clean].max())
+        tolerance = self.tolerance_db if active.any() else 0.0
+        choice = int(np.flatnonzero(clean & (score >= best - tolerance))[0])
+        return {
+            'gain': self.gains[choice],
+            'reason': reason,
+            'clip_fraction': steps[choice]['clip_fraction'],
+            'noise_floor_db': steps[choice]['noise_floor_db'],
+            'mean_snr_db': steps[choice]['score_db'] if active.any() else None,
+            'active_channels': int(active.sum()),
+            'steps': steps,
+            'seconds': time.perf_counter() - started,
+        }
+
+
+class GainMonitor:
+    """Re-sweep when the noise floor at the chosen gain shifts
+
+    Every `interval` seconds check() captures at the current gain; when the
+    noise floor moved shift_db or more since the last sweep, sweep() runs
+    again.  Results (or errors) are queued for the owner's thread.
+    """
+
+    def __init__(self, check, sweep, interval=60.0, shift_db=3.0):
+        self.check = check
+        self.sweep = sweep
+        self.interval = interval
+        self.shift_db = shift_db
+        self.baseline_db = None
+        self.sweeps = 0
+        self._results = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="gain-monitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(10.0)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                floor = self.check() if self.baseline_db is not None else None
+                if floor is None or abs(floor - self.baseline_db) >= self.shift_db:
+                    result = self.sweep()
+                    self.baseline_db = result['noise_floor_db']
+                    self.sweeps += 1
+                    self._results.put((result, None))
+            except Exception as e:
+                self._results.put((None, e))
+            if self._stop.wait(self.interval):
+                return
+
+    def results(self):
+        out = []
+        while True:
+            try:
+                out.append(self._results.get_nowait())
+            except queue.Empty:
+                return out
+
+
+class SimulatedDongle:
+    """8-bit dongle model for trying the sweep without hardware
+
+    Tuner noise and signals scale with gain; the ADC adds a fixed noise of
+    its own and clips at full scale, so too little gain buries weak
+    channels in ADC noise and too much lets a strong signal clip.
+    """
+
+    tuner_type = 'R820T'
+
+    def __init__(self, frequency_hz, offsets_hz, levels_db, sample_rate=DEFAULT_SAMPLE_RATE,
+                 tuner_noise=3e-4, adc_noise=2.5e-3, samples=1 << 18, seed=0):
+        rng = np.random.default_rng(seed)
+        self.frequency_hz = frequency_hz
+        self.sample_rate = sample_rate
+        self.gain = 0.0
+        t = np.arange(samples) / sample_rate
+        iq = np.zeros(samples, dtype=np.complex64)
+        for k, (offset, level) in enumerate(zip(offsets_hz, levels_db)):
+            # NFM carrier `level` dB above the tuner noise, 2.5 kHz deviation
+            tone = 300.0 + 50.0 * k
+            phase = 2 * np.pi * offset * t + 2.5e3 / tone * np.sin(2 * np.pi * tone * t)
+            iq += (tuner_noise * 10 ** (level / 20) * np.exp(1j * phase)).astype(np.complex64)
+        noise = (rng.standard_normal(samples) + 1j * rng.standard_normal(samples)) / np.sqrt(2)
+        self._input = iq + (noise * tuner_noise).astype(np.complex64)
+        self._adc = ((rng.standard_normal(samples) + 1j * rng.standard_normal(samples)) * adc_noise).astype(np.complex64)
+        self._position = 0
+        self._raw = np.empty(0, dtype=np.float32)
+
+    def set_gain(self, gain_db):
+        self.gain = gain_db
+
+    def read(self, count):
+        start = self._position
+        self._position = (start + count) % (len(self._input) - count)
+        scaled = self._input[start:start + count] * np.float32(10 ** (self.gain / 20))
+        scaled += self._adc[start:start + count]
+        view = scaled.view(np.float32)
+        # Quantize like the 8-bit ADC, clipping at full scale
+        np.rint(view * 127.5 + 127.5, out=view)
+        np.clip(view, 0, 255, out=view)
+        view -= 127.5
+        view *= 1 / 127.5
+        return scaled
+
+    def close(self):
+        pass
+
+
+def measure(channels=12, runs=3):
+    """Sweep a simulated dongle with weak ScanList channels and one strong unlisted signal"""
+    center = 851.0e6
+    offsets = np.linspace(-900e3, 900e3, channels)
+    levels = [18.0 if k % 3 else 8.0 for k in range(channels)]
+    results = []
+    for seed in range(runs):
+        # A strong signal 600 kHz away that isn't in the list drives clipping at high gain
+        dongle = SimulatedDongle(center, list(offsets) + [615e3], levels + [48.0 + 2 * seed], seed=seed)
+        sweep = GainSweep(dongle, center + offsets)
+        result = sweep.run()
+        by_gain = {step['gain']: step for step in result['steps']}
+        results.append({
+            'chosen_gain': result['gain'],
+            'mean_snr_db': result['mean_snr_db'],
+            'snr_at_default_32.8_db': by_gain[32.8]['score_db'],
+            'snr_at_max_gain_db': by_gain[49.6]['score_db'],
+            'clip_at_max_gain': by_gain[49.6]['clip_fraction'],
+            'sweep_seconds': result['seconds'],
+        })
+    return results
+
+
+if __name__ == "__main__":
+    for result in measure():
+        print(result)
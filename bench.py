@@ -0,0 +1,425 @@
+"""Benchmarks for the launcher's data paths
+
+Times the code behind the GUI's hot paths on synthetic data, without Tk:
+
+    scanlist   ScanList parse, full and one edited line (toggle_scan)
+    freqlist   FreqList CSV index build, mapped load and lookups
+    config     settings load, save_config round trip, FMP24.cfg rewrite
+    language   language switch over bound widgets (on_language_change)
+    dispatch   command pipeline and pipelined control API requests
+    iq         IQ file replay, spectrum FFT and channelizer throughput
+
+    python bench.py --output bench.json
+    python bench.py --baseline bench.json --tolerance 0.25 --rounds 5
+    python bench.py --generate testdata/
+
+Results are JSON.  With --baseline every metric is compared to the stored
+run; the exit code is 1 if any got worse by more than the tolerance.
+Timings that grew by less than --noise-floor-us (50 us) are not counted,
+since a sub-millisecond path can swing by more than 25% between runs, and
+a benchmark with a regressed metric is run again in a new process
+(--confirm times) so a one-off stall doesn't fail the comparison.
+Metric names say which way is better: *_ms/*_us/*_s are times, *_per_s
+and *_msps are rates.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+SCANLIST_SIZES = (10, 100, 1000, 10_000, 100_000)
+QUICK_SCANLIST_SIZES = (10, 1000, 10_000)
+LOWER_IS_BETTER = ('_ms', '_us', '_s')
+HIGHER_IS_BETTER = ('_per_s', '_msps')
+TIME_UNITS = (('_us', 1e-6), ('_ms', 1e-3), ('_s', 1.0))
+# Timings that moved by less than this are scheduler and cache noise, whatever the percentage
+NOISE_FLOOR_S = 50e-6
+
+
+def timed(call, repeat=5, number=None, min_round=0.02):
+    """Best seconds per call over `repeat` rounds
+
+    Without `number`, each round runs enough calls to take at least
+    min_round seconds, so sub-millisecond paths aren't lost in timer noise.
+    The best round is the one least disturbed by the rest of the system.
+    """
+    if number is None:
+        number = 1
+        while True:
+            started = time.perf_counter()
+            for _ in range(number):
+                call()
+            if time.perf_counter() - started >= min_round or number >= 1 << 20:
+                break
+            number *= 2
+    rounds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            call()
+        rounds.append((time.perf_counter() - started) / number)
+    return min(rounds)
+
+
+# Generators
+
+def generate_scanlists(directory, sizes=SCANLIST_SIZES):
+    from scanlist import synthetic_text
+    paths = []
+    for lines in sizes:
+        path = os.path.join(directory, f'scanlist-{lines}.ScanList')
+        with open(path, 'w') as f:
+            f.write(synthetic_text(lines))
+        paths.append(path)
+    return paths
+
+
+def generate_freqlist(directory, rows=50_000):
+    from freqdb import write_synthetic_csv
+    path = os.path.join(directory, f'freqlist-{rows}.csv')
+    write_synthetic_csv(path, rows)
+    return path
+
+
+def generate_iq(directory, seconds=2.0, carriers=8, fmt='cu8'):
+    """rtl_sdr-style capture with `carriers` NFM carriers spread over the band"""
+    from iq_file import write_synthetic
+    offsets = np.linspace(-900e3, 900e3, carriers)
+    return write_synthetic(os.path.join(directory, f'nfm-{carriers}.{fmt}'), seconds, fmt=fmt,
+                           offsets_hz=offsets)
+
+
+def generate(directory, quick=False):
+    os.makedirs(directory, exist_ok=True)
+    return {
+        'scanlists': generate_scanlists(directory, QUICK_SCANLIST_SIZES if quick else SCANLIST_SIZES),
+        'freqlist': generate_freqlist(directory, 10_000 if quick else 50_000),
+        'iq': generate_iq(directory, 0.5 if quick else 2.0),
+    }
+
+
+# Benchmarks
+
+def bench_scanlist(directory, quick):
+    from scanlist import ScanList, synthetic_text
+    results = {}
+    for lines in QUICK_SCANLIST_SIZES if quick else SCANLIST_SIZES:
+        text = synthetic_text(lines)
+        middle = f'channel {lines // 2}\n'
+        edited = text.replace(middle, f'channel {lines // 2} edited\n', 1)
+        results[f'parse_{lines}_ms'] = timed(lambda: ScanList(text)) * 1000
+        model = ScanList(text)
+        texts = [edited, text]
+
+        def edit():
+            model.set_text(texts[0])
+            texts.reverse()
+
+        results[f'edit_{lines}_ms'] = timed(edit) * 1000
+    return results
+
+
+def bench_freqlist(directory, quick):
+    from freqdb import FreqDatabase
+    path = generate_freqlist(directory, 10_000 if quick else 50_000)
+
+    def build():
+        # Without the column cache every open compiles the CSV again
+        shutil.rmtree(path + '.cache', ignore_errors=True)
+        return FreqDatabase([path], origin=(19.7163, -155.6241), distance=3000.0)
+
+    build_time = timed(build, repeat=3, number=1)
+    db = build()
+    load = timed(lambda: FreqDatabase([path], origin=(19.7163, -155.6241), distance=3000.0))
+    freqs = np.linspace(150.0, 470.0, 200)
+
+    def queries():
+        for f in freqs:
+            db.query(f, 1000)
+
+    return {
+        'build_s': build_time,
+        'load_ms': load * 1000,
+        'query_us': timed(queries) / len(freqs) * 1e6,
+    }
+
+
+def bench_config(directory, quick):
+    from config import ConfigStore, FmpConfig
+    cfg_path = os.path.join(directory, 'FMP24.cfg')
+    if os.path.exists('FMP24.cfg'):
+        shutil.copy('FMP24.cfg', cfg_path)
+    paths = (os.path.join(directory, 'fmp_settings.json'),
+             os.path.join(directory, 'launcher_config.json'), cfg_path)
+    store = ConfigStore(*paths)
+    gains = iter(range(10 ** 9))
+
+    def save_config():
+        # What the Save button does: update every field, then write now
+        store.update(ppm='23', gain=str(next(gains) % 50), frequency='423.5', input_device='1',
+                     output_device='2', role_config=True, language='ar', backend='sendkeys',
+                     rtl_tcp_address='127.0.0.1:1234', dongles='1')
+        store.flush()
+
+    results = {
+        'save_config_ms': timed(save_config) * 1000,
+        'load_settings_ms': timed(lambda: ConfigStore(*paths)) * 1000,
+        'set_us': timed(lambda: store.set('gain', next(gains) % 50)) * 1e6,
+    }
+    store.close()
+    if os.path.exists(cfg_path):
+        cfg = FmpConfig.load(cfg_path)
+        results['fmp_cfg_roundtrip_us'] = timed(lambda: FmpConfig.load(cfg_path).text()) * 1e6
+        results['fmp_cfg_lines'] = len(cfg.lines)
+    return results
+
+
+class Widget:
+    """Stands in for a Tk label: a name and a configure() method"""
+
+    def __init__(self, n):
+        self.name = f'.label{n}'
+        self.text = ''
+
+    def configure(self, text):
+        self.text = text
+
+    def __str__(self):
+        return self.name
+
+
+def bench_language(directory, quick):
+    from i18n import Translator
+    results = {}
+    for size in (50, 500) if quick else (50, 500, 5000):
+        translator = Translator('ar')
+        keys = list(translator.catalog('en'))
+        for n in range(size):
+            translator.bind(Widget(n), keys[n % len(keys)])
+        languages = ['en', 'ar']
+
+        def switch():
+            translator.set_language(languages[0])
+            languages.reverse()
+
+        results[f'switch_{size}_ms'] = timed(switch) * 1000
+    return results
+
+
+def bench_dispatch(directory, quick):
+    from command_pipeline import CommandPipeline, NullBackend
+    import control_api
+    presses = 5000 if quick else 20000
+    rounds = []
+    for _ in range(3):
+        backend = NullBackend(0.0)
+        pipeline = CommandPipeline(backend)
+        pipeline.start()
+        started = time.perf_counter()
+        for i in range(presses):
+            pipeline.submit(('gain', 'keys', 'tune')[i % 3], 1, 0.0)
+        submitted = time.perf_counter() - started
+        pipeline.wait_idle(30.0)
+        rounds.append((submitted, time.perf_counter() - started))
+        pipeline.stop()
+    submitted = min(r[0] for r in rounds)
+    drained = min(r[1] for r in rounds)
+    api = control_api.measure(requests=presses)
+    return {
+        'submit_us': submitted / presses * 1e6,
+        'presses_per_s': presses / drained,
+        'backend_calls': backend.calls,
+        'api_requests_per_s': api['pipelined_per_s'],
+        'api_round_trip_ms': api['round_trip_ms'],
+    }
+
+
+def bench_iq(directory, quick):
+    from channelizer import Channelizer
+    from iq_file import IqFileSource
+    from spectrum import Spectrum
+    path = generate_iq(directory, 0.5 if quick else 2.0)
+    block = 262144
+    source = IqFileSource(path, loop=True)
+    reads = max(1, source.open().samples // block)
+    replay = timed(lambda: [source.read(block) for _ in range(reads)], repeat=3)
+    iq = source.read(block).copy()
+    source.close()
+    spectrum = Spectrum(65536, 1024)
+    center = 423.0e6
+    channels = center + (np.arange(160) - 80) * 12.5e3
+    channelizer = Channelizer(center, channels, 2.4e6, fft_size=1024)
+    channelize = timed(lambda: channelizer.process(iq))
+    return {
+        'replay_msps': reads * block / replay / 1e6,
+        'spectrum_frame_ms': timed(lambda: spectrum.compute(iq)) * 1000,
+        'channelizer_msps': block / channelize / 1e6,
+    }
+
+
+BENCHMARKS = {
+    'scanlist': bench_scanlist,
+    'freqlist': bench_freqlist,
+    'config': bench_config,
+    'language': bench_language,
+    'dispatch': bench_dispatch,
+    'iq': bench_iq,
+}
+
+
+# Baseline comparison
+
+def direction(metric):
+    """-1 if lower is better, 1 if higher is better, 0 if not a performance figure"""
+    if metric.endswith(HIGHER_IS_BETTER):
+        return 1
+    if metric.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def seconds(metric, value):
+    """A time metric's value in seconds, None for rates"""
+    if metric.endswith(HIGHER_IS_BETTER):
+        return None
+    for suffix, scale in TIME_UNITS:
+        if metric.endswith(suffix):
+            return value * scale
+    return None
+
+
+def compare(results, baseline, tolerance=0.25, noise_floor=NOISE_FLOOR_S):
+    """Rows of (bench, metric, baseline, current, change, regressed)
+
+    change is the relative slowdown: 0.3 means 30% worse, negative is better.
+    A time that grew by less than noise_floor seconds is never regressed.
+    """
+    rows = []
+    for bench, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(bench, {}).get(metric)
+            sign = direction(metric)
+            if old is None or not sign or not old or not value:
+                continue
+            change = value / old - 1 if sign < 0 else old / value - 1
+            regressed = change > tolerance
+            if regressed and seconds(metric, value) is not None:
+                regressed = seconds(metric, value) - seconds(metric, old) >= noise_floor
+            rows.append((bench, metric, old, value, change, regressed))
+    return rows
+
+
+def best_of(runs):
+    """Merge several runs keeping each metric's best value"""
+    merged = {}
+    for results in runs:
+        for bench, metrics in results.items():
+            target = merged.setdefault(bench, {})
+            for metric, value in metrics.items():
+                sign = direction(metric)
+                if metric not in target or (sign and value * sign > target[metric] * sign):
+                    target[metric] = value
+    return merged
+
+
+def run(names=None, quick=False, rounds=1):
+    directory = tempfile.mkdtemp(prefix='khanfar-bench-')
+    runs = []
+    try:
+        for _ in range(rounds):
+            results = {}
+            for name in names or BENCHMARKS:
+                print(f"{name}...", file=sys.stderr, flush=True)
+                results[name] = BENCHMARKS[name](directory, quick)
+            runs.append(results)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return best_of(runs)
+
+
+def run_fresh(names, quick=False):
+    """run() in a new interpreter: some timings depend on per-process state such as memory layout"""
+    import subprocess
+    command = [sys.executable, os.path.abspath(__file__), '--only', *names] + (['--quick'] if quick else [])
+    output = subprocess.run(command, stdout=subprocess.PIPE, check=True).stdout
+    return json.loads(output)['results']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help="benchmarks to run")
+    parser.add_argument('--quick', action='store_true', help="smaller inputs")
+    parser.add_argument('--rounds', type=int, default=3,
+                        help="run the suite this many times and keep each metric's best value")
+    parser.add_argument('--output', help="write the results JSON here (default: stdout)")
+    parser.add_argument('--baseline', help="results JSON to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed slowdown before a metric counts as regressed (0.25 = 25%%)")
+    parser.add_argument('--noise-floor-us', type=float, default=NOISE_FLOOR_S * 1e6,
+                        help="timings that grew by less than this many microseconds don't count as regressed")
+    parser.add_argument('--confirm', type=int, default=3,
+                        help="re-run a benchmark with a regressed metric up to this many times before reporting it")
+    parser.add_argument('--generate', metavar='DIR', help="only write the synthetic inputs to DIR")
+    args = parser.parse_args(argv)
+
+    if args.generate:
+        print(json.dumps(generate(args.generate, args.quick), indent=2))
+        return 0
+
+    report = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'quick': args.quick,
+            'rounds': args.rounds,
+        },
+        'results': run(args.only, args.quick, args.rounds),
+    }
+    regressed = []
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)['results']
+        rows = compare(report['results'], baseline, args.tolerance, args.noise_floor_us * 1e-6)
+        for _ in range(args.confirm):
+            # A one-off stall shouldn't fail the run: keep the best of a few more tries
+            suspects = sorted({b for b, m, old, new, change, bad in rows if bad})
+            if not suspects:
+                break
+            report['results'] = best_of([report['results'], run_fresh(suspects, args.quick)])
+            rows = compare(report['results'], baseline, args.tolerance, args.noise_floor_us * 1e-6)
+        report['comparison'] = [
+            {'bench': b, 'metric': m, 'baseline': old, 'current': new, 'change': change, 'regressed': bad}
+            for b, m, old, new, change, bad in rows]
+        for bench, metric, old, new, change, bad in rows:
+            print(f"{'REGRESSED' if bad else 'ok':9} {bench}.{metric}: {old:.4g} -> {new:.4g} "
+                  f"({change * 100:+.1f}% worse)" if change > 0 else
+                  f"{'ok':9} {bench}.{metric}: {old:.4g} -> {new:.4g} ({-change * 100:.1f}% better)",
+                  file=sys.stderr)
+        regressed = [f"{b}.{m}" for b, m, old, new, change, bad in rows if bad]
+        report['regressed'] = regressed
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if regressed:
+        print(f"{len(regressed)} metric(s) regressed beyond {args.tolerance * 100:.0f}%: "
+              f"{', '.join(regressed)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+"""PPM calibration from a reference carrier
+
+Instead of pressing p/P a few hundred times while watching the spectrum,
+capture a fraction of a second of IQ around a carrier whose frequency is
+known (a strong control channel or a beacon), average the power spectrum
+over several blocks, find the carrier with sub-bin accuracy and turn its
+offset straight into a PPM value.
+
+The dongle is tuned a little away from the reference so the carrier is
+clear of the DC spike.  A clean carrier is located by Gaussian (parabolic
+on dB) interpolation around the peak bin; a modulated one (NFM voice,
+FSK control channel) by the noise-subtracted power centroid of its
+channel, which lands on the carrier for any symmetric modulation.
+"""
+import queue
+import threading
+import time
+
+import numpy as np
+
+from channelizer import DEFAULT_SAMPLE_RATE
+from spectrum import get_plan
+
+
+class CalibrationError(Exception):
+    """No usable reference carrier in the capture"""
+
+
+def average_power(iq, fft_size):
+    """Mean windowed power spectrum of consecutive fft_size blocks, DC in the middle"""
+    blocks = len(iq) // fft_size
+    if blocks < 1:
+        raise ValueError(f"Need at least {fft_size} samples, got {len(iq)}")
+    frames = iq[:blocks * fft_size].reshape(blocks, fft_size) * get_plan(fft_size).window
+    spectra = np.fft.fft(frames, axis=1)
+    power = np.einsum('ij,ij->j', spectra.real, spectra.real) + np.einsum('ij,ij->j', spectra.imag, spectra.imag)
+    return np.fft.fftshift(power / blocks)
+
+
+def find_carrier(power, sample_rate, expected_hz=0.0, search_hz=50e3, bandwidth_hz=12.5e3,
+                 min_snr_db=10.0):
+    """(offset Hz from center, SNR dB) of the strongest carrier near expected_hz"""
+    size = len(power)
+    bin_hz = sample_rate / size
+    center = size // 2
+    low = max(1, int(center + (expected_hz - search_hz) / bin_hz))
+    high = min(size - 1, int(center + (expected_hz + search_hz) / bin_hz) + 1)
+    if high - low < 3:
+        raise CalibrationError("Search range is outside the captured bandwidth")
+    noise = float(np.median(power))
+    peak = low + int(np.argmax(power[low:high]))
+    snr_db = 10 * np.log10(power[peak] / max(noise, 1e-30))
+    if snr_db < min_snr_db:
+        raise CalibrationError(f"No carrier within {search_hz / 1e3:g} kHz of the reference "
+                               f"(best {snr_db:.1f} dB above noise)")
+    threshold = noise * 10 ** (min_snr_db / 10)
+    half = max(2, int(bandwidth_hz / 2 / bin_hz))
+    occupied = power[max(0, peak - half):peak + half + 1] > threshold
+    if occupied.sum() <= 5:
+        # Unmodulated carrier: fit a parabola to dB around the peak bin
+        a, b, c = 10 * np.log10(np.maximum(power[peak - 1:peak + 2], 1e-30))
+        shift = 0.5 * (a - c) / (a - 2 * b + c) if a - 2 * b + c else 0.0
+        position = peak + shift
+    else:
+        # Modulated: centroid over the channel, re-centred until it settles
+        excess = np.maximum(power - noise, 0.0)
+        position = float(peak)
+        for _ in range(5):
+            start = max(0, int(round(position)) - half)
+            window = excess[start:int(round(position)) + half + 1]
+            moved = start + float(np.dot(window, np.arange(len(window)))) / float(window.sum())
+            if abs(moved - position) < 0.01:
+                position = moved
+                break
+            position = moved
+    return (position - center) * bin_hz, float(snr_db)
+
+
+class PpmCalibrator:
+    """Measure the PPM correction from a reference carrier
+
+    source is an IQ source (rtl_tcp stream or recording) tuned to
+    source.frequency_hz with applied_ppm already applied; the result is the
+    correction to use instead.  For an rtl_tcp stream the calibrator tunes
+    it to reference_hz + tune_offset_hz itself.
+    """
+
+    def __init__(self, source, reference_hz, applied_ppm=0.0, sample_rate=None, fft_size=65536,
+                 blocks=8, tune_offset_hz=-200e3, max_ppm=100.0, bandwidth_hz=12.5e3):
+        self.source = source
+        self.reference_hz = float(reference_hz)
+        self.applied_ppm = applied_ppm
+        self.sample_rate = sample_rate or getattr(source, 'sample_rate', None) or DEFAULT_SAMPLE_RATE
+        self.fft_size = fft_size
+        self.blocks = blocks
+        self.tune_offset_hz = tune_offset_hz
+        self.max_ppm = max_ppm
+        self.bandwidth_hz = bandwidth_hz
+        self._iq = np.empty(fft_size * blocks, dtype=np.complex64)
+
+    def capture(self):
+        """IQ for one measurement and the frequency it was tuned to"""
+        source = self.source
+        if hasattr(source, 'set_frequency'):
+            source.set_frequency(self.reference_hz + self.tune_offset_hz)
+            # Drop what was in flight while the tuner settled
+            source.read(self.fft_size)
+        center_hz = getattr(source, 'frequency_hz', None)
+        if not center_hz:
+            raise CalibrationError("The IQ source's tuned frequency is unknown")
+        step = self.fft_size
+        for k in range(self.blocks):
+            self._iq[k * step:(k + 1) * step] = source.read(step)
+        return self._iq, center_hz
+
+    def measure(self):
+        """One calibration: the PPM correction to use and what it was based on"""
+        started = time.perf_counter()
+        iq, center_hz = self.capture()
+        power = average_power(iq, self.fft_size)
+        expected = self.reference_hz - center_hz
+        offset, snr_db = find_carrier(power, self.sample_rate, expected,
+                                      self.reference_hz * self.max_ppm * 1e-6 + self.bandwidth_hz,
+                                      self.bandwidth_hz)
+        # The tuner lands at center * (1 + error), so every carrier shows up
+        # center * error lower than it should
+        residual = -(offset - expected) / center_hz * 1e6
+        return {
+            'ppm': round(self.applied_ppm + residual, 2),
+            'residual_ppm': residual,
+            'offset_hz': offset - expected,
+            'snr_db': snr_db,
+            'resolution_hz': self.sample_rate / self.fft_size,
+            'seconds': time.perf_counter() - started,
+        }
+
+
+class PpmTracker:
+    """Re-run a calibration every `interval` seconds on a background thread
+
+    calibrate() returns a measurement dict; results (or the exception) are
+    queued for the owner to apply on its own thread via results().
+    history keeps (time, ppm) so drift with temperature shows up.
+    """
+
+    def __init__(self, calibrate, interval=600.0):
+        self.calibrate = calibrate
+        self.interval = interval
+        self.history = []
+        self._results = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ppm-tracker", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5.0)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                result = self.calibrate()
+                self.history.append((time.time(), result['ppm']))
+                del self.history[:-1000]
+                self._results.put((result, None))
+            except Exception as e:
+                self._results.put((None, e))
+            if self._stop.wait(self.interval):
+                return
+
+    def results(self):
+        """Measurements finished since the last call, as (result, error) pairs"""
+        out = []
+        while True:
+            try:
+                out.append(self._results.get_nowait())
+            except queue.Empty:
+                return out
+
+    def drift_ppm_per_hour(self):
+        """Least-squares slope of the history, or None with fewer than 3 points"""
+        if len(self.history) < 3:
+            return None
+        times, values = np.array(self.history).T
+        if times[-1] - times[0] <= 0:
+            return None
+        return float(np.polyfit((times - times[0]) / 3600.0, values, 1)[0])
+
+
+def measure(true_ppm=23.4, reference_hz=851.0125e6, runs=20):
+    """Accuracy and time of a calibration on synthetic dongle captures
+
+    Each run records 0.3 s of the reference (a plain carrier, then an
+    NFM-modulated one, 10 dB over noise) as an uncorrected dongle with
+    about true_ppm of crystal error would see it, then calibrates from
+    the recording.
+    """
+    import os
+    import shutil
+    import tempfile
+    from channelizer import synthetic_iq
+    from iq_file import IqFileSource
+
+    directory = tempfile.mkdtemp(prefix='ppm-')
+    sample_rate = DEFAULT_SAMPLE_RATE
+    center_hz = reference_hz - 200e3
+    results = {}
+    try:
+        for kind, deviation in (('carrier', 0.0), ('nfm', 2.5e3)):
+            errors = []
+            seconds = []
+            for seed in range(runs):
+                error_ppm = true_ppm + np.random.default_rng(seed).uniform(-0.5, 0.5)
+                # The tuner lands error_ppm high, so the reference shows up that much lower
+                offset = reference_hz - center_hz * (1 + error_ppm * 1e-6)
+                iq = synthetic_iq(int(0.3 * sample_rate), [offset], sample_rate, snr_db=10.0,
+                                  deviation_hz=deviation, seed=seed)
+                path = os.path.join(directory, f'{kind}{seed}.cf32')
+                iq.tofile(path)
+                source = IqFileSource(path, sample_rate, frequency_hz=center_hz)
+                result = PpmCalibrator(source, reference_hz).measure()
+                source.close()
+                errors.append(abs(result['ppm'] - error_ppm))
+                seconds.append(result['seconds'])
+            results[kind] = {
+                'mean_abs_error_ppm': float(np.mean(errors)),
+                'max_abs_error_ppm': float(np.max(errors)),
+                'p50_seconds': float(np.median(seconds)),
+                'max_seconds': float(np.max(seconds)),
+            }
+        results['key_presses_replaced'] = int(round(true_ppm / 0.1))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    print(measure())
@@ -0,0 +1,185 @@
+"""Wideband polyphase channelizer
+
+FMP scans one frequency at a time.  Every ScanList channel that falls inside
+the tuned capture (2.4 MS/s, FMP24.cfg line 1) can instead be watched at
+once: IQ blocks go through a polyphase filter bank + FFT and each channel's
+power is read from the bins it covers.  Cost per block is one FFT per
+output frame no matter how many channels are in the list.
+"""
+import time
+
+import numpy as np
+
+from scanlist import ScanList
+
+
+DEFAULT_SAMPLE_RATE = 2.4e6
+DEFAULT_BANDWIDTH = 12.5e3
+
+
+def uint8_to_complex64(raw, out=None):
+    """Convert interleaved rtl_sdr uint8 I/Q bytes to complex64 in [-1, 1)"""
+    samples = np.frombuffer(raw, dtype=np.uint8)
+    count = len(samples) // 2
+    if out is None:
+        out = np.empty(count, dtype=np.complex64)
+    view = out[:count].view(np.float32)
+    np.subtract(samples[:count * 2], 127.5, out=view, casting='unsafe')
+    view *= 1.0 / 127.5
+    return out[:count]
+
+
+def prototype_filter(channels, taps_per_channel, cutoff=1.0):
+    """Windowed-sinc lowpass for the filter bank, shaped (taps, channels)"""
+    length = channels * taps_per_channel
+    n = np.arange(length) - (length - 1) / 2.0
+    h = np.sinc(cutoff * n / channels) * np.blackman(length)
+    h /= h.sum()
+    return h.reshape(taps_per_channel, channels).astype(np.float32)
+
+
+class Channelizer:
+    """Polyphase FFT channelizer reporting power/activity per ScanList channel
+
+    channels_hz are absolute channel frequencies; those outside the usable
+    part of the capture window are reported as NaN and never active.
+    """
+
+    def __init__(self, center_hz, channels_hz, sample_rate=DEFAULT_SAMPLE_RATE,
+                 fft_size=1024, taps_per_channel=8, bandwidths_hz=None,
+                 threshold_db=10.0, usable_fraction=0.9):
+        self.center_hz = float(center_hz)
+        self.sample_rate = float(sample_rate)
+        self.fft_size = fft_size
+        self.taps = taps_per_channel
+        self.threshold_db = threshold_db
+        self.filter = prototype_filter(fft_size, taps_per_channel)
+        self.history = np.zeros(fft_size * (taps_per_channel - 1), dtype=np.complex64)
+        self.blocks = 0
+        self.busy_seconds = 0.0
+        self.set_channels(channels_hz, bandwidths_hz, usable_fraction)
+
+    def set_channels(self, channels_hz, bandwidths_hz=None, usable_fraction=0.9):
+        """Map channel frequencies onto filter bank bins"""
+        self.channels_hz = np.asarray(channels_hz, dtype=np.float64)
+        count = len(self.channels_hz)
+        if bandwidths_hz is None:
+            bandwidths_hz = np.full(count, DEFAULT_BANDWIDTH)
+        bandwidths_hz = np.broadcast_to(np.asarray(bandwidths_hz, dtype=np.float64), (count,))
+        spacing = self.sample_rate / self.fft_size
+        offsets = self.channels_hz - self.center_hz
+        self.covered = np.abs(offsets) + bandwidths_hz / 2 <= usable_fraction * self.sample_rate / 2
+        # Every channel uses the same number of bins so the lookup is one gather
+        width = max(1, int(np.ceil(bandwidths_hz.max() / spacing))) if count else 1
+        half = np.floor(bandwidths_hz / spacing / 2.0)
+        first = np.round(offsets / spacing) - half
+        span = np.arange(width)
+        bins = first[:, None] + span[None, :]
+        self.bin_mask = (span[None, :] <= 2 * half[:, None]) & self.covered[:, None]
+        self.bin_index = (bins.astype(np.int64) % self.fft_size)
+        self.bins_per_channel = np.maximum(self.bin_mask.sum(axis=1), 1)
+        self.active = np.zeros(count, dtype=bool)
+
+    def filter_bank(self, block):
+        """Run the polyphase filter bank; returns (frames, fft_size) spectra"""
+        m = self.fft_size
+        data = np.concatenate((self.history, np.asarray(block, dtype=np.complex64)))
+        frames = (len(data) - len(self.history)) // m
+        if frames <= 0:
+            self.history = data[-len(self.history):] if len(self.history) else data[:0]
+            return np.empty((0, m), dtype=np.complex64)
+        used = frames * m
+        segments = np.lib.stride_tricks.sliding_window_view(data[:used + len(self.history)], m * self.taps)[::m]
+        weighted = segments.reshape(frames, self.taps, m) * self.filter
+        spectra = np.fft.fft(weighted.sum(axis=1), axis=1)
+        self.history = data[used:used + len(self.history)].copy()
+        return spectra
+
+    def process(self, block):
+        """Channelize one IQ block; returns a ChannelReport"""
+        started = time.perf_counter()
+        spectra = self.filter_bank(block)
+        if len(spectra):
+            bin_power = (spectra.real ** 2 + spectra.imag ** 2).mean(axis=0)
+        else:
+            bin_power = np.zeros(self.fft_size)
+        noise = float(np.median(bin_power)) or 1e-20
+        power = (bin_power[self.bin_index] * self.bin_mask).sum(axis=1) / self.bins_per_channel
+        with np.errstate(divide='ignore'):
+            power_db = 10 * np.log10(power)
+        power_db[~self.covered] = np.nan
+        noise_db = 10 * np.log10(noise)
+        self.active = self.covered & (power_db - noise_db >= self.threshold_db)
+        self.blocks += 1
+        self.busy_seconds += time.perf_counter() - started
+        return ChannelReport(self.channels_hz, power_db, self.active.copy(), noise_db)
+
+    def cycles_per_second(self):
+        """Full channel-list scan cycles per second of processing time"""
+        return self.blocks / self.busy_seconds if self.busy_seconds else 0.0
+
+
+class ChannelReport:
+    """Per-channel result of one block"""
+
+    __slots__ = ('channels_hz', 'power_db', 'active', 'noise_db')
+
+    def __init__(self, channels_hz, power_db, active, noise_db):
+        self.channels_hz = channels_hz
+        self.power_db = power_db
+        self.active = active
+        self.noise_db = noise_db
+
+    def active_channels(self):
+        return self.channels_hz[self.active]
+
+    def snr_db(self):
+        return self.power_db - self.noise_db
+
+
+def read_scanlist_frequencies(path="FMP24.ScanList"):
+    """Channel frequencies and filter bandwidths in Hz from a ScanList file"""
+    model = ScanList.load(path)
+    active = model.active_indices()
+    return model.freq_hz[active].astype(np.float64), model.bandwidth_hz[active].astype(np.float64)
+
+
+def synthetic_iq(samples, offsets_hz, sample_rate=DEFAULT_SAMPLE_RATE, snr_db=20.0,
+                 deviation_hz=2.5e3, seed=0):
+    """Complex noise plus NFM-like carriers at the given offsets from center"""
+    rng = np.random.default_rng(seed)
+    noise = (rng.standard_normal(samples) + 1j * rng.standard_normal(samples)) / np.sqrt(2)
+    iq = noise.astype(np.complex64)
+    t = np.arange(samples) / sample_rate
+    amplitude = 10 ** (snr_db / 20.0)
+    for i, offset in enumerate(offsets_hz):
+        tone = 300.0 + 50.0 * (i % 16)
+        phase = 2 * np.pi * offset * t + deviation_hz / tone * np.sin(2 * np.pi * tone * t)
+        iq += (amplitude * np.exp(1j * phase)).astype(np.complex64)
+    return iq
+
+
+def measure(channels=128, block_samples=262144, blocks=20, fft_size=1024):
+    """Channel-scan cycles per second for a list of `channels` entries"""
+    sample_rate = DEFAULT_SAMPLE_RATE
+    center = 423.0e6
+    spacing = 12.5e3
+    freqs = center + (np.arange(channels) - channels / 2) * spacing
+    active = freqs[::7] - center
+    iq = synthetic_iq(block_samples, active, sample_rate)
+    channelizer = Channelizer(center, freqs, sample_rate, fft_size=fft_size)
+    for _ in range(blocks):
+        report = channelizer.process(iq)
+    expected = channelizer.covered & np.isin(freqs, freqs[::7])
+    return {
+        'channels': channels,
+        'covered': int(channelizer.covered.sum()),
+        'detected_correctly': int((report.active == expected).sum()),
+        'cycles_per_second': channelizer.cycles_per_second(),
+        'realtime_factor': channelizer.cycles_per_second() * block_samples / sample_rate,
+    }
+
+
+if __name__ == "__main__":
+    for count in (10, 100, 160):
+        print(measure(count))
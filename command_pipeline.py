@@ -0,0 +1,328 @@
+"""Background command pipeline between the launcher and FMP24
+
+Every control action is queued here instead of talking to FMP24 on the Tk
+main thread.  A single worker thread owns the backend (and therefore the
+cached WScript.Shell object), bursts of key presses are collapsed into one
+dispatch, and results are handed back to Tk through root.after().
+"""
+import queue
+import threading
+import time
+from collections import deque
+
+
+# Operations that are merged with an already pending operation of the same kind
+COALESCED_KINDS = ('tune', 'gain', 'ppm')
+
+
+class SendKeysBackend:
+    """Drive the FMP24 window by typing keys into it"""
+
+    name = 'sendkeys'
+
+    def __init__(self, window_title="FMP24", key_delay=0.2):
+        self.window_title = window_title
+        self.key_delay = key_delay  # FMP24 needs a moment between typed digits
+        self._shell = None
+
+    def _get_shell(self):
+        """Create the WScript.Shell object once, on the thread that uses it"""
+        if self._shell is None:
+            import pythoncom
+            import win32com.client
+            pythoncom.CoInitialize()
+            self._shell = win32com.client.Dispatch("WScript.Shell")
+        return self._shell
+
+    def send_keys(self, keys):
+        shell = self._get_shell()
+        shell.AppActivate(self.window_title)
+        shell.SendKeys(keys)
+
+    def tune(self, freq_mhz):
+        """Type the frequency digit by digit and press Enter"""
+        for digit in f"{freq_mhz:.3f}":
+            self.send_keys(digit)
+            time.sleep(self.key_delay)
+        self.send_keys("{ENTER}")
+
+    def step_gain(self, steps, gain_db):
+        self.send_keys(("G" if steps > 0 else "g") * abs(steps))
+
+    def step_ppm(self, steps, ppm):
+        self.send_keys(("P" if steps > 0 else "p") * abs(steps))
+
+    def start_scan(self):
+        self.send_keys("s")
+
+    def stop_scan(self):
+        self.send_keys("{ESC}")
+        time.sleep(self.key_delay)  # Wait for the scan to stop
+
+    def close(self):
+        self._shell = None
+
+
+class Command:
+    """One queued operation, possibly standing in for several key presses"""
+
+    __slots__ = ('kind', 'value', 'target', 'submitted', 'superseded')
+
+    def __init__(self, kind, value, target, submitted):
+        self.kind = kind
+        self.value = value
+        self.target = target
+        self.submitted = [submitted]
+        self.superseded = 0
+
+
+class LatencyStats:
+    """Rolling window of keypress-to-dispatch latencies in seconds"""
+
+    def __init__(self, size=4096):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def percentile(self, pct):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'p50_ms': self.percentile(50) * 1000.0,
+            'p99_ms': self.percentile(99) * 1000.0,
+            'max_ms': max(self.samples) * 1000.0 if self.samples else 0.0,
+        }
+
+
+class CommandPipeline:
+    """Queue control actions and dispatch them to a backend on a worker thread
+
+    kind is one of:
+      'keys'        raw SendKeys string, sent as-is
+      'tune'        value = frequency in MHz; a newer tune replaces a pending one
+      'gain'/'ppm'  value = step count; pending steps are summed, target is the
+                    resulting absolute value
+      'scan_start'/'scan_stop'
+      'scan_restart' stop and start again; value becomes the pause in seconds
+    Non-coalesced operations act as barriers so ordering is preserved.
+    """
+
+    def __init__(self, backend, root=None, on_result=None, poll_ms=50):
+        self.backend = backend
+        self.root = root
+        self.on_result = on_result
+        self.poll_ms = poll_ms
+        self.latency = LatencyStats()
+        self.dispatched = 0
+        self.coalesced = 0
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._results = queue.Queue()
+        self._running = False
+        self._busy = False
+        self._thread = None
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._worker, name="fmp-commands", daemon=True)
+        self._thread.start()
+        if self.root is not None:
+            self.root.after(self.poll_ms, self._poll_results)
+
+    def stop(self, timeout=2.0):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def set_backend(self, backend):
+        """Swap the backend; the worker picks it up before the next dispatch"""
+        with self._cond:
+            old, self.backend = self.backend, backend
+        if old is not None and old is not backend:
+            self.submit('_close', old)
+
+    def submit(self, kind, value=None, target=None):
+        """Queue an operation; returns immediately"""
+        now = time.perf_counter()
+        with self._cond:
+            if kind in COALESCED_KINDS:
+                for cmd in reversed(self._pending):
+                    if cmd.kind not in COALESCED_KINDS:
+                        break
+                    if cmd.kind == kind:
+                        if kind == 'tune':
+                            cmd.value = value
+                            cmd.superseded += 1
+                        else:
+                            cmd.value += value
+                        cmd.target = target
+                        cmd.submitted.append(now)
+                        self.coalesced += 1
+                        return
+            self._pending.append(Command(kind, value, target, now))
+            self._cond.notify_all()
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending)
+
+    def wait_idle(self, timeout=5.0):
+        """Block until every queued operation has been dispatched"""
+        deadline = time.perf_counter() + timeout
+        with self._cond:
+            while self._pending or self._busy:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait()
+                if not self._running:
+                    break
+                cmd = self._pending.popleft()
+                backend = self.backend
+                self._busy = True
+            started = time.perf_counter()
+            for submitted in cmd.submitted:
+                self.latency.add(started - submitted)
+            error = None
+            try:
+                self._dispatch(backend, cmd)
+            except Exception as e:
+                error = e
+            self.dispatched += 1
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+            if cmd.kind != '_close':
+                self._results.put((cmd, error))
+        try:
+            self.backend.close()
+        except Exception:
+            pass
+
+    def _dispatch(self, backend, cmd):
+        if cmd.kind == 'keys':
+            backend.send_keys(cmd.value)
+        elif cmd.kind == 'tune':
+            backend.tune(cmd.value)
+        elif cmd.kind == 'gain':
+            if cmd.value:
+                backend.step_gain(cmd.value, cmd.target)
+        elif cmd.kind == 'ppm':
+            if cmd.value:
+                backend.step_ppm(cmd.value, cmd.target)
+        elif cmd.kind in ('set_ppm', 'set_gain'):
+            # Absolute values, for backends that take them in one command
+            getattr(backend, cmd.kind)(cmd.value)
+        elif cmd.kind == 'scan_start':
+            backend.start_scan()
+        elif cmd.kind == 'scan_stop':
+            backend.stop_scan()
+        elif cmd.kind == 'scan_restart':
+            started = time.perf_counter()
+            backend.stop_scan()
+            backend.start_scan()
+            cmd.value = time.perf_counter() - started
+        elif cmd.kind == '_close':
+            cmd.value.close()
+        else:
+            raise ValueError(f"Unknown command kind: {cmd.kind}")
+
+    def _poll_results(self):
+        """Deliver finished operations to on_result on the Tk thread"""
+        self.drain_results()
+        if self._running and self.root is not None:
+            self.root.after(self.poll_ms, self._poll_results)
+
+    def drain_results(self):
+        while True:
+            try:
+                cmd, error = self._results.get_nowait()
+            except queue.Empty:
+                return
+            if self.on_result:
+                self.on_result(cmd, error)
+
+
+class NullBackend:
+    """Backend that only burns a fixed time per call; used for measurements"""
+
+    name = 'null'
+
+    def __init__(self, delay=0.0005):
+        self.delay = delay
+        self.calls = 0
+
+    def _call(self, *args):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+
+    send_keys = tune = step_gain = step_ppm = _call
+    start_scan = stop_scan = _call
+
+    def close(self):
+        pass
+
+
+def measure_latency(presses=2000, burst=20, rate=500.0, backend_delay=0.002):
+    """Keypress-to-dispatch latency with bursts of gain/ppm/tune presses
+
+    Presses arrive at `rate` per second while every backend call takes
+    `backend_delay` seconds, so without coalescing the queue would grow.
+    Returns the latency summary plus how many backend calls were needed.
+    """
+    backend = NullBackend(backend_delay)
+    pipeline = CommandPipeline(backend)
+    pipeline.start()
+    kinds = ('gain', 'ppm', 'tune', 'keys')
+    interval = 1.0 / rate if rate else 0.0
+    start = time.perf_counter()
+    for i in range(presses):
+        if interval:
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        kind = kinds[(i // burst) % len(kinds)]
+        if kind == 'tune':
+            pipeline.submit('tune', 422.0 + i * 0.00625)
+        elif kind == 'keys':
+            pipeline.submit('keys', 'm')
+        else:
+            pipeline.submit(kind, 1, 0.0)
+    submit_time = time.perf_counter() - start
+    pipeline.wait_idle(30.0)
+    pipeline.stop()
+    result = pipeline.latency.summary()
+    result.update({
+        'presses': presses,
+        'backend_calls': backend.calls,
+        'coalesced': pipeline.coalesced,
+        'seconds': submit_time,
+    })
+    return result
+
+
+if __name__ == "__main__":
+    for key, value in measure_latency().items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
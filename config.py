@@ -0,0 +1,315 @@
+"""One settings store for the launcher and FMP24.cfg
+
+Launcher settings used to be split over fmp_settings.json (save_settings)
+and launcher_config.json (save_config) with different defaults.  They now
+live in fmp_settings.json only; launcher_config.json is still read for
+values the main file doesn't have yet.  FMP24.cfg is read and written
+line by line with its "; comment" column kept in place.
+
+Values are typed and cached in memory.  set() returns at once; a writer
+thread writes the files (atomically) once no change has come in for
+`delay` seconds, so a burst of changes, like holding G, costs one write.
+The writer only holds the settings lock to take a snapshot, so a slow
+disk never holds up set().  A failed write is retried with a backoff
+that doubles up to MAX_BACKOFF seconds.
+"""
+import json
+import os
+import threading
+import time
+
+from fileutil import atomic_write
+
+
+def _bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
+# name: (type, default).  Defaults are the ones the launcher has always
+# shown on a fresh install (gain 32, output device 2); load_settings' old
+# fallbacks (gain 50, output device 1) are dropped.
+SETTINGS = {
+    'ppm': (float, 23.0),
+    'gain': (float, 32.0),
+    'frequency': (float, 423.0),
+    'input_device': (int, 1),
+    'output_device': (int, 2),
+    'role_config': (_bool, True),
+    'language': (str, 'ar'),
+    'backend': (str, 'sendkeys'),
+    'rtl_tcp_address': (str, '127.0.0.1:1234'),
+    'dongles': (int, 1),
+    'api_address': (str, '127.0.0.1:4550'),
+    'economy': (_bool, True),
+    'cpu_target': (float, 0.0),
+}
+
+MAX_BACKOFF = 30.0
+
+# launcher_config.json used other names for some keys
+LEGACY_NAMES = {'rf_gain': 'gain'}
+
+
+def _step_table(value):
+    if isinstance(value, str):
+        return [int(v) for v in value.split()]
+    return [int(v) for v in value]
+
+
+def _origin(value):
+    if isinstance(value, str):
+        value = value.split()
+    lat, lon = value
+    return (float(lat), float(lon))
+
+
+def format_value(value):
+    if isinstance(value, (list, tuple)):
+        return ' '.join(format_value(v) for v in value)
+    if isinstance(value, float):
+        return f"{value:g}"
+    return str(value)
+
+
+# FMP24.cfg, one value per line (FMP24 has the DSD+ path on line 6)
+FMP_CFG_FIELDS = (
+    ('sample_rate_mhz', float),
+    ('window_width', int),
+    ('fft_size_k', int),
+    ('update_rate', float),
+    ('step_table', _step_table),
+    ('dsdplus_path', str),
+    ('freq_list', str),
+    ('freq_list_aux', str),
+    ('search_units', str),
+    ('search_distance', float),
+    ('search_origin', _origin),
+)
+
+
+class FmpConfig:
+    """FMP24.cfg values with each line's comment kept for writing back"""
+
+    def __init__(self, lines=()):
+        self.values = {}
+        self.lines = []  # (value text, value column width, comment) per line
+        self.newline = '\r\n' if lines and lines[0].endswith('\r\n') else '\n'
+        for line in lines:
+            line = line.rstrip('\r\n')
+            value, sep, comment = line.partition(';')
+            width = len(value) if sep else 0
+            self.lines.append([value.strip(), width, comment if sep else None])
+        for index, (name, kind) in enumerate(FMP_CFG_FIELDS):
+            if index < len(self.lines):
+                self.values[name] = kind(self.lines[index][0])
+
+    @classmethod
+    def load(cls, path="FMP24.cfg"):
+        # Keep FMP24's CRLF line endings when writing back
+        with open(path, 'r', newline='') as f:
+            return cls(f.readlines())
+
+    def __getitem__(self, name):
+        return self.values[name]
+
+    def get(self, name, default=None):
+        return self.values.get(name, default)
+
+    def set(self, name, value):
+        """Returns True if the value changed"""
+        for index, (field, kind) in enumerate(FMP_CFG_FIELDS):
+            if field == name:
+                value = kind(value)
+                if self.values.get(name) == value:
+                    return False
+                while len(self.lines) <= index:
+                    self.lines.append(['', 0, None])
+                self.values[name] = value
+                self.lines[index][0] = format_value(value)
+                return True
+        raise KeyError(name)
+
+    @property
+    def fft_size(self):
+        """FFT size in points ("64" in the file means 64k)"""
+        size = self.values['fft_size_k']
+        return size * 1024 if size < 1024 else size
+
+    def text(self):
+        out = []
+        for value, width, comment in self.lines:
+            if comment is None:
+                out.append(value)
+            else:
+                out.append(value.ljust(max(width - 1, len(value))) + ' ;' + comment)
+        return self.newline.join(out) + self.newline
+
+
+class ConfigStore:
+    """Typed launcher settings plus FMP24.cfg with debounced write-behind"""
+
+    def __init__(self, path="fmp_settings.json", legacy_path="launcher_config.json",
+                 cfg_path="FMP24.cfg", delay=0.5):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.cfg_path = cfg_path
+        self.delay = delay
+        self.values = {name: default for name, (kind, default) in SETTINGS.items()}
+        self.cfg = None
+        self.writes = 0
+        self.last_error = None
+        self._dirty = set()
+        self._due = None
+        self._retry_at = 0.0
+        self._backoff = 0.0
+        self._lock = threading.Condition()
+        # Held for a whole write so snapshots reach the disk in order
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._thread = None
+        self.load()
+
+    def load(self):
+        """Read the settings files; unknown keys are ignored, bad values keep the default"""
+        for path, names in ((self.legacy_path, LEGACY_NAMES), (self.path, {})):
+            try:
+                with open(path, 'r') as f:
+                    stored = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for key, value in stored.items():
+                name = names.get(key, key)
+                if name in SETTINGS:
+                    try:
+                        self.values[name] = SETTINGS[name][0](value)
+                    except (TypeError, ValueError):
+                        pass
+        try:
+            self.cfg = FmpConfig.load(self.cfg_path)
+        except (OSError, ValueError):
+            self.cfg = None
+
+    def get(self, name):
+        return self.values[name]
+
+    def set(self, name, value):
+        """Change one setting; raises ValueError if it doesn't convert"""
+        self.update(**{name: value})
+
+    def update(self, **values):
+        converted = {name: SETTINGS[name][0](value) for name, value in values.items()}
+        with self._lock:
+            changed = {name for name, value in converted.items() if self.values[name] != value}
+            if not changed:
+                return
+            self.values.update(converted)
+            self._dirty.add('settings')
+            self._schedule()
+
+    def set_cfg(self, name, value):
+        """Change one FMP24.cfg value (takes effect when FMP24 next starts)"""
+        with self._lock:
+            if self.cfg is None:
+                raise OSError(f"{self.cfg_path} could not be read")
+            if self.cfg.set(name, value):
+                self._dirty.add('cfg')
+                self._schedule()
+
+    def _schedule(self):
+        self._due = max(time.monotonic() + self.delay, self._retry_at)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._writer, name="config-writer", daemon=True)
+            self._thread.start()
+        self._lock.notify()
+
+    def _writer(self):
+        while True:
+            with self._lock:
+                while not self._closed and (self._due is None or self._due > time.monotonic()):
+                    self._lock.wait(None if self._due is None else self._due - time.monotonic())
+                if self._closed:
+                    return
+            self._write()
+
+    def _write(self):
+        """Snapshot the dirty files under the lock and write them outside it"""
+        with self._write_lock:
+            with self._lock:
+                dirty, self._dirty, self._due = self._dirty, set(), None
+                settings = json.dumps(self.values, indent=4) if 'settings' in dirty else None
+                cfg = self.cfg.text() if 'cfg' in dirty and self.cfg is not None else None
+            try:
+                if settings is not None:
+                    atomic_write(self.path, settings)
+                    self.writes += 1
+                    dirty.discard('settings')
+                if cfg is not None:
+                    atomic_write(self.cfg_path, cfg)
+                    self.writes += 1
+                    dirty.discard('cfg')
+            except OSError as e:
+                with self._lock:
+                    self.last_error = e
+                    self._dirty |= dirty
+                    self._backoff = min(MAX_BACKOFF, self._backoff * 2 or self.delay or 0.1)
+                    self._retry_at = time.monotonic() + self._backoff
+                    self._schedule()
+                return
+            with self._lock:
+                self._backoff = self._retry_at = 0.0
+                if not self._dirty:
+                    self.last_error = None
+
+    def flush(self):
+        """Write pending changes now; raises the error if they can't be written"""
+        if self._dirty:
+            self._write()
+        with self._lock:
+            error, self.last_error = self.last_error, None
+        if error is not None:
+            raise error
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._closed = True
+            self._lock.notify()
+
+
+def measure(presses=200, interval=0.01, delay=0.2):
+    """Disk writes and set() cost for a held key (auto-repeat every `interval` s)"""
+    import shutil
+    import tempfile
+    directory = tempfile.mkdtemp()
+    try:
+        cfg = os.path.join(directory, 'FMP24.cfg')
+        if os.path.exists('FMP24.cfg'):
+            shutil.copy('FMP24.cfg', cfg)
+        store = ConfigStore(os.path.join(directory, 'fmp_settings.json'),
+                            os.path.join(directory, 'launcher_config.json'), cfg, delay)
+        cost = 0.0
+        gain = store.get('gain')
+        for _ in range(presses):
+            gain += 1
+            started = time.perf_counter()
+            store.set('gain', gain)
+            cost += time.perf_counter() - started
+            time.sleep(interval)
+        time.sleep(delay * 3)
+        writes = store.writes
+        reloaded = ConfigStore(store.path, store.legacy_path, cfg).get('gain')
+        store.close()
+        return {
+            'presses': presses,
+            'disk_writes': writes,
+            'set_us': cost / presses * 1e6,
+            'persisted': reloaded == gain,
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    print(measure())
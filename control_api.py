@@ -0,0 +1,502 @@
+"""JSON-RPC control API for the scanner controller
+
+Newline-delimited JSON-RPC 2.0 over TCP ("host:port") or a Unix socket
+("unix:/path").  Clients may pipeline: send any number of requests
+without waiting, and the replies come back in order.  The server reads
+whatever has arrived, handles every complete line and writes all replies
+in one go, so a burst of requests costs one socket write, not one each.
+JSON arrays are handled as batches.  SLOW_METHODS (IQ sweeps, FMP24
+restarts) run one at a time on a worker thread and reply when they
+finish, possibly after later requests, so match replies by id.
+
+Every request carries this install's token (see load_token) in a "token"
+member.  A line that is not JSON, a request without the right token or a
+line longer than MAX_REQUEST closes the connection, so a browser posting
+to the port gets nothing past its HTTP request line.
+
+A client that calls "subscribe" also gets controller events as
+notifications: {"jsonrpc": "2.0", "method": "event", "params":
+{"event": ..., ...}}.
+
+    {"jsonrpc": "2.0", "id": 1, "method": "tune", "params": [423.5], "token": "..."}
+    {"jsonrpc": "2.0", "id": 1, "result": 423.5}
+"""
+import asyncio
+import hmac
+import itertools
+import json
+import os
+import queue
+import secrets
+import socket
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from controller import ControllerError
+from fileutil import atomic_write
+
+
+DEFAULT_ADDRESS = '127.0.0.1:4550'
+TOKEN_PATH = 'control_token'
+MAX_REQUEST = 8 << 20
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+CONTROLLER_ERROR = -32000
+UNAUTHORIZED = -32001
+
+# Controller methods callable over the API
+METHODS = (
+    'status', 'latency', 'tune', 'step_gain', 'step_ppm', 'send_keys',
+    'start_scan', 'stop_scan', 'get_scan_list', 'save_scan_list', 'channels',
+    'get_settings', 'update_settings', 'save_settings', 'reset_settings',
+    'set_backend', 'launch', 'stop_fmp', 'restart_fmp', 'governor_status',
+    'set_ppm', 'calibrate_ppm', 'track_ppm', 'ppm_status',
+    'set_gain', 'auto_gain', 'auto_gain_monitor', 'survey',
+    'demodulate', 'demod_status', 'lookup', 'scan_line',
+)
+
+# These read IQ for seconds, wait for FMP24 to exit or may have to compile
+# a frequency list first; they run on a worker thread so other clients and
+# the event poll keep going
+SLOW_METHODS = frozenset(('launch', 'stop_fmp', 'restart_fmp', 'calibrate_ppm', 'auto_gain', 'survey',
+                          'lookup', 'scan_line'))
+
+POLL_INTERVAL = 0.05
+SCAN_LIST_CHECK = 1.0
+
+
+def parse_address(address):
+    """('unix', path) or ('tcp', (host, port))"""
+    if address.startswith('unix:'):
+        return 'unix', address[5:]
+    host, _, port = address.rpartition(':')
+    if not host or not port.isdigit():
+        raise ValueError(f"Expected host:port or unix:/path, got {address!r}")
+    return 'tcp', (host, int(port))
+
+
+def load_token(path=TOKEN_PATH):
+    """This install's API token, created (readable by the owner only) on first use"""
+    try:
+        with open(path, encoding='ascii') as f:
+            token = f.read().strip()
+    except FileNotFoundError:
+        token = ''
+    if not token:
+        token = secrets.token_hex(16)
+        atomic_write(path, token + '\n')
+    return token
+
+
+class RpcError(Exception):
+    def __init__(self, code, message, key=None):
+        super().__init__(message)
+        self.code = code
+        self.key = key
+
+
+def _error(id, code, message, key=None):
+    error = {'code': code, 'message': message}
+    if key is not None:
+        error['data'] = {'key': key}
+    return {'jsonrpc': '2.0', 'id': id, 'error': error}
+
+
+class ControlServer:
+    """Serve a ScannerController on one asyncio event loop"""
+
+    def __init__(self, controller, address=DEFAULT_ADDRESS, token=None):
+        self.controller = controller
+        self.address = address
+        self.token = token or load_token()
+        self.methods = {name: getattr(controller, name) for name in METHODS}
+        self.methods['subscribe'] = None
+        self.requests = 0
+        self.loop = None
+        self.bound = None
+        self._server = None
+        self._subscribers = set()
+        self._stopped = None
+        self._stop_fmp = True
+        self._ready = threading.Event()
+        self._thread = None
+        self._loop_thread = None
+        self._worker = None
+        controller.listeners.append(self._on_event)
+
+    # Request handling
+
+    def handle(self, request, writer=None):
+        """Reply dict for one decoded request, or None for a notification"""
+        if isinstance(request, list):
+            replies = [r for r in (self.handle(item, writer) for item in request) if r is not None]
+            return replies or None
+        if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+            return _error(None, INVALID_REQUEST, "Invalid request")
+        self.requests += 1
+        id = request.get('id')
+        name = request['method']
+        params = request.get('params', ())
+        if name not in self.methods:
+            return _error(id, METHOD_NOT_FOUND, f"Unknown method: {name}")
+        try:
+            if name == 'subscribe':
+                self._subscribers.add(writer)
+                result = True
+            elif isinstance(params, dict):
+                result = self.methods[name](**params)
+            elif isinstance(params, list):
+                result = self.methods[name](*params)
+            else:
+                return _error(id, INVALID_PARAMS, "params must be a list or an object")
+        except ControllerError as e:
+            return _error(id, CONTROLLER_ERROR, str(e), e.key)
+        except (TypeError, ValueError) as e:
+            return _error(id, INVALID_PARAMS, str(e))
+        except Exception as e:
+            return _error(id, CONTROLLER_ERROR, f"{type(e).__name__}: {str(e)}")
+        if 'id' not in request:
+            return None
+        return {'jsonrpc': '2.0', 'id': id, 'result': result}
+
+    def authorized(self, request):
+        """True if the request (every member of a batch) has this install's token"""
+        if isinstance(request, list):
+            return bool(request) and all(self.authorized(item) for item in request)
+        token = request.get('token') if isinstance(request, dict) else None
+        return isinstance(token, str) and hmac.compare_digest(token.encode(), self.token.encode())
+
+    def _decode(self, line):
+        """(request, None), or (None, error reply) for a line that ends the connection"""
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return None, _error(None, PARSE_ERROR, "Parse error")
+        if not self.authorized(request):
+            return None, _error(None, UNAUTHORIZED, "Missing or wrong API token")
+        return request, None
+
+    def is_slow(self, request):
+        if isinstance(request, list):
+            return any(self.is_slow(item) for item in request)
+        return isinstance(request, dict) and request.get('method') in SLOW_METHODS
+
+    async def _handle_slow(self, request, writer):
+        reply = await self.loop.run_in_executor(self._worker, self.handle, request, writer)
+        if reply is not None and not writer.is_closing():
+            writer.write(json.dumps(reply).encode() + b'\n')
+
+    async def _client(self, reader, writer):
+        buffered = bytearray()
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                buffered += data
+                refused = None
+                out = []
+                if b'\n' in data:
+                    end = buffered.rindex(b'\n')
+                    lines = bytes(buffered[:end]).split(b'\n')
+                    del buffered[:end + 1]
+                    for line in lines:
+                        if not line.strip():
+                            continue
+                        request, refused = self._decode(line)
+                        if refused is not None:
+                            break
+                        if self.is_slow(request):
+                            asyncio.ensure_future(self._handle_slow(request, writer))
+                            continue
+                        reply = self.handle(request, writer)
+                        if reply is not None:
+                            out.append(json.dumps(reply))
+                if refused is None and len(buffered) > MAX_REQUEST:
+                    refused = _error(None, INVALID_REQUEST, "Request too large")
+                if refused is not None:
+                    out.append(json.dumps(refused))
+                if out:
+                    out.append('')
+                    writer.write('\n'.join(out).encode())
+                    await writer.drain()
+                if refused is not None:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._subscribers.discard(writer)
+            writer.close()
+
+    def _on_event(self, event, data):
+        if self._loop_thread is not None and threading.get_ident() != self._loop_thread:
+            # Emitted by a slow method on the worker thread
+            self.loop.call_soon_threadsafe(self._on_event, event, data)
+            return
+        if not self._subscribers:
+            return
+        params = dict(data, event=event)
+        line = json.dumps({'jsonrpc': '2.0', 'method': 'event', 'params': params}).encode() + b'\n'
+        for writer in list(self._subscribers):
+            if writer.is_closing():
+                self._subscribers.discard(writer)
+            else:
+                writer.write(line)
+
+    async def _poll(self):
+        next_check = 0.0
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            try:
+                self.controller.commands.drain_results()
+                now = time.monotonic()
+                if now >= next_check:
+                    next_check = now + SCAN_LIST_CHECK
+                    self.controller.poll()
+            except Exception as e:
+                self._on_event('error', {'message': str(e)})
+
+    # Lifecycle
+
+    async def serve(self):
+        """Run until stop() is called"""
+        self.loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._worker = ThreadPoolExecutor(1, thread_name_prefix="control-slow")
+        # FMP24 restarts triggered by fast methods and the poll queue behind the slow methods
+        self.controller.run_slow = self._worker.submit
+        self._stopped = asyncio.Event()
+        kind, where = parse_address(self.address)
+        if kind == 'unix':
+            if os.path.exists(where):
+                os.unlink(where)
+            self._server = await asyncio.start_unix_server(self._client, where)
+            self.bound = f'unix:{where}'
+        else:
+            self._server = await asyncio.start_server(self._client, *where)
+            host, port = self._server.sockets[0].getsockname()[:2]
+            self.bound = f'{host}:{port}'
+        poller = asyncio.ensure_future(self._poll())
+        self._ready.set()
+        try:
+            await self._stopped.wait()
+        finally:
+            poller.cancel()
+            self._server.close()
+            for writer in list(self._subscribers):
+                writer.close()
+            self._worker.shutdown(wait=True, cancel_futures=True)
+            self.controller.run_slow = None
+            self._loop_thread = None
+            self.controller.close(self._stop_fmp)
+
+    def stop(self, stop_fmp=True):
+        """Thread-safe; the controller is closed once the server has stopped"""
+        self._stop_fmp = stop_fmp
+        if self.loop is not None and self._stopped is not None:
+            self.loop.call_soon_threadsafe(self._stopped.set)
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(10.0)
+
+    def start(self, timeout=10.0):
+        """Serve on a background thread; returns once the socket is listening"""
+        error = []
+
+        def run():
+            try:
+                asyncio.run(self.serve())
+            except Exception as e:
+                error.append(e)
+                self._ready.set()
+
+        self._thread = threading.Thread(target=run, name="control-api", daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout)
+        if error:
+            raise error[0]
+        return self
+
+    def join(self):
+        if self._thread is not None:
+            self._thread.join()
+
+
+class ControlClient:
+    """Blocking client with pipelining; safe to use from several threads
+
+    call() waits for its reply; request() returns a Future so many requests
+    can be in flight at once; notify() doesn't ask for a reply at all.
+    Events from subscribe() are put on the `events` queue as
+    (event, params) tuples.  The token defaults to this install's.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=5.0, token=None):
+        self.address = address
+        self.timeout = timeout
+        self.token = token or load_token()
+        kind, where = parse_address(address)
+        if kind == 'unix':
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(where)
+        else:
+            self.sock = socket.create_connection(where, timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.settimeout(None)
+        self.events = queue.Queue()
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._send_lock = threading.Lock()
+        self._closed = False
+        self._reader = threading.Thread(target=self._read, name="control-client", daemon=True)
+        self._reader.start()
+
+    def _send(self, data):
+        with self._send_lock:
+            self.sock.sendall(data)
+
+    def request(self, method, *args, **kwargs):
+        future = Future()
+        id = next(self._ids)
+        self._pending[id] = future
+        message = {'jsonrpc': '2.0', 'id': id, 'method': method, 'params': kwargs or list(args),
+                   'token': self.token}
+        try:
+            self._send(json.dumps(message).encode() + b'\n')
+        except OSError as e:
+            self._pending.pop(id, None)
+            future.set_exception(e)
+        return future
+
+    def call(self, method, *args, **kwargs):
+        return self.request(method, *args, **kwargs).result(self.timeout)
+
+    def notify(self, method, *args, **kwargs):
+        message = {'jsonrpc': '2.0', 'method': method, 'params': kwargs or list(args),
+                   'token': self.token}
+        self._send(json.dumps(message).encode() + b'\n')
+
+    def call_many(self, calls):
+        """Send (method, params) pairs in one write and wait for all replies"""
+        futures = []
+        lines = []
+        for method, params in calls:
+            future = Future()
+            id = next(self._ids)
+            self._pending[id] = future
+            futures.append(future)
+            lines.append(json.dumps({'jsonrpc': '2.0', 'id': id, 'method': method, 'params': params,
+                                     'token': self.token}))
+        lines.append('')
+        self._send('\n'.join(lines).encode())
+        return [f.result(self.timeout) for f in futures]
+
+    def subscribe(self):
+        return self.call('subscribe')
+
+    def _read(self):
+        buffered = b''
+        try:
+            while True:
+                data = self.sock.recv(65536)
+                if not data:
+                    break
+                buffered += data
+                *lines, buffered = buffered.split(b'\n')
+                for line in lines:
+                    if line.strip():
+                        self._dispatch(json.loads(line))
+        except (OSError, ValueError) as e:
+            error = e
+        else:
+            error = ConnectionError("Control API connection closed")
+        for future in list(self._pending.values()):
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+        if not self._closed:
+            self.events.put(('disconnected', {'message': str(error)}))
+
+    def _dispatch(self, message):
+        if isinstance(message, list):
+            for item in message:
+                self._dispatch(item)
+            return
+        if message.get('method') == 'event':
+            params = message['params']
+            self.events.put((params.pop('event'), params))
+            return
+        future = self._pending.pop(message.get('id'), None)
+        if future is None:
+            return
+        if 'error' in message:
+            error = message['error']
+            key = (error.get('data') or {}).get('key')
+            future.set_exception(RpcError(error['code'], error['message'], key))
+        else:
+            future.set_result(message.get('result'))
+
+    def close(self):
+        self._closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+def measure(requests=20000, window=500, address='127.0.0.1:0'):
+    """Pipelined tune/step/status requests per second against a null backend"""
+    import shutil
+    import tempfile
+    from command_pipeline import NullBackend
+    from config import ConfigStore
+    from controller import ScannerController
+
+    directory = tempfile.mkdtemp()
+    try:
+        scan_path = os.path.join(directory, 'FMP24.ScanList')
+        if os.path.exists('FMP24.ScanList'):
+            shutil.copy('FMP24.ScanList', scan_path)
+        settings = ConfigStore(os.path.join(directory, 'fmp_settings.json'),
+                               os.path.join(directory, 'launcher_config.json'),
+                               os.path.join(directory, 'FMP24.cfg'))
+        controller = ScannerController(settings, scan_path, NullBackend(0.0))
+        token = secrets.token_hex(16)
+        server = ControlServer(controller, address, token).start()
+        client = ControlClient(server.bound, token=token)
+        kinds = (('tune', [423.5]), ('step_gain', [1]), ('step_gain', [-1]), ('status', []))
+
+        started = time.perf_counter()
+        for _ in range(200):
+            client.call('status')
+        round_trip = (time.perf_counter() - started) / 200
+
+        started = time.perf_counter()
+        done = 0
+        while done < requests:
+            batch = [kinds[(done + i) % len(kinds)] for i in range(min(window, requests - done))]
+            client.call_many(batch)
+            done += len(batch)
+        elapsed = time.perf_counter() - started
+        controller.commands.wait_idle()
+        result = {
+            'requests': requests,
+            'pipelined_per_s': requests / elapsed,
+            'round_trip_ms': round_trip * 1000,
+            'backend_calls': controller.commands.backend.calls,
+            'coalesced': controller.commands.coalesced,
+        }
+        client.close()
+        server.stop()
+        return result
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    print(measure())
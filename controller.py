@@ -0,0 +1,752 @@
+"""Scanner controller without a GUI
+
+Owns the settings store, FMP24.ScanList, the command pipeline with its
+backend and the FMP24 supervisor.  The Tk launcher, scripts and the
+headless service all drive it through control_api; nothing here imports
+tkinter.  Methods are meant to be called from one thread (the API
+server's event loop), except control_api.SLOW_METHODS, which the server
+runs one at a time on a worker thread; those only reach shared state
+through the settings store, the command pipeline and the supervisor,
+which lock for themselves.  poll() delivers pipeline results and picks
+up ScanList edits made by other programs.
+
+Restarting FMP24 waits for every instance to exit, so restarts asked for
+by fast methods or poll() (a gain or PPM change on the SendKeys backend,
+the CPU governor) go to run_slow, which the API server points at its
+worker thread.
+"""
+import os
+import time
+
+from command_pipeline import CommandPipeline, SendKeysBackend
+from config import ConfigStore, SETTINGS
+
+
+# The CPU governor only restarts FMP24 after this long without a user command
+RESTART_QUIET = 10.0
+
+
+class ControllerError(Exception):
+    """A request the controller can't carry out; key is a message catalog key"""
+
+    def __init__(self, message, key=None):
+        super().__init__(message)
+        self.key = key
+
+
+class ScannerController:
+    """Tune, scan, settings and FMP24 launch for one scanner"""
+
+    def __init__(self, settings=None, scan_path="FMP24.ScanList", backend=None):
+        self.settings = settings if settings is not None else ConfigStore()
+        self.scan_path = scan_path
+        self.scanning = False
+        self.supervisor = None
+        self.activity = None
+        self.governor = None
+        self.ppm_tracker = None
+        self._ppm_pending = None
+        self._ppm_min_change = 0.5
+        self.gain_monitor = None
+        self._gain_pending = None
+        self.demod = None
+        self.last_action = 0.0
+        self.started = time.time()
+        self.listeners = []
+        # Runs a callable off the event loop; the API server sets it to its worker's submit
+        self.run_slow = None
+        self._scan_file = None
+        self._freq_db = None
+        self.commands = CommandPipeline(backend or self.create_backend(), on_result=self.on_command_result)
+        self.commands.start()
+
+    # Events
+
+    def emit(self, event, **data):
+        for listener in list(self.listeners):
+            listener(event, data)
+
+    def on_command_result(self, cmd, error):
+        self.emit('command', kind=cmd.kind, value=cmd.value,
+                  error=None if error is None else str(error))
+
+    def _submit(self, kind, value=None, target=None):
+        self.last_action = time.monotonic()
+        self.commands.submit(kind, value, target)
+
+    def poll(self):
+        """Deliver finished commands, run the CPU governor and reload FMP24.ScanList if it changed on disk"""
+        self.commands.drain_results()
+        if self.governor is not None:
+            try:
+                self.governor.step()
+            except Exception as e:
+                self.emit('governor', error=str(e))
+        if self.ppm_tracker is not None:
+            self._apply_tracked_ppm()
+        if self.gain_monitor is not None:
+            self._apply_monitored_gain()
+        if self.demod is not None and self.demod.error is not None:
+            self.emit('demod', error=str(self.demod.error))
+            self.demodulate(None)
+        if self._scan_file is not None and self._scan_file.changed_on_disk():
+            try:
+                text, diff = self._scan_file.read()
+            except OSError:
+                return
+            self.emit('scan_list', added=len(diff.added), removed=len(diff.removed), source='disk')
+            self.apply_scan_list_diff(diff)
+
+    # Backend
+
+    def create_backend(self, name=None, address=None):
+        """Build the command backend; raises ValueError for a bad rtl_tcp address"""
+        keys = SendKeysBackend()
+        if (name or self.settings.get('backend')) == "rtl_tcp":
+            from rtl_tcp import RtlTcpBackend, parse_address
+            host, port = parse_address(address or self.settings.get('rtl_tcp_address'))
+            return RtlTcpBackend(host, port, fallback=keys)
+        return keys
+
+    def set_backend(self, name, address=None):
+        self.update_settings(backend=name, rtl_tcp_address=address or self.settings.get('rtl_tcp_address'))
+        return {'backend': self.commands.backend.name}
+
+    def backend_ready(self):
+        """True if there is something to send commands to"""
+        return self.supervisor is not None or self.commands.backend.name != 'sendkeys'
+
+    def _require_backend(self):
+        if not self.backend_ready():
+            raise ControllerError("Please launch FMP24 first", 'launch_fmp_first')
+
+    # Tuning
+
+    def tune(self, frequency):
+        frequency = float(frequency)
+        if frequency <= 0:
+            raise ControllerError("Frequency must be positive", 'invalid_frequency')
+        self._require_backend()
+        # If scanning, stop it first with Esc
+        if self.scanning and self.supervisor is not None:
+            self._submit('scan_stop')
+            self._set_scanning(False)
+        # A newer retune replaces a pending one
+        self._submit('tune', frequency)
+        self.settings.set('frequency', frequency)
+        return frequency
+
+    def step_gain(self, direction=1):
+        """Step the RF gain by 1 dB per step; repeated steps are merged
+
+        The setting changes even before FMP24 runs, so the next launch uses it.
+        """
+        direction = int(direction)
+        gain = self.settings.get('gain') + direction
+        if not 0 <= gain <= 50:
+            raise ControllerError("RF Gain must be between 0 and 50")
+        self.settings.set('gain', gain)
+        if self.backend_ready():
+            self._submit('gain', direction, gain)
+        return gain
+
+    def step_ppm(self, direction=1):
+        """Step the PPM correction by 0.1 per step"""
+        direction = int(direction)
+        ppm = round(self.settings.get('ppm') + 0.1 * direction, 1)
+        self.settings.set('ppm', ppm)
+        if self.backend_ready():
+            self._submit('ppm', direction, ppm)
+        return ppm
+
+    def _push(self, kind, value, reason):
+        """Send an absolute gain or PPM in one step instead of key presses
+
+        rtl_tcp takes it as one command; FMP24 only at start-up, so a running
+        FMP24 is restarted with the new command line.
+        """
+        if hasattr(self.commands.backend, kind):
+            self._submit(kind, value)
+        elif self.supervisor is not None:
+            self.restart_later(f'{kind[4:]} {reason}')
+
+    def set_ppm(self, ppm, reason='set'):
+        ppm = round(float(ppm), 1)
+        if not -999.9 <= ppm <= 999.9:
+            raise ControllerError("PPM must be between -999.9 and 999.9")
+        self.settings.set('ppm', ppm)
+        self.settings.flush()
+        self._push('set_ppm', ppm, reason)
+        self.emit('ppm', ppm=ppm, reason=reason)
+        return ppm
+
+    def set_gain(self, gain, reason='set'):
+        gain = float(gain)
+        if not 0 <= gain <= 50:
+            raise ControllerError("RF Gain must be between 0 and 50")
+        self.settings.set('gain', gain)
+        self.settings.flush()
+        self._push('set_gain', gain, reason)
+        self.emit('gain', gain=gain, reason=reason)
+        return gain
+
+    def send_keys(self, keys):
+        self._require_backend()
+        self._submit('keys', str(keys))
+
+    # Scan list
+
+    @property
+    def scan_file(self):
+        if self._scan_file is None:
+            from scanlist_sync import ScanListFile
+            self._scan_file = ScanListFile(self.scan_path)
+            try:
+                self._scan_file.read()
+            except OSError:
+                pass
+        return self._scan_file
+
+    def get_scan_list(self):
+        with open(self.scan_path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def save_scan_list(self, text):
+        """Write FMP24.ScanList; restarts a running scan if channels changed"""
+        diff = self.scan_file.write(text)
+        self.emit('scan_list', added=len(diff.added), removed=len(diff.removed), source='save')
+        self.apply_scan_list_diff(diff)
+        return {'added': len(diff.added), 'removed': len(diff.removed)}
+
+    def apply_scan_list_diff(self, diff):
+        """Bring the running scanner up to date with the changed channels
+
+        Every backend scans with FMP24, which only reads the ScanList when a
+        scan starts, so a change always costs one restart.  Sharded instances
+        scan their own copy of part of the list, so the shards are planned
+        again and the instances whose shard changed are restarted.
+        """
+        if not diff or self.supervisor is None:
+            return
+        if len(self.supervisor.instances) > 1:
+            changed = self._replan()
+            if changed:
+                self.restart_later('scan list', changed)
+        elif self.scanning:
+            self._submit('scan_restart')
+
+    def channels(self):
+        """Active scan list entries as (frequency MHz, mode) pairs"""
+        model = self.scan_file.model
+        return [(freq, model.mode_text(i)) for i, freq in
+                zip(model.active_indices(), model.frequencies_mhz())]
+
+    # Scanning
+
+    def _set_scanning(self, scanning):
+        if scanning != self.scanning:
+            self.scanning = scanning
+            self.emit('scan', scanning=scanning)
+
+    def start_scan(self, text=None):
+        """Start scanning; text, if given, is saved first since FMP24 scans the file
+
+        Returns the channel count and the first few parse errors.
+        """
+        if self.supervisor is None:
+            raise ControllerError("Please launch FMP24 first", 'launch_fmp_first')
+        model = self.scan_file.model
+        if text is not None:
+            # Re-parses only the lines edited since the last scan
+            diff = self.scan_file.write(text)
+            if diff:
+                self.emit('scan_list', added=len(diff.added), removed=len(diff.removed), source='scan')
+        frequencies = model.frequencies_mhz()
+        errors = model.errors()
+        if not frequencies:
+            raise ControllerError("No valid frequencies in scan list")
+        self._submit('scan_start')
+        self._set_scanning(True)
+        return {'channels': len(frequencies), 'errors': [list(e) for e in errors[:10]],
+                'error_count': len(errors)}
+
+    def stop_scan(self):
+        if self.supervisor is not None:
+            # Esc stops the scan
+            self._submit('scan_stop')
+        self._set_scanning(False)
+
+    # Settings
+
+    def get_settings(self):
+        return dict(self.settings.values)
+
+    def update_settings(self, **values):
+        unknown = [name for name in values if name not in SETTINGS]
+        if unknown:
+            raise ControllerError(f"Unknown settings: {', '.join(unknown)}")
+        get = self.settings.get
+        current = (get('backend'), get('rtl_tcp_address'))
+        wanted = (values.get('backend', current[0]), values.get('rtl_tcp_address', current[1]))
+        backend = None
+        if wanted != current:
+            try:
+                backend = self.create_backend(*wanted)
+            except ValueError:
+                raise ControllerError("Invalid rtl_tcp address")
+        try:
+            self.settings.update(**values)
+        except ValueError as e:
+            raise ControllerError(f"Could not save settings: {str(e)}")
+        if backend is not None:
+            self.commands.set_backend(backend)
+        if 'cpu_target' in values:
+            self._update_governor()
+        return self.get_settings()
+
+    def save_settings(self):
+        """Write pending settings now instead of waiting for the background write"""
+        self.settings.flush()
+
+    def reset_settings(self):
+        return self.update_settings(**{name: default for name, (kind, default) in SETTINGS.items()})
+
+    # FMP24
+
+    def _fmp_command(self, count):
+        from supervisor import fmp_command
+        get = self.settings.get
+        # One dongle keeps the chosen output device; more get a TCP audio port each
+        return fmp_command(
+            role_config=get('role_config'),
+            ppm=f"{get('ppm'):g}",
+            frequency=f"{get('frequency'):g}",
+            gain=f"{get('gain'):g}",
+            output=str(get('output_device')) if count == 1 else None,
+            economy=get('economy'),
+        )
+
+    def activity_store(self):
+        """The activity history, opened on first use"""
+        if self.activity is None:
+            from activity import ActivityStore
+            self.activity = ActivityStore("activity.db")
+        return self.activity
+
+    def launch(self):
+        """Start FMP24 on every configured dongle under the supervisor"""
+        from supervisor import ScanSupervisor
+        get = self.settings.get
+        count = max(1, get('dongles'))
+        first = get('input_device')
+        devices = range(first, first + count)
+
+        command = self._fmp_command(count)
+        model = None
+        hit_rates = None
+        if count > 1:
+            model = self.scan_file.model
+            hit_rates = self.activity_store().hit_rates()
+
+        if self.supervisor is not None:
+            self.supervisor.stop()
+            self.supervisor = None
+        # The supervisor restarts FMP24 if it exits
+        self.supervisor = ScanSupervisor(command, devices, model, hit_rates=hit_rates).start()
+        self.settings.flush()
+        self._update_governor()
+        # Channels outside every dongle's 2.4 MHz window are not scanned
+        unplaced = self.supervisor.unplaced_channels
+        self.emit('launch', dongles=count, unplaced_channels=unplaced)
+        return {'dongles': count, 'unplaced_channels': unplaced}
+
+    def _replan(self):
+        """Split the current ScanList over the dongles again; returns the instances to restart"""
+        return self.supervisor.replan(self.scan_file.model, self.activity_store().hit_rates())
+
+    def restart_fmp(self, reason='restart', instances=None):
+        """Restart running FMP24 instances with the current settings, ScanList and FMP24.cfg
+
+        instances limits the restart to some of the supervisor's instances.
+        A scan that was running is started again.
+        """
+        if self.supervisor is None:
+            raise ControllerError("Please launch FMP24 first", 'launch_fmp_first')
+        self.settings.flush()
+        self.supervisor.command = self._fmp_command(len(self.supervisor.instances))
+        if instances is None and len(self.supervisor.instances) > 1:
+            self._replan()
+        self.supervisor.restart(reason, instances)
+        if self.scanning:
+            self._submit('scan_start')
+        self.emit('restart', reason=reason)
+
+    def restart_later(self, reason='restart', instances=None):
+        """restart_fmp without waiting for it: on run_slow if set, else right here
+
+        Errors are reported as a 'restart' event.
+        """
+        def restart():
+            try:
+                self.restart_fmp(reason, instances)
+            except Exception as e:
+                self.emit('restart', reason=reason, error=str(e))
+        if self.run_slow is None:
+            restart()
+        else:
+            self.run_slow(restart)
+
+    def stop_fmp(self):
+        if self.supervisor is not None:
+            self.supervisor.stop()
+            self.supervisor = None
+        self._set_scanning(False)
+
+    # CPU governor
+
+    def _update_governor(self):
+        """Start or stop the governor to match the cpu_target setting (0 = off)"""
+        target = self.settings.get('cpu_target')
+        if target <= 0 or self.settings.cfg is None:
+            self.governor = None
+            return
+        if self.governor is None:
+            from governor import CpuGovernor
+            self.governor = CpuGovernor(self.settings, self._fmp_pids,
+                                        lambda: self.restart_later('cpu governor'),
+                                        safe_to_restart=self._safe_to_restart,
+                                        log_path=os.path.join(os.path.dirname(os.path.abspath(self.scan_path)),
+                                                              'governor.log'))
+        self.governor.target_percent = target
+
+    def _fmp_pids(self):
+        if self.supervisor is None:
+            return []
+        return [i.process.pid for i in self.supervisor.instances if i.alive()]
+
+    def _safe_to_restart(self):
+        """Nothing queued and no user command for RESTART_QUIET seconds"""
+        return (self.supervisor is not None and not self.commands.pending()
+                and time.monotonic() - self.last_action >= RESTART_QUIET)
+
+    def governor_status(self):
+        if self.governor is None:
+            return {'enabled': False}
+        status = self.governor.status()
+        status['enabled'] = True
+        status['target_percent'] = self.governor.target_percent
+        status['log'] = [message for when, message, data in self.governor.events[-10:]]
+        return status
+
+    # PPM calibration
+
+    def _calibrator(self, reference_mhz, source=None, recorded_mhz=None):
+        from calibrate import PpmCalibrator
+        from iq_file import IqFileSource, open_source
+        address = source or self.settings.get('rtl_tcp_address')
+        frequency_hz = float(recorded_mhz) * 1e6 if recorded_mhz is not None else None
+        stream = open_source(address, frequency_hz=frequency_hz, loop=True, realtime=False)
+        if isinstance(stream, IqFileSource):
+            # FMP24 records with its -P already applied
+            applied = self.settings.get('ppm')
+        elif self.commands.backend.name == 'rtl_tcp' and address == self.settings.get('rtl_tcp_address'):
+            # The server has the correction we pushed, in whole PPM
+            applied = float(round(self.settings.get('ppm')))
+        else:
+            applied = 0.0
+        return PpmCalibrator(stream, float(reference_mhz) * 1e6, applied)
+
+    def calibrate_ppm(self, reference_mhz, source=None, apply=True, recorded_mhz=None):
+        """Measure the PPM error on a reference carrier and, if apply, set it
+
+        source is an rtl_tcp address (default: the rtl_tcp setting) or a
+        recording made at recorded_mhz.
+        """
+        from calibrate import CalibrationError
+        calibrator = self._calibrator(reference_mhz, source, recorded_mhz)
+        try:
+            result = calibrator.measure()
+        except CalibrationError as e:
+            raise ControllerError(str(e))
+        except (OSError, ValueError, EOFError) as e:
+            raise ControllerError(f"Could not read IQ: {str(e)}")
+        finally:
+            calibrator.source.close()
+        if apply:
+            result['ppm'] = self.set_ppm(result['ppm'], 'calibration')
+        return result
+
+    def track_ppm(self, reference_mhz=None, interval=600.0, source=None, min_change=0.5):
+        """Re-calibrate every `interval` seconds to follow temperature drift
+
+        Without reference_mhz tracking stops.  A new value is applied when it
+        differs by min_change PPM or more, at a moment the CPU governor would
+        also accept a restart.
+        """
+        if self.ppm_tracker is not None:
+            self.ppm_tracker.stop()
+            self.ppm_tracker = None
+        self._ppm_pending = None
+        if reference_mhz is None:
+            return {'tracking': False}
+        from calibrate import PpmTracker
+
+        def calibrate():
+            calibrator = self._calibrator(reference_mhz, source)
+            try:
+                return calibrator.measure()
+            finally:
+                calibrator.source.close()
+
+        self._ppm_min_change = float(min_change)
+        self.ppm_tracker = PpmTracker(calibrate, float(interval)).start()
+        return {'tracking': True, 'interval': float(interval)}
+
+    def _apply_tracked_ppm(self):
+        for result, error in self.ppm_tracker.results():
+            if error is not None:
+                self.emit('ppm', error=str(error), reason='drift')
+            elif abs(result['ppm'] - self.settings.get('ppm')) >= self._ppm_min_change:
+                self._ppm_pending = result['ppm']
+        if self._ppm_pending is not None and (self.supervisor is None or self._safe_to_restart()):
+            ppm, self._ppm_pending = self._ppm_pending, None
+            self.set_ppm(ppm, 'drift')
+
+    def ppm_status(self):
+        tracker = self.ppm_tracker
+        return {
+            'ppm': self.settings.get('ppm'),
+            'tracking': tracker is not None,
+            'history': tracker.history[-50:] if tracker else [],
+            'drift_ppm_per_hour': tracker.drift_ppm_per_hour() if tracker else None,
+        }
+
+    # Automatic gain
+
+    def _gain_sweep(self, source=None):
+        from autogain import GainSweep
+        from iq_file import IqFileSource, open_source
+        model = self.scan_file.model
+        active = model.active_indices()
+        freqs = model.freq_hz[active].astype(float)
+        bandwidths = model.bandwidth_hz[active].astype(float)
+        # Look at the ScanList's span if it fits one capture, else around the tuned frequency
+        if len(freqs) and freqs.max() - freqs.min() <= 2.0e6:
+            center = (freqs.max() + freqs.min()) / 2
+        else:
+            center = self.settings.get('frequency') * 1e6
+        stream = open_source(source or self.settings.get('rtl_tcp_address'), frequency_hz=center,
+                             realtime=False)
+        if isinstance(stream, IqFileSource):
+            stream.close()
+            raise ControllerError("Gain can't be swept on a recording; use an rtl_tcp source")
+        return GainSweep(stream, freqs, bandwidths)
+
+    def auto_gain(self, source=None, apply=True):
+        """Sweep the tuner's gain table and, if apply, set the best gain in one step"""
+        sweep = self._gain_sweep(source)
+        try:
+            result = sweep.run()
+        except (OSError, ValueError) as e:
+            raise ControllerError(f"Could not read IQ: {str(e)}")
+        finally:
+            sweep.source.close()
+        if apply:
+            self.set_gain(result['gain'], 'auto')
+        return result
+
+    def auto_gain_monitor(self, interval=None, shift_db=3.0, source=None):
+        """Re-sweep gain whenever the noise floor shifts by shift_db; no interval stops it"""
+        if self.gain_monitor is not None:
+            self.gain_monitor.stop()
+            self.gain_monitor = None
+        self._gain_pending = None
+        if not interval:
+            return {'monitoring': False}
+        from autogain import GainMonitor
+
+        def check():
+            sweep = self._gain_sweep(source)
+            try:
+                return sweep.measure_gain(self.settings.get('gain'))['noise_floor_db']
+            finally:
+                sweep.source.close()
+
+        def run():
+            sweep = self._gain_sweep(source)
+            try:
+                result = sweep.run()
+                # The next check compares against the floor at the gain in use
+                sweep.source.set_gain(result['gain'])
+                return result
+            finally:
+                sweep.source.close()
+
+        self.gain_monitor = GainMonitor(check, run, float(interval), float(shift_db)).start()
+        return {'monitoring': True, 'interval': float(interval)}
+
+    def _apply_monitored_gain(self):
+        for result, error in self.gain_monitor.results():
+            if error is not None:
+                self.emit('gain', error=str(error), reason='monitor')
+            elif result['gain'] != self.settings.get('gain'):
+                self._gain_pending = result['gain']
+        if self._gain_pending is not None and (self.supervisor is None or self._safe_to_restart()):
+            gain, self._gain_pending = self._gain_pending, None
+            self.set_gain(gain, 'monitor')
+
+    # Frequency lists
+
+    def freq_db(self):
+        """The FMP-FreqList CSVs named in FMP24.cfg, compiled on first use; None without FMP24.cfg"""
+        from freqdb import FreqDatabase
+        try:
+            if self._freq_db is None:
+                self._freq_db = FreqDatabase.from_fmp_config(self.settings.cfg_path)
+            else:
+                self._freq_db.refresh()
+        except (OSError, ValueError, KeyError):
+            self._freq_db = None
+        return self._freq_db
+
+    def lookup(self, freq_mhz, tolerance_hz=1000, limit=5):
+        """Frequency list records near freq_mhz within FMP24.cfg's search range, nearest first"""
+        db = self.freq_db()
+        return db.query(float(freq_mhz), int(tolerance_hz), limit=int(limit)) if db is not None else []
+
+    def scan_line(self, freq_mhz, mode='NFM'):
+        """ScanList line for freq_mhz, described from the nearest frequency list record"""
+        from freqdb import describe
+        records = self.lookup(freq_mhz, limit=1)
+        line = f"{float(freq_mhz):.5f} {mode} {describe(records[0]) if records else ''}".rstrip()
+        return {'line': line, 'record': records[0] if records else None}
+
+    # Band survey
+
+    def survey(self, start_mhz, stop_mhz, source=None, dwell=0.05, fft_size=4096, threshold_db=10.0):
+        """Sweep a range and propose ScanList lines for carriers not already listed"""
+        from iq_file import IqFileSource, open_source
+        from survey import BandSurvey, propose, step_table
+        if not 0 < float(start_mhz) < float(stop_mhz):
+            raise ControllerError("Survey range must be start < stop, in MHz")
+        stream = open_source(source or self.settings.get('rtl_tcp_address'), realtime=False)
+        if isinstance(stream, IqFileSource):
+            stream.close()
+            raise ControllerError("A survey needs a tunable rtl_tcp source")
+        try:
+            sweep = BandSurvey(stream, float(start_mhz) * 1e6, float(stop_mhz) * 1e6,
+                               fft_size=int(fft_size), dwell=float(dwell))
+            spectrum = sweep.run()
+        except (OSError, ValueError) as e:
+            raise ControllerError(f"Could not read IQ: {str(e)}")
+        finally:
+            stream.close()
+        from freqdb import describe
+
+        def lookup(freq_hz, step_hz):
+            records = self.lookup(freq_hz / 1e6, step_hz // 2, 1)
+            return describe(records[0]) if records else None
+
+        model = self.scan_file.model
+        listed = model.freq_hz[model.active_indices()]
+        candidates = propose(spectrum, step_table(self.settings.cfg_path), float(threshold_db), listed,
+                             lookup=lookup)
+        return {
+            'lines': [c['line'] for c in candidates if not c['listed']],
+            'candidates': candidates,
+            'mhz_per_s': sweep.mhz_per_second(),
+            'seconds': sweep.seconds,
+        }
+
+    # Python demodulator
+
+    def demodulate(self, channels_mhz=(), center_mhz=None, port=None, source=None, economy=None):
+        """Demodulate ScanList channels in-process and serve each on an FMP-style audio port
+
+        channels_mhz defaults to the active ScanList channels inside the
+        capture around center_mhz (default: the frequency setting); None
+        stops the demodulator.  Ports count up from `port`, one per channel.
+        """
+        if self.demod is not None:
+            self.demod.close()
+            self.demod.source.close()
+            self.demod = None
+        if channels_mhz is None:
+            return {'running': False}
+        from activity import ActivityTracker
+        from demod import AUDIO_RATE, DEFAULT_PORT, DemodEngine
+        from iq_file import open_source
+        from tone_decoder import ToneDecoder
+        model = self.scan_file.model
+        active = model.active_indices()
+        listed = dict(zip(model.freq_hz[active].tolist(), model.bandwidth_hz[active].tolist()))
+        center = float(center_mhz if center_mhz is not None else self.settings.get('frequency')) * 1e6
+        if channels_mhz:
+            freqs = [int(round(float(mhz) * 1e6)) for mhz in channels_mhz]
+        else:
+            freqs = [f for f in listed if abs(f - center) < 1.0e6]
+        if not freqs:
+            raise ControllerError("No ScanList channels within 1 MHz of the centre frequency")
+        port = int(port or DEFAULT_PORT)
+        channels = [(f, listed.get(f, 12500), port + k) for k, f in enumerate(freqs)]
+        # Squelch openings become hits in the activity history, tagged with their CTCSS/DCS tone
+        modes = dict(zip(model.freq_hz[active].tolist(), model.mode[active].tolist()))
+        tracker = ActivityTracker(self.activity_store(), freqs, [modes.get(f, 0) for f in freqs])
+        stream = open_source(source or self.settings.get('rtl_tcp_address'), frequency_hz=center)
+        try:
+            engine = DemodEngine(stream, center, channels, tracker=tracker, tones=ToneDecoder(AUDIO_RATE),
+                                 economy=self.settings.get('economy') if economy is None else bool(economy))
+        except (OSError, ValueError) as e:
+            stream.close()
+            raise ControllerError(str(e))
+        self.demod = engine.start()
+        return engine.status()
+
+    def demod_status(self):
+        if self.demod is None:
+            return {'running': False}
+        return self.demod.status()
+
+    # Queries
+
+    def status(self):
+        get = self.settings.get
+        return {
+            'frequency': get('frequency'),
+            'gain': get('gain'),
+            'ppm': get('ppm'),
+            'scanning': self.scanning,
+            'launched': self.supervisor is not None,
+            'instances': self.supervisor.status() if self.supervisor is not None else [],
+            'unplaced_channels': self.supervisor.unplaced_channels if self.supervisor is not None else 0,
+            'backend': self.commands.backend.name,
+            'pending': self.commands.pending(),
+            'dispatched': self.commands.dispatched,
+            'coalesced': self.commands.coalesced,
+            'uptime': time.time() - self.started,
+        }
+
+    def latency(self):
+        return self.commands.latency.summary()
+
+    def close(self, stop_fmp=True):
+        """Stop the command worker and write pending settings
+
+        With stop_fmp False, FMP24 keeps running after the controller is gone.
+        """
+        if self.supervisor is not None and stop_fmp:
+            self.supervisor.stop()
+        self.supervisor = None
+        for monitor in (self.ppm_tracker, self.gain_monitor):
+            if monitor is not None:
+                monitor.stop()
+        self.ppm_tracker = self.gain_monitor = None
+        self.demodulate(None)
+        self.commands.stop()
+        if self.activity is not None:
+            self.activity.close()
+            self.activity = None
+        try:
+            self.settings.close()
+        except OSError:
+            pass
@@ -0,0 +1,43 @@
+"""Small file helpers shared by the launcher's on-disk stores"""
+import os
+import tempfile
+
+
+def atomic_write(path, data, encoding='utf-8'):
+    """Write data to path via a temp file and rename, so readers never see half a file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data.encode(encoding) if isinstance(data, str) else data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+    except BaseException:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        raise
+
+
+class FileStamp:
+    """Remembers a file's mtime and size to notice edits made by someone else"""
+
+    def __init__(self, path):
+        self.path = path
+        self.stamp = None
+
+    def current(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def update(self):
+        """Record the file as it is now (call after our own writes)"""
+        self.stamp = self.current()
+
+    def changed(self):
+        return self.current() != self.stamp
@@ -0,0 +1,326 @@
+"""Indexed frequency-list database for FMP-FreqList CSV files
+
+FMP re-reads and filters its frequency list CSVs on every retune.  Here each
+CSV is compiled once into a columnar cache next to it (one .npy file per
+column, sorted by TX frequency) that is memory-mapped on load, so a lookup
+is a bisect into the frequency column plus a vectorized haversine over the
+matching rows.  The cache is rebuilt when the CSV changes; rows appended
+to the end of the file are merged in without re-parsing the rest.
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import time
+
+import numpy as np
+
+from config import FmpConfig
+
+
+EARTH_RADIUS = {'miles': 3958.8, 'kilometers': 6371.0}
+TEXT_FIELDS = ('licensee', 'location', 'mode1', 'mode2')
+CACHE_VERSION = 1
+TAIL_CHECK = 4096  # bytes hashed to detect an append-only change
+
+
+def haversine(lat, lon, origin_lat, origin_lon, units='miles'):
+    """Great circle distance from origin to every (lat, lon), vectorized"""
+    lat1, lon1 = np.radians(origin_lat), np.radians(origin_lon)
+    lat2, lon2 = np.radians(lat), np.radians(lon)
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS[units] * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def parse_rows(text):
+    """Parse FreqList CSV text; ';' lines are comments, malformed rows are skipped"""
+    tx, rx, lat, lon, texts = [], [], [], [], []
+    lines = (line for line in io.StringIO(text) if line.strip() and not line.lstrip().startswith(';'))
+    for row in csv.reader(lines, skipinitialspace=True):
+        if len(row) < 6:
+            continue
+        try:
+            tx_hz = int(round(float(row[0]) * 1e6))
+            rx_hz = int(round(float(row[1]) * 1e6)) if row[1].strip() else 0
+            lat.append(float(row[4]))
+            lon.append(float(row[5]))
+        except ValueError:
+            continue
+        tx.append(tx_hz)
+        rx.append(rx_hz)
+        fields = (row + ['', '', '', ''])[2:4] + (row + ['', ''])[6:8]
+        texts.append('\x1f'.join(field.strip() for field in fields))
+    return tx, rx, lat, lon, texts
+
+
+def to_columns(tx, rx, lat, lon, texts):
+    """Parsed rows as column arrays plus a UTF-8 text blob and row offsets"""
+    encoded = [t.encode('utf-8') for t in texts]
+    offsets = np.zeros(len(encoded), dtype=np.int64)
+    if encoded:
+        np.cumsum([len(t) for t in encoded[:-1]], out=offsets[1:])
+    return (
+        np.asarray(tx, dtype=np.int64),
+        np.asarray(rx, dtype=np.int64),
+        np.asarray(lat, dtype=np.float32),
+        np.asarray(lon, dtype=np.float32),
+        offsets,
+        np.frombuffer(b''.join(encoded), dtype=np.uint8),
+    )
+
+
+class FreqList:
+    """One compiled, memory-mapped frequency list"""
+
+    def __init__(self, csv_path, cache_dir=None):
+        self.csv_path = csv_path
+        self.cache_dir = cache_dir or csv_path + '.cache'
+        self.meta = None
+        self.load()
+
+    def _column(self, name):
+        return os.path.join(self.cache_dir, name + '.npy')
+
+    def _source_state(self):
+        st = os.stat(self.csv_path)
+        return {'mtime': st.st_mtime, 'size': st.st_size}
+
+    def _tail_hash(self, size):
+        with open(self.csv_path, 'rb') as f:
+            f.seek(max(0, size - TAIL_CHECK))
+            return hashlib.sha1(f.read(min(size, TAIL_CHECK))).hexdigest()
+
+    def load(self):
+        """Map the cache, rebuilding it first if the CSV has changed"""
+        state = self._source_state()
+        meta = self._read_meta()
+        if meta is None or meta['version'] != CACHE_VERSION:
+            self.build()
+        elif meta['mtime'] != state['mtime'] or meta['size'] != state['size']:
+            if state['size'] > meta['size'] and self._tail_hash(meta['size']) == meta['tail']:
+                self.append(meta['size'])
+            else:
+                self.build()
+        self._map()
+
+    def _read_meta(self):
+        try:
+            with open(os.path.join(self.cache_dir, 'meta.json'), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _map(self):
+        self.meta = self._read_meta()
+        self.tx = np.load(self._column('tx'), mmap_mode='r')
+        self.rx = np.load(self._column('rx'), mmap_mode='r')
+        self.lat = np.load(self._column('lat'), mmap_mode='r')
+        self.lon = np.load(self._column('lon'), mmap_mode='r')
+        self.text_offsets = np.load(self._column('text_offsets'), mmap_mode='r')
+        self.text = np.load(self._column('text'), mmap_mode='r')
+
+    def _unmap(self):
+        self.tx = self.rx = self.lat = self.lon = self.text_offsets = self.text = None
+
+    def build(self):
+        with open(self.csv_path, 'r', encoding='utf-8', errors='replace') as f:
+            self._write(*to_columns(*parse_rows(f.read())))
+
+    def append(self, old_size):
+        """Merge rows appended after old_size into the existing cache"""
+        with open(self.csv_path, 'rb') as f:
+            f.seek(old_size)
+            tail = f.read().decode('utf-8', errors='replace')
+        self._map()
+        tx, rx, lat, lon, offsets, text = to_columns(*parse_rows(tail))
+        self._write(
+            np.concatenate((self.tx, tx)),
+            np.concatenate((self.rx, rx)),
+            np.concatenate((self.lat, lat)),
+            np.concatenate((self.lon, lon)),
+            np.concatenate((self.text_offsets[:-1], offsets + self.text_offsets[-1])),
+            np.concatenate((self.text, text)),
+        )
+
+    def _write(self, tx, rx, lat, lon, offsets, text):
+        """Sort every column by TX frequency and save; offsets has one entry per row"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        order = np.argsort(tx, kind='stable')
+        lengths = np.diff(np.append(offsets, len(text)))[order]
+        sorted_offsets = np.zeros(len(order) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=sorted_offsets[1:])
+        # Byte gather that moves each row's text to its sorted position
+        gather = np.repeat(offsets[order] - sorted_offsets[:-1], lengths) + np.arange(sorted_offsets[-1])
+        columns = {
+            'tx': tx[order],
+            'rx': rx[order],
+            'lat': lat[order],
+            'lon': lon[order],
+            'text_offsets': sorted_offsets,
+            'text': text[gather],
+        }
+        # Windows will not replace a file that is still mapped
+        self._unmap()
+        for name, data in columns.items():
+            # Write beside the live file and swap so mapped readers never see half a column
+            temp = self._column(name) + '.tmp'
+            with open(temp, 'wb') as f:
+                np.save(f, data)
+            os.replace(temp, self._column(name))
+        state = self._source_state()
+        meta = dict(state, version=CACHE_VERSION, rows=len(order), tail=self._tail_hash(state['size']))
+        with open(os.path.join(self.cache_dir, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    def record_text(self, index):
+        start, end = self.text_offsets[index], self.text_offsets[index + 1]
+        return bytes(self.text[start:end]).decode('utf-8')
+
+    def record(self, index, distance=None):
+        record = dict(zip(TEXT_FIELDS, self.record_text(index).split('\x1f')))
+        record.update({
+            'tx_mhz': int(self.tx[index]) / 1e6,
+            'rx_mhz': int(self.rx[index]) / 1e6 if self.rx[index] else None,
+            'latitude': float(self.lat[index]),
+            'longitude': float(self.lon[index]),
+            'distance': distance,
+        })
+        return record
+
+    def range(self, low_hz, high_hz):
+        """Row index slice with low_hz <= TX frequency <= high_hz"""
+        start = int(np.searchsorted(self.tx, low_hz, side='left'))
+        stop = int(np.searchsorted(self.tx, high_hz, side='right'))
+        return start, stop
+
+    def __len__(self):
+        return len(self.tx)
+
+
+class FreqDatabase:
+    """Query API over the primary and auxiliary frequency lists"""
+
+    def __init__(self, csv_paths, origin=None, distance=None, units='miles'):
+        self.lists = [FreqList(path) for path in csv_paths if os.path.exists(path)]
+        self.origin = origin
+        self.distance = distance
+        self.units = units
+
+    @classmethod
+    def from_fmp_config(cls, cfg_path="FMP24.cfg"):
+        """Use list paths and search settings from FMP24.cfg lines 7-11
+
+        FMP24.cfg has the DSD+ path on line 6, one line more than FMP.cfg.
+        """
+        base = os.path.dirname(os.path.abspath(cfg_path))
+        cfg = FmpConfig.load(cfg_path)
+        paths = [os.path.join(base, cfg[name].replace('\\', os.sep)) for name in ('freq_list', 'freq_list_aux')]
+        units = 'kilometers' if 'k' in cfg['search_units'].lower() else 'miles'
+        return cls(paths, origin=cfg['search_origin'], distance=cfg['search_distance'], units=units)
+
+    def refresh(self):
+        """Pick up CSV changes; cheap when nothing changed"""
+        for freq_list in self.lists:
+            state = freq_list._source_state()
+            if state['mtime'] != freq_list.meta['mtime'] or state['size'] != freq_list.meta['size']:
+                freq_list.load()
+
+    def query(self, freq_mhz, tolerance_hz=1000, origin=None, distance=None, limit=None):
+        """Records within tolerance of freq_mhz and within range, nearest first"""
+        origin = origin or self.origin
+        distance = self.distance if distance is None else distance
+        center = int(round(freq_mhz * 1e6))
+        matches = []
+        for freq_list in self.lists:
+            start, stop = freq_list.range(center - tolerance_hz, center + tolerance_hz)
+            if start == stop:
+                continue
+            index = np.arange(start, stop)
+            if origin is not None:
+                dist = haversine(freq_list.lat[start:stop], freq_list.lon[start:stop],
+                                 origin[0], origin[1], self.units)
+                if distance is not None:
+                    keep = dist <= distance
+                    index, dist = index[keep], dist[keep]
+            else:
+                dist = np.full(len(index), np.nan)
+            matches.extend((float(d), freq_list, int(i)) for d, i in zip(dist, index))
+        matches.sort(key=lambda m: m[0])
+        if limit is not None:
+            matches = matches[:limit]
+        return [freq_list.record(i, d) for d, freq_list, i in matches]
+
+
+def describe(record, width=40):
+    """Short ScanList description for a record: licensee and location"""
+    text = ' '.join(record[name] for name in ('licensee', 'location') if record.get(name))
+    return ' '.join(text.split())[:width]
+
+
+def naive_query(csv_path, freq_mhz, tolerance_hz, origin, distance, units='miles'):
+    """What FMP does on every retune: parse the whole CSV and filter it"""
+    results = []
+    with open(csv_path, 'r', encoding='utf-8', errors='replace') as f:
+        tx, rx, lat, lon, texts = parse_rows(f.read())
+    center = freq_mhz * 1e6
+    for i in range(len(tx)):
+        if abs(tx[i] - center) <= tolerance_hz:
+            d = float(haversine(lat[i], lon[i], origin[0], origin[1], units))
+            if d <= distance:
+                results.append((d, i))
+    return sorted(results)
+
+
+def write_synthetic_csv(path, rows, seed=0):
+    """FreqList CSV with `rows` random records around 150-470 MHz"""
+    rng = np.random.default_rng(seed)
+    tx = rng.integers(150_000, 470_000, rows) * 0.00125
+    lat = rng.uniform(18.0, 50.0, rows)
+    lon = rng.uniform(-160.0, -65.0, rows)
+    with open(path, 'w') as f:
+        f.write('; TXfreq, RXfreq, Licensee, Location, Latitude, Longitude, first emission mode, second emission mode\n')
+        for i in range(rows):
+            f.write(f'{tx[i]:.5f}, {tx[i] + 5:.5f}, "licensee {i}", "location {i}", '
+                    f'{lat[i]:.4f}, {lon[i]:.4f}, "11K2F3E", ""\n')
+
+
+def measure(rows=200_000, queries=200, path=None):
+    """Compare indexed lookups against the naive CSV scan"""
+    path = path or os.path.join(os.path.abspath('.'), 'freqdb-bench.csv')
+    write_synthetic_csv(path, rows)
+    cache_dir = path + '.cache'
+    try:
+        started = time.perf_counter()
+        db = FreqDatabase([path], origin=(19.7163, -155.6241), distance=3000.0)
+        build = time.perf_counter() - started
+        started = time.perf_counter()
+        FreqDatabase([path], origin=(19.7163, -155.6241), distance=3000.0)
+        warm_load = time.perf_counter() - started
+        freqs = np.linspace(200.0, 460.0, queries)
+        started = time.perf_counter()
+        for f in freqs:
+            db.query(f, 1000)
+        indexed = (time.perf_counter() - started) / queries
+        started = time.perf_counter()
+        naive_query(path, freqs[0], 1000, (19.7163, -155.6241), 3000.0)
+        naive = time.perf_counter() - started
+        return {
+            'rows': rows,
+            'build_s': build,
+            'mapped_load_ms': warm_load * 1000.0,
+            'indexed_query_us': indexed * 1e6,
+            'naive_query_ms': naive * 1000.0,
+            'speedup': naive / indexed,
+        }
+    finally:
+        if os.path.isdir(cache_dir):
+            for name in os.listdir(cache_dir):
+                os.remove(os.path.join(cache_dir, name))
+            os.rmdir(cache_dir)
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    print(measure())
@@ -0,0 +1,336 @@
+"""Keep FMP24's CPU use under a target by stepping its load settings
+
+FMP.txt names three CPU levers: economy mode (-e1), a smaller FFT size
+(FMP24.cfg line 3) and a lower spectrum update rate (line 4).  The
+governor samples CPU time and resident memory of the FMP24 processes,
+walks a ladder of settings from heaviest to lightest, and applies a new
+step only at a safe restart point, since FMP24 reads FMP24.cfg at start-up.
+Every decision is logged with the measurements behind it.
+
+CPU is read from /proc/<pid>/stat on Linux and GetProcessTimes on Windows;
+no extra packages are needed.
+"""
+import os
+import sys
+import threading
+import time
+
+
+# (FFT size in k, update rate in Hz, economy mode), heaviest first.  Economy
+# mode goes first: FMP.txt says it costs DSD+ almost nothing.
+LEVELS = (
+    (64, 15.0, False),
+    (64, 15.0, True),
+    (32, 15.0, True),
+    (32, 10.0, True),
+    (16, 10.0, True),
+    (16, 5.0, True),
+    (8, 5.0, True),
+)
+
+
+class ProcessSampler:
+    """CPU seconds and RSS of a set of processes"""
+
+    def __init__(self):
+        self.cpus = os.cpu_count() or 1
+        if sys.platform.startswith('linux'):
+            self.ticks = os.sysconf('SC_CLK_TCK')
+            self.page = os.sysconf('SC_PAGE_SIZE')
+            self.read = self._read_proc
+        elif sys.platform == 'win32':
+            self.read = self._read_windows
+        else:
+            raise OSError(f"No process sampler for {sys.platform}")
+        self._last = {}
+
+    def _read_proc(self, pid):
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            # The command name may contain spaces; fields resume after ')'
+            fields = f.read().rpartition(b')')[2].split()
+        with open(f'/proc/{pid}/statm', 'rb') as f:
+            resident = int(f.read().split()[1])
+        return (int(fields[11]) + int(fields[12])) / self.ticks, resident * self.page
+
+    def _read_windows(self, pid):
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage',
+                    'QuotaPagedPoolUsage', 'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage',
+                    'PagefileUsage', 'PeakPagefileUsage')]
+
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            raise OSError(f"Cannot open process {pid}")
+        try:
+            times = [wintypes.FILETIME() for _ in range(4)]
+            if not kernel32.GetProcessTimes(handle, *[ctypes.byref(t) for t in times]):
+                raise OSError(f"GetProcessTimes failed for {pid}")
+            kernel, user = [(t.dwHighDateTime << 32 | t.dwLowDateTime) / 1e7 for t in times[2:]]
+            counters = Counters()
+            counters.cb = ctypes.sizeof(Counters)
+            ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb)
+            return kernel + user, counters.WorkingSetSize
+        finally:
+            kernel32.CloseHandle(handle)
+
+    def sample(self, pids, now=None):
+        """CPU use since the previous sample (percent of the machine and cores) and total RSS
+
+        Processes seen for the first time only count from the next sample on.
+        """
+        now = time.monotonic() if now is None else now
+        used = 0.0
+        rss = 0
+        current = {}
+        for pid in pids:
+            try:
+                cpu, resident = self.read(pid)
+            except (OSError, ValueError, IndexError):
+                continue  # exited between listing and reading
+            current[pid] = (cpu, now)
+            rss += resident
+            if pid in self._last:
+                last_cpu, last_time = self._last[pid]
+                if now > last_time:
+                    used += (cpu - last_cpu) / (now - last_time)
+        self._last = current
+        return {'cores': used, 'cpu_percent': used / self.cpus * 100.0, 'rss_bytes': rss,
+                'processes': len(current)}
+
+
+def nearest_level(fft_size_k, update_rate, economy):
+    """Ladder step closest to the current settings"""
+    def distance(level):
+        fft, rate, eco = level
+        return (abs(fft - fft_size_k) / 8.0, abs(rate - update_rate), eco != economy)
+    return min(range(len(LEVELS)), key=lambda i: distance(LEVELS[i]))
+
+
+class CpuGovernor:
+    """Step FFT size, update rate and economy mode to hold CPU under target
+
+    pids() lists the FMP24 process ids, safe_to_restart() says whether
+    restarting FMP24 now is acceptable and restart() restarts it with the
+    current settings.  CPU is averaged over `window` samples; the governor
+    steps lighter above target_percent (or above rss_limit bytes) and
+    heavier once a whole window is below target_percent - band.  After a
+    change it waits `cooldown` seconds before judging again, and a level it
+    had to leave for being too heavy is not tried again for `probation`
+    seconds, doubling each time it fails again, so it doesn't flap.
+    """
+
+    def __init__(self, store, pids, restart, safe_to_restart=None, target_percent=70.0, band=20.0,
+                 rss_limit=None, interval=2.0, window=5, cooldown=60.0, probation=600.0,
+                 log_path=None, sampler=None):
+        self.store = store
+        self.pids = pids
+        self.restart = restart
+        self.safe_to_restart = safe_to_restart or (lambda: True)
+        self.target_percent = target_percent
+        self.band = band
+        self.rss_limit = rss_limit
+        self.interval = interval
+        self.window = window
+        self.cooldown = cooldown
+        self.probation = probation
+        self.log_path = log_path
+        self.sampler = sampler or ProcessSampler()
+        self.samples = []
+        self.events = []
+        self.level = self.current_level()
+        self.pending = None
+        self.changes = 0
+        self._next_sample = 0.0
+        self._hold_until = 0.0
+        self._too_heavy = {}  # level -> (retry after, probation used)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def current_level(self):
+        cfg = self.store.cfg
+        if cfg is None:
+            return 0
+        return nearest_level(cfg['fft_size_k'], cfg['update_rate'], self.store.get('economy'))
+
+    def _log(self, message, **data):
+        now = time.time()
+        self.events.append((now, message, data))
+        del self.events[:-500]
+        if self.log_path:
+            details = ' '.join(f"{k}={v:.1f}" if isinstance(v, float) else f"{k}={v}" for k, v in data.items())
+            try:
+                with open(self.log_path, 'a') as f:
+                    f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now))} {message} {details}\n")
+            except OSError:
+                pass
+
+    def decide(self, cpu_percent, rss_bytes, now=None):
+        """-1 to go heavier, +1 to go lighter, 0 to stay, with the reason"""
+        now = time.monotonic() if now is None else now
+        self.samples.append(cpu_percent)
+        del self.samples[:-self.window]
+        average = sum(self.samples) / len(self.samples)
+        if self.rss_limit and rss_bytes > self.rss_limit and self.level < len(LEVELS) - 1:
+            return 1, f"RSS {rss_bytes / 2**20:.0f} MiB over {self.rss_limit / 2**20:.0f} MiB"
+        if len(self.samples) < self.window:
+            return 0, None
+        if average > self.target_percent and self.level < len(LEVELS) - 1:
+            return 1, f"CPU {average:.0f}% over {self.target_percent:.0f}%"
+        if average < self.target_percent - self.band and self.level > 0:
+            retry = self._too_heavy.get(self.level - 1, (0.0, 0.0))[0]
+            if now >= retry:
+                return -1, f"CPU {average:.0f}% under {self.target_percent - self.band:.0f}%"
+        return 0, None
+
+    def step(self, now=None):
+        """One governor pass; cheap to call more often than `interval`"""
+        now = time.monotonic() if now is None else now
+        if now < self._next_sample:
+            return
+        self._next_sample = now + self.interval
+        pids = list(self.pids())
+        if not pids:
+            self.samples.clear()
+            return
+        sample = self.sampler.sample(pids, now)
+        if not sample['processes'] or now < self._hold_until:
+            return
+        if self.pending is None:
+            direction, reason = self.decide(sample['cpu_percent'], sample['rss_bytes'], now)
+            if direction > 0:
+                # Keep away from the level we are leaving; longer each time it fails
+                previous = self._too_heavy.get(self.level, (0.0, 0.0))[1]
+                wait = min(previous * 2, 24 * 3600.0) if previous else self.probation
+                self._too_heavy[self.level] = (now + wait, wait)
+            if direction:
+                self.pending = self.level + direction
+                fft, rate, eco = LEVELS[self.pending]
+                self._log(f"step {'lighter' if direction > 0 else 'heavier'} to level {self.pending}: {reason}",
+                          cpu_percent=sample['cpu_percent'], rss_mib=sample['rss_bytes'] / 2**20,
+                          fft_k=fft, update_rate=rate, economy=eco)
+        if self.pending is not None:
+            if self.safe_to_restart():
+                self.apply(self.pending)
+                self._hold_until = now + self.cooldown
+            else:
+                self._log("waiting for a safe restart point", level=self.pending)
+
+    def apply(self, level):
+        """Write the level's settings and restart FMP24 with them"""
+        fft, rate, eco = LEVELS[level]
+        self.store.set_cfg('fft_size_k', fft)
+        self.store.set_cfg('update_rate', rate)
+        self.store.set('economy', eco)
+        self.store.flush()
+        self.restart()
+        self.level = level
+        self.pending = None
+        self.changes += 1
+        self.samples.clear()
+        self._log(f"applied level {level}", fft_k=fft, update_rate=rate, economy=eco)
+
+    def status(self):
+        fft, rate, eco = LEVELS[self.level]
+        return {
+            'level': self.level,
+            'fft_size_k': fft,
+            'update_rate': rate,
+            'economy': eco,
+            'pending': self.pending,
+            'cpu_percent': self.samples[-1] if self.samples else None,
+            'changes': self.changes,
+        }
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="cpu-governor", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5.0)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.step()
+            except Exception as e:
+                self._log(f"governor error: {e}")
+            self._stop.wait(min(self.interval, 0.5))
+
+
+# Stand-in for FMP24 that burns CPU in proportion to the FFT size and
+# update rate in its FMP24.cfg, less in economy mode (-e1).
+BURNER = r'''
+import sys, time
+full = float(sys.argv[1])
+economy = '-e1' in sys.argv[2:]
+with open('FMP24.cfg') as f:
+    lines = [l.split(';')[0].strip() for l in f]
+fft_k, rate = float(lines[2]), float(lines[3])
+load = min(1.0, full * (fft_k / 64) ** 0.5 * (rate / 15) * (0.8 if economy else 1.0))
+period = 0.05
+while True:
+    start = time.perf_counter()
+    while time.perf_counter() - start < period * load:
+        pass
+    time.sleep(period * (1 - load))
+'''
+
+
+def burner_command(full_load=0.9):
+    """Supervisor argv for a stand-in that uses full_load cores at 64k/15 Hz without economy"""
+    def build(instance, economy=False):
+        return [sys.executable, '-c', BURNER, str(full_load), '-e1' if economy else '-e0']
+    return build
+
+
+def measure(seconds=40.0, target_percent=45.0, full_load=0.9):
+    """Run a burner under the governor and record how CPU settles"""
+    import shutil
+    import tempfile
+    from config import ConfigStore
+    from supervisor import ScanSupervisor
+
+    directory = tempfile.mkdtemp(prefix='governor-')
+    try:
+        shutil.copy('FMP24.cfg', directory)
+        store = ConfigStore(os.path.join(directory, 'fmp_settings.json'),
+                            os.path.join(directory, 'launcher_config.json'),
+                            os.path.join(directory, 'FMP24.cfg'), delay=0.05)
+        store.set('economy', False)
+        build = burner_command(full_load)
+        supervisor = ScanSupervisor(lambda i: build(i, store.get('economy')), [1],
+                                    base_dir=directory).start()
+        governor = CpuGovernor(store, lambda: [i.process.pid for i in supervisor.instances if i.alive()],
+                               supervisor.restart, target_percent=target_percent, band=15.0,
+                               interval=1.0, window=3, cooldown=3.0, probation=15.0,
+                               log_path=os.path.join(directory, 'governor.log'))
+        trace = []
+        started = time.monotonic()
+        while time.monotonic() - started < seconds:
+            governor.step()
+            if governor.samples:
+                trace.append((round(time.monotonic() - started), governor.level, round(governor.samples[-1])))
+            time.sleep(1.0)
+        supervisor.stop()
+        with open(os.path.join(directory, 'governor.log')) as f:
+            log = f.read().splitlines()
+        return {'final': governor.status(), 'trace': trace[::2], 'log': log}
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    result = measure()
+    print(result['final'])
+    print(result['trace'])
+    print('\n'.join(result['log']))
@@ -0,0 +1,129 @@
+"""Keyed translation registry
+
+Each translated widget is bound to its message key when it is created, so
+a language switch walks only the bound widgets and looks every text up by
+key.  Catalogs live in locales/<language>.json and are read the first
+time a language is used.
+"""
+import json
+import os
+
+try:
+    from tkinter import TclError
+except ImportError:
+    # Headless use (bench.py, scanctl.py) without Tk installed
+    class TclError(Exception):
+        pass
+
+
+LOCALES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'locales')
+
+
+class Translator:
+    """Message catalogs plus the widgets bound to their keys"""
+
+    def __init__(self, language='ar', fallback='en', directory=LOCALES_DIR):
+        self.language = language
+        self.fallback = fallback
+        self.directory = directory
+        self._catalogs = {}
+        self._bindings = {}
+
+    def languages(self):
+        """Languages with a catalog file"""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return sorted(name[:-5] for name in names if name.endswith('.json'))
+
+    def catalog(self, language):
+        catalog = self._catalogs.get(language)
+        if catalog is None:
+            try:
+                with open(os.path.join(self.directory, f'{language}.json'), 'r', encoding='utf-8') as f:
+                    catalog = json.load(f)
+            except (OSError, ValueError):
+                catalog = {}
+            self._catalogs[language] = catalog
+        return catalog
+
+    def get(self, key, *args):
+        """Text for key in the current language, then the fallback, then the key itself"""
+        text = self.catalog(self.language).get(key)
+        if text is None:
+            text = self.catalog(self.fallback).get(key, key)
+        if args:
+            return text.format(*args)
+        return text
+
+    def bind(self, widget, key, *args, option='text'):
+        """Show key's text on widget now and after every language switch
+
+        Binding the same widget option again replaces the key.
+        Returns the widget so creation and binding fit in one expression.
+        """
+        self._bindings[(str(widget), option)] = (widget.configure, key, args, option)
+        widget.configure(**{option: self.get(key, *args)})
+        return widget
+
+    def bind_setter(self, name, setter, key, *args):
+        """Bind something that isn't a widget option, e.g. a window title or notebook tab"""
+        self._bindings[name] = (setter, key, args, None)
+        setter(self.get(key, *args))
+
+    def unbind(self, widget, option='text'):
+        self._bindings.pop((str(widget), option), None)
+
+    def set_language(self, language):
+        """Switch language and update every bound widget; destroyed ones are dropped"""
+        self.language = language
+        dead = []
+        for name, (setter, key, args, option) in self._bindings.items():
+            text = self.get(key, *args)
+            try:
+                if option is None:
+                    setter(text)
+                else:
+                    setter(**{option: text})
+            except TclError:
+                dead.append(name)
+        for name in dead:
+            del self._bindings[name]
+
+    def __len__(self):
+        return len(self._bindings)
+
+
+def measure(sizes=(50, 500, 5000), repeats=20):
+    """Language switch time per bound widget count (no display needed)"""
+    import time
+
+    class Label:
+        def __init__(self, n):
+            self.name = f'.label{n}'
+            self.text = ''
+
+        def configure(self, text):
+            self.text = text
+
+        def __str__(self):
+            return self.name
+
+    translator = Translator('ar')
+    keys = list(translator.catalog('en'))
+    results = {}
+    for size in sizes:
+        translator._bindings.clear()
+        for n in range(size):
+            translator.bind(Label(n), keys[n % len(keys)])
+        started = time.perf_counter()
+        for i in range(repeats):
+            translator.set_language('en' if i % 2 == 0 else 'ar')
+        elapsed = (time.perf_counter() - started) / repeats
+        results[size] = {'switch_ms': elapsed * 1000, 'us_per_widget': elapsed / size * 1e6}
+    return results
+
+
+if __name__ == "__main__":
+    print(measure())
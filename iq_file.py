@@ -0,0 +1,316 @@
+"""Memory-mapped IQ recordings as a sample source
+
+Replays FMP's raw I/Q recordings (the R key; stereo WAV, I on the left
+channel) and rtl_sdr captures (.cu8/.bin/.raw, interleaved uint8) through
+the same read(count)/close() interface as rtl_tcp.RtlTcpStream, so the
+spectrum worker, channelizer and friends can run on a recording instead
+of a dongle.  The file is memory-mapped: a block is a view of the page
+cache converted into one reused complex64 buffer, and float32 recordings
+are returned without any copy.  Pacing is either realtime (one block per
+block duration, as a dongle would deliver) or as fast as possible.
+"""
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+from channelizer import DEFAULT_SAMPLE_RATE, uint8_to_complex64
+
+
+# Sample formats: numpy dtype of one I or Q value
+FORMATS = {
+    'cu8': np.uint8,
+    'cs8': np.int8,
+    'cs16': np.int16,
+    'cf32': np.float32,
+}
+
+EXTENSIONS = {
+    '.cu8': 'cu8', '.bin': 'cu8', '.raw': 'cu8', '.dat': 'cu8',
+    '.cs8': 'cs8', '.cs16': 'cs16', '.cf32': 'cf32', '.cfile': 'cf32',
+}
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def read_wav_header(data, file_size=None):
+    """(format, sample_rate, data offset, data size) of a stereo I/Q WAV
+
+    data is the start of the file (64 KiB is plenty).
+    """
+    file_size = file_size or len(data)
+    if data[:4] != b'RIFF' or data[8:12] != b'WAVE':
+        raise ValueError("Not a RIFF/WAVE file")
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk, size = struct.unpack_from('<4sI', data, offset)
+        body = offset + 8
+        if chunk == b'fmt ':
+            tag, channels, rate, _, _, bits = struct.unpack_from('<HHIIHH', data, body)
+            if tag == WAVE_FORMAT_EXTENSIBLE and size >= 26:
+                tag = struct.unpack_from('<H', data, body + 24)[0]
+            if channels != 2:
+                raise ValueError(f"I/Q WAV needs 2 channels, not {channels}")
+            kinds = {(WAVE_FORMAT_PCM, 8): 'cu8', (WAVE_FORMAT_PCM, 16): 'cs16',
+                     (WAVE_FORMAT_IEEE_FLOAT, 32): 'cf32'}
+            if (tag, bits) not in kinds:
+                raise ValueError(f"Unsupported WAV sample format {tag}/{bits} bit")
+            fmt = (kinds[tag, bits], rate)
+        elif chunk == b'data':
+            if fmt is None:
+                raise ValueError("WAV data chunk before fmt chunk")
+            # Recorders that were killed leave the size at 0 or 0xFFFFFFFF
+            if size in (0, 0xFFFFFFFF) or body + size > file_size:
+                size = file_size - body
+            return fmt[0], fmt[1], body, size
+        offset = body + size + (size & 1)
+    raise ValueError("WAV file has no data chunk")
+
+
+class IqFileSource:
+    """IQ samples from a recording file as complex64 blocks
+
+    read() returns a view into a reused buffer (or into the mapped file),
+    so a block is only valid until the next read.  At the end of the file
+    the source starts again from the beginning when loop is set; otherwise
+    read() raises EOFError once fewer than `count` samples are left.
+    """
+
+    def __init__(self, path, sample_rate=None, fmt=None, loop=False, realtime=False,
+                 frequency_hz=None):
+        self.path = path
+        self.loop = loop
+        self.realtime = realtime
+        self.frequency_hz = frequency_hz
+        self.format = fmt
+        self.sample_rate = sample_rate
+        self.offset = 0
+        self.samples = 0
+        self.position = 0
+        self.delivered = 0
+        self.loops = 0
+        self._file = None
+        self._map = None
+        self._values = None
+        self._scratch = np.empty(0, dtype=np.complex64)
+        self._started = None
+        self._paced = 0
+
+    def open(self):
+        if self._map is not None:
+            return self
+        self._file = open(self.path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{self.path} is empty")
+        if hasattr(self._map, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+            # Read ahead aggressively and drop pages behind us
+            self._map.madvise(mmap.MADV_SEQUENTIAL)
+        size = len(self._map)
+        if self._map[:4] == b'RIFF':
+            fmt, rate, self.offset, size = read_wav_header(self._map[:65536], size)
+            self.format = self.format or fmt
+            self.sample_rate = self.sample_rate or rate
+        else:
+            extension = os.path.splitext(self.path)[1].lower()
+            self.format = self.format or EXTENSIONS.get(extension, 'cu8')
+        if self.format not in FORMATS:
+            raise ValueError(f"Unknown IQ format {self.format!r}")
+        self.sample_rate = self.sample_rate or DEFAULT_SAMPLE_RATE
+        dtype = np.dtype(FORMATS[self.format])
+        self.samples = size // (2 * dtype.itemsize)
+        self._values = np.frombuffer(self._map, dtype=dtype, count=self.samples * 2,
+                                     offset=self.offset)
+        return self
+
+    @property
+    def duration(self):
+        self.open()
+        return self.samples / self.sample_rate
+
+    def seek(self, sample):
+        """Move to a sample index (negative counts from the end)"""
+        self.open()
+        if sample < 0:
+            sample += self.samples
+        self.position = min(max(int(sample), 0), self.samples)
+        self._started = None
+
+    def seek_seconds(self, seconds):
+        self.open()
+        self.seek(int(seconds * self.sample_rate))
+
+    def tell(self):
+        return self.position
+
+    def _convert(self, values, out):
+        """Interleaved I/Q values -> complex64 in out (normalized to [-1, 1))"""
+        if self.format == 'cu8':
+            return uint8_to_complex64(values, out)
+        view = out.view(np.float32)
+        if self.format == 'cf32':
+            view[:] = values
+        else:
+            scale = 1.0 / (128.0 if self.format == 'cs8' else 32768.0)
+            np.multiply(values, scale, out=view, casting='unsafe')
+        return out
+
+    def read(self, count):
+        """Next `count` samples as complex64"""
+        self.open()
+        if count > self.samples:
+            raise ValueError(f"Block of {count} samples is longer than the recording")
+        if self.position + count > self.samples:
+            if not self.loop:
+                raise EOFError(f"End of {self.path}")
+        if len(self._scratch) < count:
+            self._scratch = np.empty(count, dtype=np.complex64)
+        out = self._scratch[:count]
+        start = self.position
+        end = start + count
+        if end <= self.samples:
+            values = self._values[start * 2:end * 2]
+            if self.format == 'cf32':
+                # Already complex64 in the file: hand out the mapped pages as they are
+                block = values.view(np.complex64)
+            else:
+                block = self._convert(values, out)
+            self.position = end
+        else:
+            # Wrap around: tail of the file then its start
+            first = self.samples - start
+            self._convert(self._values[start * 2:], out[:first])
+            self._convert(self._values[:(count - first) * 2], out[first:])
+            block = out
+            self.position = count - first
+            self.loops += 1
+        self.delivered += count
+        if self.realtime:
+            self._pace(count)
+        return block
+
+    def _pace(self, count):
+        """Sleep so blocks come out no faster than the dongle would deliver them"""
+        now = time.perf_counter()
+        if self._started is None:
+            self._started = now
+            self._paced = 0
+        self._paced += count
+        due = self._started + self._paced / self.sample_rate
+        if due > now:
+            time.sleep(due - now)
+        elif now - due > 1.0:
+            # Fell more than a second behind (e.g. a slow consumer): don't burst to catch up
+            self._started = now
+            self._paced = 0
+
+    def close(self):
+        self._values = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # A caller still holds a zero-copy block; freed with it
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def open_source(address, sample_rate=DEFAULT_SAMPLE_RATE, frequency_hz=None, loop=True,
+                realtime=True):
+    """IQ source for an rtl_tcp 'host:port' or the path of a recording
+
+    For a recording, frequency_hz is the frequency it was made at, and
+    sample_rate applies to raw files; a WAV file's header gives its own.
+    """
+    if os.path.isfile(address):
+        with open(address, 'rb') as f:
+            wav = f.read(4) == b'RIFF'
+        return IqFileSource(address, None if wav else sample_rate, loop=loop, realtime=realtime,
+                            frequency_hz=frequency_hz)
+    from rtl_tcp import RtlTcpStream, parse_address
+    host, port = parse_address(address)
+    return RtlTcpStream(host, port, sample_rate, frequency_hz)
+
+
+def write_synthetic(path, seconds=1.0, sample_rate=DEFAULT_SAMPLE_RATE, fmt='cu8',
+                    offsets_hz=(-300e3, 12.5e3, 450e3), chunk=1 << 20):
+    """Write a multi-carrier test recording (raw, or WAV if path ends in .wav)"""
+    from channelizer import synthetic_iq
+    total = int(seconds * sample_rate)
+    iq = synthetic_iq(min(chunk, total), list(offsets_hz), sample_rate)
+    if fmt == 'cu8':
+        values = np.clip(iq.view(np.float32) * 127.5 + 127.5, 0, 255).astype(np.uint8)
+    elif fmt == 'cs8':
+        values = np.clip(iq.view(np.float32) * 128, -128, 127).astype(np.int8)
+    elif fmt == 'cs16':
+        values = np.clip(iq.view(np.float32) * 32768, -32768, 32767).astype(np.int16)
+    else:
+        values = iq.view(np.float32)
+    data = values.tobytes()
+    size = total * 2 * values.itemsize
+    with open(path, 'wb') as f:
+        if path.lower().endswith('.wav'):
+            tag = WAVE_FORMAT_IEEE_FLOAT if fmt == 'cf32' else WAVE_FORMAT_PCM
+            bits = values.itemsize * 8
+            f.write(struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + size, b'WAVE', b'fmt ', 16,
+                                tag, 2, int(sample_rate), int(sample_rate) * 2 * values.itemsize,
+                                2 * values.itemsize, bits, b'data', size))
+        remaining = size
+        while remaining > 0:
+            f.write(data[:remaining])
+            remaining -= len(data)
+    return path
+
+
+def measure(seconds=30.0, block=262144, directory=None):
+    """Replay throughput from a recording in the page cache, per format"""
+    import shutil
+    import tempfile
+    # Only the scratch directory made here is removed afterwards, never the caller's
+    directory = tempfile.mkdtemp(prefix='iq-file-', dir=directory)
+    results = {}
+    try:
+        for fmt, name in (('cu8', 'capture.cu8'), ('cs16', 'fmp.wav'), ('cf32', 'capture.cf32')):
+            path = write_synthetic(os.path.join(directory, name), seconds, fmt=fmt)
+            source = IqFileSource(path).open()
+            started = time.perf_counter()
+            total = 0
+            try:
+                while True:
+                    total += len(source.read(block))
+            except EOFError:
+                pass
+            elapsed = time.perf_counter() - started
+            source.close()
+            results[fmt] = {
+                'samples': total,
+                'msps': total / elapsed / 1e6,
+                'gs_per_min': total / elapsed * 60 / 1e9,
+                'x_realtime': total / DEFAULT_SAMPLE_RATE / elapsed,
+            }
+            os.remove(path)
+        # Realtime pacing: half a second of samples should take half a second
+        path = write_synthetic(os.path.join(directory, 'paced.cu8'), 0.25)
+        source = IqFileSource(path, loop=True, realtime=True)
+        started = time.perf_counter()
+        for _ in range(int(0.5 * DEFAULT_SAMPLE_RATE / 24000)):
+            source.read(24000)
+        results['realtime_0.5s_took'] = time.perf_counter() - started
+        results['loops'] = source.loops
+        source.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    print(measure())
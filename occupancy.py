@@ -0,0 +1,376 @@
+"""Offline channel occupancy from archives of IQ recordings
+
+Runs the channelizer over recordings made with FMP's R key (or rtl_sdr
+captures) and reports, for every ScanList channel inside the recorded
+span, how busy it was and every transmission with its start, stop and
+peak SNR.
+
+Recordings are cut into chunks that a process pool works through in
+parallel.  Workers memory-map the recording themselves, so the samples
+are shared through the page cache and a task is only a few numbers; each
+worker writes one byte per channel per block (0 = quiet, otherwise the
+SNR in dB) straight into a shared-memory window that the parent reads.
+The window has a fixed size and is reused, so memory stays bounded
+however long a recording is; transmissions that span windows are
+carried over.
+
+The report is columnar: one table of channels and one of transmissions,
+written as Parquet when pyarrow is installed and as CSV otherwise.
+"""
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from channelizer import Channelizer, DEFAULT_SAMPLE_RATE
+from iq_file import IqFileSource
+
+
+def _analyze_chunk(path, fmt, sample_rate, center_hz, channels_hz, bandwidths_hz, fft_size,
+                   threshold_db, block_samples, first_block, blocks, shm_name, row, shape):
+    """Worker: channel activity for `blocks` blocks from first_block on, written at `row`"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    source = IqFileSource(path, sample_rate, fmt)
+    out = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    try:
+        channelizer = Channelizer(center_hz, channels_hz, sample_rate, fft_size,
+                                  bandwidths_hz=bandwidths_hz, threshold_db=threshold_db)
+        start = first_block * block_samples
+        history = len(channelizer.history)
+        if start >= history:
+            # Fill the filter bank from the samples before the chunk so its first block is clean
+            source.seek(start - history)
+            channelizer.history[:] = source.read(history)
+        else:
+            source.seek(start)
+        for k in range(blocks):
+            report = channelizer.process(source.read(block_samples))
+            snr = np.nan_to_num(report.power_db - report.noise_db, nan=0.0)
+            out[row + k] = np.where(report.active, np.clip(np.rint(snr), 1, 255), 0)
+        return blocks * block_samples
+    finally:
+        source.close()
+        del out
+        shm.close()
+
+
+def _runs(active):
+    """Start and end (exclusive) indices of the True runs in a 1-D array"""
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], active, [False])).view(np.int8)))
+    return edges[::2], edges[1::2]
+
+
+class TransmissionTracker:
+    """Turn consecutive windows of per-block activity into transmissions
+
+    Gaps shorter than hang_blocks are bridged (squelch tail, fading) and
+    transmissions shorter than min_blocks are dropped.  A run that touches
+    the end of a window stays open until the next window shows whether it
+    goes on.
+    """
+
+    def __init__(self, channels, hang_blocks=10, min_blocks=4):
+        self.hang_blocks = hang_blocks
+        self.min_blocks = min_blocks
+        self.active_blocks = np.zeros(channels, dtype=np.int64)
+        self.blocks = 0
+        self.open = [None] * channels  # (start, end, peak) per channel
+        self.events = []  # (channel index, start block, end block, peak SNR dB)
+
+    def add(self, window):
+        """window: (blocks, channels) uint8 from the workers"""
+        base = self.blocks
+        count = len(window)
+        self.blocks += count
+        active = window > 0
+        self.active_blocks += active.sum(axis=0)
+        for channel in range(window.shape[1]):
+            starts, ends = _runs(active[:, channel])
+            peaks = np.maximum.reduceat(window[:, channel], starts) if len(starts) else starts
+            runs = [(base + s, base + e, int(p)) for s, e, p in zip(starts, ends, peaks)]
+            pending = self.open[channel]
+            if pending is not None:
+                runs.insert(0, pending)
+            merged = []
+            for run in runs:
+                if merged and run[0] - merged[-1][1] <= self.hang_blocks:
+                    last = merged[-1]
+                    merged[-1] = (last[0], run[1], max(last[2], run[2]))
+                else:
+                    merged.append(run)
+            self.open[channel] = None
+            for run in merged:
+                if run[1] + self.hang_blocks >= self.blocks:
+                    self.open[channel] = run  # may continue in the next window
+                else:
+                    self._close(channel, run)
+
+    def _close(self, channel, run):
+        if run[1] - run[0] >= self.min_blocks:
+            self.events.append((channel, run[0], run[1], run[2]))
+
+    def finish(self):
+        for channel, run in enumerate(self.open):
+            if run is not None:
+                self._close(channel, run)
+        self.open = [None] * len(self.open)
+
+
+def recording_start(path, duration):
+    """Recordings are written as they go, so the file's mtime is when it ended"""
+    return os.path.getmtime(path) - duration
+
+
+class OccupancyAnalyzer:
+    """Occupancy of ScanList channels over a set of recordings
+
+    recordings are (path, center_hz) pairs; with start_times (epoch
+    seconds per recording) missing, file modification times are used.
+    """
+
+    def __init__(self, channels_hz, bandwidths_hz=12.5e3, workers=None, sample_rate=None, fmt=None,
+                 fft_size=1024, threshold_db=10.0, block_seconds=0.05, chunk_seconds=30.0,
+                 window_seconds=1800.0, hang_seconds=0.5, min_seconds=0.2):
+        self.channels_hz = np.asarray(channels_hz, dtype=np.float64)
+        self.bandwidths_hz = np.broadcast_to(np.asarray(bandwidths_hz, dtype=np.float64),
+                                             self.channels_hz.shape).copy()
+        self.workers = workers or os.cpu_count() or 1
+        self.sample_rate = sample_rate
+        self.fmt = fmt
+        self.fft_size = fft_size
+        self.threshold_db = threshold_db
+        self.block_seconds = block_seconds
+        self.chunk_seconds = chunk_seconds
+        self.window_seconds = window_seconds
+        self.hang_seconds = hang_seconds
+        self.min_seconds = min_seconds
+        self.files = []
+        self.samples = 0
+        self.seconds = 0.0
+
+    def analyze(self, recordings, start_times=None):
+        started = time.perf_counter()
+        self.files = []
+        with ProcessPoolExecutor(self.workers) as pool:
+            for k, (path, center_hz) in enumerate(recordings):
+                start = start_times[k] if start_times else None
+                self.files.append(self._analyze_file(pool, path, center_hz, start))
+        self.seconds = time.perf_counter() - started
+        return self
+
+    def _analyze_file(self, pool, path, center_hz, start_time):
+        probe = IqFileSource(path, self.sample_rate, self.fmt).open()
+        sample_rate, fmt, samples = probe.sample_rate, probe.format, probe.samples
+        probe.close()
+        # Whole filter bank frames per block
+        block_samples = self.fft_size * max(1, int(round(self.block_seconds * sample_rate / self.fft_size)))
+        block_seconds = block_samples / sample_rate
+        total_blocks = samples // block_samples
+        chunk_blocks = max(1, int(self.chunk_seconds / block_seconds))
+        window_blocks = max(chunk_blocks, int(self.window_seconds / block_seconds) // chunk_blocks * chunk_blocks)
+        window_blocks = min(window_blocks, max(total_blocks, 1))
+        offsets = self.channels_hz - center_hz
+        inside = np.abs(offsets) + self.bandwidths_hz / 2 <= 0.45 * sample_rate
+        channels = np.flatnonzero(inside)
+        duration = total_blocks * block_seconds
+        if start_time is None:
+            start_time = recording_start(path, samples / sample_rate)
+        tracker = TransmissionTracker(len(channels), int(round(self.hang_seconds / block_seconds)),
+                                      max(1, int(round(self.min_seconds / block_seconds))))
+        if len(channels) and total_blocks:
+            shape = (window_blocks, len(channels))
+            shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)))
+            try:
+                window = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+                for first in range(0, total_blocks, window_blocks):
+                    count = min(window_blocks, total_blocks - first)
+                    futures = [pool.submit(_analyze_chunk, path, fmt, sample_rate, center_hz,
+                                           self.channels_hz[channels], self.bandwidths_hz[channels],
+                                           self.fft_size, self.threshold_db, block_samples,
+                                           first + row, min(chunk_blocks, count - row), shm.name, row, shape)
+                               for row in range(0, count, chunk_blocks)]
+                    for future in futures:
+                        self.samples += future.result()
+                    tracker.add(window[:count])
+                tracker.finish()
+                del window
+            finally:
+                shm.close()
+                shm.unlink()
+        return {
+            'path': path,
+            'center_hz': center_hz,
+            'start': start_time,
+            'duration': duration,
+            'block_seconds': block_seconds,
+            'channels': channels,
+            'tracker': tracker,
+        }
+
+    def channel_table(self):
+        """One row per channel over all recordings, as columns"""
+        count = len(self.channels_hz)
+        recorded = np.zeros(count)
+        active = np.zeros(count)
+        transmissions = np.zeros(count, dtype=np.int64)
+        airtime = np.zeros(count)
+        longest = np.zeros(count)
+        peak = np.full(count, np.nan)
+        first = np.full(count, np.inf)
+        last = np.full(count, -np.inf)
+        for info in self.files:
+            channels, tracker, block = info['channels'], info['tracker'], info['block_seconds']
+            recorded[channels] += info['duration']
+            active[channels] += tracker.active_blocks * block
+            for index, start, end, level in tracker.events:
+                channel = channels[index]
+                seconds = (end - start) * block
+                transmissions[channel] += 1
+                airtime[channel] += seconds
+                longest[channel] = max(longest[channel], seconds)
+                peak[channel] = np.fmax(peak[channel], level)
+                first[channel] = min(first[channel], info['start'] + start * block)
+                last[channel] = max(last[channel], info['start'] + end * block)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return {
+                'channel_mhz': self.channels_hz / 1e6,
+                'recorded_s': recorded,
+                'occupancy': np.where(recorded > 0, active / recorded, np.nan),
+                # Share of the time between the first and last transmission that was on air
+                'duty_cycle': np.where(transmissions > 0, airtime / (last - first), np.nan),
+                'transmissions': transmissions,
+                'mean_s': np.where(transmissions > 0, airtime / transmissions, np.nan),
+                'longest_s': longest,
+                'peak_snr_db': peak,
+            }
+
+    def event_table(self):
+        """One row per transmission, in time order, as columns"""
+        rows = []
+        for info in self.files:
+            channels, block = info['channels'], info['block_seconds']
+            for index, start, end, level in info['tracker'].events:
+                rows.append((self.channels_hz[channels[index]] / 1e6, info['start'] + start * block,
+                             info['start'] + end * block, (end - start) * block, level, info['path']))
+        rows.sort(key=lambda r: r[1])
+        names = ('channel_mhz', 'start', 'stop', 'duration_s', 'peak_snr_db', 'file')
+        return {name: [row[k] for row in rows] for k, name in enumerate(names)}
+
+    def write_report(self, prefix):
+        """<prefix>_channels and <prefix>_transmissions as .parquet or .csv; returns the paths"""
+        return [write_table(f"{prefix}_channels", self.channel_table()),
+                write_table(f"{prefix}_transmissions", self.event_table())]
+
+    def throughput(self):
+        return {
+            'samples': self.samples,
+            'seconds': self.seconds,
+            'msps': self.samples / self.seconds / 1e6 if self.seconds else 0.0,
+            'x_realtime': self.samples / (self.sample_rate or DEFAULT_SAMPLE_RATE) / self.seconds if self.seconds else 0.0,
+        }
+
+
+def write_table(path, columns):
+    """Write columns (name -> sequence) as Parquet if pyarrow is installed, else CSV"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        path += '.csv'
+        names = list(columns)
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(names)
+            writer.writerows(zip(*(columns[name] for name in names)))
+        return path
+    path += '.parquet'
+    pyarrow.parquet.write_table(pyarrow.table({name: list(values) if not isinstance(values, np.ndarray) else values
+                                               for name, values in columns.items()}), path)
+    return path
+
+
+def measure(seconds=30.0, files=2, workers=None, directory=None):
+    """Occupancy of synthetic recordings with known on/off keying, and scaling with workers
+
+    Each recording has five channels keyed on and off on a known schedule;
+    the report is checked against it.  Throughput is given per worker
+    count up to the number of cores.
+    """
+    import shutil
+    import tempfile
+    # Only the scratch directory made here is removed afterwards, never the caller's
+    directory = tempfile.mkdtemp(prefix='occupancy-', dir=directory)
+    sample_rate = DEFAULT_SAMPLE_RATE
+    center = 851.0e6
+    offsets = np.array([-800e3, -300e3, 12.5e3, 400e3, 900e3])
+    rng = np.random.default_rng(1)
+    try:
+        recordings = []
+        expected = np.zeros(len(offsets))
+        chunk = int(sample_rate)
+        t = np.arange(chunk) / sample_rate
+        for k in range(files):
+            path = os.path.join(directory, f'rec{k}.cu8')
+            with open(path, 'wb') as f:
+                for second in range(int(seconds)):
+                    # Channel c is on air for whole seconds where (second + k) % (c + 2) == 0
+                    on = np.array([(second + k) % (c + 2) == 0 for c in range(len(offsets))])
+                    expected += on
+                    iq = (rng.standard_normal(chunk) + 1j * rng.standard_normal(chunk)) * 0.05
+                    for offset in offsets[on]:
+                        iq += 0.2 * np.exp(1j * (2 * np.pi * offset * t + 2.5e3 / 400 * np.sin(2 * np.pi * 400 * t)))
+                    values = np.clip(np.stack([iq.real, iq.imag], axis=1) * 127.5 + 127.5, 0, 255)
+                    f.write(values.astype(np.uint8).tobytes())
+            recordings.append((path, center))
+        results = {}
+        counts = sorted({1, workers or os.cpu_count() or 1})
+        for count in counts:
+            analyzer = OccupancyAnalyzer(center + offsets, workers=count, sample_rate=sample_rate,
+                                         chunk_seconds=10.0, window_seconds=30.0)
+            analyzer.analyze(recordings, start_times=[1.8e9 + k * seconds for k in range(files)])
+            results[f'workers_{count}'] = analyzer.throughput()
+        table = analyzer.channel_table()
+        results['occupancy'] = np.round(table['occupancy'], 3).tolist()
+        results['expected_occupancy'] = np.round(expected / (seconds * files), 3).tolist()
+        results['transmissions'] = table['transmissions'].tolist()
+        results['report'] = analyzer.write_report(os.path.join(directory, 'report'))
+        results['transmission_rows'] = len(analyzer.event_table()['start'])
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Channel occupancy report from IQ recordings")
+    parser.add_argument('recordings', nargs='*', help="recording files; PATH@MHZ gives a file its own center")
+    parser.add_argument('--center', type=float, help="center frequency in MHz the recordings were made at")
+    parser.add_argument('--scanlist', default='FMP24.ScanList')
+    parser.add_argument('--output', default='occupancy', help="report path prefix")
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--threshold', type=float, default=10.0, help="dB over the noise floor")
+    parser.add_argument('--sample-rate', type=float, help="for raw files, in S/s")
+    args = parser.parse_args()
+    if not args.recordings:
+        print(measure())
+        return
+    from channelizer import read_scanlist_frequencies
+    channels, bandwidths = read_scanlist_frequencies(args.scanlist)
+    recordings = []
+    for item in args.recordings:
+        path, _, mhz = item.partition('@')
+        if not mhz and args.center is None:
+            parser.error(f"{path}: no center frequency (use --center or PATH@MHZ)")
+        recordings.append((path, float(mhz or args.center) * 1e6))
+    analyzer = OccupancyAnalyzer(channels, bandwidths, args.workers, args.sample_rate,
+                                 threshold_db=args.threshold).analyze(recordings)
+    for path in analyzer.write_report(args.output):
+        print(path)
+    print(analyzer.throughput())
+
+
+if __name__ == "__main__":
+    main()
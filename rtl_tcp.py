@@ -0,0 +1,322 @@
+"""rtl_tcp control backend
+
+Speaks the rtl_tcp wire protocol directly instead of typing keys into the
+FMP24 window.  On connect the server sends a 12-byte dongle info header
+("RTL0", tuner type, gain count); after that every command is a 5-byte
+packet: one command byte followed by a big-endian 32-bit parameter.
+"""
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+from channelizer import uint8_to_complex64
+
+
+CMD_SET_FREQUENCY = 0x01
+CMD_SET_SAMPLE_RATE = 0x02
+CMD_SET_GAIN_MODE = 0x03
+CMD_SET_GAIN = 0x04
+CMD_SET_FREQ_CORRECTION = 0x05
+
+HEADER_MAGIC = b"RTL0"
+HEADER_SIZE = 12
+COMMAND_SIZE = 5
+
+TUNER_TYPES = {
+    0: 'unknown', 1: 'E4000', 2: 'FC0012', 3: 'FC0013',
+    4: 'FC2580', 5: 'R820T', 6: 'R828D',
+}
+
+_command = struct.Struct(">BI")
+_signed_command = struct.Struct(">Bi")
+_header = struct.Struct(">4sII")
+
+
+def parse_address(address, default_port=1234):
+    """Split 'host:port' into a (host, port) tuple"""
+    host, _, port = address.rpartition(':')
+    if not host:
+        return address, default_port
+    return host, int(port)
+
+
+def pack_command(cmd, param):
+    if param < 0:
+        return _signed_command.pack(cmd, param)
+    return _command.pack(cmd, param)
+
+
+def recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("rtl_tcp connection closed")
+        data.extend(chunk)
+    return bytes(data)
+
+
+class RtlTcpBackend:
+    """Command backend for an rtl_tcp server
+
+    Frequency, gain and PPM changes are sent as one binary packet each.
+    Key presses and scan start/stop have no rtl_tcp equivalent; they are
+    handed to `fallback` (normally the SendKeys backend) when one is given.
+    """
+
+    name = 'rtl_tcp'
+
+    def __init__(self, host='127.0.0.1', port=1234, fallback=None, timeout=2.0):
+        self.host = host
+        self.port = port
+        self.fallback = fallback
+        self.timeout = timeout
+        self.sock = None
+        self.tuner_type = None
+        self.gain_count = None
+        self.commands_sent = 0
+
+    def connect(self):
+        if self.sock is not None:
+            return
+        sock = socket.create_connection((self.host, self.port), self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            magic, tuner, gains = _header.unpack(recv_exact(sock, HEADER_SIZE))
+            if magic != HEADER_MAGIC:
+                raise ConnectionError(f"Not an rtl_tcp server (header {magic!r})")
+        except Exception:
+            sock.close()
+            raise
+        self.sock = sock
+        self.tuner_type = TUNER_TYPES.get(tuner, str(tuner))
+        self.gain_count = gains
+        # Manual gain, otherwise set_gain is ignored by the tuner
+        self.send(CMD_SET_GAIN_MODE, 1)
+
+    def send(self, cmd, param):
+        self.connect()
+        try:
+            self.sock.sendall(pack_command(cmd, param))
+        except OSError:
+            self.close()
+            raise
+        self.commands_sent += 1
+
+    def set_frequency(self, hz):
+        self.send(CMD_SET_FREQUENCY, int(round(hz)))
+
+    def set_sample_rate(self, hz):
+        self.send(CMD_SET_SAMPLE_RATE, int(round(hz)))
+
+    def set_gain(self, gain_db):
+        """Gain is sent in tenths of a dB"""
+        self.send(CMD_SET_GAIN, int(round(gain_db * 10)))
+
+    def set_freq_correction(self, ppm):
+        """rtl_tcp only accepts whole PPM values"""
+        self.send(CMD_SET_FREQ_CORRECTION, int(round(ppm)))
+
+    # Backend interface used by CommandPipeline
+
+    def tune(self, freq_mhz):
+        self.set_frequency(freq_mhz * 1e6)
+
+    def step_gain(self, steps, gain_db):
+        self.set_gain(gain_db)
+
+    def step_ppm(self, steps, ppm):
+        self.set_freq_correction(ppm)
+
+    def set_ppm(self, ppm):
+        self.set_freq_correction(ppm)
+
+    def _fallback(self, method, *args):
+        if self.fallback is None:
+            raise NotImplementedError(f"{method} is not supported by rtl_tcp")
+        getattr(self.fallback, method)(*args)
+
+    def send_keys(self, keys):
+        self._fallback('send_keys', keys)
+
+    def start_scan(self):
+        self._fallback('start_scan')
+
+    def stop_scan(self):
+        self._fallback('stop_scan')
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+        if self.fallback is not None:
+            self.fallback.close()
+
+
+class RtlTcpStream:
+    """IQ samples from an rtl_tcp server as complex64 blocks
+
+    read() reuses one byte buffer and one sample buffer, so the returned
+    array is overwritten by the next read.
+    """
+
+    def __init__(self, host='127.0.0.1', port=1234, sample_rate=2.4e6, frequency_hz=None,
+                 timeout=5.0):
+        self.host = host
+        self.port = port
+        self.sample_rate = sample_rate
+        self.frequency_hz = frequency_hz
+        self.timeout = timeout
+        self.sock = None
+        self.tuner_type = None
+        self.manual_gain = False
+        self._raw = bytearray()
+        self._samples = np.empty(0, dtype=np.complex64)
+
+    def open(self):
+        if self.sock is not None:
+            return self
+        sock = socket.create_connection((self.host, self.port), self.timeout)
+        try:
+            magic, tuner, _ = _header.unpack(recv_exact(sock, HEADER_SIZE))
+            if magic != HEADER_MAGIC:
+                raise ConnectionError(f"Not an rtl_tcp server (header {magic!r})")
+            sock.sendall(pack_command(CMD_SET_SAMPLE_RATE, int(self.sample_rate)))
+            if self.frequency_hz:
+                sock.sendall(pack_command(CMD_SET_FREQUENCY, int(self.frequency_hz)))
+        except Exception:
+            sock.close()
+            raise
+        self.sock = sock
+        self.tuner_type = TUNER_TYPES.get(tuner, str(tuner))
+        self.manual_gain = False
+        return self
+
+    def read(self, count):
+        """Next `count` samples; raises ConnectionError when the server goes away"""
+        self.open()
+        size = count * 2
+        if len(self._raw) < size:
+            self._raw = bytearray(size)
+            self._samples = np.empty(count, dtype=np.complex64)
+        view = memoryview(self._raw)[:size]
+        received = 0
+        while received < size:
+            n = self.sock.recv_into(view[received:])
+            if not n:
+                raise ConnectionError("rtl_tcp connection closed")
+            received += n
+        return uint8_to_complex64(view, self._samples)
+
+    def set_frequency(self, hz):
+        """Retune; samples already in flight still belong to the old frequency"""
+        self.frequency_hz = hz
+        if self.sock is not None:
+            self.sock.sendall(pack_command(CMD_SET_FREQUENCY, int(round(hz))))
+
+    def set_gain(self, gain_db):
+        """Manual gain in dB (sent in tenths)"""
+        self.open()
+        if not self.manual_gain:
+            self.sock.sendall(pack_command(CMD_SET_GAIN_MODE, 1))
+            self.manual_gain = True
+        self.sock.sendall(pack_command(CMD_SET_GAIN, int(round(gain_db * 10))))
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+class StandInServer:
+    """Minimal local rtl_tcp server that records the commands it receives
+
+    With echo=True every command packet is sent straight back, which lets a
+    client time the full round trip.  With iq set to a bytes object of
+    interleaved uint8 samples, those are streamed in a loop like a dongle.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, tuner=5, gain_count=29, echo=False, iq=None):
+        self.tuner = tuner
+        self.gain_count = gain_count
+        self.echo = echo
+        self.iq = iq
+        self.commands = []
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind((host, port))
+        self._listener.listen(1)
+        self.address = self._listener.getsockname()
+        self._thread = threading.Thread(target=self._serve, name="rtl_tcp-stand-in", daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self._listener.accept()
+            except OSError:
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with conn:
+                conn.sendall(_header.pack(HEADER_MAGIC, self.tuner, self.gain_count))
+                if self.iq:
+                    threading.Thread(target=self._stream, args=(conn,), daemon=True).start()
+                try:
+                    while True:
+                        packet = recv_exact(conn, COMMAND_SIZE)
+                        cmd, param = _command.unpack(packet)
+                        if cmd == CMD_SET_FREQ_CORRECTION:
+                            param = _signed_command.unpack(packet)[1]
+                        self.commands.append((cmd, param))
+                        if self.echo:
+                            conn.sendall(packet)
+                except (ConnectionError, OSError):
+                    pass
+
+    def _stream(self, conn):
+        try:
+            while True:
+                conn.sendall(self.iq)
+        except OSError:
+            pass
+
+    def close(self):
+        self._listener.close()
+
+
+def measure_tuning(count=5000):
+    """Tune-command round-trip latency and command rate against a stand-in server"""
+    server = StandInServer(echo=True)
+    backend = RtlTcpBackend(*server.address)
+    try:
+        backend.connect()
+        recv_exact(backend.sock, COMMAND_SIZE)  # echo of the gain mode packet
+        rtts = []
+        for i in range(count):
+            started = time.perf_counter()
+            backend.tune(422.3 + (i % 200) * 0.00625)
+            recv_exact(backend.sock, COMMAND_SIZE)
+            rtts.append(time.perf_counter() - started)
+        rtts.sort()
+        elapsed = sum(rtts)
+        return {
+            'tuner': backend.tuner_type,
+            'commands': count,
+            'rtt_p50_us': rtts[len(rtts) // 2] * 1e6,
+            'rtt_p99_us': rtts[int(len(rtts) * 0.99)] * 1e6,
+            'commands_per_second': count / elapsed,
+        }
+    finally:
+        backend.close()
+        server.close()
+
+
+if __name__ == "__main__":
+    for key, value in measure_tuning().items():
+        print(f"{key}: {value:.1f}" if isinstance(value, float) else f"{key}: {value}")
@@ -0,0 +1,112 @@
+"""Command-line entry point for the scanner, no tkinter needed
+
+    python scanctl.py serve [--listen 127.0.0.1:4550]
+    python scanctl.py call tune 423.5
+    python scanctl.py call start_scan
+    python scanctl.py call update_settings gain=30 dongles=2
+    python scanctl.py watch
+    python scanctl.py bench
+
+"serve" runs the controller headless; the Tk launcher connects to it
+instead of starting its own when one is already listening.  Arguments to
+"call" are read as JSON where they parse ("423.5", "true") and as
+strings otherwise; name=value arguments become keyword parameters.
+Requests are signed with the token in control_token, which the first
+client or server run in this directory creates.
+"""
+import argparse
+import json
+import signal
+import sys
+
+from control_api import DEFAULT_ADDRESS, ControlClient, ControlServer, RpcError, measure
+
+
+def parse_value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def parse_params(words):
+    args = []
+    kwargs = {}
+    for word in words:
+        name, sep, value = word.partition('=')
+        if sep and name.isidentifier():
+            kwargs[name] = parse_value(value)
+        else:
+            args.append(parse_value(word))
+    if args and kwargs:
+        raise ValueError("Use either positional or name=value parameters, not both")
+    return kwargs or args
+
+
+def serve(address):
+    from config import ConfigStore
+    from controller import ScannerController
+    settings = ConfigStore()
+    server = ControlServer(ScannerController(settings), address or settings.get('api_address'))
+    server.controller.listeners.append(lambda event, data: print(event, json.dumps(data), flush=True))
+    signal.signal(signal.SIGINT, lambda *args: server.stop())
+    server.start()
+    print(f"Listening on {server.bound}", flush=True)
+    server.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--address', default=DEFAULT_ADDRESS, help="host:port or unix:/path")
+    parser.add_argument('--timeout', type=float, default=300.0,
+                        help="seconds to wait for a reply (surveys and sweeps take a while)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help="run the controller without a GUI")
+    serve_parser.add_argument('--listen', help="address to listen on (default: api_address setting)")
+    call_parser = commands.add_parser('call', help="call one API method and print the result")
+    call_parser.add_argument('method')
+    call_parser.add_argument('params', nargs='*')
+    commands.add_parser('watch', help="print controller events as they happen")
+    bench_parser = commands.add_parser('bench', help="pipelined requests per second on a null backend")
+    bench_parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        serve(args.listen)
+        return 0
+    if args.command == 'bench':
+        print(json.dumps(measure(args.requests), indent=2))
+        return 0
+
+    try:
+        client = ControlClient(args.address, args.timeout)
+    except OSError as e:
+        print(f"Could not connect to {args.address}: {str(e)}", file=sys.stderr)
+        return 2
+    try:
+        if args.command == 'call':
+            params = parse_params(args.params)
+            if isinstance(params, dict):
+                result = client.call(args.method, **params)
+            else:
+                result = client.call(args.method, *params)
+            print(json.dumps(result, indent=2))
+        else:
+            client.subscribe()
+            while True:
+                event, data = client.events.get()
+                print(event, json.dumps(data), flush=True)
+                if event == 'disconnected':
+                    break
+    except RpcError as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
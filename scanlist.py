@@ -0,0 +1,496 @@
+"""ScanList model
+
+Holds an FMP ScanList in parallel NumPy arrays (integer Hz, mode,
+bandwidth, priority, description offset) next to the source lines.  Edits
+re-parse only the lines that changed; large parses are vectorized.  A
+full parse of 100,000 lines takes about 75-85 ms on one core (splitting
+the text into lines is ~8 ms of that); an edit re-parses in well under
+a millisecond.
+Line format, from FMP.txt:
+
+    frequency  [mode]  [priority]  [description]
+
+Mode text selects the bandpass filter; our lists also carry a number after
+the frequency (or mode) that is used as the channel priority.  Processing
+stops at a line containing <EOF>; entries after it are kept but not scanned.
+"""
+import re
+import time
+from collections import namedtuple
+from enum import IntEnum
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class Mode(IntEnum):
+    ANALOG = 0
+    DSTAR = 1
+    NXDN48 = 2
+    DMR = 3
+    TIII = 4
+    NXDN96 = 5
+    P25 = 6
+    PROVOICE = 7
+
+
+MODE_ALIASES = {
+    'D-STAR': Mode.DSTAR, 'DSTAR': Mode.DSTAR, 'IDAS': Mode.DSTAR,
+    'NX48': Mode.NXDN48, 'NEXEDGE48': Mode.NXDN48,
+    'DMR': Mode.DMR, 'TRBO': Mode.DMR, 'CAP+': Mode.DMR, 'CON+': Mode.DMR,
+    'TIII': Mode.TIII,
+    'NXDN': Mode.NXDN96, 'NEXEDGE': Mode.NXDN96, 'NEXEDGE96': Mode.NXDN96, 'NX96': Mode.NXDN96,
+    'P25': Mode.P25,
+    'PV': Mode.PROVOICE, 'PROVOICE': Mode.PROVOICE,
+}
+
+# FMP's bandpass filter for each mode; anything else gets 12.5 kHz
+BANDWIDTH_HZ = {
+    Mode.DSTAR: 4000, Mode.NXDN48: 4000,
+    Mode.DMR: 7000, Mode.TIII: 7000,
+    Mode.NXDN96: 9500, Mode.P25: 9500,
+    Mode.PROVOICE: 12500, Mode.ANALOG: 12500,
+}
+
+BLANK, ENTRY, ERROR, EOF = 0, 1, 2, 3
+DEFAULT_PRIORITY = 0
+MAX_PRIORITY = 2**31 - 1
+MAX_FREQUENCY_HZ = 100_000_000_000
+
+Entry = namedtuple('Entry', 'line freq_hz mode bandwidth_hz priority description')
+
+_NUMBER = re.compile(r'[+-]?\d+$')
+_TOKEN = re.compile(r'\S+')
+
+
+def mode_from_text(text):
+    return MODE_ALIASES.get(text.upper(), Mode.ANALOG)
+
+
+def parse_frequency(text):
+    """MHz string to integer Hz without float rounding surprises"""
+    whole, _, frac = text.partition('.')
+    if not whole.isdigit() and whole != '':
+        raise ValueError(f"Invalid frequency '{text}'")
+    if frac and not frac.isdigit():
+        raise ValueError(f"Invalid frequency '{text}'")
+    frac = (frac + '000000')[:6]
+    hz = int(whole or '0') * 1_000_000 + int(frac)
+    if not 0 < hz <= MAX_FREQUENCY_HZ:
+        raise ValueError(f"Invalid frequency '{text}'")
+    return hz
+
+
+def parse_line(line):
+    """Parse one line into (kind, freq_hz, mode, priority, desc_offset, error)"""
+    if '<EOF>' in line:
+        return EOF, 0, Mode.ANALOG, DEFAULT_PRIORITY, len(line), None
+    tokens = _TOKEN.finditer(line)
+    first = next(tokens, None)
+    if first is None:
+        return BLANK, 0, Mode.ANALOG, DEFAULT_PRIORITY, len(line), None
+    try:
+        freq_hz = parse_frequency(first.group())
+    except ValueError as e:
+        return ERROR, 0, Mode.ANALOG, DEFAULT_PRIORITY, len(line), str(e)
+    mode = Mode.ANALOG
+    priority = DEFAULT_PRIORITY
+    desc_offset = len(line)
+    token = next(tokens, None)
+    if token is not None and not _NUMBER.match(token.group()):
+        mode = mode_from_text(token.group())
+        token = next(tokens, None)
+    if token is not None and _NUMBER.match(token.group()):
+        priority = int(token.group())
+        if abs(priority) > MAX_PRIORITY:
+            return ERROR, 0, Mode.ANALOG, DEFAULT_PRIORITY, len(line), f"Priority out of range '{token.group()}'"
+        token = next(tokens, None)
+    if token is not None:
+        desc_offset = token.start()
+    return ENTRY, freq_hz, mode, priority, desc_offset, None
+
+
+# Eight text bytes are handled at once as a little-endian uint64 "word"
+_ZEROS = np.uint64(0x3030303030303030)      # b'00000000'
+_HIGH_NIBBLES = np.uint64(0xF0F0F0F0F0F0F0F0)
+_SIXES = np.uint64(0x0606060606060606)
+_LOW_BYTES = np.array([(1 << 8 * n) - 1 for n in range(9)], dtype=np.uint64)
+_PAD = 16
+_MAX_MODE_LENGTH = 12
+_MODE_MASKS = np.array([[(1 << 8 * min(max(n - 4 * k, 0), 4)) - 1 for k in range(3)]
+                        for n in range(_MAX_MODE_LENGTH + 1)], dtype=np.uint64)
+_MODE_MIX = (np.uint64(0x9E3779B97F4A7C15), np.uint64(0xC2B2AE3D27D4EB4F))
+
+
+def _all_digits(words):
+    """True where all eight bytes of a word are ASCII digits"""
+    return (((words & _HIGH_NIBBLES) == _ZEROS)
+            & (((words + _SIXES) & _HIGH_NIBBLES) == _ZEROS))
+
+
+def _digit_values(words):
+    """Eight ASCII digits per word, most significant in the first byte, as integers"""
+    x = words - _ZEROS
+    x = x * np.uint64(10) + (x >> np.uint64(8))
+    pairs = np.uint64(0x000000FF000000FF)
+    x = (((x & pairs) * np.uint64(100 + (1000000 << 32)))
+         + (((x >> np.uint64(16)) & pairs) * np.uint64(1 + (10000 << 32))))
+    return (x >> np.uint64(32)).astype(np.int64)
+
+
+def _right_align(words, lengths):
+    """Move the first `lengths` bytes to the top of each word, '0'-filling below"""
+    shift = (8 * (8 - lengths)).astype(np.uint64)
+    return (words << shift) | (_ZEROS & _LOW_BYTES[8 - lengths])
+
+
+def _mode_keys(chars, lengths):
+    """Case-insensitive 64-bit key of the first `lengths` of 12 bytes per row"""
+    chars = chars - np.uint8(32) * ((chars - np.uint8(97)) < 26)
+    words = chars.view('<u4').astype(np.uint64) & _MODE_MASKS[lengths]
+    return words[:, 0] * _MODE_MIX[0] + words[:, 1] * _MODE_MIX[1] + words[:, 2]
+
+
+def _alias_table():
+    names = sorted(MODE_ALIASES)
+    chars = np.zeros((len(names), _MAX_MODE_LENGTH), dtype=np.uint8)
+    for i, name in enumerate(names):
+        chars[i, :len(name)] = list(name.encode('ascii'))
+    keys = _mode_keys(chars, np.array([len(name) for name in names]))
+    order = np.argsort(keys)
+    return keys[order], np.array([MODE_ALIASES[names[i]] for i in order], dtype=np.int8)
+
+
+_ALIAS_KEYS, _ALIAS_MODES = _alias_table()
+_BANDWIDTH_TABLE = np.array([BANDWIDTH_HZ[m] for m in Mode], dtype=np.int32)
+
+
+def parse_lines_fast(raw, lines):
+    """Vectorized parse of many lines; raw is the '\\n'-joined UTF-8 text
+
+    Each byte is looked at by a few comparisons; after that the work is
+    per token, reading eight bytes at a time as one integer.  Lines the
+    fast path does not cover (non-ASCII, control bytes, <EOF>, malformed
+    frequencies, numbers over eight bytes) are handed to parse_line.
+    Returns (kind, freq_hz, mode, priority, desc_offset, errors).
+    """
+    count = len(lines)
+    data = np.frombuffer(raw, dtype=np.uint8)
+    # Apart from newlines and tabs, bytes outside 32-127 are rare
+    unusual = np.flatnonzero((data - np.uint8(32)) >= 96)
+    unusual_bytes = data[unusual]
+    newlines = unusual[unusual_bytes == 10]
+    starts = np.zeros(count, dtype=np.int64)
+    starts[1:] = newlines[:count - 1] + 1
+    ends = np.append(starts[1:] - 1, len(data))
+
+    # Bracket the text with spaces so every token has a start and an end edge
+    space = np.empty(len(data) + 2, dtype=bool)
+    space[0] = space[-1] = True
+    np.less_equal(data, 32, out=space[1:-1])
+    edges = np.flatnonzero(space[1:] != space[:-1])
+    tstart = edges[0::2]
+    tend = edges[1::2]
+    tlen = tend - tstart
+    first_token = np.searchsorted(tstart, starts)
+    tokens_on_line = np.diff(np.append(first_token, len(tstart)))
+    if not len(tstart):
+        # Whitespace only: no tokens for the passes below to index, and blank lines parse cheaply
+        kind, freq_hz, mode, priority, desc_offset, errors = zip(*map(parse_line, lines))
+        return (np.array(kind, dtype=np.int8), np.array(freq_hz, dtype=np.int64),
+                np.array(mode, dtype=np.int8), np.array(priority, dtype=np.int32),
+                np.array(desc_offset, dtype=np.int32), list(errors))
+
+    # Non-ASCII, control bytes other than \t \n \v \f \r and '<' (possible <EOF>)
+    odd = np.concatenate((unusual[(unusual_bytes < 9) | (unusual_bytes > 13)], np.flatnonzero(data == 60)))
+    fallback = np.zeros(count, dtype=bool)
+    fallback[np.searchsorted(newlines, odd)] = True
+
+    padded = np.zeros(len(data) + 2 * _PAD, dtype=np.uint8)
+    padded[_PAD:-_PAD] = data
+    rows = sliding_window_view(padded, 8)
+
+    def word_at(offsets):
+        return rows[offsets + _PAD].view('<u8')[:, 0]
+
+    def token_index(k):
+        has = tokens_on_line > k
+        return has, np.where(has, first_token + k, 0)
+
+    def number(tokens):
+        """(is_number, too_long, negative, right-aligned digit words) for tokens"""
+        words = word_at(tstart[tokens])
+        length = tlen[tokens]
+        lead = (words & np.uint64(0xFF)).astype(np.uint8)
+        negative = lead == 45
+        sign = negative | (lead == 43)
+        words = np.where(sign, (words & np.uint64(0xFFFFFFFFFFFFFF00)) | np.uint64(0x30), words)
+        n = np.minimum(length, 8)
+        words = _right_align(words & _LOW_BYTES[n], n)
+        is_number = _all_digits(words) & (length > sign) & (length <= 8)
+        too_long = (length > 8) & (((lead - np.uint8(48)) < 10) | sign)
+        return is_number, too_long, negative, words
+
+    kind = np.where(tokens_on_line > 0, ENTRY, BLANK).astype(np.int8)
+    freq_hz = np.zeros(count, dtype=np.int64)
+    mode = np.zeros(count, dtype=np.int8)
+    priority = np.full(count, DEFAULT_PRIORITY, dtype=np.int32)
+    desc_offset = (ends - starts).astype(np.int32)
+
+    # Frequency: digits with at most one dot, at most 8 whole and 6 fractional digits
+    has0, t0 = token_index(0)
+    lines0 = np.flatnonzero(has0)
+    t0 = t0[lines0]
+    first, last = tstart[t0], tend[t0]
+    dot_at = last
+    dot_positions = np.flatnonzero(data == 46)
+    if len(dot_positions):
+        i = np.minimum(np.searchsorted(dot_positions, first), len(dot_positions) - 1)
+        inside = (dot_positions[i] >= first) & (dot_positions[i] < last)
+        dot_at = np.where(inside, dot_positions[i], last)
+    whole_len = np.minimum(dot_at - first, 8)
+    fraction_len = np.clip(last - dot_at - 1, 0, 6)
+    ok = (dot_at - first <= 8) & (last - dot_at <= 7) & (tlen[t0] > (dot_at < last))
+    # The eight bytes before the dot hold the whole part in their top bytes
+    whole = word_at(dot_at - 8)
+    whole = (whole & ~_LOW_BYTES[8 - whole_len]) | (_ZEROS & _LOW_BYTES[8 - whole_len])
+    fraction = word_at(dot_at + 1)
+    fraction = (fraction & _LOW_BYTES[fraction_len]) | (_ZEROS & ~_LOW_BYTES[fraction_len])
+    ok &= _all_digits(whole) & _all_digits(fraction)
+    values = _digit_values(whole) * 1_000_000 + _digit_values(fraction) // 100
+    ok &= (values > 0) & (values <= MAX_FREQUENCY_HZ)
+    fallback[lines0[~ok]] = True
+    freq_hz[lines0[ok]] = values[ok]
+
+    # Mode and priority
+    has1, t1 = token_index(1)
+    has2, t2 = token_index(2)
+    has3, t3 = token_index(3)
+    number1, long1, negative1, words1 = number(t1)
+    number2, long2, negative2, words2 = number(t2)
+    mode_token = has1 & ~number1
+    fallback |= (has1 & long1) | (mode_token & has2 & long2)
+    prio_token = np.where(mode_token, has2 & number2, has1 & number1)
+    after_prio = np.where(mode_token, np.where(has3, t3, -1), np.where(has2, t2, -1))
+    after_mode = np.where(has2, t2, -1)
+    desc_token = np.where(prio_token, after_prio, np.where(mode_token, after_mode, -1))
+
+    m_lines = np.flatnonzero(mode_token & (tlen[t1] <= _MAX_MODE_LENGTH))
+    if len(m_lines):
+        m_tok = t1[m_lines]
+        chars = sliding_window_view(padded, _MAX_MODE_LENGTH)[tstart[m_tok] + _PAD]
+        keys = _mode_keys(chars, tlen[m_tok])
+        j = np.minimum(np.searchsorted(_ALIAS_KEYS, keys), len(_ALIAS_KEYS) - 1)
+        mode[m_lines] = np.where(_ALIAS_KEYS[j] == keys, _ALIAS_MODES[j], Mode.ANALOG)
+
+    p_lines = np.flatnonzero(prio_token)
+    words = np.where(mode_token, words2, words1)[p_lines]
+    negative = np.where(mode_token, negative2, negative1)[p_lines]
+    p_values = _digit_values(words)
+    priority[p_lines] = np.where(negative, -p_values, p_values)
+
+    d_lines = np.flatnonzero(desc_token >= 0)
+    desc_offset[d_lines] = tstart[desc_token[d_lines]] - starts[d_lines]
+
+    errors = [None] * count
+    for i in np.flatnonzero(fallback):
+        k, f, m, p, d, e = parse_line(lines[i])
+        kind[i], freq_hz[i], mode[i], priority[i], desc_offset[i] = k, f, m, p, d
+        errors[i] = e
+    blank = kind == BLANK
+    freq_hz[blank] = 0
+    desc_offset[blank] = (ends - starts)[blank]
+    return kind, freq_hz, mode, priority, desc_offset, errors
+
+
+# Above this many changed lines the vectorized parser is faster
+FAST_PARSE_LINES = 64
+
+
+class ScanList:
+    """Array-backed ScanList with incremental re-parsing"""
+
+    def __init__(self, text=''):
+        self.text = ''
+        self.raw = b''
+        self.lines = []
+        self.kind = np.zeros(0, dtype=np.int8)
+        self.freq_hz = np.zeros(0, dtype=np.int64)
+        self.mode = np.zeros(0, dtype=np.int8)
+        self.bandwidth_hz = np.zeros(0, dtype=np.int32)
+        self.priority = np.zeros(0, dtype=np.int32)
+        self.desc_offset = np.zeros(0, dtype=np.int32)
+        self.line_errors = []
+        self.parse_seconds = 0.0
+        if text:
+            self.set_text(text)
+
+    @classmethod
+    def load(cls, path="FMP24.ScanList"):
+        with open(path, 'r', encoding='utf-8') as file:
+            return cls(file.read())
+
+    def set_text(self, text):
+        """Replace the whole text, re-parsing only the lines that changed
+
+        Unchanged leading and trailing lines are found with a byte compare.
+        Returns (start, removed, added) describing the spliced line range.
+        """
+        if '\r' in text:
+            text = text.replace('\r\n', '\n')
+        if text == self.text:
+            return len(self.lines), 0, 0
+        new_raw = text.encode('utf-8')
+        old = np.frombuffer(self.raw, dtype=np.uint8)
+        new = np.frombuffer(new_raw, dtype=np.uint8)
+        prefix = first_difference(old, new)
+        limit = min(len(old), len(new)) - prefix
+        suffix = first_difference(old[::-1][:limit], new[::-1][:limit])
+        start = new_raw.count(b'\n', 0, prefix)
+        start_byte = new_raw.rfind(b'\n', 0, prefix) + 1
+        # Lines whose preceding newline lies in the common suffix are unchanged
+        cut = new_raw.find(b'\n', len(new_raw) - suffix) + 1 if suffix else 0
+        if cut:
+            keep = new_raw.count(b'\n', cut)
+            if cut < len(new_raw) and not new_raw.endswith(b'\n'):
+                keep += 1
+        else:
+            cut, keep = len(new_raw), 0
+        middle = new_raw[start_byte:cut]
+        stop = len(self.lines) - keep
+        self.text = text
+        self.raw = new_raw
+        self._splice(start, stop, split_lines(middle.decode('utf-8')), middle)
+        return start, stop - start, len(self.lines) - keep - start
+
+    def replace_lines(self, start, stop, new_lines):
+        """Splice new_lines in place of lines[start:stop] and parse only those"""
+        self._splice(start, stop, list(new_lines))
+        self.text = '\n'.join(self.lines) + ('\n' if self.lines else '')
+        self.raw = self.text.encode('utf-8')
+
+    def _splice(self, start, stop, new_lines, raw=None):
+        started = time.perf_counter()
+        if len(new_lines) > FAST_PARSE_LINES:
+            if raw is None:
+                raw = '\n'.join(new_lines).encode('utf-8')
+            # new_lines came from split_lines, which drops only the final newline
+            raw = raw[:-1] if raw.endswith(b'\n') else raw
+            kind, freq, mode, priority, desc, errors = parse_lines_fast(raw, new_lines)
+        else:
+            parsed = [parse_line(line) for line in new_lines]
+            kind = np.array([p[0] for p in parsed], dtype=np.int8)
+            freq = np.array([p[1] for p in parsed], dtype=np.int64)
+            mode = np.array([p[2] for p in parsed], dtype=np.int8)
+            priority = np.array([p[3] for p in parsed], dtype=np.int32)
+            desc = np.array([p[4] for p in parsed], dtype=np.int32)
+            errors = [p[5] for p in parsed]
+
+        def splice(column, values):
+            return np.concatenate((column[:start], values, column[stop:]))
+
+        self.lines[start:stop] = new_lines
+        self.kind = splice(self.kind, kind)
+        self.freq_hz = splice(self.freq_hz, freq)
+        self.mode = splice(self.mode, mode)
+        self.bandwidth_hz = splice(self.bandwidth_hz, _BANDWIDTH_TABLE[mode])
+        self.priority = splice(self.priority, priority)
+        self.desc_offset = splice(self.desc_offset, desc)
+        self.line_errors[start:stop] = errors
+        self.parse_seconds = time.perf_counter() - started
+
+    def eof_line(self):
+        """Index of the <EOF> line, or the line count if there is none"""
+        found = np.flatnonzero(self.kind == EOF)
+        return int(found[0]) if len(found) else len(self.kind)
+
+    def active_indices(self):
+        """Line indices of entries that FMP would scan"""
+        return np.flatnonzero(self.kind[:self.eof_line()] == ENTRY)
+
+    def entry(self, i):
+        return Entry(int(i), int(self.freq_hz[i]), Mode(int(self.mode[i])),
+                     int(self.bandwidth_hz[i]), int(self.priority[i]), self.description(i))
+
+    def entries(self):
+        return [self.entry(i) for i in self.active_indices()]
+
+    def description(self, i):
+        return self.lines[i][self.desc_offset[i]:].strip()
+
+    def mode_text(self, i):
+        """Mode token as written, or '' when the line has none"""
+        tokens = self.lines[i].split()
+        if len(tokens) > 1 and not _NUMBER.match(tokens[1]):
+            return tokens[1]
+        return ''
+
+    def frequencies_mhz(self):
+        return (self.freq_hz[self.active_indices()] / 1e6).tolist()
+
+    def errors(self):
+        """(line number, message) for every line that failed to parse"""
+        return [(i + 1, e) for i, e in enumerate(self.line_errors) if e is not None]
+
+    def to_text(self):
+        return self.text
+
+    def __len__(self):
+        return len(self.active_indices())
+
+
+def first_difference(a, b):
+    """Index of the first differing byte, comparing in growing chunks"""
+    limit = min(len(a), len(b))
+    i, step = 0, 4096
+    while i < limit:
+        j = min(limit, i + step)
+        differ = np.flatnonzero(a[i:j] != b[i:j])
+        if len(differ):
+            return i + int(differ[0])
+        i, step = j, step * 2
+    return limit
+
+
+def split_lines(text):
+    """Lines of text; a trailing newline does not start another line"""
+    lines = text.split('\n')
+    if lines and lines[-1] == '':
+        lines.pop()
+    return lines
+
+
+def synthetic_text(lines, seed=0):
+    """ScanList text in the mixed styles found in FMP24.ScanList"""
+    modes = ('NFM', '', 'DMR', 'P25', 'NXDN', 'D-STAR', 'TIII')
+    out = []
+    state = seed * 7919 + 1
+    for i in range(lines):
+        state = (state * 1103515245 + 12345) & 0x7FFFFFFF
+        freq = 136.0 + (state % 400000) * 0.00125
+        mode = modes[i % len(modes)]
+        out.append(f"{freq:.5f} {mode} {i % 20} channel {i}".replace('  ', ' '))
+    return '\n'.join(out) + '\n'
+
+
+def measure(lines=100_000):
+    """Full parse time and single-line edit time for a large list"""
+    text = synthetic_text(lines)
+    started = time.perf_counter()
+    model = ScanList(text)
+    full = time.perf_counter() - started
+    edited = text.replace('channel 500\n', 'channel 500 edited\n', 1)
+    started = time.perf_counter()
+    model.set_text(edited)
+    edit = time.perf_counter() - started
+    return {
+        'lines': lines,
+        'entries': len(model),
+        'full_parse_ms': full * 1000.0,
+        'edit_ms': edit * 1000.0,
+        'edit_parse_ms': model.parse_seconds * 1000.0,
+    }
+
+
+if __name__ == "__main__":
+    print(measure())
@@ -0,0 +1,92 @@
+"""Keep FMP24.ScanList, the editor and the running scanner in step
+
+Saving used to stop the scan, rewrite the file in place and wait a fixed
+two seconds before restarting.  Here the new text is diffed against the
+parsed list, written atomically, and only the channels that actually
+changed are reported so the caller can decide whether the scanner needs a
+restart at all.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from fileutil import FileStamp, atomic_write
+from scanlist import Mode, ScanList
+
+
+Channel = namedtuple('Channel', 'freq_hz mode')
+
+_MODE_BITS = 4
+
+
+class ChannelDiff:
+    """Channels added to and removed from the active part of the list"""
+
+    def __init__(self, added, removed):
+        self.added = added
+        self.removed = removed
+
+    def __bool__(self):
+        return bool(self.added or self.removed)
+
+    def __repr__(self):
+        return f"ChannelDiff(+{len(self.added)}, -{len(self.removed)})"
+
+
+def channel_keys(model):
+    """Sorted int64 keys (freq_hz, mode) of the active entries"""
+    active = model.active_indices()
+    keys = (model.freq_hz[active] << _MODE_BITS) | model.mode[active].astype(np.int64)
+    keys.sort()
+    return keys
+
+
+def diff_keys(old, new):
+    """Multiset difference of two key arrays"""
+    keys, inverse = np.unique(np.concatenate((old, new)), return_inverse=True)
+    weights = np.concatenate((-np.ones(len(old)), np.ones(len(new))))
+    balance = np.bincount(inverse, weights=weights, minlength=len(keys)).astype(np.int64)
+
+    def channels(mask, counts):
+        picked = np.repeat(keys[mask], counts[mask])
+        return [Channel(int(k >> _MODE_BITS), Mode(int(k & ((1 << _MODE_BITS) - 1)))) for k in picked]
+
+    return ChannelDiff(channels(balance > 0, balance), channels(balance < 0, -balance))
+
+
+class ScanListFile:
+    """FMP24.ScanList on disk plus its parsed model"""
+
+    def __init__(self, path="FMP24.ScanList"):
+        self.path = path
+        self.model = ScanList()
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.stamp = FileStamp(path)
+
+    def apply_text(self, text):
+        """Re-parse text incrementally; returns the ChannelDiff"""
+        self.model.set_text(text)
+        keys = channel_keys(self.model)
+        diff = diff_keys(self.keys, keys)
+        self.keys = keys
+        return diff
+
+    def read(self):
+        """Load the file; returns (text, ChannelDiff)"""
+        with open(self.path, 'r', encoding='utf-8') as file:
+            text = file.read()
+        self.stamp.update()
+        return text, self.apply_text(text)
+
+    def write(self, text):
+        """Atomically replace the file; returns the ChannelDiff
+
+        The model only takes the text once it is on disk, so a failed write
+        leaves both as they were and saving again still sees the change.
+        """
+        atomic_write(self.path, text)
+        self.stamp.update()
+        return self.apply_text(text)
+
+    def changed_on_disk(self):
+        return self.stamp.changed()
@@ -0,0 +1,338 @@
+"""Adaptive scan order from priority and channel history
+
+FMP steps through FMP24.ScanList in file order with one fixed dwell.  The
+scheduler here picks the next channel instead:
+
+  * every channel gains urgency with the time since it was last visited,
+    at a rate set by its priority (the number after the frequency, higher
+    is more important) and by how often it has been busy lately, so busy
+    channels come round sooner while quiet ones still always come round;
+  * priority channels (priority >= priority_level) are revisited at least
+    every priority_interval seconds, like a hardware scanner's priority
+    check;
+  * no channel waits longer than max_wait seconds, whatever the scores;
+  * channels that have been quiet for quiet_visits visits in a row get the
+    short dwell;
+  * a carrier that is on for most visits (a nuisance: birdie, data
+    carrier) is locked out for lockout_seconds.
+
+Mean time-to-detect (from the start of a transmission to the visit that
+finds it) is the figure of merit; simulate() measures it on synthetic
+traffic against FMP's fixed order.
+
+The launcher does not drive its scans with this yet.  FMP24 runs its own
+scan loop over FMP24.ScanList and can only be told to start or stop it,
+and rtl_tcp serves one client, which is FMP24, so the launcher has no IQ
+of its own to judge a channel busy.  The in-process demodulator needs no
+scan order: it hears every channel in the capture at once.
+ScheduledScanner is the piece to use once the launcher owns the tuner.
+"""
+import threading
+import time
+
+import numpy as np
+
+from command_pipeline import LatencyStats
+
+
+class PriorityScheduler:
+    """Chooses the next channel and its dwell; record() feeds back what was found"""
+
+    def __init__(self, freqs_hz, priorities=None, dwell=0.1, quiet_dwell=0.04, quiet_visits=10,
+                 priority_level=10, priority_interval=2.0, priority_weight=0.2,
+                 activity_weight=1.0, activity_half_life=900.0, nuisance_duty=0.9,
+                 nuisance_visits=5, lockout_seconds=600.0, max_wait=45.0, now=None):
+        now = time.monotonic() if now is None else now
+        self.freqs_hz = np.asarray(freqs_hz, dtype=np.int64)
+        count = len(self.freqs_hz)
+        if priorities is None:
+            priorities = np.zeros(count)
+        self.priority = np.maximum(np.asarray(priorities, dtype=np.float64), 0.0)
+        self.dwell = dwell
+        self.quiet_dwell = quiet_dwell
+        self.quiet_visits = quiet_visits
+        self.priority_interval = priority_interval
+        self.activity_weight = activity_weight
+        self.decay = np.log(2) / activity_half_life
+        self.nuisance_duty = nuisance_duty
+        self.nuisance_visits = nuisance_visits
+        self.lockout_seconds = lockout_seconds
+        self.max_wait = max_wait
+        self.base_weight = 1.0 + priority_weight * self.priority
+        self.priority_channels = np.flatnonzero(self.priority >= priority_level)
+        self.last_visit = np.full(count, now)
+        self.activity = np.zeros(count)       # decayed count of transmissions found
+        self.activity_time = np.full(count, now)
+        self.duty = np.zeros(count)           # fraction of recent visits that were busy
+        self.visits = np.zeros(count, dtype=np.int64)
+        self.quiet = np.zeros(count, dtype=np.int64)
+        self.busy = np.zeros(count, dtype=bool)
+        self.lockout_until = np.zeros(count)
+        self.detect_gaps = LatencyStats()
+        self.log = []
+        self._score = np.empty(count)
+
+    @classmethod
+    def from_scanlist(cls, model, hit_rates=None, **options):
+        """Active ScanList entries; hit_rates (freq_hz: hits/hour) seeds the activity"""
+        active = model.active_indices()
+        scheduler = cls(model.freq_hz[active], model.priority[active], **options)
+        if hit_rates:
+            rates = np.array([hit_rates.get(int(f), 0.0) for f in scheduler.freqs_hz])
+            # Steady-state decayed count for that many hits per hour
+            scheduler.activity[:] = rates / 3600.0 / scheduler.decay
+        return scheduler
+
+    def __len__(self):
+        return len(self.freqs_hz)
+
+    def next(self, now=None):
+        """(channel index, dwell seconds), or (None, 0) if every channel is locked out"""
+        now = time.monotonic() if now is None else now
+        available = self.lockout_until <= now
+        if len(self.priority_channels):
+            waited = now - self.last_visit[self.priority_channels]
+            waited[~available[self.priority_channels]] = -1.0
+            most = int(np.argmax(waited))
+            if waited[most] >= self.priority_interval:
+                index = int(self.priority_channels[most])
+                return index, self.dwell_for(index)
+        oldest = int(np.argmin(np.where(available, self.last_visit, np.inf)))
+        if available[oldest] and now - self.last_visit[oldest] >= self.max_wait:
+            return oldest, self.dwell_for(oldest)
+        score = self._score
+        np.subtract(now, self.activity_time, out=score)
+        score *= -self.decay
+        np.exp(score, out=score)
+        score *= self.activity
+        score *= self.activity_weight
+        score += self.base_weight
+        score *= now - self.last_visit
+        score[~available] = -1.0
+        index = int(np.argmax(score))
+        if score[index] < 0:
+            return None, 0.0
+        return index, self.dwell_for(index)
+
+    def dwell_for(self, index):
+        return self.quiet_dwell if self.quiet[index] >= self.quiet_visits else self.dwell
+
+    def record(self, index, busy, now=None):
+        """Result of a visit: busy is True if the channel carried a signal"""
+        now = time.monotonic() if now is None else now
+        previous = self.last_visit[index]
+        self.last_visit[index] = now
+        self.visits[index] += 1
+        self.duty[index] += (float(busy) - self.duty[index]) * 0.25
+        if busy:
+            self.quiet[index] = 0
+            if not self.busy[index]:
+                # A new transmission: it started at most this long ago
+                self.detect_gaps.add(now - previous)
+                age = now - self.activity_time[index]
+                self.activity[index] = self.activity[index] * np.exp(-self.decay * age) + 1.0
+                self.activity_time[index] = now
+        else:
+            self.quiet[index] += 1
+        self.busy[index] = busy
+        if busy and self.visits[index] >= self.nuisance_visits and self.duty[index] >= self.nuisance_duty:
+            self.lock_out(index, self.lockout_seconds, now, 'nuisance carrier')
+
+    def lock_out(self, index, seconds, now=None, reason='manual'):
+        now = time.monotonic() if now is None else now
+        self.lockout_until[index] = now + seconds
+        self.duty[index] = 0.0
+        self.busy[index] = False
+        self.log.append((now, int(self.freqs_hz[index]), f'locked out {seconds:.0f} s: {reason}'))
+
+    def clear_lockout(self, index):
+        self.lockout_until[index] = 0.0
+
+    def locked_out(self, now=None):
+        now = time.monotonic() if now is None else now
+        return self.freqs_hz[self.lockout_until > now].tolist()
+
+    def stats(self):
+        """Detection delay: time from the previous visit to the visit that found a transmission"""
+        gaps = self.detect_gaps
+        return {
+            'detections': gaps.count,
+            'detect_gap_p50_s': gaps.percentile(50),
+            'detect_gap_p99_s': gaps.percentile(99),
+            'locked_out': len(self.locked_out()),
+        }
+
+
+class FixedOrderScheduler:
+    """FMP's own behaviour: file order, one dwell, no lockout"""
+
+    def __init__(self, freqs_hz, dwell=0.1):
+        self.freqs_hz = np.asarray(freqs_hz, dtype=np.int64)
+        self.dwell = dwell
+        self.position = -1
+
+    def __len__(self):
+        return len(self.freqs_hz)
+
+    def next(self, now=None):
+        self.position = (self.position + 1) % len(self.freqs_hz)
+        return self.position, self.dwell
+
+    def record(self, index, busy, now=None):
+        pass
+
+
+class ScheduledScanner:
+    """Drive a scheduler with real tune and squelch functions on a thread
+
+    tune(freq_mhz) retunes (e.g. ScannerController.tune over rtl_tcp) and
+    is_busy() says whether the current channel carries a signal (e.g. a
+    channelizer or audio level check).  A busy channel is held while it
+    stays busy, up to max_hold seconds.
+    """
+
+    def __init__(self, scheduler, tune, is_busy, settle=0.01, max_hold=30.0, hang=1.0):
+        self.scheduler = scheduler
+        self.tune = tune
+        self.is_busy = is_busy
+        self.settle = settle
+        self.max_hold = max_hold
+        self.hang = hang
+        self.current = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="scheduled-scan", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.max_hold + 1.0)
+
+    def _run(self):
+        while not self._stop.is_set():
+            index, dwell = self.scheduler.next()
+            if index is None:
+                self._stop.wait(1.0)
+                continue
+            self.current = index
+            self.tune(self.scheduler.freqs_hz[index] / 1e6)
+            self._stop.wait(self.settle + dwell)
+            busy = self.is_busy()
+            if busy:
+                # Listen while the transmission lasts, plus a short hang time
+                held = time.monotonic() + self.max_hold
+                quiet_since = None
+                while not self._stop.is_set() and time.monotonic() < held:
+                    if self.is_busy():
+                        quiet_since = None
+                    elif quiet_since is None:
+                        quiet_since = time.monotonic()
+                    elif time.monotonic() - quiet_since >= self.hang:
+                        break
+                    self._stop.wait(0.05)
+            self.scheduler.record(index, busy)
+
+
+def synthetic_traffic(seconds, busy=10, rare=190, nuisance=2, seed=0):
+    """Channel frequencies, priorities and (start, end) transmission lists
+
+    busy channels carry ~20 calls/hour, rare ones ~1/hour, nuisance
+    channels are always on.  Calls last 2-10 s.  Every fifth busy channel
+    and two rare ones are priority channels.
+    """
+    rng = np.random.default_rng(seed)
+    count = busy + rare + nuisance
+    freqs = (420_000_000 + rng.choice(800, count, replace=False) * 6250).astype(np.int64)
+    rates = np.concatenate([np.full(busy, 20.0), np.full(rare, 1.0), np.zeros(nuisance)]) / 3600.0
+    priorities = rng.integers(0, 6, count)
+    priorities[:busy:5] = 10
+    priorities[busy:busy + 2] = 10
+    traffic = []
+    for channel in range(count):
+        if channel >= busy + rare:
+            traffic.append((np.array([0.0]), np.array([seconds * 2])))
+            continue
+        calls = rng.poisson(rates[channel] * seconds)
+        starts = np.sort(rng.uniform(0, seconds, calls))
+        ends = starts + rng.uniform(2.0, 10.0, calls)
+        traffic.append((starts, ends))
+    kinds = np.array(['busy'] * busy + ['rare'] * rare + ['nuisance'] * nuisance)
+    return freqs, priorities, traffic, kinds
+
+
+def simulate(scheduler, traffic, kinds, seconds, retune=0.005, max_hold=5.0, hang=1.0):
+    """Run a scheduler against synthetic traffic on a simulated clock
+
+    Returns mean time-to-detect for busy and rare channels (a call that is
+    never heard counts with its full length), the share of calls never
+    heard, and the longest gap between visits to any non-nuisance channel
+    (starvation).
+    """
+    count = len(traffic)
+    found = [np.zeros(len(starts), dtype=bool) for starts, ends in traffic]
+    delays = {'busy': [], 'rare': []}
+    last_visit = np.zeros(count)
+    max_gap = np.zeros(count)
+    t = 0.0
+    visits = 0
+    while t < seconds:
+        index, dwell = scheduler.next(t)
+        if index is None:
+            t += 1.0
+            continue
+        t += retune + dwell
+        starts, ends = traffic[index]
+        call = int(np.searchsorted(starts, t, side='right')) - 1
+        busy = call >= 0 and ends[call] > t
+        if busy:
+            if not found[index][call] and kinds[index] in delays:
+                found[index][call] = True
+                delays[kinds[index]].append(min(t - starts[call], ends[call] - starts[call]))
+            # Hold for the rest of the call and the hang time
+            t = min(ends[call] + hang, t + max_hold)
+        max_gap[index] = max(max_gap[index], t - last_visit[index])
+        last_visit[index] = t
+        scheduler.record(index, busy, t)
+        visits += 1
+    max_gap = np.maximum(max_gap, t - last_visit)
+    calls = {kind: 0 for kind in delays}
+    heard = {kind: 0 for kind in delays}
+    for index, (starts, ends) in enumerate(traffic):
+        if kinds[index] in calls:
+            within = starts < seconds
+            calls[kinds[index]] += int(within.sum())
+            heard[kinds[index]] += int(found[index][within].sum())
+            # A call that was never heard went undetected for its whole length
+            missed = within & ~found[index]
+            delays[kinds[index]].extend((ends[missed] - starts[missed]).tolist())
+    watched = kinds != 'nuisance'
+    return {
+        'visits': visits,
+        'busy_ttd_s': float(np.mean(delays['busy'])) if delays['busy'] else None,
+        'rare_ttd_s': float(np.mean(delays['rare'])) if delays['rare'] else None,
+        'busy_missed': 1 - heard['busy'] / calls['busy'] if calls['busy'] else 0.0,
+        'rare_missed': 1 - heard['rare'] / calls['rare'] if calls['rare'] else 0.0,
+        'max_gap_s': float(max_gap[watched].max()),
+    }
+
+
+def measure(seconds=3600.0, dwell=0.1):
+    """Time-to-detect with FMP's fixed order versus the adaptive scheduler"""
+    freqs, priorities, traffic, kinds = synthetic_traffic(seconds)
+    fixed = simulate(FixedOrderScheduler(freqs, dwell), traffic, kinds, seconds)
+    scheduler = PriorityScheduler(freqs, priorities, dwell=dwell, now=0.0)
+    started = time.perf_counter()
+    adaptive = simulate(scheduler, traffic, kinds, seconds)
+    adaptive['next_us'] = (time.perf_counter() - started) / adaptive['visits'] * 1e6
+    adaptive['locked_out'] = len(scheduler.log)
+    return {'fixed': fixed, 'adaptive': adaptive}
+
+
+if __name__ == "__main__":
+    for name, result in measure().items():
+        print(name, result)
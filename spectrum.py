@@ -0,0 +1,324 @@
+"""Spectrum and waterfall rendering for the launcher
+
+FMP24's own spectrum window is minimized (-_3), so the launcher draws its
+own from streamed IQ.  FFT size, display width and update rate come from
+FMP24.cfg lines 2-4.  A worker thread does the FFT and renders each frame
+into one of two preallocated PPM buffers (spectrum trace on top, waterfall
+below) while the Tk thread reads the other; the Tk thread only hands the
+finished frame to a PhotoImage.
+"""
+import threading
+import time
+
+import numpy as np
+
+from command_pipeline import LatencyStats
+from config import FmpConfig
+
+
+def fft_settings(cfg_path="FMP24.cfg"):
+    """Sample rate, window width, FFT size and update rate from FMP24.cfg"""
+    cfg = FmpConfig.load(cfg_path)
+    return {
+        'sample_rate': cfg['sample_rate_mhz'] * 1e6,
+        'width': cfg['window_width'],
+        'fft_size': cfg.fft_size,
+        'update_rate': cfg['update_rate'],
+    }
+
+
+class FftPlan:
+    """Window and work buffers for one FFT size"""
+
+    def __init__(self, size):
+        self.size = size
+        n = np.arange(size)
+        # 4-term Blackman-Harris: low leakage so weak carriers stay visible
+        window = (0.35875 - 0.48829 * np.cos(2 * np.pi * n / size)
+                  + 0.14128 * np.cos(4 * np.pi * n / size) - 0.01168 * np.cos(6 * np.pi * n / size))
+        self.window = (window / window.sum()).astype(np.float32)
+        self.windowed = np.empty(size, dtype=np.complex64)
+        self.spectrum = np.empty(size, dtype=np.complex64)
+        self.power = np.empty(size, dtype=np.float32)
+        self.shifted = np.empty(size, dtype=np.float32)
+
+
+_plans = {}
+
+
+def get_plan(size):
+    plan = _plans.get(size)
+    if plan is None:
+        plan = _plans[size] = FftPlan(size)
+    return plan
+
+
+class Spectrum:
+    """Power spectrum in dBFS reduced to one value per display column"""
+
+    def __init__(self, fft_size=65536, width=1024):
+        self.plan = get_plan(fft_size)
+        self.width = width
+        if fft_size >= width:
+            self.per_column = fft_size // width
+            self.columns = None
+        else:
+            self.per_column = 1
+            self.columns = (np.arange(width) * fft_size // width).astype(np.int64)
+        self.row = np.empty(width, dtype=np.float32)
+
+    def compute(self, iq):
+        """dB per column for the last fft_size samples of iq (center in the middle)"""
+        plan = self.plan
+        size = plan.size
+        np.multiply(iq[-size:], plan.window, out=plan.windowed)
+        np.fft.fft(plan.windowed, out=plan.spectrum)
+        view = plan.spectrum.view(np.float32).reshape(size, 2)
+        np.einsum('ij,ij->i', view, view, out=plan.power)
+        half = size // 2
+        plan.shifted[:half] = plan.power[half:]
+        plan.shifted[half:] = plan.power[:half]
+        if self.columns is None:
+            used = self.per_column * self.width
+            # Peak per column, so a narrow carrier isn't averaged away
+            np.max(plan.shifted[:used].reshape(self.width, self.per_column), axis=1, out=self.row)
+        else:
+            np.take(plan.shifted, self.columns, out=self.row)
+        np.maximum(self.row, 1e-20, out=self.row)
+        np.log10(self.row, out=self.row)
+        self.row *= 10.0
+        return self.row
+
+
+def colormap():
+    """256-entry black-blue-cyan-yellow-red-white palette"""
+    stops = np.array([0, 0.2, 0.4, 0.6, 0.8, 1.0])
+    colors = np.array([
+        (0, 0, 0), (0, 0, 160), (0, 180, 220), (240, 240, 0), (240, 40, 0), (255, 255, 255),
+    ], dtype=np.float64)
+    x = np.linspace(0, 1, 256)
+    return np.stack([np.interp(x, stops, colors[:, c]) for c in range(3)], axis=1).astype(np.uint8)
+
+
+class SpectrumImage:
+    """Spectrum trace above a scrolling waterfall, rendered as a PPM frame
+
+    The waterfall is a ring of rows; compose() copies the trace and the
+    ring, newest row first, into a frame buffer behind a fixed PPM header.
+    """
+
+    def __init__(self, width=1024, trace_height=120, waterfall_height=300,
+                 floor_db=-120.0, range_db=80.0):
+        self.width = width
+        self.trace_height = trace_height
+        self.waterfall_height = waterfall_height
+        self.floor_db = floor_db
+        self.range_db = range_db
+        self.palette = colormap()
+        self.height = trace_height + waterfall_height
+        self.header = b'P6 %d %d 255\n' % (width, self.height)
+        self.frame, self.pixels = self.new_frame()
+        self.trace = np.empty((trace_height, width, 3), dtype=np.uint8)
+        self.ring = np.zeros((waterfall_height, width, 3), dtype=np.uint8)
+        self.newest = 0
+        self.levels = np.empty(width, dtype=np.float32)
+        self.indices = np.empty(width, dtype=np.intp)
+        self.tops = np.empty(width, dtype=np.intp)
+        self.rows = np.arange(trace_height)[:, None]
+        self.mask = np.empty((trace_height, width), dtype=bool)
+        self.trace_color = np.array((0, 220, 120), dtype=np.uint8)
+        self.trace_background = np.array((10, 10, 30), dtype=np.uint8)
+        self.memory_color = np.array((255, 160, 0), dtype=np.uint8)
+        self.column_index = np.arange(width)
+
+    def new_frame(self):
+        """A frame buffer with the PPM header filled in, and its pixel array"""
+        frame = bytearray(len(self.header) + self.width * self.height * 3)
+        frame[:len(self.header)] = self.header
+        pixels = np.frombuffer(frame, dtype=np.uint8, offset=len(self.header))
+        return frame, pixels.reshape(self.height, self.width, 3)
+
+    def level_rows(self, row_db, out):
+        """Trace row (0 = top) of each column's level"""
+        np.subtract(row_db, self.floor_db, out=self.levels)
+        self.levels *= (self.trace_height - 1) / self.range_db
+        np.clip(self.levels, 0, self.trace_height - 1, out=self.levels)
+        np.subtract(self.trace_height - 1, self.levels, out=self.levels)
+        out[:] = self.levels
+        return out
+
+    def push(self, row_db, memory_db=None):
+        """Add one spectrum row: redraw the trace and write a waterfall row
+
+        memory_db, if given, is drawn over the trace as one dot per column
+        (FMP's spectrum memory overlay).
+        """
+        np.subtract(row_db, self.floor_db, out=self.levels)
+        self.levels *= 255.0 / self.range_db
+        np.clip(self.levels, 0, 255, out=self.levels)
+        self.indices[:] = self.levels
+        self.newest = (self.newest - 1) % self.waterfall_height
+        np.take(self.palette, self.indices, axis=0, out=self.ring[self.newest])
+        # Trace: fill each column from its level down to the bottom
+        np.multiply(self.levels, (self.trace_height - 1) / 255.0, out=self.levels)
+        np.subtract(self.trace_height - 1, self.levels, out=self.levels)
+        self.tops[:] = self.levels
+        np.greater_equal(self.rows, self.tops, out=self.mask)
+        self.trace[:] = self.trace_background
+        self.trace[self.mask] = self.trace_color
+        if memory_db is not None:
+            self.trace[self.level_rows(memory_db, self.tops), self.column_index] = self.memory_color
+
+    def compose(self, target=None):
+        """Render into target, a (frame, pixels) pair from new_frame(); returns the frame
+
+        The newest waterfall row ends up at the top.  target defaults to
+        the image's own frame.
+        """
+        frame, pixels = target or (self.frame, self.pixels)
+        pixels[:self.trace_height] = self.trace
+        waterfall = pixels[self.trace_height:]
+        split = self.waterfall_height - self.newest
+        waterfall[:split] = self.ring[self.newest:]
+        waterfall[split:] = self.ring[:self.newest]
+        return frame
+
+
+class SpectrumWorker:
+    """Read IQ, compute and render frames on a background thread
+
+    source.read(count) returns complex64 samples (e.g. RtlTcpStream).  The
+    worker reads everything the source delivers so a live stream never
+    backs up, and renders one frame per 1/update_rate seconds of samples.
+    take_frame() returns the newest finished frame or None; frames are
+    rendered into two buffers in turn, and the one handed out is left
+    alone until the next take_frame().  With a
+    spectrum_memory.SpectrumMemory as memory, every frame's full-resolution
+    power is folded into it on this thread, and show_memory draws its
+    max-hold over the trace.
+    """
+
+    def __init__(self, source, fft_size=65536, width=1024, update_rate=15.0,
+                 sample_rate=2.4e6, memory=None, **image_options):
+        self.source = source
+        self.spectrum = Spectrum(fft_size, width)
+        self.image = SpectrumImage(width, **image_options)
+        self.memory = memory
+        self.show_memory = memory is not None
+        self.memory_row = np.empty(width, dtype=np.float32)
+        self._reset_memory = False
+        self.block = max(fft_size, int(sample_rate / update_rate))
+        self.compute_stats = LatencyStats(512)
+        self.render_stats = LatencyStats(512)
+        self.frames = 0
+        self.skipped = 0
+        self.error = None
+        self._buffers = (self.image.new_frame(), self.image.new_frame())
+        self._ready = None  # index of the newest finished buffer
+        self._held = None  # index of the buffer take_frame() handed out
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="spectrum", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(2.0)
+        self.source.close()
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                iq = self.source.read(self.block)
+                self.process(iq)
+        except Exception as e:
+            self.error = e
+
+    def reset_memory(self):
+        """FMP's X key; done by the worker before its next frame"""
+        self._reset_memory = True
+
+    def process(self, iq):
+        started = time.perf_counter()
+        row = self.spectrum.compute(iq)
+        memory_row = None
+        if self.memory is not None:
+            if self._reset_memory:
+                self._reset_memory = False
+                self.memory.reset()
+            self.memory.update(self.spectrum.plan.shifted)
+            if self.show_memory:
+                memory_row = self.memory.columns(self.image.width, self.memory_row)
+        computed = time.perf_counter()
+        self.image.push(row, memory_row)
+        with self._lock:
+            back = 1 - self._held if self._held is not None else int(self._ready == 0)
+            if self._ready == back:
+                # Not taken yet; the reader gets the newer frame instead
+                self._ready = None
+                self.skipped += 1
+        self.image.compose(self._buffers[back])
+        with self._lock:
+            if self._ready is not None:
+                self.skipped += 1
+            self._ready = back
+        self.compute_stats.add(computed - started)
+        self.render_stats.add(time.perf_counter() - computed)
+        self.frames += 1
+
+    def take_frame(self):
+        """The newest PPM frame (a bytearray) or None if there is no new one"""
+        with self._lock:
+            if self._ready is None:
+                return None
+            self._held, self._ready = self._ready, None
+            return self._buffers[self._held][0]
+
+    def stats(self):
+        compute = self.compute_stats.summary()
+        render = self.render_stats.summary()
+        return {
+            'frames': self.frames,
+            'skipped': self.skipped,
+            'fft_p50_ms': compute['p50_ms'],
+            'fft_p99_ms': compute['p99_ms'],
+            'render_p50_ms': render['p50_ms'],
+            'render_p99_ms': render['p99_ms'],
+        }
+
+
+def measure(fft_size=65536, width=1024, frames=60, sample_rate=2.4e6, update_rate=15.0):
+    """Worker-side time per frame and the frame rate one core can sustain"""
+    from channelizer import synthetic_iq
+
+    class Source:
+        def __init__(self):
+            self.iq = synthetic_iq(int(sample_rate / update_rate), [-300e3, 12.5e3, 450e3], sample_rate)
+
+        def read(self, count):
+            return self.iq
+
+        def close(self):
+            pass
+
+    worker = SpectrumWorker(Source(), fft_size, width, update_rate, sample_rate)
+    started = time.perf_counter()
+    for _ in range(frames):
+        worker.process(worker.source.iq)
+        worker.take_frame()
+    elapsed = time.perf_counter() - started
+    result = worker.stats()
+    result['max_fps'] = frames / elapsed
+    result['frame_bytes'] = len(worker.image.frame)
+    return result
+
+
+if __name__ == "__main__":
+    print(fft_settings())
+    print(measure())
@@ -0,0 +1,304 @@
+"""Spectrum memory with discovery of unlisted transmitters
+
+FMP's M key overlays a memory of where the spectrum has been busy, and X
+clears it; someone still has to watch it and click.  SpectrumMemory
+does the watching on every FFT frame the spectrum worker computes:
+
+  - full-resolution power is summed into groups of about resolution_hz,
+    which averages the per-bin noise down so one threshold works
+  - a decaying max-hold (the overlay) and a per-group count of busy
+    frames are updated in place
+  - each group is busy from on_db above the noise floor until it drops
+    below off_db (hysteresis), so a fading carrier isn't counted twice
+  - when groups turn busy, the run of busy groups they belong to is
+    located by its power centroid, snapped to the FMP24.cfg step table
+    and, unless FMP24.ScanList already has it, recorded as a discovery
+    with timestamps and queued as an alert
+
+A quiet frame is a dozen in-place ufunc calls on preallocated arrays;
+only frames where something keys up do any allocating work.
+"""
+import queue
+import threading
+import time
+
+import numpy as np
+
+from survey import DEFAULT_STEPS, mode_for_width, snap
+
+
+class SpectrumMemory:
+    """Max-hold, busy counts and carrier discovery over fftshifted power frames
+
+    update() takes the linear power of one frame (DC in the middle, as
+    spectrum.Spectrum leaves it in plan.shifted).  listed_hz are the
+    ScanList frequencies; carriers within half a step of one are not
+    reported.  Alerts are read with alerts() on any thread.
+    """
+
+    def __init__(self, fft_size, sample_rate, center_hz, frame_rate=15.0, listed_hz=(),
+                 steps=DEFAULT_STEPS, resolution_hz=1250.0, on_db=10.0, off_db=6.0,
+                 decay_db_per_s=0.2, dc_hz=2000.0, usable_fraction=0.9, valley_db=6.0):
+        self.fft_size = fft_size
+        self.sample_rate = float(sample_rate)
+        self.center_hz = float(center_hz)
+        self.steps = tuple(steps)
+        self.valley_factor = 10 ** (valley_db / 10)
+        bin_hz = self.sample_rate / fft_size
+        self.group = max(1, int(round(resolution_hz / bin_hz)))
+        self.groups = fft_size // self.group
+        self.group_hz = bin_hz * self.group
+        self.on_factor = np.float32(10 ** (on_db / 10))
+        self.off_factor = np.float32(10 ** (off_db / 10))
+        self.decay = np.float32(10 ** (-decay_db_per_s / frame_rate / 10))
+        # Group centre offsets from the tuned frequency
+        self.offsets_hz = (np.arange(self.groups) * self.group + (self.group - 1) / 2 - fft_size / 2) * bin_hz
+        self.usable = ((np.abs(self.offsets_hz) > dc_hz)
+                       & (np.abs(self.offsets_hz) < self.sample_rate * usable_fraction / 2))
+        self.power = np.zeros(self.groups, dtype=np.float32)
+        self.hold = np.zeros(self.groups, dtype=np.float32)
+        self.counts = np.zeros(self.groups, dtype=np.uint32)
+        self.active = np.zeros(self.groups, dtype=bool)
+        self._previous = np.zeros(self.groups, dtype=bool)
+        self._rising = np.zeros(self.groups, dtype=bool)
+        self._keep = np.zeros(self.groups, dtype=bool)
+        self._busy = np.zeros(self.groups, dtype=np.uint32)
+        self._column_starts = None
+        self._sorted = np.empty(self.groups, dtype=np.float32)
+        self.noise = 0.0
+        self.frames = 0
+        self.busy_seconds = 0.0
+        self.discoveries = {}
+        self._alerts = queue.Queue()
+        self._lock = threading.Lock()
+        self.set_listed(listed_hz)
+
+    def set_listed(self, listed_hz):
+        """Replace the ScanList frequencies; discoveries now listed are dropped"""
+        self.listed_hz = np.sort(np.asarray(listed_hz, dtype=np.float64))
+        with self._lock:
+            for freq in [f for f, d in self.discoveries.items() if self.is_listed(f, d['step_hz'])]:
+                del self.discoveries[freq]
+
+    def is_listed(self, freq_hz, step_hz):
+        listed = self.listed_hz
+        if not len(listed):
+            return False
+        i = np.searchsorted(listed, freq_hz)
+        near = listed[max(0, i - 1):i + 1]
+        return bool(np.min(np.abs(near - freq_hz)) < step_hz / 2)
+
+    def reset(self):
+        """FMP's X key: clear the memory and counts (discoveries are kept)"""
+        self.hold[:] = 0
+        self.counts[:] = 0
+        self.active[:] = False
+        self.frames = 0
+
+    def retune(self, center_hz):
+        self.center_hz = float(center_hz)
+        self.reset()
+
+    def update(self, shifted_power, now=None):
+        """Fold one frame in; returns the number of new carriers found"""
+        started = time.perf_counter()
+        used = self.groups * self.group
+        np.add.reduce(shifted_power[:used].reshape(self.groups, self.group), axis=1, out=self.power)
+        np.multiply(self.hold, self.decay, out=self.hold)
+        np.maximum(self.hold, self.power, out=self.hold)
+        # Noise floor: median group, partitioned in a scratch copy
+        np.copyto(self._sorted, self.power)
+        half = self.groups // 2
+        self._sorted.partition(half)
+        self.noise = float(self._sorted[half])
+        np.copyto(self._previous, self.active)
+        np.greater_equal(self.power, self.off_factor * self.noise, out=self._keep)
+        np.logical_and(self.active, self._keep, out=self.active)
+        np.greater(self.power, self.on_factor * self.noise, out=self._rising)
+        np.logical_and(self._rising, self.usable, out=self._rising)
+        np.logical_or(self.active, self._rising, out=self.active)
+        np.copyto(self._busy, self.active, casting='unsafe')
+        np.add(self.counts, self._busy, out=self.counts)
+        np.greater(self.active, self._previous, out=self._rising)
+        self.frames += 1
+        found = self._discover(now) if self._rising.any() else 0
+        self.busy_seconds += time.perf_counter() - started
+        return found
+
+    def _valleys(self, start, end):
+        """Split points inside a run where the power dips valley_db below the peaks on both sides"""
+        splits = []
+        peak = valley = self.power[start]
+        at = start
+        for g in range(start + 1, end):
+            p = self.power[g]
+            if p < valley:
+                valley, at = p, g
+            elif p > valley * self.valley_factor and peak > valley * self.valley_factor:
+                splits.append(at)
+                peak = valley = p
+                at = g
+            elif p > peak:
+                peak = valley = p
+                at = g
+        return splits
+
+    def carriers(self):
+        """(centroid offset Hz, width Hz, SNR dB, keyed up this frame) per busy carrier
+
+        A run of busy groups holding several carriers (neighbouring channels
+        keyed up together) is split at the dips between them.
+        """
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], self.active.view(np.int8), [0]))))
+        starts, ends = edges[0::2], edges[1::2]
+        if not len(starts):
+            return []
+        splits = [g for s, e in zip(starts.tolist(), ends.tolist()) if e - s > 2 for g in self._valleys(s, e)]
+        if splits:
+            starts = np.sort(np.concatenate((starts, splits)))
+            ends = np.sort(np.concatenate((ends, splits)))
+        excess = np.maximum(self.power - self.noise, 0.0).astype(np.float64)
+        index = np.arange(self.groups, dtype=np.float64)
+        weight = np.concatenate(([0.0], np.cumsum(excess)))
+        moment = np.concatenate(([0.0], np.cumsum(excess * index)))
+        rising = np.concatenate(([0], np.cumsum(self._rising)))
+        total = weight[ends] - weight[starts]
+        centroid = (moment[ends] - moment[starts]) / np.maximum(total, 1e-30)
+        peak = np.maximum.reduceat(self.power, starts)
+        snr = 10 * np.log10(np.maximum(peak, 1e-30) / max(self.noise, 1e-30))
+        offsets = np.interp(centroid, index, self.offsets_hz)
+        new = rising[ends] > rising[starts]
+        return list(zip(offsets.tolist(), ((ends - starts) * self.group_hz).tolist(), snr.tolist(),
+                        new.tolist()))
+
+    def _discover(self, now=None):
+        now = time.time() if now is None else now
+        found = 0
+        tolerance = max(self.group_hz / 2, 500.0)
+        for offset, width, snr, new in self.carriers():
+            if not new:
+                continue
+            freq, step = snap(self.center_hz + offset, self.steps, tolerance)
+            if self.is_listed(freq, step):
+                continue
+            with self._lock:
+                known = self.discoveries.get(freq)
+                if known is not None:
+                    known['last_seen'] = now
+                    known['hits'] += 1
+                    known['snr_db'] = max(known['snr_db'], snr)
+                    continue
+                mode = mode_for_width(width)
+                stamp = time.strftime('%m-%d %H:%M', time.localtime(now))
+                discovery = {
+                    'freq_hz': freq,
+                    'step_hz': step,
+                    'first_seen': now,
+                    'last_seen': now,
+                    'hits': 1,
+                    'snr_db': snr,
+                    'width_hz': width,
+                    'mode': mode,
+                    'line': f"{freq / 1e6:.5f} {mode} found {stamp}",
+                }
+                self.discoveries[freq] = discovery
+            self._alerts.put(dict(discovery))
+            found += 1
+        return found
+
+    def alerts(self):
+        """Discoveries made since the last call, oldest first"""
+        out = []
+        while True:
+            try:
+                out.append(self._alerts.get_nowait())
+            except queue.Empty:
+                return out
+
+    def discovered(self):
+        """All discoveries, most recently heard first"""
+        with self._lock:
+            return sorted((dict(d) for d in self.discoveries.values()), key=lambda d: -d['last_seen'])
+
+    def occupancy(self):
+        """Fraction of frames each group was busy since the last reset"""
+        return self.counts / max(self.frames, 1)
+
+    def columns(self, width, out):
+        """Max-hold in dB reduced to `width` display columns, written into out"""
+        if self._column_starts is None or len(self._column_starts) != width:
+            self._column_starts = np.arange(width) * self.groups // width
+        np.maximum.reduceat(self.hold, self._column_starts, out=out)
+        # Groups are sums of `group` bins; show the mean bin on the trace's dB scale
+        out *= 1.0 / self.group
+        np.maximum(out, 1e-20, out=out)
+        np.log10(out, out=out)
+        out *= 10.0
+        return out
+
+
+def measure(seconds=60.0, frame_rate=15.0, fft_size=65536, sample_rate=2.4e6, listed=8, bursts=24, seed=0):
+    """Discovery on a simulated minute of spectrum frames
+
+    `listed` channels are in the ScanList and talk often; `bursts` short
+    transmissions (0.3 - 3 s, 6 - 30 dB) happen on unlisted channels.
+    Frames are power spectra of noise plus NFM carriers, generated
+    directly in the frequency domain so the engine's own cost is what
+    gets timed.
+    """
+    from spectrum import get_plan
+
+    rng = np.random.default_rng(seed)
+    center = 460.0e6
+    bin_hz = sample_rate / fft_size
+    raster = center + np.arange(-80, 81) * 12.5e3
+    picks = rng.choice(len(raster), listed + bursts, replace=False)
+    listed_hz = raster[picks[:listed]]
+    burst_hz = raster[picks[listed:]]
+    frames = int(seconds * frame_rate)
+    starts = rng.integers(0, frames - 50, bursts)
+    lengths = rng.integers(int(0.3 * frame_rate), int(3 * frame_rate), bursts)
+    levels = rng.uniform(6, 30, bursts)
+    # NFM carrier shape: about 8 kHz wide at the -20 dB points
+    shape_bins = np.arange(-160, 161)
+    shape = np.exp(-0.5 * (shape_bins * bin_hz / 2.5e3) ** 2)
+    memory = SpectrumMemory(fft_size, sample_rate, center, frame_rate, listed_hz)
+    plan = get_plan(fft_size)
+    frame = plan.shifted
+    alerts = []
+    for k in range(frames):
+        frame[:] = rng.exponential(1.0, fft_size)
+        on_air = [(f, 10 ** (3.0 + rng.uniform(-0.2, 0.2))) for f in listed_hz if (k // 30) % 3 == 0]
+        on_air += [(f, 10 ** (level / 10)) for f, s, n, level in zip(burst_hz, starts, lengths, levels)
+                   if s <= k < s + n]
+        for freq, level in on_air:
+            b = int(round((freq - center) / bin_hz)) + fft_size // 2
+            frame[b + shape_bins] += level * shape * (1 + 0.3 * rng.standard_normal(len(shape)))
+        memory.update(frame, now=k / frame_rate)
+        alerts += memory.alerts()
+    # Peak memory allocated by a quiet frame once the band has gone quiet
+    import tracemalloc
+    frame[:] = rng.exponential(1.0, fft_size)
+    memory.update(frame)
+    tracemalloc.start()
+    memory.update(frame)
+    allocated = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    found = {a['freq_hz'] for a in alerts}
+    expected = set(burst_hz.tolist())
+    audible = {f for f, level in zip(burst_hz.tolist(), levels) if level >= 10.0}
+    return {
+        'frames': frames,
+        'bursts': bursts,
+        'found': len(found & expected),
+        'found_of_10dB_or_more': f"{len(found & audible)}/{len(audible)}",
+        'false_alerts': len(found - expected),
+        'listed_alerted': len(found & set(listed_hz.tolist())),
+        'update_ms': 1000 * memory.busy_seconds / frames,
+        'max_frame_rate': frames / memory.busy_seconds,
+        'quiet_frame_peak_alloc_bytes': allocated,
+    }
+
+
+if __name__ == "__main__":
+    print(measure())
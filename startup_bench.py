@@ -0,0 +1,133 @@
+"""Cold-start benchmark for the launcher
+
+Starts Khanfar-S.py in a fresh interpreter with KHANFAR_STARTUP_BENCH set.
+Its home is a temp directory whose Documents folder holds an activated
+license and its cache stamp, so the run takes the same activation path
+as an activated install.  The launcher prints how long its own start-up
+took once its window is mapped and the Tk loop is idle, then exits.
+Wall time is measured from process spawn, so interpreter start and
+imports count too; -X importtime gives the time spent importing
+everything the run loaded.  The exit code is 1 when the median goes over
+the budget.
+
+    python startup_bench.py --runs 5 --budget-ms 1500
+"""
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BUDGET_MS = 1500.0
+ACTIVATION_KEY = '1234567890'
+
+
+def activated_home(script='Khanfar-S.py'):
+    """Temp home directory with a license for ACTIVATION_KEY and its cache stamp
+
+    The license is written with the launcher's own encrypt_key and
+    cache_activation.
+    """
+    spec = importlib.util.spec_from_file_location('launcher', os.path.join(HERE, script))
+    launcher = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(launcher)
+    gui = launcher.SDRLauncherGUI.__new__(launcher.SDRLauncherGUI)
+    gui.encryption_key = launcher.ENCRYPTION_KEY
+    encrypted_key = gui.encrypt_key(ACTIVATION_KEY)
+    home = tempfile.mkdtemp(prefix='startup-bench-')
+    documents = os.path.join(home, 'Documents')
+    os.makedirs(documents)
+    license_file = os.path.join(documents, '.khanfar_license')
+    with open(license_file, 'w') as f:
+        f.write(encrypted_key)
+    gui.cache_activation(license_file, encrypted_key)
+    return home
+
+
+def run_once(script, timeout, home):
+    """(wall ms, in-app ms, import ms) for one cold start"""
+    # ~ is HOME on POSIX and USERPROFILE on Windows
+    env = dict(os.environ, KHANFAR_STARTUP_BENCH='1', HOME=home, USERPROFILE=home)
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', script], cwd=HERE, env=env,
+                            capture_output=True, text=True, timeout=timeout)
+    wall_ms = (time.perf_counter() - started) * 1000
+    for line in result.stdout.splitlines():
+        if line.startswith('interactive_ms='):
+            return wall_ms, float(line.split('=', 1)[1]), imported_ms(result.stderr)
+    raise RuntimeError(f"launcher exited without reporting (code {result.returncode}): "
+                       f"{result.stderr.strip()[-500:]}")
+
+
+def imported_ms(importtime):
+    """Total of the top-level imports in -X importtime output"""
+    total = 0
+    for line in importtime.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit() and not name.startswith('  '):
+            total += int(cumulative)
+    return total / 1000
+
+
+def import_ms(script='Khanfar-S.py', before_window=('config', 'control_api', 'controller')):
+    """Import time of the launcher module plus what it loads before its window appears
+
+    Needs no display; before_window are the modules connect_controller
+    imports.  A full run also reports what was really imported.
+    """
+    code = (f"import importlib.util, sys, time\n"
+            f"t = time.perf_counter()\n"
+            f"spec = importlib.util.spec_from_file_location('launcher', {script!r})\n"
+            f"spec.loader.exec_module(importlib.util.module_from_spec(spec))\n"
+            f"import {', '.join(before_window)}\n"
+            f"print((time.perf_counter() - t) * 1000)\n")
+    result = subprocess.run([sys.executable, '-c', code], cwd=HERE, capture_output=True, text=True)
+    return float(result.stdout.strip())
+
+
+def measure(runs=5, script='Khanfar-S.py', timeout=30.0):
+    walls = []
+    in_app = []
+    imports = []
+    home = activated_home(script)
+    try:
+        for _ in range(runs):
+            wall, app, imported = run_once(script, timeout, home)
+            walls.append(wall)
+            in_app.append(app)
+            imports.append(imported)
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+    return {
+        'runs': runs,
+        'wall_median_ms': statistics.median(walls),
+        'wall_max_ms': max(walls),
+        'in_app_median_ms': statistics.median(in_app),
+        'import_median_ms': statistics.median(imports),
+        'launcher_import_ms': import_ms(script),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS)
+    args = parser.parse_args(argv)
+    result = measure(args.runs)
+    result['budget_ms'] = args.budget_ms
+    result['within_budget'] = result['wall_median_ms'] <= args.budget_ms
+    print(json.dumps(result, indent=2))
+    return 0 if result['within_budget'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
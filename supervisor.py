@@ -0,0 +1,403 @@
+"""Run one FMP24 per RTL dongle and keep them running
+
+The ScanList is split into shards by frequency span so each shard's
+channels fit in one capture window (2.4 MHz, FMP24.cfg line 1).  An
+instance is tuned to one window, so each dongle gets exactly one shard:
+spare dongles split the busiest shards (balancing channel count and hit
+rate), and when there are more windows than dongles the quietest windows
+are left out and reported as unplaced.  Each instance gets its own working directory (FMP24 reads FMP24.ScanList
+and FMP24.cfg from the current directory), device index and TCP audio
+port.  A monitor thread restarts instances that exit, with exponential
+backoff.  When the ScanList changes, replan() splits it again and only
+the instances whose shard changed need a restart.
+"""
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+
+WINDOW_HZ = 2.4e6
+USABLE_FRACTION = 0.9  # stay clear of the filter roll-off at the band edges
+
+
+class Shard:
+    """A group of channels that one FMP24 instance scans"""
+
+    def __init__(self, freqs_hz, weights, lines):
+        self.freqs_hz = np.asarray(freqs_hz, dtype=np.int64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.lines = list(lines)
+
+    @property
+    def span_hz(self):
+        return int(self.freqs_hz.max() - self.freqs_hz.min()) if len(self.freqs_hz) else 0
+
+    @property
+    def center_hz(self):
+        return (int(self.freqs_hz.max()) + int(self.freqs_hz.min())) // 2 if len(self.freqs_hz) else 0
+
+    @property
+    def load(self):
+        return float(self.weights.sum())
+
+    def split(self):
+        """Halve by weight, keeping frequency order"""
+        cumulative = np.cumsum(self.weights)
+        cut = int(np.searchsorted(cumulative, cumulative[-1] / 2)) + 1
+        cut = min(max(cut, 1), len(self.freqs_hz) - 1)
+        return (Shard(self.freqs_hz[:cut], self.weights[:cut], self.lines[:cut]),
+                Shard(self.freqs_hz[cut:], self.weights[cut:], self.lines[cut:]))
+
+
+def plan_shards(model, devices, hit_rates=None, window_hz=WINDOW_HZ * USABLE_FRACTION):
+    """Split the active ScanList entries into at most one shard per device
+
+    hit_rates maps freq_hz to hits per hour; a channel weighs 1 + its rate so
+    busy channels count for more when balancing.
+    Returns (shards, unplaced): a Shard or None per device, heaviest first,
+    and the Shards left over when there are more windows than devices.
+    """
+    active = model.active_indices()
+    order = active[np.argsort(model.freq_hz[active], kind='stable')]
+    freqs = model.freq_hz[order]
+    rates = hit_rates or {}
+    weights = np.array([1.0 + rates.get(int(f), 0.0) for f in freqs])
+    lines = [model.lines[i] for i in order]
+
+    # Greedy windows: start a new shard when the span would exceed the window
+    shards = []
+    start = 0
+    for i in range(1, len(freqs) + 1):
+        if i == len(freqs) or freqs[i] - freqs[start] > window_hz:
+            shards.append(Shard(freqs[start:i], weights[start:i], lines[start:i]))
+            start = i
+
+    # More dongles than windows: split the heaviest shard until every device has one
+    while 0 < len(shards) < devices:
+        heaviest = max(range(len(shards)), key=lambda k: (shards[k].load, len(shards[k].freqs_hz)))
+        if len(shards[heaviest].freqs_hz) < 2:
+            break
+        shards[heaviest:heaviest + 1] = list(shards[heaviest].split())
+
+    # One window per dongle: the busiest windows get one, the rest are reported
+    shards.sort(key=lambda s: (s.load, len(s.freqs_hz)), reverse=True)
+    placed, unplaced = shards[:devices], shards[devices:]
+    return placed + [None] * (devices - len(placed)), unplaced
+
+
+class Instance:
+    """One supervised FMP24 process"""
+
+    def __init__(self, device, port, cwd, shard=None):
+        self.device = device
+        self.port = port
+        self.cwd = cwd
+        self.shard = shard
+        self.process = None
+        self.started_at = None
+        self.restarts = 0
+        self.backoff = 0.0
+        self.next_start = 0.0
+        self.last_exit = None
+
+    @property
+    def center_hz(self):
+        """Tune to the center of the shard"""
+        return self.shard.center_hz if self.shard is not None else None
+
+    @property
+    def channels(self):
+        return len(self.shard.freqs_hz) if self.shard is not None else 0
+
+    def scans(self, shard):
+        """True if this instance already scans exactly shard"""
+        if self.shard is None or shard is None:
+            return self.shard is shard
+        return self.shard.lines == shard.lines
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+
+class ScanSupervisor:
+    """Start, watch and restart N FMP24 instances
+
+    command(instance) returns the argv for an instance.  With a single
+    device and no sharding the instance runs in base_dir itself.
+    unplaced holds the shards no dongle could cover.
+    """
+
+    def __init__(self, command, devices, model=None, base_port=20001, base_dir='.',
+                 hit_rates=None, check_interval=1.0, min_backoff=1.0, max_backoff=60.0,
+                 stable_after=30.0, probe_ports=False, shared_files=('FMP24.cfg',)):
+        self.command = command
+        self.base_dir = os.path.abspath(base_dir)
+        self.check_interval = check_interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.probe_ports = probe_ports
+        self.shared_files = shared_files
+        self.events = []
+        self._lock = threading.Lock()
+        self._control = threading.Lock()  # check() vs restart()
+        self._stop = threading.Event()
+        self._thread = None
+        self.hit_rates = hit_rates
+        devices = list(devices)
+        if model is not None and len(devices) > 1:
+            plan, self.unplaced = plan_shards(model, len(devices), hit_rates)
+        else:
+            plan, self.unplaced = [None] * len(devices), []
+        self.instances = []
+        for k, device in enumerate(devices):
+            cwd = self.base_dir if len(devices) == 1 else os.path.join(self.base_dir, 'shards', f'dev{device}')
+            self.instances.append(Instance(device, base_port + k, cwd, plan[k]))
+
+    def prepare(self, instance):
+        """Give a sharded instance its own directory, ScanList and config"""
+        if instance.cwd == self.base_dir:
+            return
+        os.makedirs(instance.cwd, exist_ok=True)
+        for name in self.shared_files:
+            source = os.path.join(self.base_dir, name)
+            if os.path.exists(source):
+                shutil.copy2(source, os.path.join(instance.cwd, name))
+        shard = instance.shard
+        lines = shard.lines if shard is not None else []
+        with open(os.path.join(instance.cwd, 'FMP24.ScanList'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def replan(self, model, hit_rates=None):
+        """Split a changed ScanList again; returns the instances whose shard changed
+
+        A shard that is still the same stays with the instance scanning it,
+        so one edited window costs one restart.  The new shards are used by
+        the next _launch of each instance.
+        """
+        if len(self.instances) < 2:
+            return []
+        if hit_rates is not None:
+            self.hit_rates = hit_rates
+        plan, self.unplaced = plan_shards(model, len(self.instances), self.hit_rates)
+        waiting = []
+        for instance in self.instances:
+            same = next((k for k, shard in enumerate(plan) if instance.scans(shard)), None)
+            if same is None:
+                waiting.append(instance)
+            else:
+                plan.pop(same)
+        for instance, shard in zip(waiting, plan):
+            instance.shard = shard
+        return waiting
+
+    def _launch(self, instance):
+        self.prepare(instance)
+        instance.process = subprocess.Popen(self.command(instance), cwd=instance.cwd)
+        instance.started_at = time.monotonic()
+        self._log(instance, 'started')
+
+    def _log(self, instance, what):
+        with self._lock:
+            self.events.append((time.time(), instance.device, what))
+            del self.events[:-500]
+
+    def start(self):
+        for instance in self.instances:
+            self._launch(instance)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._monitor, name="fmp-supervisor", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        for instance in self.instances:
+            if instance.alive():
+                instance.process.terminate()
+                try:
+                    instance.process.wait(timeout)
+                except subprocess.TimeoutExpired:
+                    instance.process.kill()
+            self._log(instance, 'stopped')
+
+    def healthy(self, instance):
+        if not instance.alive():
+            return False
+        if self.probe_ports and time.monotonic() - instance.started_at > self.check_interval * 5:
+            try:
+                with socket.create_connection(('127.0.0.1', instance.port), 0.5):
+                    pass
+            except OSError:
+                return False
+        return True
+
+    def check(self):
+        """One health check pass; restarts failed instances when their backoff expires"""
+        now = time.monotonic()
+        for instance in self.instances:
+            if instance.process is None:
+                if now >= instance.next_start:
+                    self._launch(instance)
+                continue
+            if self.healthy(instance):
+                if instance.backoff and now - instance.started_at > self.stable_after:
+                    instance.backoff = 0.0
+                continue
+            if instance.alive():
+                instance.process.kill()
+                instance.process.wait()
+            instance.last_exit = instance.process.returncode
+            instance.process = None
+            instance.restarts += 1
+            instance.backoff = min(self.max_backoff, max(self.min_backoff, instance.backoff * 2))
+            instance.next_start = now + instance.backoff
+            self._log(instance, f'exited ({instance.last_exit}); restart in {instance.backoff:.0f} s')
+
+    def restart(self, reason='restart', instances=None):
+        """Stop and relaunch instances (all by default) now, e.g. to pick up a new FMP24.cfg
+
+        Not counted as a failure: no backoff, and prepare() copies the
+        shared files into shard directories again.
+        """
+        with self._control:
+            for instance in self.instances if instances is None else instances:
+                if instance.alive():
+                    instance.process.terminate()
+                    try:
+                        instance.process.wait(5.0)
+                    except subprocess.TimeoutExpired:
+                        instance.process.kill()
+                        instance.process.wait()
+                self._log(instance, f'stopped ({reason})')
+                instance.backoff = 0.0
+                self._launch(instance)
+
+    def _monitor(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                with self._control:
+                    self.check()
+            except Exception as e:
+                self.events.append((time.time(), None, f'monitor error: {e}'))
+
+    def status(self):
+        return [{
+            'device': i.device,
+            'port': i.port,
+            'alive': i.alive(),
+            'channels': i.channels,
+            'center_mhz': i.center_hz / 1e6 if i.center_hz else None,
+            'restarts': i.restarts,
+            'pid': i.process.pid if i.process else None,
+        } for i in self.instances]
+
+    @property
+    def unplaced_channels(self):
+        return sum(len(s.freqs_hz) for s in self.unplaced)
+
+    def __bool__(self):
+        return any(i.alive() for i in self.instances)
+
+
+def fmp_command(exe="FMP24", role_config=True, ppm="0", frequency="99.9", gain="32",
+                output=None, economy=None, extra=("-_3",)):
+    """argv builder for ScanSupervisor matching launch_fmp24's options
+
+    Sharded instances tune to their shard, send audio to their own TCP port
+    and start in scanner mode.  economy True/False adds -e1/-e0; None
+    leaves FMP24's default (-e1).
+    """
+    def build(instance):
+        cmd = [exe]
+        if role_config:
+            cmd.append("-rc")
+        center = instance.center_hz
+        cmd.extend([
+            f"-i{instance.device}",
+            f"-P{ppm}",
+            f"-f{center / 1e6:.6f}" if center else f"-f{frequency}",
+            f"-g{gain}",
+            f"-o{output if output is not None else instance.port}",
+        ])
+        if instance.shard is not None:
+            cmd.append("-s1")
+        if economy is not None:
+            cmd.append(f"-e{int(bool(economy))}")
+        cmd.extend(extra)
+        return cmd
+    return build
+
+
+# Stand-in for FMP24: "scans" its ScanList with a fixed dwell and prints a
+# count of channel visits every second; exits early if told to crash.
+STAND_IN = r'''
+import sys, time
+dwell = float(sys.argv[1]); crash_after = float(sys.argv[2])
+with open('FMP24.ScanList') as f:
+    channels = [l.split()[0] for l in f if l.strip()]
+start = last = time.monotonic(); visits = 0
+while True:
+    for ch in channels:
+        time.sleep(dwell); visits += 1
+        now = time.monotonic()
+        if now - last >= 1.0:
+            print(visits, flush=True); visits = 0; last = now
+        if crash_after and now - start > crash_after:
+            sys.exit(3)
+'''
+
+
+def stand_in_command(dwell=0.01, crash_after=0.0):
+    def build(instance):
+        return [sys.executable, '-c', STAND_IN, str(dwell), str(crash_after)]
+    return build
+
+
+def measure_scaling(model, max_devices=4, seconds=3.0, dwell=0.01, base_dir=None):
+    """Channel visits per second and unplaced channels for 1..max_devices stand-in instances
+
+    Each run works in a fresh temporary directory (inside base_dir if given)
+    that is removed afterwards; nothing else in base_dir is touched.
+    """
+    import tempfile
+    results = {}
+    for n in range(1, max_devices + 1):
+        work = tempfile.mkdtemp(prefix='fmp-shards-', dir=base_dir)
+        supervisor = ScanSupervisor(stand_in_command(dwell), range(1, n + 1), model, base_dir=work)
+        if n == 1:
+            plan, supervisor.unplaced = plan_shards(model, 1)
+            supervisor.instances[0].cwd = os.path.join(work, 'shards', 'dev1')
+            supervisor.instances[0].shard = plan[0]
+        for instance in supervisor.instances:
+            supervisor.prepare(instance)
+        started = time.monotonic()
+        processes = [subprocess.Popen(supervisor.command(i), cwd=i.cwd, stdout=subprocess.PIPE, text=True)
+                     for i in supervisor.instances]
+        time.sleep(seconds)
+        for p in processes:
+            p.terminate()
+        visits = 0
+        for p in processes:
+            out, _ = p.communicate()
+            visits += sum(int(x) for x in out.split())
+        results[n] = {'visits_per_s': visits / (time.monotonic() - started),
+                      'unplaced_channels': supervisor.unplaced_channels}
+        shutil.rmtree(work, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    from scanlist import ScanList
+    # Four busy 1.25 MHz stretches of 12.5 kHz channels
+    bands = (152.0, 155.5, 460.0, 851.0)
+    print(measure_scaling(ScanList(''.join(f"{band + k * 0.0125:.5f} NFM\n"
+                                           for band in bands for k in range(100)))))
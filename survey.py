@@ -0,0 +1,284 @@
+"""Band survey: sweep a frequency range and propose ScanList entries
+
+Like rtl_power: the tuner hops across the range in windows that overlap
+by `overlap` of the sample rate, each hop averages `dwell` seconds of FFT
+power per bin, and the central part of every window is stitched into one
+spectrum.  The tuner's passband ripple is measured from the hops
+themselves (the median shape across all windows) and divided out, and
+the DC spike is patched, so one threshold over the noise works across the
+whole range.
+
+Carriers are located by their power centroid, snapped to the step-size
+table on FMP24.cfg line 5 and given a mode from their occupied bandwidth
+using FMP's filter classes (4, 7, 9.5 and 12.5 kHz); the mode is a guess
+to check by ear.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from calibrate import average_power
+from channelizer import DEFAULT_SAMPLE_RATE
+from scanlist import BANDWIDTH_HZ, Mode
+
+
+DEFAULT_STEPS = (5000, 6250, 7500, 12500, 15000, 25000)
+
+# Mode text to propose for a carrier of a given occupied bandwidth
+MODE_BY_WIDTH = (
+    (BANDWIDTH_HZ[Mode.NXDN48], 'NX48'),
+    (BANDWIDTH_HZ[Mode.DMR], 'DMR'),
+    (BANDWIDTH_HZ[Mode.P25], 'P25'),
+)
+
+
+def step_table(cfg_path="FMP24.cfg"):
+    """Step sizes in Hz from FMP24.cfg (a negative entry only marks the default)"""
+    from config import FmpConfig
+    try:
+        return tuple(sorted({abs(step) for step in FmpConfig.load(cfg_path)['step_table'] if step}))
+    except (OSError, ValueError, KeyError):
+        return DEFAULT_STEPS
+
+
+def snap(freq_hz, steps, tolerance_hz):
+    """Nearest channel raster point: the coarsest step within tolerance, else the finest step"""
+    for step in sorted(steps, reverse=True):
+        snapped = round(freq_hz / step) * step
+        if abs(snapped - freq_hz) <= tolerance_hz:
+            return snapped, step
+    step = min(steps)
+    return round(freq_hz / step) * step, step
+
+
+def mode_for_width(width_hz):
+    for limit, mode in MODE_BY_WIDTH:
+        if width_hz <= limit:
+            return mode
+    return 'NFM'
+
+
+class Spectrum:
+    """Stitched survey spectrum: bin frequencies and calibrated dB per bin"""
+
+    def __init__(self, freqs_hz, power_db, noise_db, bin_hz):
+        self.freqs_hz = freqs_hz
+        self.power_db = power_db
+        self.noise_db = noise_db
+        self.bin_hz = bin_hz
+
+    def carriers(self, threshold_db=10.0, min_width_hz=500.0, max_width_hz=30e3):
+        """(center Hz, occupied width Hz, SNR dB) of every carrier threshold_db over the noise"""
+        snr = self.power_db - self.noise_db
+        above = snr >= threshold_db
+        edges = np.flatnonzero(np.diff(np.concatenate(([False], above, [False])).view(np.int8)))
+        runs = []
+        for start, end in zip(edges[::2], edges[1::2]):
+            # Bridge dips of a bin or two inside a modulated carrier
+            if runs and start - runs[-1][1] <= 2:
+                runs[-1][1] = end
+            else:
+                runs.append([start, end])
+        linear = 10 ** (snr / 10) - 1
+        found = []
+        for start, end in runs:
+            width = (end - start) * self.bin_hz
+            if width < min_width_hz or width > max_width_hz:
+                continue
+            weights = np.maximum(linear[start:end], 0)
+            center = float(np.dot(weights, self.freqs_hz[start:end]) / weights.sum())
+            found.append((center, width, float(snr[start:end].max())))
+        return found
+
+
+class BandSurvey:
+    """Sweep start_hz..stop_hz with a tunable IQ source (read, set_frequency)"""
+
+    def __init__(self, source, start_hz, stop_hz, sample_rate=None, fft_size=4096, dwell=0.05,
+                 overlap=0.25, settle_samples=None):
+        self.source = source
+        self.start_hz = float(start_hz)
+        self.stop_hz = float(stop_hz)
+        self.sample_rate = sample_rate or getattr(source, 'sample_rate', None) or DEFAULT_SAMPLE_RATE
+        self.fft_size = fft_size
+        self.frames = max(1, int(round(dwell * self.sample_rate / fft_size)))
+        self.overlap = overlap
+        self.settle_samples = settle_samples if settle_samples is not None else fft_size * 4
+        self.bin_hz = self.sample_rate / fft_size
+        # Keep the central bins of each window; the edges are in the anti-alias roll-off
+        self.keep = int(fft_size * (1 - overlap)) // 2 * 2
+        self.step_hz = self.keep * self.bin_hz
+        self.hops = max(1, int(np.ceil((self.stop_hz - self.start_hz) / self.step_hz)))
+        self.seconds = 0.0
+        self._iq = np.empty(fft_size * self.frames, dtype=np.complex64)
+
+    def centers(self):
+        return self.start_hz + self.step_hz * (np.arange(self.hops) + 0.5)
+
+    def capture(self, center_hz):
+        self.source.set_frequency(center_hz)
+        if self.settle_samples:
+            self.source.read(self.settle_samples)
+        step = self.fft_size
+        for k in range(self.frames):
+            self._iq[k * step:(k + 1) * step] = self.source.read(step)
+        return average_power(self._iq, self.fft_size)
+
+    def run(self):
+        """Sweep once; returns the stitched Spectrum"""
+        started = time.perf_counter()
+        size = self.fft_size
+        low = size // 2 - self.keep // 2
+        windows = np.empty((self.hops, self.keep))
+        for k, center in enumerate(self.centers()):
+            windows[k] = self.capture(center)[low:low + self.keep]
+        # DC spike: replace the centre bins with their neighbours
+        dc = self.keep // 2
+        windows[:, dc - 2:dc + 3] = np.median(windows[:, np.r_[dc - 6:dc - 2, dc + 3:dc + 7]], axis=1)[:, None]
+        power_db = 10 * np.log10(np.maximum(windows, 1e-30))
+        noise_db = np.median(power_db, axis=1, keepdims=True)
+        if self.hops >= 4:
+            # Passband shape common to every hop: signals are in few hops per bin, noise in all
+            shape = np.median(power_db - noise_db, axis=0)
+            power_db -= shape - np.median(shape)
+        freqs = (self.centers()[:, None] + (np.arange(self.keep) - self.keep // 2)[None, :] * self.bin_hz)
+        inside = (freqs >= self.start_hz) & (freqs < self.stop_hz)
+        self.seconds = time.perf_counter() - started
+        return Spectrum(freqs[inside], power_db[inside],
+                        np.broadcast_to(noise_db, power_db.shape)[inside], self.bin_hz)
+
+    def mhz_per_second(self):
+        return (self.stop_hz - self.start_hz) / 1e6 / self.seconds if self.seconds else 0.0
+
+
+def propose(spectrum, steps=DEFAULT_STEPS, threshold_db=10.0, existing_hz=(), description="survey",
+            lookup=None):
+    """ScanList candidates as dicts, strongest first; existing channels are marked listed
+
+    lookup(freq_hz, step_hz), if given, names an unlisted channel (e.g.
+    from the frequency lists); None keeps `description`.
+    """
+    existing = np.sort(np.asarray(existing_hz, dtype=np.float64))
+    tolerance = max(1.5 * spectrum.bin_hz, 500.0)
+    found = {}
+    for center, width, snr in spectrum.carriers(threshold_db):
+        freq, step = snap(center, steps, tolerance)
+        if freq in found and found[freq]['snr_db'] >= snr:
+            continue
+        listed = bool(len(existing)) and bool(np.min(np.abs(existing - freq)) < step / 2)
+        mode = mode_for_width(width)
+        name = (lookup(freq, step) if lookup is not None and not listed else None) or description
+        found[freq] = {
+            'freq_hz': freq,
+            'measured_hz': center,
+            'step_hz': step,
+            'width_hz': width,
+            'snr_db': snr,
+            'mode': mode,
+            'listed': listed,
+            'line': f"{freq / 1e6:.5f} {mode} {name} {snr:.0f} dB",
+        }
+    return sorted(found.values(), key=lambda c: -c['snr_db'])
+
+
+class SimulatedBand:
+    """Tunable IQ source over a band of NFM carriers, with tuner ripple and a DC spike"""
+
+    def __init__(self, carriers_hz, levels_db, widths_hz=None, sample_rate=DEFAULT_SAMPLE_RATE, seed=0):
+        self.carriers_hz = np.asarray(carriers_hz, dtype=np.float64)
+        self.levels_db = np.asarray(levels_db, dtype=np.float64)
+        self.widths_hz = np.full(len(self.carriers_hz), 2.5e3) if widths_hz is None else np.asarray(widths_hz)
+        self.sample_rate = sample_rate
+        self.frequency_hz = None
+        self._rng = np.random.default_rng(seed)
+        self._t = 0
+
+    def set_frequency(self, hz):
+        self.frequency_hz = hz
+
+    def read(self, count):
+        t = (self._t + np.arange(count)) / self.sample_rate
+        self._t += count
+        noise = self._rng.standard_normal((2, count)).astype(np.float32) * 0.01
+        iq = (noise[0] + 1j * noise[1]).astype(np.complex64)
+        offsets = self.carriers_hz - self.frequency_hz
+        near = np.flatnonzero(np.abs(offsets) < self.sample_rate / 2)
+        for k in near:
+            # Deviation of a quarter of the occupied width, 400 Hz tone
+            phase = 2 * np.pi * offsets[k] * t + self.widths_hz[k] / 4 / 400 * np.sin(2 * np.pi * 400 * t)
+            iq += (0.01 * 10 ** (self.levels_db[k] / 20) * np.exp(1j * phase)).astype(np.complex64)
+        # Tuner ripple (a couple of dB across the window) and the DC offset
+        spectrum = np.fft.fft(iq)
+        freq = np.fft.fftfreq(count) * 2
+        spectrum *= (10 ** ((-1.5 * freq ** 2 + 0.5 * np.cos(6 * freq)) / 20)).astype(np.float32)
+        iq = np.fft.ifft(spectrum).astype(np.complex64) + np.complex64(0.05 + 0.03j)
+        return iq
+
+
+def measure(span_mhz=20.0, carriers=40, seed=3):
+    """Sweep a simulated band with known carriers; detection and MHz surveyed per second"""
+    rng = np.random.default_rng(seed)
+    start = 450.0e6
+    raster = np.arange(start + 50e3, start + span_mhz * 1e6 - 50e3, 12.5e3)
+    truth = np.sort(rng.choice(raster, carriers, replace=False))
+    levels = rng.uniform(12, 40, carriers)
+    widths = rng.choice([3e3, 6e3, 8e3, 11e3], carriers)
+    results = {}
+    for fft_size, dwell in ((4096, 0.05), (16384, 0.1)):
+        survey = BandSurvey(SimulatedBand(truth, levels, widths, seed=seed), start, start + span_mhz * 1e6,
+                            fft_size=fft_size, dwell=dwell)
+        spectrum = survey.run()
+        candidates = propose(spectrum, existing_hz=truth[:5])
+        proposed = np.array([c['freq_hz'] for c in candidates])
+        hits = int(np.isin(truth, proposed).sum())
+        results[f'fft{fft_size}_dwell{dwell}'] = {
+            'hops': survey.hops,
+            'found': hits,
+            'of': carriers,
+            'false': int(len(proposed) - np.isin(proposed, truth).sum()),
+            'listed': sum(c['listed'] for c in candidates),
+            'mhz_per_s': survey.mhz_per_second(),
+            # On a dongle each hop also takes its settle + dwell of samples
+            'dongle_mhz_per_s': span_mhz / (survey.hops * (dwell + survey.settle_samples / survey.sample_rate)),
+            'sample_lines': [c['line'] for c in candidates[:3]],
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Survey a band and print candidate ScanList lines")
+    parser.add_argument('start', type=float, nargs='?', help="MHz")
+    parser.add_argument('stop', type=float, nargs='?', help="MHz")
+    parser.add_argument('--address', default='127.0.0.1:1234', help="rtl_tcp server")
+    parser.add_argument('--fft-size', type=int, default=4096)
+    parser.add_argument('--dwell', type=float, default=0.05, help="seconds per hop")
+    parser.add_argument('--threshold', type=float, default=10.0, help="dB over the noise floor")
+    parser.add_argument('--gain', type=float)
+    parser.add_argument('--all', action='store_true', help="include channels already in the ScanList")
+    args = parser.parse_args()
+    if args.start is None or args.stop is None:
+        print(measure())
+        return
+    from channelizer import read_scanlist_frequencies
+    from rtl_tcp import RtlTcpStream, parse_address
+    try:
+        existing = read_scanlist_frequencies()[0]
+    except OSError:
+        existing = ()
+    stream = RtlTcpStream(*parse_address(args.address)).open()
+    try:
+        if args.gain is not None:
+            stream.set_gain(args.gain)
+        survey = BandSurvey(stream, args.start * 1e6, args.stop * 1e6, fft_size=args.fft_size, dwell=args.dwell)
+        candidates = propose(survey.run(), step_table(), args.threshold, existing)
+    finally:
+        stream.close()
+    for candidate in candidates:
+        if args.all or not candidate['listed']:
+            print(candidate['line'])
+    print(f"# {survey.mhz_per_second():.1f} MHz/s", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import asyncio
+import socket
+import threading
+
+import numpy as np
+
+from audio_ingest import BLOCK, DROP, AudioIngest, Consumer, SlowConsumer
+
+
+class Collector(Consumer):
+    def __init__(self, name, policy=BLOCK):
+        super().__init__(policy, block_timeout=5.0)
+        self.name = name
+        self.data = bytearray()
+
+    def handle(self, frame):
+        self.data += frame
+
+
+def serve_once(audio):
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+
+    def serve():
+        conn, _ = listener.accept()
+        with conn:
+            conn.sendall(audio)
+        listener.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    return listener.getsockname()
+
+
+def test_every_consumer_gets_the_whole_stream_and_a_slow_one_drops():
+    sample_rate = 8000
+    audio = (np.arange(sample_rate * 2) % 65536).astype('<u2').tobytes()
+    ingest = AudioIngest(*serve_once(audio), sample_rate, frame_ms=20, ring_seconds=0.2, reconnect=False)
+    first = ingest.add(Collector('first'))
+    second = ingest.add(Collector('second'))
+    slow = ingest.add(SlowConsumer(0.02, DROP))
+    asyncio.run(ingest.run())
+    assert ingest.bytes_received == len(audio)
+    assert bytes(first.data) == bytes(second.data) == audio
+    frames = len(audio) // ingest.ring.frame_bytes
+    metrics = ingest.metrics()
+    assert metrics['first']['dropped'] == metrics['second']['dropped'] == 0
+    # Dropping keeps the slow consumer from holding the others back
+    assert slow.dropped > 0
+    assert slow.frames + slow.dropped == frames
@@ -0,0 +1,32 @@
+import numpy as np
+
+from autogain import GAIN_TABLES, GainSweep, SimulatedDongle, code_histogram
+
+
+def test_code_histogram_counts_clipped_codes():
+    iq = np.array([-1 - 1j, 1 + 1j, 0.5 - 2j], dtype=np.complex64)
+    histogram = code_histogram(iq)
+    assert histogram.sum() == 6
+    assert histogram[0] == 3 and histogram[255] == 2 and histogram[191] == 1
+
+
+def test_a_strong_neighbour_keeps_the_gain_below_clipping():
+    center = 851.0e6
+    offsets = np.linspace(-900e3, 900e3, 12)
+    levels = [18.0 if k % 3 else 8.0 for k in range(12)]
+    dongle = SimulatedDongle(center, list(offsets) + [615e3], levels + [48.0])
+    result = GainSweep(dongle, center + offsets).run()
+    by_gain = {step['gain']: step for step in result['steps']}
+    assert list(by_gain) == list(GAIN_TABLES['R820T'])
+    assert result['gain'] < 32.8
+    assert result['clip_fraction'] <= 1e-4
+    assert by_gain[49.6]['clip_fraction'] > 0.5
+    assert result['mean_snr_db'] > by_gain[32.8]['score_db'] + 10
+    assert result['active_channels'] == 12
+
+
+def test_without_signals_the_most_gain_that_does_not_clip_wins():
+    center = 460.0e6
+    result = GainSweep(SimulatedDongle(center, [], []), [center + 100e3]).run()
+    assert result['gain'] == 49.6
+    assert result['active_channels'] == 0 and result['mean_snr_db'] is None
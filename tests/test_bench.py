@@ -0,0 +1,15 @@
+from bench import compare
+
+
+def test_small_absolute_changes_are_not_regressions():
+    baseline = {'scanlist': {'parse_10_ms': 0.010, 'parse_100000_ms': 40.0, 'lines_per_s': 1e6},
+                'config': {'save_us': 100.0}}
+    results = {'scanlist': {'parse_10_ms': 0.030, 'parse_100000_ms': 60.0, 'lines_per_s': 5e5},
+               'config': {'save_us': 140.0}}
+    rows = {(bench, metric): (change, bad) for bench, metric, old, new, change, bad in compare(results, baseline)}
+    # 200% slower, but by 20 us
+    assert rows['scanlist', 'parse_10_ms'] == (2.0, False)
+    assert rows['config', 'save_us'][1] is False
+    assert rows['scanlist', 'parse_100000_ms'][1] is True
+    assert rows['scanlist', 'lines_per_s'] == (1.0, True)
+    assert compare(results, baseline, noise_floor=0.0)[0][5] is True
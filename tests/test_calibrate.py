@@ -0,0 +1,50 @@
+import pytest
+
+from calibrate import CalibrationError, PpmCalibrator
+from channelizer import DEFAULT_SAMPLE_RATE, synthetic_iq
+
+
+class Capture:
+    """A recording in memory, made at frequency_hz"""
+
+    def __init__(self, iq, frequency_hz):
+        self.iq = iq
+        self.frequency_hz = frequency_hz
+        self.position = 0
+
+    def read(self, count):
+        block = self.iq[self.position:self.position + count]
+        self.position += count
+        return block
+
+
+def dongle_capture(reference_hz, error_ppm, deviation_hz=0.0, snr_db=15.0):
+    center_hz = reference_hz - 200e3
+    # The tuner lands error_ppm high, so the reference shows up that much lower
+    offset = reference_hz - center_hz * (1 + error_ppm * 1e-6)
+    iq = synthetic_iq(8 * 65536, [offset], DEFAULT_SAMPLE_RATE, snr_db=snr_db, deviation_hz=deviation_hz)
+    return Capture(iq, center_hz)
+
+
+@pytest.mark.parametrize('deviation_hz', [0.0, 2.5e3])
+def test_measures_the_crystal_error(deviation_hz):
+    reference_hz = 851.0125e6
+    result = PpmCalibrator(dongle_capture(reference_hz, 23.4, deviation_hz), reference_hz).measure()
+    assert result['ppm'] == pytest.approx(23.4, abs=0.1)
+    assert result['snr_db'] > 10
+
+
+def test_correction_already_applied_is_added():
+    reference_hz = 462.5625e6
+    # Recorded with -P20 applied, 3.1 PPM still off
+    result = PpmCalibrator(dongle_capture(reference_hz, 3.1), reference_hz, applied_ppm=20.0).measure()
+    assert result['ppm'] == pytest.approx(23.1, abs=0.1)
+    assert result['residual_ppm'] == pytest.approx(3.1, abs=0.1)
+
+
+def test_no_carrier_is_an_error():
+    noise = synthetic_iq(8 * 65536, [], DEFAULT_SAMPLE_RATE)
+    with pytest.raises(CalibrationError):
+        PpmCalibrator(Capture(noise, 851.0e6), 851.2e6).measure()
+    with pytest.raises(CalibrationError):
+        PpmCalibrator(Capture(noise, None), 851.2e6).measure()
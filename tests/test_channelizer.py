@@ -0,0 +1,30 @@
+import numpy as np
+
+from channelizer import Channelizer, synthetic_iq, uint8_to_complex64
+
+
+def test_uint8_samples_map_to_unit_range():
+    samples = uint8_to_complex64(bytes([0, 255, 255, 0, 128, 127]))
+    assert np.allclose(samples, [-1 + 1j, 1 - 1j, (0.5 - 0.5j) / 127.5])
+
+
+def test_active_channels_are_found_among_quiet_ones():
+    center = 460.0e6
+    freqs = center + (np.arange(64) - 32) * 12.5e3
+    on = freqs[[3, 20, 41, 60]]
+    # Outside the usable 90% of the capture: never reported
+    outside = center + 1.15e6
+    channelizer = Channelizer(center, np.append(freqs, outside))
+    report = channelizer.process(synthetic_iq(65536, on - center))
+    assert report.active_channels().tolist() == on.tolist()
+    assert np.isnan(report.power_db[-1]) and not report.active[-1]
+    assert np.all(report.snr_db()[:-1][np.isin(freqs, on)] > 20)
+
+
+def test_a_partial_frame_waits_for_the_next_block():
+    center = 851.0e6
+    channelizer = Channelizer(center, [center + 100e3], fft_size=256)
+    iq = synthetic_iq(256 * 40, [100e3])
+    assert channelizer.process(iq[:100]).active.tolist() == [False]
+    assert channelizer.process(iq[100:]).active.tolist() == [True]
+    assert len(channelizer.history) == 256 * 7
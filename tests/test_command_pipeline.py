@@ -0,0 +1,67 @@
+from command_pipeline import CommandPipeline
+
+
+class Recording:
+    name = 'recording'
+
+    def __init__(self):
+        self.calls = []
+
+    def send_keys(self, keys):
+        self.calls.append(('keys', keys))
+
+    def tune(self, freq_mhz):
+        self.calls.append(('tune', freq_mhz))
+
+    def step_gain(self, steps, gain_db):
+        self.calls.append(('gain', steps, gain_db))
+
+    def step_ppm(self, steps, ppm):
+        self.calls.append(('ppm', steps, ppm))
+
+    def start_scan(self):
+        self.calls.append(('scan_start',))
+
+    def stop_scan(self):
+        self.calls.append(('scan_stop',))
+
+    def close(self):
+        pass
+
+
+def run(submissions):
+    backend = Recording()
+    # Queued before the worker starts, so everything is pending at once
+    pipeline = CommandPipeline(backend)
+    for args in submissions:
+        pipeline.submit(*args)
+    pipeline.start()
+    assert pipeline.wait_idle()
+    pipeline.stop()
+    return pipeline, backend.calls
+
+
+def test_tune_replaces_tune_and_steps_sum():
+    pipeline, calls = run([('tune', 423.5), ('gain', 1, 31), ('tune', 460.125), ('gain', 1, 32),
+                           ('ppm', -1, -0.1), ('gain', -3, 29), ('ppm', -1, -0.2)])
+    assert calls == [('tune', 460.125), ('gain', -1, 29), ('ppm', -2, -0.2)]
+    assert pipeline.coalesced == 4
+    assert pipeline.latency.count == 7
+
+
+def test_other_kinds_are_barriers():
+    pipeline, calls = run([('gain', 1, 31), ('keys', 's'), ('gain', 1, 32), ('tune', 423.5),
+                           ('scan_stop',), ('tune', 460.125)])
+    assert calls == [('gain', 1, 31), ('keys', 's'), ('gain', 1, 32), ('tune', 423.5),
+                     ('scan_stop',), ('tune', 460.125)]
+    assert pipeline.coalesced == 0
+
+
+def test_steps_that_cancel_out_send_nothing():
+    pipeline, calls = run([('gain', 2, 34), ('gain', -2, 32), ('scan_restart',)])
+    assert calls == [('scan_stop',), ('scan_start',)]
+    results = []
+    pipeline.on_result = lambda cmd, error: results.append((cmd.kind, error))
+    pipeline.drain_results()
+    assert [kind for kind, error in results] == ['gain', 'scan_restart']
+    assert all(error is None for kind, error in results)
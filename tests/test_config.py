@@ -0,0 +1,88 @@
+import json
+import threading
+import time
+
+import pytest
+
+import config
+from config import ConfigStore, FmpConfig
+
+CFG = ('2.4                                ; sampling rate (1.0, 2.0 or 2.4)\r\n'
+       '1024                               ; spectrum window width\r\n'
+       '64                                 ; FFT size (16k, 32k, 64k)\r\n'
+       '15                                 ; spectrum update rate in Hz\r\n'
+       '5000 -6250 7500 12500 15000 25000  ; step size table; units = Hz; negate default\r\n')
+
+
+def make_store(directory, delay=0.01):
+    return ConfigStore(str(directory / 'fmp_settings.json'), str(directory / 'launcher_config.json'),
+                       str(directory / 'FMP24.cfg'), delay)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_fmp_cfg_round_trip_keeps_comments_and_crlf():
+    cfg = FmpConfig(CFG.splitlines(keepends=True))
+    assert cfg.text() == CFG
+    assert cfg['step_table'] == [5000, -6250, 7500, 12500, 15000, 25000]
+    assert cfg.fft_size == 65536
+    assert cfg.set('update_rate', '20') and not cfg.set('update_rate', 20.0)
+    assert cfg.text().splitlines(keepends=True)[3] == (
+        '20                                 ; spectrum update rate in Hz\r\n')
+
+
+def test_settings_round_trip(tmp_path):
+    (tmp_path / 'launcher_config.json').write_text(json.dumps({'rf_gain': 40, 'language': 'en'}))
+    (tmp_path / 'FMP24.cfg').write_bytes(CFG.encode())
+    store = make_store(tmp_path)
+    assert (store.get('gain'), store.get('language')) == (40.0, 'en')
+    store.update(ppm='1.5', economy='off')
+    store.set_cfg('fft_size_k', 32)
+    with pytest.raises(ValueError):
+        store.set('dongles', 'two')
+    store.close()
+    reloaded = make_store(tmp_path)
+    assert (reloaded.get('ppm'), reloaded.get('economy'), reloaded.get('gain')) == (1.5, False, 40.0)
+    assert reloaded.cfg['fft_size_k'] == 32
+    assert (tmp_path / 'FMP24.cfg').read_bytes().count(b'\r\n') == 5
+    reloaded.close()
+
+
+def test_failed_write_is_retried(tmp_path):
+    missing = tmp_path / 'later'
+    store = make_store(missing)
+    store.set('gain', 12)
+    assert wait_for(lambda: store.last_error is not None)
+    missing.mkdir()
+    assert wait_for(lambda: (missing / 'fmp_settings.json').exists())
+    assert json.loads((missing / 'fmp_settings.json').read_text())['gain'] == 12.0
+    store.close()
+
+
+def test_set_does_not_wait_for_the_disk(tmp_path, monkeypatch):
+    writing = threading.Event()
+    release = threading.Event()
+    atomic_write = config.atomic_write
+
+    def slow_write(path, text):
+        writing.set()
+        release.wait(5.0)
+        atomic_write(path, text)
+
+    monkeypatch.setattr(config, 'atomic_write', slow_write)
+    store = make_store(tmp_path)
+    store.set('gain', 10)
+    assert writing.wait(5.0)
+    started = time.perf_counter()
+    store.set('gain', 11)
+    assert time.perf_counter() - started < 0.5
+    release.set()
+    store.close()
+    assert json.loads((tmp_path / 'fmp_settings.json').read_text())['gain'] == 11.0
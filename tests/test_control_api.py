@@ -0,0 +1,122 @@
+import json
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from command_pipeline import NullBackend
+from config import ConfigStore
+from control_api import MAX_REQUEST, ControlClient, ControlServer, RpcError, load_token
+from controller import ScannerController
+
+
+TOKEN = 'test-token'
+
+
+@pytest.fixture
+def server(tmp_path):
+    scan_path = tmp_path / 'FMP24.ScanList'
+    scan_path.write_text('423.50000 NFM\n')
+    settings = ConfigStore(str(tmp_path / 'fmp_settings.json'), str(tmp_path / 'launcher_config.json'),
+                           str(tmp_path / 'FMP24.cfg'))
+    controller = ScannerController(settings, str(scan_path), NullBackend(0.0))
+    server = ControlServer(controller, '127.0.0.1:0', TOKEN).start()
+    yield server
+    server.stop()
+
+
+def raw_exchange(server, data):
+    """Everything the server sends back before it closes the connection"""
+    host, port = server.bound.rsplit(':', 1)
+    with socket.create_connection((host, int(port)), 5.0) as sock:
+        sock.sendall(data)
+        sock.shutdown(socket.SHUT_WR)
+        received = b''
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return [json.loads(line) for line in received.splitlines() if line.strip()]
+            received += chunk
+
+
+def test_pipelined_calls_and_batches(server):
+    client = ControlClient(server.bound, token=TOKEN)
+    try:
+        assert client.call_many([('tune', [423.5]), ('status', [])])[0] == 423.5
+        assert client.call('get_scan_list').startswith('423.5')
+        with pytest.raises(RpcError) as e:
+            client.call('no_such_method')
+        assert e.value.code == -32601
+    finally:
+        client.close()
+
+
+def test_notification_has_no_reply(server):
+    line = {'jsonrpc': '2.0', 'method': 'tune', 'params': [423.5], 'token': TOKEN}
+    status = {'jsonrpc': '2.0', 'id': 7, 'method': 'status', 'params': [], 'token': TOKEN}
+    replies = raw_exchange(server, (json.dumps(line) + '\n' + json.dumps(status) + '\n').encode())
+    assert [r['id'] for r in replies] == [7]
+
+
+def test_request_without_token_closes_connection(server):
+    request = {'jsonrpc': '2.0', 'id': 1, 'method': 'save_scan_list', 'params': ['1.0 PWNED\n']}
+    second = dict(request, token=TOKEN)
+    replies = raw_exchange(server, (json.dumps(request) + '\n' + json.dumps(second) + '\n').encode())
+    assert [r['error']['code'] for r in replies] == [-32001]
+    with open(server.controller.scan_path) as f:
+        assert 'PWNED' not in f.read()
+
+
+def test_http_preamble_is_rejected(server):
+    body = json.dumps({'method': 'save_scan_list', 'params': ['1.0 PWNED\n'], 'token': TOKEN})
+    post = (f'POST / HTTP/1.1\r\nHost: 127.0.0.1:4550\r\nContent-Type: text/plain\r\n'
+            f'Content-Length: {len(body)}\r\n\r\n{body}\n').encode()
+    replies = raw_exchange(server, post)
+    assert [r['error']['code'] for r in replies] == [-32700]
+    with open(server.controller.scan_path) as f:
+        assert 'PWNED' not in f.read()
+
+
+def test_unterminated_line_is_capped(server):
+    replies = raw_exchange(server, b'[' * (MAX_REQUEST + 1))
+    assert replies[-1]['error']['code'] == -32600
+
+
+def test_token_is_created_once(tmp_path):
+    path = str(tmp_path / 'control_token')
+    token = load_token(path)
+    assert len(token) == 32
+    assert load_token(path) == token
+    if os.name == 'posix':
+        assert os.stat(path).st_mode & 0o077 == 0
+
+
+def test_slow_methods_do_not_block_other_requests(server):
+    started = threading.Event()
+    release = threading.Event()
+
+    def survey(start_mhz, stop_mhz):
+        started.set()
+        release.wait(5.0)
+        server.controller.emit('survey', done=True)
+        return {'lines': []}
+
+    server.methods['survey'] = survey
+    client = ControlClient(server.bound, token=TOKEN)
+    try:
+        client.subscribe()
+        pending = client.request('survey', 400.0, 470.0)
+        assert started.wait(5.0)
+        before = time.perf_counter()
+        assert client.call('status')['scanning'] is False
+        assert time.perf_counter() - before < 1.0
+        assert not pending.done()
+        release.set()
+        assert pending.result(5.0) == {'lines': []}
+        event, data = client.events.get(timeout=5.0)
+        assert (event, data) == ('survey', {'done': True})
+    finally:
+        release.set()
+        client.close()
@@ -0,0 +1,67 @@
+import pytest
+
+from command_pipeline import NullBackend
+from config import ConfigStore
+from controller import ControllerError, ScannerController
+
+
+class Launched:
+    """Stands in for a running ScanSupervisor"""
+
+    def __init__(self):
+        self.instances = [None]
+        self.restarts = []
+
+    def stop(self):
+        pass
+
+    def restart(self, reason='restart', instances=None):
+        self.restarts.append(reason)
+
+
+@pytest.fixture
+def controller(tmp_path):
+    scan_path = tmp_path / 'FMP24.ScanList'
+    scan_path.write_text('423.50000 NFM\n')
+    settings = ConfigStore(str(tmp_path / 'fmp_settings.json'), str(tmp_path / 'launcher_config.json'),
+                           str(tmp_path / 'FMP24.cfg'))
+    controller = ScannerController(settings, str(scan_path), NullBackend(0.0))
+    events = []
+    controller.listeners.append(lambda event, data: events.append((event, data)))
+    controller.events = events
+    yield controller
+    controller.close()
+
+
+def events(controller, name):
+    return [data for event, data in controller.events if event == name]
+
+
+def test_start_scan_saves_the_scanned_text(controller):
+    with pytest.raises(ControllerError):
+        controller.start_scan('423.50000 NFM\n460.12500 NFM\n')
+    assert controller.get_scan_list() == '423.50000 NFM\n'
+    controller.supervisor = Launched()
+    text = '423.50000 NFM\n460.12500 NFM\n'
+    assert controller.start_scan(text)['channels'] == 2
+    assert controller.get_scan_list() == text
+    assert events(controller, 'scan_list') == [{'added': 1, 'removed': 0, 'source': 'scan'}]
+    # Saving what is already being scanned must not restart the scan
+    assert controller.save_scan_list(text) == {'added': 0, 'removed': 0}
+    assert controller.save_scan_list('460.12500 NFM\n') == {'added': 0, 'removed': 1}
+    controller.commands.wait_idle()
+    controller.commands.drain_results()
+    kinds = [data['kind'] for data in events(controller, 'command')]
+    assert kinds == ['scan_start', 'scan_restart']
+
+
+def test_gain_restart_runs_on_the_slow_worker(controller):
+    controller.supervisor = Launched()
+    queued = []
+    controller.run_slow = queued.append
+    assert controller.set_gain(30) == 30.0
+    # The SendKeys-style backend has no set_gain, so FMP24 must restart, but not here
+    assert controller.supervisor.restarts == []
+    queued.pop()()
+    assert controller.supervisor.restarts == ['gain set']
+    assert events(controller, 'restart') == [{'reason': 'gain set'}]
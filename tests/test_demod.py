@@ -0,0 +1,94 @@
+import numpy as np
+
+from activity import ActivityStore, ActivityTracker
+from demod import AUDIO_RATE, DemodEngine, NfmDemodulator
+from tone_decoder import ToneDecoder
+
+RATE = 2_400_000
+CENTER = 460_000_000
+CHANNEL = CENTER + 100_000
+
+
+class BurstSource:
+    """Complex noise with a carrier on CHANNEL from `start` to `stop` seconds
+
+    With ctcss, the carrier is FM-modulated by that tone at 500 Hz deviation.
+    """
+
+    sample_rate = RATE
+
+    def __init__(self, start, stop, ctcss=None, seed=0):
+        self.start = start
+        self.stop = stop
+        self.ctcss = ctcss
+        self.position = 0
+        self.rng = np.random.default_rng(seed)
+
+    def read(self, count):
+        n = self.position + np.arange(count)
+        iq = 0.01 * (self.rng.standard_normal(count) + 1j * self.rng.standard_normal(count))
+        t = n / RATE
+        on = (t >= self.start) & (t < self.stop)
+        phase = 2 * np.pi * (CHANNEL - CENTER) * t[on]
+        if self.ctcss:
+            phase += 500.0 / self.ctcss * np.sin(2 * np.pi * self.ctcss * t[on])
+        iq[on] += 0.5 * np.exp(1j * phase)
+        self.position += count
+        return iq.astype(np.complex64)
+
+    def close(self):
+        pass
+
+
+def test_squelch_follows_carrier():
+    demod = NfmDemodulator(100_000, 12_500, RATE)
+    source = BurstSource(0.5, 1.0)
+    states = []
+    for _ in range(75):
+        demod.process(source.read(48_000))
+        states.append(demod.squelch_open)
+    assert not any(states[:24])
+    assert all(states[26:49])
+    assert not any(states[51:])
+    assert demod.level_db > demod.noise_db
+
+
+def test_engine_records_one_hit_per_transmission(tmp_path):
+    store = ActivityStore(str(tmp_path / "activity.db"))
+    tracker = ActivityTracker(store, [CHANNEL], [3])
+    engine = DemodEngine(BurstSource(0.5, 1.5), CENTER, [(CHANNEL, 12_500, 0)],
+                         block=48_000, tracker=tracker)
+    try:
+        for _ in range(100):
+            engine.step()
+        status = engine.status()['channels'][0]
+        assert status['squelch_open'] is False
+    finally:
+        engine.close()
+    store.flush()
+    hits = store.recent(CHANNEL)
+    store.close()
+    assert len(hits) == 1
+    ts, dwell, level, tag = hits[0]
+    assert abs(ts - (engine.started + 0.5)) < 0.05
+    assert abs(dwell - 1.0) < 0.05
+    assert level > -20
+    assert tag is None
+
+
+def test_hits_carry_the_ctcss_tag(tmp_path):
+    store = ActivityStore(str(tmp_path / "activity.db"))
+    engine = DemodEngine(BurstSource(0.5, 2.0, ctcss=103.5), CENTER, [(CHANNEL, 12_500, 0)], block=48_000,
+                         tracker=ActivityTracker(store, [CHANNEL]), tones=ToneDecoder(AUDIO_RATE))
+    try:
+        tags = []
+        for _ in range(125):
+            engine.step()
+            tags.append(engine.status()['channels'][0]['tag'])
+    finally:
+        engine.close()
+    store.flush()
+    hits = store.recent(CHANNEL)
+    store.close()
+    assert '103.5' in tags and tags[-1] is None
+    assert [hit[3] for hit in hits] == ['103.5']
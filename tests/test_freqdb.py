@@ -0,0 +1,69 @@
+import shutil
+
+import numpy as np
+import pytest
+
+import iq_file
+from command_pipeline import NullBackend
+from config import ConfigStore
+from controller import ScannerController
+from freqdb import FreqDatabase, describe, naive_query, write_synthetic_csv
+from survey import SimulatedBand
+
+ORIGIN = (19.7163, -155.6241)
+HEADER = '; TXfreq, RXfreq, Licensee, Location, Latitude, Longitude, first emission mode, second emission mode\n'
+
+
+def test_indexed_query_matches_the_naive_scan(tmp_path):
+    path = str(tmp_path / 'list.csv')
+    write_synthetic_csv(path, 3000)
+    db = FreqDatabase([path], origin=ORIGIN, distance=4000.0)
+    for freq in np.linspace(150.0, 470.0, 25):
+        indexed = [r['distance'] for r in db.query(freq, 20_000)]
+        naive = [d for d, _ in naive_query(path, freq, 20_000, ORIGIN, 4000.0)]
+        assert indexed == pytest.approx(naive, rel=1e-4)
+
+
+def test_appended_rows_are_found(tmp_path):
+    path = tmp_path / 'list.csv'
+    path.write_text(HEADER + '460.0125, , "City Fire", "Hilo", 19.72, -155.08, "11K2F3E", ""\n')
+    db = FreqDatabase([str(path)], origin=ORIGIN, distance=100.0)
+    assert [r['licensee'] for r in db.query(460.0125)] == ['City Fire']
+    with open(path, 'a') as f:
+        f.write('460.0125, , "County EMS", "Kona", 19.64, -155.99, "7K60FXE", ""\n')
+    db.refresh()
+    records = db.query(460.0125)
+    assert sorted(r['licensee'] for r in records) == ['City Fire', 'County EMS']
+    assert describe(records[0]) in ('City Fire Hilo', 'County EMS Kona')
+
+
+@pytest.fixture
+def controller(tmp_path):
+    shutil.copy('FMP24.cfg', tmp_path / 'FMP24.cfg')
+    (tmp_path / 'FMP-FreqList.csv').write_text(
+        HEADER + '460.0125, 465.0125, "City   Fire", "Hilo", 19.72, -155.08, "11K2F3E", ""\n'
+                 '460.0125, , "Far Away", "Honolulu", 21.31, -157.86, "11K2F3E", ""\n')
+    (tmp_path / 'FMP24.ScanList').write_text('423.50000 NFM\n')
+    settings = ConfigStore(str(tmp_path / 'fmp_settings.json'), str(tmp_path / 'launcher_config.json'),
+                           str(tmp_path / 'FMP24.cfg'))
+    controller = ScannerController(settings, str(tmp_path / 'FMP24.ScanList'), NullBackend(0.0))
+    yield controller
+    controller.close()
+
+
+def test_scan_line_is_described_from_the_frequency_list(controller):
+    # Honolulu is beyond FMP24.cfg's 99.9 mile search distance
+    assert controller.scan_line(460.0125)['line'] == '460.01250 NFM City Fire Hilo'
+    assert controller.scan_line(155.5)['line'] == '155.50000 NFM'
+
+
+class Band(SimulatedBand):
+    def close(self):
+        pass
+
+
+def test_survey_proposals_are_named_from_the_frequency_list(controller, monkeypatch):
+    band = Band([460.0125e6, 460.0375e6], [30, 25], [11e3, 11e3])
+    monkeypatch.setattr(iq_file, 'open_source', lambda *args, **kwargs: band)
+    lines = [line.rsplit(' ', 2)[0] for line in controller.survey(459.9, 460.1)['lines']]
+    assert sorted(lines) == ['460.01250 NFM City Fire Hilo', '460.03750 NFM survey']
@@ -0,0 +1,60 @@
+import json
+
+from i18n import TclError, Translator
+
+
+class Widget:
+    def __init__(self, name):
+        self.name = name
+        self.options = {}
+        self.destroyed = False
+
+    def configure(self, **options):
+        if self.destroyed:
+            raise TclError(f'invalid command name "{self.name}"')
+        self.options.update(options)
+
+    def __str__(self):
+        return self.name
+
+
+def translator(tmp_path):
+    (tmp_path / 'en.json').write_text(json.dumps({'ready': 'Ready', 'set_to': 'Set to {} MHz', 'only_en': 'Only'}))
+    (tmp_path / 'ar.json').write_text(json.dumps({'ready': 'جاهز', 'set_to': 'تم الضبط {}'}), encoding='utf-8')
+    return Translator('en', directory=str(tmp_path))
+
+
+def test_bound_widgets_follow_the_language(tmp_path):
+    t = translator(tmp_path)
+    assert t.languages() == ['ar', 'en']
+    label = t.bind(Widget('.label'), 'ready')
+    button = t.bind(Widget('.button'), 'set_to', 423.5)
+    tip = t.bind(Widget('.tip'), 'only_en', option='tooltip')
+    titles = []
+    t.bind_setter('title', titles.append, 'ready')
+    t.set_language('ar')
+    assert label.options == {'text': 'جاهز'}
+    assert button.options == {'text': 'تم الضبط 423.5'}
+    # Missing in Arabic: English, then the key itself
+    assert tip.options == {'tooltip': 'Only'}
+    assert t.get('no_such_key') == 'no_such_key'
+    assert titles == ['Ready', 'جاهز']
+
+
+def test_rebinding_replaces_and_destroyed_widgets_are_dropped(tmp_path):
+    t = translator(tmp_path)
+    label = t.bind(Widget('.label'), 'ready')
+    t.bind(label, 'set_to', 1)
+    gone = t.bind(Widget('.gone'), 'ready')
+    assert len(t) == 2
+    gone.destroyed = True
+    t.set_language('ar')
+    assert len(t) == 1
+    assert label.options['text'] == 'تم الضبط 1'
+    t.unbind(label)
+    assert len(t) == 0
+
+
+def test_shipped_catalogs_have_the_same_keys():
+    t = Translator()
+    assert set(t.catalog('ar')) == set(t.catalog('en'))
@@ -0,0 +1,13 @@
+from iq_file import open_source, write_synthetic
+
+
+def test_raw_files_take_the_given_rate_and_wav_files_their_header(tmp_path):
+    raw = write_synthetic(str(tmp_path / 'capture.cu8'), 0.05, sample_rate=2.0e6)
+    wav = write_synthetic(str(tmp_path / 'fmp.wav'), 0.05, sample_rate=1.0e6, fmt='cs16')
+    for path, expected in ((raw, 2.0e6), (wav, 1.0e6)):
+        source = open_source(path, 2.0e6, realtime=False).open()
+        try:
+            assert source.sample_rate == expected
+            assert abs(source.duration - 0.05) < 1e-3
+        finally:
+            source.close()
@@ -0,0 +1,39 @@
+import numpy as np
+
+from occupancy import TransmissionTracker, measure
+
+
+def test_tracker_bridges_gaps_and_carries_runs_across_windows():
+    tracker = TransmissionTracker(2, hang_blocks=2, min_blocks=3)
+    first = np.zeros((10, 2), dtype=np.uint8)
+    first[1:3, 0] = 20   # too short on its own
+    first[4:10, 1] = 15  # touches the end of the window
+    tracker.add(first)
+    assert tracker.events == []
+    second = np.zeros((10, 2), dtype=np.uint8)
+    second[0:3, 1] = 30  # continues the run from the first window
+    tracker.add(second)
+    tracker.finish()
+    assert tracker.events == [(1, 4, 13, 30)]
+    assert tracker.active_blocks.tolist() == [2, 9]
+
+
+def test_tracker_splits_on_long_gaps():
+    tracker = TransmissionTracker(1, hang_blocks=1, min_blocks=1)
+    window = np.zeros((12, 1), dtype=np.uint8)
+    window[0:2] = 10
+    window[3:5] = 12  # one quiet block: bridged
+    window[8:10] = 11  # three quiet blocks: a new transmission
+    tracker.add(window)
+    tracker.finish()
+    assert tracker.events == [(0, 0, 5, 12), (0, 8, 10, 11)]
+
+
+def test_measured_occupancy_matches_the_keying(tmp_path):
+    keep = tmp_path / 'keep.txt'
+    keep.write_text('mine')
+    results = measure(seconds=6, files=1, workers=2, directory=str(tmp_path))
+    assert np.allclose(results['occupancy'], results['expected_occupancy'], atol=0.05)
+    assert sum(results['transmissions']) == results['transmission_rows'] > 0
+    # Only measure's own scratch directory is removed
+    assert list(tmp_path.iterdir()) == [keep]
@@ -0,0 +1,73 @@
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from rtl_tcp import (CMD_SET_FREQ_CORRECTION, CMD_SET_FREQUENCY, CMD_SET_GAIN, CMD_SET_GAIN_MODE,
+                     CMD_SET_SAMPLE_RATE, COMMAND_SIZE, RtlTcpBackend, RtlTcpStream, StandInServer,
+                     pack_command, parse_address, recv_exact)
+
+
+def test_commands_are_five_bytes_big_endian():
+    assert pack_command(CMD_SET_FREQUENCY, 460_125_000) == b'\x01' + (460_125_000).to_bytes(4, 'big')
+    assert pack_command(CMD_SET_GAIN, 496) == b'\x04\x00\x00\x01\xf0'
+    assert pack_command(CMD_SET_FREQ_CORRECTION, -3) == b'\x05\xff\xff\xff\xfd'
+    assert parse_address('10.0.0.2:1235') == ('10.0.0.2', 1235)
+    assert parse_address('localhost') == ('localhost', 1234)
+
+
+def test_backend_reads_the_header_and_sends_one_packet_per_change():
+    server = StandInServer(tuner=5, gain_count=29, echo=True)
+    backend = RtlTcpBackend(*server.address)
+    try:
+        backend.tune(460.125)
+        backend.step_gain(3, 49.6)
+        backend.set_ppm(-2.6)
+        # Each echo means the server has recorded that packet
+        for _ in range(4):
+            recv_exact(backend.sock, COMMAND_SIZE)
+        assert (backend.tuner_type, backend.gain_count) == ('R820T', 29)
+        assert server.commands == [(CMD_SET_GAIN_MODE, 1), (CMD_SET_FREQUENCY, 460_125_000),
+                                   (CMD_SET_GAIN, 496), (CMD_SET_FREQ_CORRECTION, -3)]
+        with pytest.raises(NotImplementedError):
+            backend.start_scan()
+    finally:
+        backend.close()
+        server.close()
+
+
+def test_a_server_without_the_magic_is_refused():
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+
+    def serve():
+        conn, _ = listener.accept()
+        with conn:
+            conn.sendall(b'HTTP/1.1 400')
+            conn.recv(1)
+
+    threading.Thread(target=serve, daemon=True).start()
+    backend = RtlTcpBackend(*listener.getsockname())
+    with pytest.raises(ConnectionError):
+        backend.connect()
+    assert backend.sock is None
+    listener.close()
+
+
+def test_stream_sets_rate_and_frequency_and_converts_samples():
+    server = StandInServer(iq=bytes([255, 0, 0, 255] * 1024))
+    stream = RtlTcpStream(*server.address, sample_rate=2.048e6, frequency_hz=851.0125e6).open()
+    try:
+        block = stream.read(4096)
+        assert block.dtype == np.complex64 and len(block) == 4096
+        assert np.all(block.real * block.imag < 0)
+        deadline = time.monotonic() + 2.0
+        while len(server.commands) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert server.commands == [(CMD_SET_SAMPLE_RATE, 2_048_000), (CMD_SET_FREQUENCY, 851_012_500)]
+    finally:
+        stream.close()
+        server.close()
@@ -0,0 +1,125 @@
+import random
+
+import numpy as np
+import pytest
+
+import scanlist_sync
+from scanlist import (BLANK, ENTRY, EOF, ERROR, FAST_PARSE_LINES, Mode, ScanList,
+                      parse_line, parse_lines_fast, split_lines, synthetic_text)
+
+
+def parse_slow(text):
+    return [parse_line(line) for line in split_lines(text)]
+
+
+def assert_model_matches(model, text):
+    expected = parse_slow(text)
+    assert model.kind.tolist() == [p[0] for p in expected]
+    assert model.freq_hz.tolist() == [p[1] for p in expected]
+    assert model.mode.tolist() == [p[2] for p in expected]
+    assert model.priority.tolist() == [p[3] for p in expected]
+    assert model.desc_offset.tolist() == [p[4] for p in expected]
+    assert model.line_errors == [p[5] for p in expected]
+
+
+def test_parse_line_fields():
+    line = '423.0125 DMR 5 Fire dispatch'
+    kind, freq, mode, priority, desc, error = parse_line(line)
+    assert (kind, freq, mode, priority, error) == (ENTRY, 423_012_500, Mode.DMR, 5, None)
+    assert line[desc:] == 'Fire dispatch'
+    assert parse_line('   ')[0] == BLANK
+    assert parse_line('<EOF>')[0] == EOF
+    assert parse_line('abc NFM')[0] == ERROR
+
+
+def test_entries_and_eof():
+    model = ScanList('423.5 NFM 2 Ops\n\n151.25 P25\n<EOF>\n160.1 NFM\n')
+    entries = model.entries()
+    assert [e.freq_hz for e in entries] == [423_500_000, 151_250_000]
+    assert entries[0].description == 'Ops'
+    assert entries[1].bandwidth_hz == 9500
+    assert model.frequencies_mhz() == [423.5, 151.25]
+
+
+@pytest.mark.parametrize('ending', ['\n\n', '\n\n\n\n', '\n \n'])
+def test_fast_parse_with_trailing_blank_lines(ending):
+    text = synthetic_text(FAST_PARSE_LINES + 6) + ending
+    model = ScanList(text)
+    assert len(model.lines) == len(split_lines(text))
+    assert len(model) == FAST_PARSE_LINES + 6
+    assert_model_matches(model, text)
+
+
+@pytest.mark.parametrize('count', [1, FAST_PARSE_LINES + 36])
+def test_priority_overflow_is_a_line_error(count):
+    text = '423.1 NFM 2147483648\n423.2 NFM 7\n' * count
+    model = ScanList(text)
+    assert len(model) == count
+    assert model.errors()[0] == (1, "Priority out of range '2147483648'")
+    model.set_text('423.1 NFM 99999999999\n' * 100)
+    assert len(model) == 0
+    assert len(model.errors()) == 100
+
+
+def test_fast_parser_agrees_with_parse_line():
+    rng = random.Random(7)
+    words = ['423.5', '151.0125', '.5', '5.', '1.2.3', '99999999999999', '100000.000001',
+             '0', '0.0', '12a', '-3', '+4', '+', '7', '2147483647', '2147483648', '-2147483648',
+             '1234567890', 'NFM', 'dmr', 'D-STAR', 'nexedge96', 'CAP+', 'Tower', 'Fire\tDisp',
+             '<EOF>', 'café', '\x01', '1234567890123456789012345', '423.1234567']
+    lines = []
+    for _ in range(3000):
+        lines.append(' ' * rng.randint(0, 2) + ' '.join(rng.choice(words) for _ in range(rng.randint(0, 5))))
+    text = '\n'.join(lines) + '\n'
+    raw = text.encode('utf-8')[:-1]
+    kind, freq, mode, priority, desc, errors = parse_lines_fast(raw, split_lines(text))
+    expected = parse_slow(text)
+    for i, p in enumerate(expected):
+        assert (kind[i], freq[i], mode[i], priority[i], desc[i], errors[i]) == p, lines[i]
+
+
+def test_incremental_edit_matches_full_parse():
+    text = synthetic_text(500)
+    model = ScanList(text)
+    edited = text.replace('channel 250\n', 'channel 250 edited\n423.5 NFM 9 new\n', 1)
+    start, removed, added = model.set_text(edited)
+    assert (removed, added) == (1, 2)
+    assert_model_matches(model, edited)
+    model.replace_lines(0, 1, ['151.25 P25 3'])
+    assert model.priority[0] == 3
+    assert_model_matches(model, model.text)
+
+
+def test_crlf_text():
+    model = ScanList('423.5 NFM\r\n151.25 DMR\r\n')
+    assert model.freq_hz.tolist() == [423_500_000, 151_250_000]
+    assert np.all(model.kind == ENTRY)
+
+
+def test_fast_parse_of_blank_lines():
+    model = ScanList(' \n' * 100)
+    assert len(model) == 0
+    assert len(model.lines) == len(split_lines(' \n' * 100))
+    text = synthetic_text(10)
+    model = ScanList(text)
+    model.set_text(text + '\n' * 100)
+    assert len(model) == 10
+    assert_model_matches(model, text + '\n' * 100)
+
+
+def test_failed_save_keeps_the_model_and_the_change(tmp_path, monkeypatch):
+    path = tmp_path / 'FMP24.ScanList'
+    path.write_text('423.50000 NFM Bahía Blanca\n', encoding='utf-8')
+    scan_file = scanlist_sync.ScanListFile(str(path))
+    text, diff = scan_file.read()
+    assert 'Bahía' in text and len(diff.added) == 1
+
+    def fail(path, data):
+        raise OSError("disk full")
+    monkeypatch.setattr(scanlist_sync, 'atomic_write', fail)
+    with pytest.raises(OSError):
+        scan_file.write(text + '460.12500 NFM\n')
+    assert len(scan_file.model) == 1
+    monkeypatch.undo()
+    assert len(scan_file.write(text + '460.12500 NFM\n').added) == 1
+    assert path.read_bytes().decode('utf-8').endswith('460.12500 NFM\n')
@@ -0,0 +1,23 @@
+from scheduler import FixedOrderScheduler, PriorityScheduler, simulate, synthetic_traffic
+from scanlist import ScanList
+
+
+def test_busy_channels_are_found_sooner_than_in_file_order():
+    seconds = 3600.0
+    freqs, priorities, traffic, kinds = synthetic_traffic(seconds)
+    fixed = simulate(FixedOrderScheduler(freqs, 0.1), traffic, kinds, seconds)
+    scheduler = PriorityScheduler(freqs, priorities, dwell=0.1, now=0.0)
+    adaptive = simulate(scheduler, traffic, kinds, seconds)
+    assert adaptive['busy_ttd_s'] < fixed['busy_ttd_s']
+    assert adaptive['busy_missed'] < fixed['busy_missed']
+    # Both always-on carriers get locked out
+    assert sorted({entry[1] for entry in scheduler.log}) == sorted(freqs[kinds == 'nuisance'].tolist())
+
+
+def test_from_scanlist_uses_priorities_and_history():
+    model = ScanList('423.1275 10 new\n460.0125 NFM 0 quiet\n460.0250 NFM 0 busy\n')
+    scheduler = PriorityScheduler.from_scanlist(model, {460_025_000: 30.0}, now=0.0)
+    assert scheduler.freqs_hz.tolist() == [423_127_500, 460_012_500, 460_025_000]
+    assert scheduler.priority.tolist() == [10.0, 0.0, 0.0]
+    assert scheduler.activity[2] > 0 == scheduler.activity[1]
+    assert scheduler.priority_channels.tolist() == [0]
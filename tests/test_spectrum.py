@@ -0,0 +1,36 @@
+import numpy as np
+
+from spectrum import SpectrumWorker
+
+
+class Tone:
+    def __init__(self):
+        self.offset = 0.1
+
+    def read(self, count):
+        self.offset = -self.offset
+        return np.exp(2j * np.pi * self.offset * np.arange(count)).astype(np.complex64)
+
+    def close(self):
+        pass
+
+
+def test_taken_frame_is_left_alone_while_the_worker_renders():
+    source = Tone()
+    worker = SpectrumWorker(source, fft_size=1024, width=256, update_rate=1000.0, sample_rate=48000,
+                            trace_height=20, waterfall_height=30)
+    assert worker.take_frame() is None
+    worker.process(source.read(1024))
+    frame = worker.take_frame()
+    assert frame.startswith(b'P6 256 50 255\n')
+    assert worker.take_frame() is None
+    held = bytes(frame)
+    for _ in range(3):
+        worker.process(source.read(1024))
+    assert frame == held
+    assert worker.skipped == 2
+    newest = worker.take_frame()
+    assert newest is not frame and newest != held
+    worker.process(source.read(1024))
+    assert newest != bytes(worker.take_frame())
+    assert len(newest) == len(worker.image.frame)
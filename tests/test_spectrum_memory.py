@@ -0,0 +1,52 @@
+import numpy as np
+
+from spectrum_memory import SpectrumMemory
+
+
+FFT_SIZE = 16384
+SAMPLE_RATE = 2.4e6
+CENTER = 460.0e6
+
+
+def frame(rng, carriers):
+    """fftshifted power: exponential noise plus ~8 kHz wide carriers at (Hz, dB)"""
+    bin_hz = SAMPLE_RATE / FFT_SIZE
+    power = rng.exponential(1.0, FFT_SIZE).astype(np.float32)
+    shape_bins = np.arange(-40, 41)
+    shape = np.exp(-0.5 * (shape_bins * bin_hz / 2.5e3) ** 2)
+    for freq, level_db in carriers:
+        b = int(round((freq - CENTER) / bin_hz)) + FFT_SIZE // 2
+        power[b + shape_bins] += 10 ** (level_db / 10) * shape
+    return power
+
+
+def test_unlisted_carriers_are_found_once_per_keying():
+    rng = np.random.default_rng(0)
+    listed, unlisted = 460.2125e6, 459.6375e6
+    memory = SpectrumMemory(FFT_SIZE, SAMPLE_RATE, CENTER, listed_hz=[listed])
+    schedule = [[]] * 3 + [[(listed, 20.0), (unlisted, 20.0)]] * 5 + [[]] * 3 + [[(unlisted, 20.0)]] * 2
+    found = [memory.update(frame(rng, carriers), now=float(k)) for k, carriers in enumerate(schedule)]
+    assert found == [0, 0, 0, 1] + [0] * 9
+    alerts = memory.alerts()
+    assert [a['freq_hz'] for a in alerts] == [unlisted]
+    assert alerts[0]['line'].startswith('459.63750 NFM found ')
+    assert memory.alerts() == []
+    # Keyed up again after going quiet: the same discovery, heard twice
+    [discovery] = memory.discovered()
+    assert discovery['hits'] == 2
+    assert (discovery['first_seen'], discovery['last_seen']) == (3.0, 11.0)
+    busy = memory.occupancy()[np.argmin(np.abs(memory.offsets_hz - (unlisted - CENTER)))]
+    assert busy == 7 / 13
+
+
+def test_listing_a_discovery_drops_it_and_reset_clears_the_hold():
+    rng = np.random.default_rng(1)
+    memory = SpectrumMemory(FFT_SIZE, SAMPLE_RATE, CENTER)
+    memory.update(frame(rng, []))
+    memory.update(frame(rng, [(460.5e6, 25.0)]))
+    assert [d['freq_hz'] for d in memory.discovered()] == [460.5e6]
+    assert memory.hold.max() > 100 * memory.noise
+    memory.set_listed([460.5e6])
+    assert memory.discovered() == []
+    memory.reset()
+    assert memory.hold.max() == 0 and memory.frames == 0
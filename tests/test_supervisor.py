@@ -0,0 +1,66 @@
+import os
+
+from scanlist import ScanList
+from supervisor import WINDOW_HZ, ScanSupervisor, fmp_command, measure_scaling, plan_shards, stand_in_command
+
+
+def banded(*bands, channels=40):
+    return ScanList(''.join(f"{band + k * 0.0125:.5f} NFM\n" for band in bands for k in range(channels)))
+
+
+def test_more_windows_than_dongles_reports_the_quietest():
+    model = banded(152.0, 460.0, 851.0)
+    busy = {int(round((851.0 + k * 0.0125) * 1e6)): 50.0 for k in range(40)}
+    shards, unplaced = plan_shards(model, 2, busy)
+    assert [round(s.center_hz / 1e6) for s in shards] == [851, 152]
+    assert [round(s.center_hz / 1e6) for s in unplaced] == [460]
+    assert all(s.span_hz <= WINDOW_HZ for s in shards)
+
+
+def test_spare_dongles_split_windows():
+    shards, unplaced = plan_shards(banded(460.0, channels=80), 3)
+    assert unplaced == []
+    assert sorted(len(s.freqs_hz) for s in shards) == [20, 20, 40]
+    single, _ = plan_shards(banded(460.0, channels=1), 2)
+    assert single[1] is None
+
+
+def test_each_instance_tunes_to_its_own_window(tmp_path):
+    supervisor = ScanSupervisor(fmp_command(), [1, 2], banded(152.0, 460.0, 851.0), base_dir=str(tmp_path))
+    assert supervisor.unplaced_channels == 40
+    for instance in supervisor.instances:
+        supervisor.prepare(instance)
+        with open(os.path.join(instance.cwd, 'FMP24.ScanList')) as f:
+            freqs = [float(line.split()[0]) * 1e6 for line in f]
+        assert len(freqs) == instance.channels == 40
+        assert max(abs(f - instance.center_hz) for f in freqs) < WINDOW_HZ / 2
+        assert f"-f{instance.center_hz / 1e6:.6f}" in supervisor.command(instance)
+
+
+def test_measure_scaling_leaves_base_dir_alone(tmp_path):
+    keep = tmp_path / 'FMP24.ScanList'
+    keep.write_text('423.50000 NFM\n')
+    results = measure_scaling(banded(152.0, 460.0), max_devices=2, seconds=0.3, base_dir=str(tmp_path))
+    assert [r['unplaced_channels'] for r in results.values()] == [40, 0]
+    assert os.listdir(tmp_path) == ['FMP24.ScanList']
+
+
+def test_editing_the_list_restarts_only_the_changed_shard(tmp_path):
+    supervisor = ScanSupervisor(stand_in_command(), [1, 2], banded(152.0, 460.0), base_dir=str(tmp_path),
+                                check_interval=60.0).start()
+    try:
+        pids = {i.device: i.process.pid for i in supervisor.instances}
+        edited = banded(152.0, 460.0)
+        edited.set_text(edited.text + '460.60000 NFM\n')
+        changed = supervisor.replan(edited)
+        assert [round(i.center_hz / 1e6) for i in changed] == [460]
+        supervisor.restart('scan list', changed)
+        for instance in supervisor.instances:
+            with open(os.path.join(instance.cwd, 'FMP24.ScanList')) as f:
+                count = sum(1 for line in f if line.strip())
+            assert count == instance.channels
+            assert (instance.process.pid != pids[instance.device]) == (instance in changed)
+        assert sorted(i.channels for i in supervisor.instances) == [40, 41]
+        assert supervisor.replan(edited) == []
+    finally:
+        supervisor.stop()
@@ -0,0 +1,34 @@
+import numpy as np
+
+from survey import BandSurvey, SimulatedBand, mode_for_width, propose, snap
+
+
+def test_snap_prefers_the_coarsest_step_in_tolerance():
+    assert snap(462_562_700, (5000, 6250, 12500), 500) == (462_562_500, 12500)
+    assert snap(851_006_300, (6250, 12500), 500) == (851_006_250, 6250)
+    # Nothing within tolerance: the finest raster
+    assert snap(460_002_000, (6250, 12500), 100) == (460_000_000, 6250)
+
+
+def test_mode_from_occupied_width():
+    assert mode_for_width(3e3) == 'NX48'
+    assert mode_for_width(11e3) == 'NFM'
+
+
+def test_sweep_finds_the_carriers_and_marks_listed_ones():
+    rng = np.random.default_rng(5)
+    start = 460.0e6
+    truth = np.sort(rng.choice(np.arange(start + 50e3, start + 6e6 - 50e3, 12.5e3), 10, replace=False))
+    levels = rng.uniform(15, 40, len(truth))
+    survey = BandSurvey(SimulatedBand(truth, levels, np.full(len(truth), 11e3), seed=5), start, start + 6e6)
+    spectrum = survey.run()
+    names = {truth[-1]: 'Repeater'}
+    candidates = propose(spectrum, existing_hz=truth[:3], lookup=lambda freq, step: names.get(freq))
+    proposed = np.array([c['freq_hz'] for c in candidates])
+    assert np.isin(truth, proposed).all()
+    assert np.isin(proposed, truth).all()
+    assert [c['snr_db'] for c in candidates] == sorted((c['snr_db'] for c in candidates), reverse=True)
+    by_freq = {c['freq_hz']: c for c in candidates}
+    assert sorted(f for f, c in by_freq.items() if c['listed']) == sorted(truth[:3])
+    assert by_freq[truth[-1]]['line'].startswith(f"{truth[-1] / 1e6:.5f} NFM Repeater ")
+    assert by_freq[truth[3]]['line'].split()[2] == 'survey'
@@ -0,0 +1,65 @@
+import wave
+
+import pytest
+
+from tone_decoder import (CTCSS_TONES, DCS_CODES, ToneDecoder, TonePolicy, WavTcpServer,
+                          read_tcp_audio, synthetic_audio)
+
+RATE = 48000
+
+
+def decode(decoder, audio, stream_id=0, block=4800):
+    tag = None
+    for start in range(0, len(audio), block):
+        decoder.feed(stream_id, audio[start:start + block])
+        tag = decoder.decode().get(stream_id, tag)
+    return tag
+
+
+@pytest.mark.parametrize('tone', [CTCSS_TONES[0], 100.0, 156.7, CTCSS_TONES[-1]])
+def test_ctcss(tone):
+    assert decode(ToneDecoder(RATE), synthetic_audio(1.5, RATE, ctcss=tone)) == f"{tone:.1f}"
+
+
+@pytest.mark.parametrize('code', ['023', '131', DCS_CODES[-1]])
+def test_dcs(code):
+    assert decode(ToneDecoder(RATE), synthetic_audio(1.5, RATE, dcs=code)) == f"D{code}N"
+
+
+def test_plain_voice_has_no_tag_and_streams_are_independent():
+    decoder = ToneDecoder(RATE)
+    voice = synthetic_audio(1.5, RATE, seed=1)
+    toned = synthetic_audio(1.5, RATE, ctcss=123.0, seed=2)
+    for start in range(0, len(voice), 4800):
+        decoder.feed('a', voice[start:start + 4800])
+        decoder.feed('b', toned[start:start + 4800])
+        tags = decoder.decode()
+    assert tags == {'a': None, 'b': '123.0'}
+    decoder.reset('b')
+    assert decoder.decode() == {'a': None}
+
+
+def test_policy():
+    policy = TonePolicy(hold={None: {'100.0'}}, skip={460_000_000: {'100.0', 'D023N'}})
+    assert policy.action(460_000_000, '100.0') == 'skip'
+    assert policy.action(460_012_500, '100.0') == 'hold'
+    assert policy.action(460_012_500, None) is None
+
+
+def test_tag_from_tcp_audio(tmp_path):
+    path = str(tmp_path / 'tone.wav')
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        wav.writeframes((synthetic_audio(1.5, RATE, ctcss=88.5) * 32767).astype('<i2').tobytes())
+    server = WavTcpServer(path, realtime=False)
+    try:
+        decoder = ToneDecoder(RATE)
+        tag = None
+        for block in read_tcp_audio(*server.address):
+            decoder.feed(0, block)
+            tag = decoder.decode().get(0, tag)
+    finally:
+        server.close()
+    assert tag == '88.5'
@@ -0,0 +1,358 @@
+"""Sub-audible CTCSS/DCS tone decoder for FMP24's TCP audio output
+
+FMP stops on every carrier.  Decoding the CTCSS tone or DCS code under the
+audio lets the launcher tag each hit and skip or hold on it.  Audio is
+low-passed and decimated to 1.2 kHz, then all 50 CTCSS tones are measured
+with one matrix product (a Goertzel filter bank evaluated as a DFT at the
+tone frequencies) and DCS bits are sliced at 134.4 baud and matched
+against every rotation of every Golay codeword.
+"""
+import socket
+import threading
+import time
+import wave
+
+import numpy as np
+
+
+CTCSS_TONES = np.array([
+    67.0, 69.3, 71.9, 74.4, 77.0, 79.7, 82.5, 85.4, 88.5, 91.5,
+    94.8, 97.4, 100.0, 103.5, 107.2, 110.9, 114.8, 118.8, 123.0, 127.3,
+    131.8, 136.5, 141.3, 146.2, 151.4, 156.7, 159.8, 162.2, 165.5, 167.9,
+    171.3, 173.8, 177.3, 179.9, 183.5, 186.2, 189.9, 192.8, 196.6, 199.5,
+    203.5, 206.5, 210.7, 218.1, 225.7, 229.1, 233.6, 241.8, 250.3, 254.1,
+])
+
+DCS_CODES = (
+    '023', '025', '026', '031', '032', '036', '043', '047', '051', '053',
+    '054', '065', '071', '072', '073', '074', '114', '115', '116', '122',
+    '125', '131', '132', '134', '143', '145', '152', '155', '156', '162',
+    '165', '172', '174', '205', '212', '223', '225', '226', '243', '244',
+    '245', '246', '251', '252', '255', '261', '263', '265', '266', '271',
+    '274', '306', '311', '315', '325', '331', '332', '343', '346', '351',
+    '356', '364', '365', '371', '411', '412', '413', '423', '431', '432',
+    '445', '446', '452', '454', '455', '462', '464', '465', '466', '503',
+    '506', '516', '523', '526', '532', '546', '565', '606', '612', '624',
+    '627', '631', '632', '654', '662', '664', '703', '712', '723', '731',
+    '732', '734', '743', '754',
+)
+
+DCS_BAUD = 134.4
+GOLAY_GENERATOR = 0xC75
+WORD_BITS = 23
+WORD_MASK = (1 << WORD_BITS) - 1
+
+DECIMATED_RATE = 1200.0
+
+
+def golay_parity(data):
+    """11 parity bits of the (23,12) Golay code for 12 data bits"""
+    reg = data << 11
+    for bit in range(22, 10, -1):
+        if reg & (1 << bit):
+            reg ^= GOLAY_GENERATOR << (bit - 11)
+    return reg & 0x7FF
+
+
+def dcs_codeword(code):
+    """23-bit DCS word, bit 0 sent first: 9 code bits, '100' marker, parity"""
+    data = int(code, 8) | (0b100 << 9)
+    return data | (golay_parity(data) << 12)
+
+
+def _rotations(word):
+    return [((word >> r) | (word << (WORD_BITS - r))) & WORD_MASK for r in range(WORD_BITS)]
+
+
+def _dcs_table():
+    """Sorted rotations of every codeword with their names"""
+    table = {}
+    # Inverted codes alias other codes' normal words (023I is 047N); prefer N
+    for polarity in ('N', 'I'):
+        for code in DCS_CODES:
+            word = dcs_codeword(code)
+            if polarity == 'I':
+                word = ~word & WORD_MASK
+            for rotated in _rotations(word):
+                table.setdefault(rotated, f"D{code}{polarity}")
+    keys = np.array(sorted(table), dtype=np.int64)
+    return keys, [table[k] for k in keys]
+
+
+DCS_WORDS, DCS_NAMES = _dcs_table()
+
+
+def lowpass_taps(sample_rate, cutoff, transition):
+    count = int(4.0 * sample_rate / transition) | 1
+    n = np.arange(count) - (count - 1) / 2.0
+    taps = np.sinc(2 * cutoff / sample_rate * n) * np.hamming(count)
+    return (taps / taps.sum()).astype(np.float32)
+
+
+class ToneStream:
+    """Per-stream state: decimating lowpass filter and a decimated window"""
+
+    def __init__(self, sample_rate, window_seconds):
+        self.sample_rate = sample_rate
+        self.decimation = max(1, int(round(sample_rate / DECIMATED_RATE)))
+        self.rate = sample_rate / self.decimation
+        self.taps = lowpass_taps(sample_rate, 300.0, 300.0)
+        self.history = np.zeros(len(self.taps) - 1, dtype=np.float32)
+        self.phase = 0  # input samples to skip before the next decimated output
+        self.window = np.zeros(int(round(window_seconds * self.rate)), dtype=np.float32)
+        self.filled = 0
+        self.tag = None
+        self.candidate = None
+        self.candidate_count = 0
+
+    def feed(self, samples):
+        """Filter and decimate one block of audio into the analysis window"""
+        samples = np.asarray(samples, dtype=np.float32)
+        data = np.concatenate((self.history, samples))
+        taps = len(self.taps)
+        start = self.phase
+        available = len(data) - taps + 1
+        if available > start:
+            frames = np.lib.stride_tricks.sliding_window_view(data, taps)[start:available:self.decimation]
+            out = frames @ self.taps[::-1]
+            count = len(out)
+            self.phase = start + count * self.decimation - available
+            if count >= len(self.window):
+                self.window[:] = out[-len(self.window):]
+            else:
+                self.window[:-count] = self.window[count:]
+                self.window[-count:] = out
+            self.filled = min(len(self.window), self.filled + count)
+        else:
+            self.phase = start - available
+        self.history = data[len(data) - (taps - 1):]
+
+    def ready(self):
+        return self.filled == len(self.window)
+
+
+class ToneDecoder:
+    """Batched CTCSS/DCS decoder for one or more audio streams
+
+    feed(stream_id, samples) is cheap; decode() evaluates every ready stream
+    with a single (streams x window) @ (window x tones) product.  A tag is
+    reported once it has been seen `confirm` times in a row.
+    """
+
+    def __init__(self, sample_rate=48000, window_seconds=0.5, ctcss_threshold=0.3,
+                 confirm=2):
+        self.sample_rate = sample_rate
+        self.window_seconds = window_seconds
+        self.ctcss_threshold = ctcss_threshold
+        self.confirm = confirm
+        self.streams = {}
+        probe = ToneStream(sample_rate, window_seconds)
+        n = np.arange(len(probe.window))
+        self.rate = probe.rate
+        self.basis = np.exp(-2j * np.pi * np.outer(n, CTCSS_TONES) / probe.rate).astype(np.complex64)
+        self.samples_per_bit = probe.rate / DCS_BAUD
+        self.decode_seconds = 0.0
+        self.decodes = 0
+
+    def stream(self, stream_id):
+        if stream_id not in self.streams:
+            self.streams[stream_id] = ToneStream(self.sample_rate, self.window_seconds)
+        return self.streams[stream_id]
+
+    def feed(self, stream_id, samples):
+        self.stream(stream_id).feed(samples)
+
+    def reset(self, stream_id):
+        """Forget a stream's audio and tag, e.g. when its transmission ends"""
+        self.streams.pop(stream_id, None)
+
+    def decode(self):
+        """Update and return {stream_id: tag} for every stream with a full window"""
+        started = time.perf_counter()
+        ready = [(sid, s) for sid, s in self.streams.items() if s.ready()]
+        if not ready:
+            return {}
+        windows = np.stack([s.window for _, s in ready])
+        windows -= windows.mean(axis=1, keepdims=True)
+        spectrum = np.abs(windows @ self.basis) ** 2
+        total = (windows ** 2).sum(axis=1) * windows.shape[1] / 2 + 1e-12
+        ratio = spectrum / total[:, None]
+        best = ratio.argmax(axis=1)
+        result = {}
+        for row, (sid, stream) in enumerate(ready):
+            tag = None
+            if ratio[row, best[row]] >= self.ctcss_threshold:
+                tag = f"{CTCSS_TONES[best[row]]:.1f}"
+            else:
+                tag = self.decode_dcs(windows[row])
+            result[sid] = self._confirm(stream, tag)
+        self.decode_seconds += time.perf_counter() - started
+        self.decodes += 1
+        return result
+
+    def decode_dcs(self, window):
+        """Slice NRZ bits at every clock phase and look for DCS codewords"""
+        spb = self.samples_per_bit
+        bits_available = int((len(window) - spb) / spb)
+        if bits_available < WORD_BITS:
+            return None
+        weights = np.int64(1) << np.arange(WORD_BITS, dtype=np.int64)
+        best_name, best_hits = None, 0
+        for phase in np.linspace(0, spb, 8, endpoint=False):
+            positions = (phase + spb / 2 + spb * np.arange(bits_available)).astype(np.int64)
+            bits = (window[positions] > 0).astype(np.int64)
+            words = np.lib.stride_tricks.sliding_window_view(bits, WORD_BITS) @ weights
+            index = np.searchsorted(DCS_WORDS, words)
+            index[index >= len(DCS_WORDS)] = 0
+            hits = index[DCS_WORDS[index] == words]
+            if len(hits) > best_hits:
+                names = [DCS_NAMES[i] for i in hits]
+                best_name = max(set(names), key=names.count)
+                best_hits = len(hits)
+        # Need most of the window to agree before calling it a code
+        if best_hits >= (bits_available - WORD_BITS + 1) // 2:
+            return best_name
+        return None
+
+    def _confirm(self, stream, tag):
+        if tag == stream.candidate:
+            stream.candidate_count += 1
+        else:
+            stream.candidate, stream.candidate_count = tag, 1
+        if stream.candidate_count >= self.confirm:
+            stream.tag = tag
+        return stream.tag
+
+    def cpu_per_decode_ms(self):
+        return self.decode_seconds / self.decodes * 1000.0 if self.decodes else 0.0
+
+
+class TonePolicy:
+    """Decide whether to hold or skip a channel from its tone tag
+
+    hold/skip map a channel (or None for every channel) to a set of tags.
+    """
+
+    def __init__(self, hold=None, skip=None):
+        self.hold = hold or {}
+        self.skip = skip or {}
+
+    def action(self, channel, tag):
+        if tag is None:
+            return None
+        for rules, verdict in ((self.skip, 'skip'), (self.hold, 'hold')):
+            if tag in rules.get(channel, ()) or tag in rules.get(None, ()):
+                return verdict
+        return None
+
+
+def read_tcp_audio(host, port, block_samples=4800, timeout=5.0):
+    """Yield int16 mono audio blocks from an FMP24 -o<port> stream as float32"""
+    with socket.create_connection((host, port), timeout) as sock:
+        buffer = bytearray()
+        size = block_samples * 2
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return
+            buffer.extend(chunk)
+            while len(buffer) >= size:
+                block = np.frombuffer(bytes(buffer[:size]), dtype='<i2').astype(np.float32)
+                del buffer[:size]
+                yield block / 32768.0
+
+
+class WavTcpServer:
+    """Local stand-in for FMP24's audio port that plays back a 16-bit mono WAV"""
+
+    def __init__(self, path, host='127.0.0.1', port=0, realtime=True, loop=False):
+        with wave.open(path, 'rb') as wav:
+            if wav.getsampwidth() != 2 or wav.getnchannels() != 1:
+                raise ValueError("WAV playback needs 16-bit mono audio")
+            self.sample_rate = wav.getframerate()
+            self.data = wav.readframes(wav.getnframes())
+        self.realtime = realtime
+        self.loop = loop
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind((host, port))
+        self._listener.listen(1)
+        self.address = self._listener.getsockname()
+        self._thread = threading.Thread(target=self._serve, name="wav-tcp", daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        chunk = self.sample_rate // 10 * 2
+        while True:
+            try:
+                conn, _ = self._listener.accept()
+            except OSError:
+                return
+            with conn:
+                try:
+                    while True:
+                        started = time.perf_counter()
+                        for offset in range(0, len(self.data), chunk):
+                            conn.sendall(self.data[offset:offset + chunk])
+                            if self.realtime:
+                                due = started + (offset + chunk) / 2 / self.sample_rate
+                                time.sleep(max(0.0, due - time.perf_counter()))
+                        if not self.loop:
+                            break
+                except OSError:
+                    pass
+
+    def close(self):
+        self._listener.close()
+
+
+def synthetic_audio(seconds, sample_rate=48000, ctcss=None, dcs=None, voice=True, seed=0):
+    """Speech-band noise plus a CTCSS tone or DCS code, as float32"""
+    rng = np.random.default_rng(seed)
+    count = int(seconds * sample_rate)
+    t = np.arange(count) / sample_rate
+    audio = np.zeros(count)
+    if voice:
+        audio += 0.3 * np.sin(2 * np.pi * 800 * t) * rng.uniform(0.5, 1.0)
+        audio += 0.05 * rng.standard_normal(count)
+    if ctcss is not None:
+        audio += 0.15 * np.sin(2 * np.pi * ctcss * t)
+    if dcs is not None:
+        word = dcs_codeword(dcs)
+        bits = np.array([(word >> (i % WORD_BITS)) & 1 for i in range(int(seconds * DCS_BAUD) + 1)])
+        audio += 0.15 * (2.0 * bits[(t * DCS_BAUD).astype(np.int64)] - 1.0)
+    return audio.astype(np.float32)
+
+
+def measure(streams=8, seconds=3.0, block_seconds=0.1, sample_rate=48000):
+    """Per-block CPU and time-to-tag for several streams decoded together"""
+    decoder = ToneDecoder(sample_rate)
+    sources = {}
+    for i in range(streams):
+        if i % 2:
+            sources[i] = synthetic_audio(seconds, sample_rate, dcs=DCS_CODES[i * 7], seed=i)
+        else:
+            sources[i] = synthetic_audio(seconds, sample_rate, ctcss=CTCSS_TONES[i * 5], seed=i)
+    block = int(block_seconds * sample_rate)
+    feed_seconds = 0.0
+    first_tag = {}
+    blocks = int(seconds / block_seconds)
+    for b in range(blocks):
+        started = time.perf_counter()
+        for sid, audio in sources.items():
+            decoder.feed(sid, audio[b * block:(b + 1) * block])
+        feed_seconds += time.perf_counter() - started
+        for sid, tag in decoder.decode().items():
+            if tag is not None and sid not in first_tag:
+                first_tag[sid] = (tag, (b + 1) * block_seconds)
+    return {
+        'streams': streams,
+        'tags': {sid: tag for sid, (tag, _) in sorted(first_tag.items())},
+        'time_to_tag_ms': max((t for _, t in first_tag.values()), default=0.0) * 1000.0,
+        'feed_ms_per_block': feed_seconds / blocks * 1000.0,
+        'decode_ms_per_block': decoder.cpu_per_decode_ms(),
+    }
+
+
+if __name__ == "__main__":
+    print(measure())